@@ -1,7 +1,7 @@
 # app/api/v1/api.py
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import matches
+from app.api.v1.endpoints import admin, events, matches
 # from app.api.v1.endpoints import users # Ví dụ nếu có thêm endpoint cho user
 
 api_router_v1 = APIRouter()
@@ -17,6 +17,8 @@ api_router_v1 = APIRouter()
 # Để rõ ràng, ta sẽ bỏ prefix ở đây và quản lý ở main.py.
 # Tag "Match Predictions" sẽ được sử dụng từ matches.router.
 api_router_v1.include_router(matches.router, tags=["Match Predictions"]) # Giả sử tag đã được đặt trong matches.router
+api_router_v1.include_router(events.router, tags=["Events"])
+api_router_v1.include_router(admin.router, tags=["Admin"])
 
 # Hoặc nếu muốn ghi đè/thêm tag ở đây:
 # api_router_v1.include_router(matches.router, tags=["Match Predictions"])
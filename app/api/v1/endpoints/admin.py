@@ -0,0 +1,79 @@
+# app/api/v1/endpoints/admin.py
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app import schemas
+from app.core.security import require_admin_token
+from app.api.v1.endpoints import matches
+from app.services.model_reload import ModelReloader
+
+router = APIRouter()
+
+
+# --- ModelReloader, gắn vào app.state.model_reloader trong lifespan của app/main.py (sau init_match_state) ---
+def init_admin_state(state) -> None:
+    # Runtime cũ được dừng khi mọi request/job đang giữ nó đã kết thúc (kể cả job chạy tiếp sau timeout)
+    state.model_reloader = ModelReloader(
+        lambda version: matches.reload_match_runtime(state, version),
+        lambda runtime: runtime.retire(),
+    )
+
+
+def _timestamp(seconds: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc) if seconds is not None else None
+
+
+def _reload_status(reloader: ModelReloader) -> schemas.admin.ModelReloadStatus:
+    reload_status = reloader.status()
+    return schemas.admin.ModelReloadStatus(
+        state=reload_status["state"], target_version=reload_status["target_version"], error=reload_status["error"],
+        started_at=_timestamp(reload_status["started_at"]), finished_at=_timestamp(reload_status["finished_at"]))
+
+
+@router.get(
+    "/admin/model",
+    response_model=schemas.admin.ModelStatusResponse,
+    dependencies=[Depends(require_admin_token)],
+    summary="Active Model Version",
+    description="""
+    Returns the model version serving requests, the versions available in the model registry (subdirectories of
+    `ml_models/`, oldest first) and the status of the last reload. Requires the `X-Admin-Token` header.
+    """
+)
+async def get_model_status(request: Request):
+    state = request.app.state
+    runtime = state.match_runtime
+    return schemas.admin.ModelStatusResponse(
+        active_version=runtime.version if runtime is not None else None,
+        model_version=runtime.predictor.model_version if runtime is not None else None,
+        loaded_at=_timestamp(runtime.loaded_at) if runtime is not None else None,
+        available_versions=state.model_registry.list_versions(),
+        reload=_reload_status(state.model_reloader),
+    )
+
+
+@router.post(
+    "/admin/model/reload",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.admin.ModelReloadStatus,
+    dependencies=[Depends(require_admin_token)],
+    summary="Reload the Model",
+    description="""
+    Loads `version` (default: the latest version) in the background. The version's columns and scalers are
+    validated and the model is warmed up and its feature store built before it replaces the active model, so
+    requests keep being served by the current model during the reload; requests already running finish on the
+    model they started with. If loading fails the current model stays active and the error is reported by
+    `GET /admin/model`. Requires the `X-Admin-Token` header.
+    """
+)
+async def reload_model(reload_request: schemas.admin.ModelReloadRequest, request: Request):
+    state = request.app.state
+    try:
+        version, _ = state.model_registry.resolve(reload_request.version or "")
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    if not state.model_reloader.start(version):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A model reload is already in progress.")
+    return _reload_status(state.model_reloader)
@@ -0,0 +1,89 @@
+# app/api/v1/endpoints/events.py
+from typing import List, Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app import schemas
+from app.api.v1.endpoints import matches
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import SessionLocal
+from app.services.user_events import UserUpdateQueue, UserUpdateQueueFullError
+
+router = APIRouter()
+
+
+# --- Hàng đợi sự kiện, gắn vào app.state.user_update_queue trong lifespan của app/main.py ---
+# (sau init_match_state: dùng predictor, feature store và result cache của app.state.match_runtime)
+def init_event_state(state) -> None:
+    state.user_update_queue = UserUpdateQueue(
+        lambda user_ids: _apply_user_updates(state, user_ids),
+        coalesce_seconds=settings.USER_EVENTS_COALESCE_SECONDS,
+        max_delay_seconds=settings.USER_EVENTS_MAX_DELAY_SECONDS,
+        max_batch_size=settings.USER_EVENTS_MAX_BATCH_SIZE,
+        max_pending=settings.USER_EVENTS_MAX_PENDING,
+        max_retries=settings.USER_EVENTS_MAX_RETRIES,
+        retry_backoff_seconds=settings.USER_EVENTS_RETRY_BACKOFF_SECONDS,
+    )
+    state.user_update_queue.start()
+    metrics.register_collector(lambda: _collect_event_metrics(state), name="user_events")
+
+
+def shutdown_event_state(state) -> None:
+    queue = getattr(state, "user_update_queue", None)
+    if queue is not None:
+        queue.stop(timeout=5)
+
+
+def _apply_user_updates(state, user_ids: List[int]) -> None:
+    """Chạy trong thread của UserUpdateQueue, với session DB riêng, trên runtime của version model hiện tại."""
+    runtime = matches.acquire_match_runtime(state)
+    if runtime is None:
+        raise RuntimeError("No model is loaded.")
+    db = SessionLocal()
+    try:
+        runtime.service(db).apply_user_updates(user_ids)
+    finally:
+        db.close()
+        runtime.release()
+
+
+def _collect_event_metrics(state):
+    yield ("amoura_user_event_queue_depth", "gauge", "Users with user-updated events waiting to be processed.",
+           [({}, state.user_update_queue.depth)])
+
+
+def get_user_update_queue(request: Request) -> UserUpdateQueue:
+    queue = getattr(request.app.state, "user_update_queue", None)
+    if queue is None or getattr(request.app.state, "match_runtime", None) is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Match prediction service is not available due to model loading issues.")
+    return queue
+
+
+@router.post(
+    "/events/user-updated",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.event.UserUpdatedEventAccepted,
+    summary="Notify that a User Changed",
+    description="""
+    Call after a user's profile, location, pets, interests or languages change, or after the user is deleted
+    or changes role. The user's features are refreshed and only the pairs involving that user are rescored,
+    in both directions; the user's own cached results are replaced, other users' cached results that contain (or
+    would now contain) the user are invalidated, and the precomputed matches table is updated. Events are
+    processed asynchronously and coalesced: several events for the same user within
+    `USER_EVENTS_COALESCE_SECONDS` trigger a single rescore. Failed rescores are retried with exponential backoff.
+    Returns 503 when `USER_EVENTS_MAX_PENDING` users are already waiting to be processed.
+    """
+)
+async def user_updated(
+    event: schemas.event.UserUpdatedEvent,
+    user_update_queue: Annotated[UserUpdateQueue, Depends(get_user_update_queue)],
+):
+    try:
+        coalesced = user_update_queue.submit(event.user_id)
+    except UserUpdateQueueFullError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="User-updated event queue is full, please retry later.")
+    return schemas.event.UserUpdatedEventAccepted(user_id=event.user_id, coalesced=coalesced,
+                                                  queue_depth=user_update_queue.depth)
@@ -1,44 +1,296 @@
 # app/api/v1/endpoints/matches.py
-from fastapi import APIRouter, Depends, HTTPException, status
+import threading
+import time
+from contextlib import nullcontext
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from typing import List, Annotated # Annotated cho FastAPI 0.95+
+from typing import Callable, ContextManager, Dict, Iterator, List, Annotated, Optional # Annotated cho FastAPI 0.95+
 
 from app import schemas # Schemas từ app/schemas/__init__.py
-from app.services.match_service import MatchService
+from app.services.match_service import MatchService, decode_match_cursor, encode_match_cursor
+from app.services.scoring_pool import ShardedScoringPool
+from app.services.match_cache import InMemoryMatchCacheBackend, MatchResultCache
 from app.ml.predictor import MatchPredictor
-from app.db.session import get_db
+from app.ml.feature_store import UserFeatureStore
+from app.ml.model_registry import ModelRegistry
+from app.db.session import SessionLocal
 from app.core.config import settings # Để lấy role name (nếu cần config)
+from app.core.concurrency import BoundedExecutor, ExecutorSaturatedError, ExecutorTimeoutError
+from app.core.metrics import metrics
+from app.core.security import require_admin_token
 
 router = APIRouter()
 
-# --- Khởi tạo MatchPredictor ---
-# Cách 1: Khởi tạo global (đơn giản cho ví dụ này, model tải 1 lần khi module import)
-# Trong production, bạn có thể muốn quản lý instance này tốt hơn, ví dụ qua lifespan events
-# hoặc một dependency phức tạp hơn nếu việc khởi tạo tốn nhiều tài nguyên.
-try:
-    match_predictor_instance = MatchPredictor()
-    print("INFO: MatchPredictor initialized successfully.")
-except FileNotFoundError as fnf_error:
-    print(f"CRITICAL: FileNotFoundError during MatchPredictor initialization - {fnf_error}. Check model paths and file existence.")
-    match_predictor_instance = None # Đảm bảo nó là None để get_match_service bắt được
-except Exception as e:
-    print(f"CRITICAL: Failed to initialize MatchPredictor due to an unexpected error: {e}")
-    import traceback
-    traceback.print_exc() # In chi tiết traceback để debug
-    match_predictor_instance = None
-
-
-# --- Dependency để lấy MatchService ---
-def get_match_service(
-    db: Annotated[Session, Depends(get_db)], # Python 3.9+
-    # db: Session = Depends(get_db) # Python < 3.9
-) -> MatchService:
-    if not match_predictor_instance:
+# --- Các thành phần dùng chung của match endpoints ---
+# Được tạo trong lifespan của app/main.py (không tạo lúc import module) và gắn vào app.state:
+#   model_registry, match_runtime (MatchRuntime của version model đang dùng), match_executor
+class MatchRuntime:
+    """
+    Mọi thành phần phụ thuộc vào một version model: predictor, UserFeatureStore, ShardedScoringPool và cache kết quả
+    (namespace theo version). Khi reload model, một MatchRuntime mới được tạo và khởi động đầy đủ rồi thay cho
+    runtime cũ bằng một phép gán app.state.match_runtime; mỗi request lấy runtime một lần lúc bắt đầu nên request
+    đang chạy dùng trọn vẹn version cũ cho tới khi xong.
+    Request và job giữ runtime bằng acquire()/release(); runtime cũ bị retire() chỉ dừng khi holder cuối cùng trả
+    nó (job chạy tiếp sau khi request timeout vẫn giữ runtime tới khi xong).
+    """
+
+    def __init__(self, version: str, predictor: MatchPredictor):
+        self.version = version
+        self.predictor = predictor
+        self.loaded_at = time.time()
+        self._holders_lock = threading.Lock()
+        self._holders = 0
+        self._retired = False
+        self._closed = False
+        # UserFeatureStore (snapshot feature của toàn bộ USER, được build trong start())
+        self.user_feature_store = (
+            UserFeatureStore(predictor, fetch_chunk_size=settings.CANDIDATE_FETCH_CHUNK_SIZE,
+                             ann_enabled=settings.ANN_RETRIEVAL_ENABLED, ann_n_lists=settings.ANN_N_LISTS)
+            if settings.USER_FEATURE_STORE_ENABLED else None
+        )
+        # ShardedScoringPool (tùy chọn, chỉ dùng cho DB path khi store chưa sẵn sàng/bị tắt)
+        self.scoring_pool = (
+            ShardedScoringPool(max_workers=settings.MATCH_PROCESS_POOL_WORKERS,
+                               shard_size=settings.MATCH_PROCESS_POOL_SHARD_SIZE,
+                               models_dir=predictor.models_dir,
+                               inference_mode=predictor.inference_mode,
+                               early_exit=predictor.tree_evaluator is not None,
+                               early_exit_min_threshold=predictor.early_exit_min_threshold,
+                               use_bundle=predictor.bundle is not None)
+            if settings.MATCH_PROCESS_POOL_WORKERS > 0 else None
+        )
+        # Cache kết quả potential matches (namespace theo model version + cấu hình ảnh hưởng kết quả)
+        self.result_cache = (
+            MatchResultCache(
+                InMemoryMatchCacheBackend(max_entries=settings.MATCH_RESULT_CACHE_MAX_ENTRIES),
+                ttl_seconds=settings.MATCH_RESULT_CACHE_TTL_SECONDS,
+                namespace=f"{version}:{predictor.model_version}:{settings.MATCH_PROBABILITY_THRESHOLD}"
+                          f":{settings.GEO_FILTER_MODE.lower()}"
+                          f"{f':ann{settings.ANN_CANDIDATES}' if settings.ANN_RETRIEVAL_ENABLED else ''}",
+                max_indexed_entries=settings.MATCH_RESULT_CACHE_MAX_ENTRIES,
+            )
+            if settings.MATCH_RESULT_CACHE_ENABLED else None
+        )
+
+    def start(self, phase: Callable[[str], ContextManager] = lambda name: nullcontext(), strict: bool = False) -> None:
+        """
+        Warmup predictor, build UserFeatureStore và khởi động worker của ShardedScoringPool; mỗi bước chạy trong
+        phase(tên bước). strict=False (startup): lỗi chỉ được log, service dùng đường chậm hơn (DB path, khởi tạo
+        lười). strict=True (reload): lỗi được ném ra để giữ version cũ.
+        """
+        def step(name: str, func: Callable[[], object], warning: str) -> None:
+            with phase(name):
+                try:
+                    func()
+                except Exception as e:
+                    if strict:
+                        raise
+                    print(f"WARNING: {warning}: {e}")
+
+        # Chấm điểm tổng hợp để request đầu tiên không phải trả chi phí khởi tạo lười
+        step("warmup", lambda: self.predictor.warmup(threshold=settings.MATCH_PROBABILITY_THRESHOLD),
+             "MatchPredictor warmup failed")
+        # Build snapshot feature của toàn bộ USER. Nếu lỗi (vd: DB chưa sẵn sàng),
+        # service vẫn chạy được bằng cách tải candidate từ DB cho mỗi request.
+        if self.user_feature_store is not None:
+            step("feature_store", self._build_feature_store,
+                 "Failed to build UserFeatureStore, falling back to per-request DB loading")
+        # Khởi động trước các worker process của ShardedScoringPool (mỗi worker nạp model một lần)
+        if self.scoring_pool is not None:
+            step("scoring_pool", self.scoring_pool.warmup, "Failed to start ShardedScoringPool workers")
+
+    def _build_feature_store(self) -> None:
+        db = SessionLocal()
+        try:
+            self.user_feature_store.build(db)
+        finally:
+            db.close()
+
+    def service(self, db: Session) -> MatchService:
+        return MatchService(db=db, predictor=self.predictor, feature_store=self.user_feature_store,
+                            scoring_pool=self.scoring_pool, result_cache=self.result_cache)
+
+    def acquire(self) -> bool:
+        """Giữ runtime cho một request/job; trả về False nếu runtime đã bị dừng (lấy lại app.state.match_runtime)."""
+        with self._holders_lock:
+            if self._closed:
+                return False
+            self._holders += 1
+            return True
+
+    def release(self) -> None:
+        with self._holders_lock:
+            self._holders -= 1
+            close = self._retired and self._holders == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self.shutdown()
+
+    def retire(self) -> None:
+        """Gọi sau khi runtime đã bị thay: dừng ngay nếu không còn ai giữ, nếu không thì khi holder cuối cùng trả nó."""
+        with self._holders_lock:
+            self._retired = True
+            close = self._holders == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        if self.scoring_pool is not None:
+            self.scoring_pool.shutdown(wait=False)
+
+
+def acquire_match_runtime(state) -> Optional[MatchRuntime]:
+    """Lấy và giữ runtime hiện tại (None nếu chưa có model); caller phải release() nó."""
+    while True:
+        runtime = getattr(state, "match_runtime", None)
+        # acquire() chỉ lỗi khi runtime vừa bị thay và đã dừng: app.state đã trỏ tới runtime mới
+        if runtime is None or runtime.acquire():
+            return runtime
+
+
+def _predictor_kwargs() -> dict:
+    return dict(inference_mode=settings.MATCH_MODEL_INFERENCE.lower(), n_jobs=settings.MATCH_MODEL_N_JOBS,
+                early_exit=settings.MATCH_EARLY_EXIT_ENABLED, pair_cache_size=settings.PAIR_SCORE_CACHE_MAX_ENTRIES,
+                use_bundle=settings.MODEL_BUNDLE_ENABLED,
+                early_exit_min_threshold=settings.MATCH_EARLY_EXIT_MIN_THRESHOLD)
+
+
+def load_match_runtime(registry: ModelRegistry, version: str = "") -> Optional[MatchRuntime]:
+    """Tải version model (rỗng = mới nhất); trả về None nếu lỗi (các endpoint trả 503 thay vì làm hỏng cả app)."""
+    try:
+        version, predictor = registry.load(version, **_predictor_kwargs())
+        print(f"INFO: MatchPredictor initialized successfully (model version '{version}').")
+        return MatchRuntime(version, predictor)
+    except FileNotFoundError as fnf_error:
+        print(f"CRITICAL: FileNotFoundError during MatchPredictor initialization - {fnf_error}. Check model paths and file existence.")
+    except Exception as e:
+        print(f"CRITICAL: Failed to initialize MatchPredictor due to an unexpected error: {e}")
+        import traceback
+        traceback.print_exc() # In chi tiết traceback để debug
+    return None
+
+
+def reload_match_runtime(state, version: str) -> Optional[MatchRuntime]:
+    """
+    Tải, kiểm tra và khởi động version mới rồi thay cho runtime hiện tại; trả về runtime cũ (caller retire() nó, nó
+    dừng khi các request/job đang giữ nó đã xong). Lỗi được ném ra và runtime hiện tại được giữ nguyên.
+    Hàng đợi user-updated được tạm dừng trong lúc build store mới: sự kiện đến trong lúc đó được xử lý trên
+    runtime mới, nên store mới không bỏ sót thay đổi nào.
+    """
+    version, predictor = state.model_registry.load(version, **_predictor_kwargs())
+    runtime = MatchRuntime(version, predictor)
+    queue = getattr(state, "user_update_queue", None)
+    with queue.paused() if queue is not None else nullcontext():
+        try:
+            runtime.start(strict=True)
+        except Exception:
+            runtime.shutdown()
+            raise
+        previous, state.match_runtime = state.match_runtime, runtime
+    print(f"INFO: Switched to model version '{version}' ({predictor.model_version}).")
+    return previous
+
+
+def init_match_state(state) -> None:
+    """Gắn registry, executor và metric collector vào app.state; runtime được gắn sau khi khởi động (main.py)."""
+    state.model_registry = ModelRegistry()
+    state.match_runtime = None
+    # Thread pool riêng cho MatchService (SQLAlchemy, pandas, LightGBM đều là code đồng bộ)
+    # Endpoint async chỉ await kết quả, nên event loop vẫn phục vụ các request khác trong lúc chấm điểm
+    state.match_executor = BoundedExecutor(
+        max_workers=settings.MATCH_WORKER_THREADS,
+        max_pending=settings.MATCH_MAX_PENDING_REQUESTS,
+        timeout=settings.MATCH_REQUEST_TIMEOUT_SECONDS,
+    )
+    metrics.register_collector(lambda: _collect_component_metrics(state), name="matches")
+
+
+def shutdown_match_state(state) -> None:
+    executor = getattr(state, "match_executor", None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+    runtime = getattr(state, "match_runtime", None)
+    if runtime is not None:
+        runtime.shutdown()
+
+
+# --- Metric lấy từ trạng thái có sẵn của các thành phần trên (đọc lúc scrape GET /metrics) ---
+def _collect_component_metrics(state):
+    yield ("amoura_match_executor_pending_requests", "gauge",
+           "Potential-matches requests queued or running in the match executor.",
+           [({}, state.match_executor.pending)])
+    runtime = state.match_runtime
+    if runtime is None:
+        return
+    yield ("amoura_model_info", "gauge", "Active model: registry version and model file hash.",
+           [({"version": runtime.version, "model_version": runtime.predictor.model_version}, 1)])
+    if runtime.result_cache is not None:
+        cache_stats = runtime.result_cache.stats()
+        yield ("amoura_match_result_cache_events_total", "counter",
+               "Potential-matches result cache events (hits, misses, invalidations, backend counters).",
+               [({"event": name}, value) for name, value in sorted(cache_stats.items()) if name != "entries"])
+        if "entries" in cache_stats:
+            yield ("amoura_match_result_cache_entries", "gauge", "Entries in the potential-matches result cache.",
+                   [({}, cache_stats["entries"])])
+    bio_stats = runtime.predictor.artifacts.bio_encoder.stats()
+    yield ("amoura_bio_cache_events_total", "counter", "Bio TF-IDF cache lookups.",
+           [({"event": "hits"}, bio_stats["hits"]), ({"event": "misses"}, bio_stats["misses"])])
+    yield ("amoura_bio_cache_entries", "gauge", "Entries in the bio TF-IDF cache.", [({}, bio_stats["entries"])])
+    if runtime.predictor.pair_score_cache is not None:
+        pair_stats = runtime.predictor.pair_score_cache.stats()
+        yield ("amoura_pair_score_cache_events_total", "counter", "Pair score cache lookups, one per pair.",
+               [({"event": "hits"}, pair_stats["hits"]), ({"event": "misses"}, pair_stats["misses"])])
+        yield ("amoura_pair_score_cache_entries", "gauge", "User pairs in the pair score cache.",
+               [({}, pair_stats["entries"])])
+    if runtime.user_feature_store is not None:
+        yield ("amoura_user_feature_store_users", "gauge", "Users in the current UserFeatureStore snapshot.",
+               [({}, len(runtime.user_feature_store))])
+
+
+# --- Dependency để lấy MatchRuntime ---
+# Job nhận factory runtime.service thay vì MatchService: session DB được mở/đóng ngay trong worker thread,
+# nên request bị timeout (504) không đóng session khi job vẫn đang dùng nó.
+# Runtime được lấy một lần ở đây: reload model giữa chừng không đổi model của request đang chạy.
+# Request giữ runtime tới khi xong, job giữ thêm một lần tới khi nó kết thúc (xem _run_match_job).
+def get_match_runtime(request: Request) -> Iterator[MatchRuntime]:
+    runtime = acquire_match_runtime(request.app.state)
+    if runtime is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Match prediction service is not available due to model loading issues."
         )
-    return MatchService(db=db, predictor=match_predictor_instance)
+    try:
+        yield runtime
+    finally:
+        runtime.release()
+
+
+def get_match_executor(request: Request) -> BoundedExecutor:
+    executor = getattr(request.app.state, "match_executor", None)
+    if executor is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Match prediction service is not ready.")
+    return executor
+
+
+async def _run_match_job(match_executor: BoundedExecutor, runtime: MatchRuntime, func: Callable, *args,
+                         timeout: Optional[float] = None):
+    """Chạy func(runtime.service, *args) trong match_executor; runtime được giữ tới khi job thực sự kết thúc."""
+    runtime.acquire()  # Luôn thành công: request đang giữ runtime
+    return await match_executor.run(func, runtime.service, *args, timeout=timeout, on_done=runtime.release)
+
+
+def _run_ranked_potential_matches(service_factory: Callable[[Session], MatchService], user_id: int,
+                                  limit: int, min_score: Optional[float], after):
+    """Chạy trong match_executor, với session DB riêng."""
+    db = SessionLocal()
+    try:
+        return service_factory(db).get_ranked_potential_matches(
+            current_user_id=user_id, limit=limit, min_score=min_score, after=after)
+    finally:
+        db.close()
 
 
 @router.get(
@@ -50,32 +302,60 @@ def get_match_service(
     response_model=schemas.match.PotentialMatchResponse,
     summary="Get Potential Matches for a User",
     description="""
-    Retrieves a list of user IDs that are potential matches for the given user_id.
+    Retrieves the potential matches for the given user_id, ranked by match score (highest first).
     The user specified by `user_id` must have the 'USER' role.
     The matching is determined by the underlying AI/ML model.
+    Results are paginated: pass the returned `next_cursor` as `cursor` to get the next page.
     """
     # tags đã được định nghĩa khi tạo APIRouter ở trên
 )
 async def get_potential_matches_for_user(
     user_id: int,
-    # match_service: MatchService = Depends(get_match_service) # Python < 3.9
-    match_service: Annotated[MatchService, Depends(get_match_service)] # Python 3.9+
+    match_runtime: Annotated[MatchRuntime, Depends(get_match_runtime)],
+    match_executor: Annotated[BoundedExecutor, Depends(get_match_executor)],
+    limit: Annotated[int, Query(ge=1, le=settings.POTENTIAL_MATCHES_MAX_LIMIT,
+                                description="Maximum number of matches to return.")] = settings.POTENTIAL_MATCHES_DEFAULT_LIMIT,
+    min_score: Annotated[Optional[float], Query(ge=0.0, le=1.0,
+                                                description="Only return matches with a score >= min_score.")] = None,
+    cursor: Annotated[Optional[str], Query(description="`next_cursor` from the previous page.")] = None,
 ):
     """
     Endpoint to get potential matches for a specific user.
     - **user_id**: The ID of the user for whom to find matches.
+    - **limit**: Page size.
+    - **min_score**: Optional lower bound on the match score.
+    - **cursor**: Opaque pagination cursor returned by the previous page.
     """
     if user_id <= 0:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID must be a positive integer.")
 
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_match_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+
     try:
-        potential_matches_ids = match_service.get_potential_matches(current_user_id=user_id)
+        ranked_matches, has_more = await _run_match_job(
+            match_executor, match_runtime, _run_ranked_potential_matches, user_id, limit, min_score, after)
+        next_cursor = encode_match_cursor(ranked_matches[-1][1], ranked_matches[-1][0]) if has_more else None
         return schemas.match.PotentialMatchResponse(
             user_id=user_id,
-            potential_match_ids=potential_matches_ids
+            potential_match_ids=[match_id for match_id, _ in ranked_matches],
+            matches=[schemas.match.PotentialMatch(user_id=match_id, score=score) for match_id, score in ranked_matches],
+            next_cursor=next_cursor
         )
     except HTTPException as http_exc: # Bắt lại HTTPException từ service để trả về đúng status
         raise http_exc
+    except ExecutorSaturatedError as e:
+        print(f"WARNING: Rejecting potential matches request for user {user_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many match requests in progress, please retry later.")
+    except ExecutorTimeoutError as e:
+        print(f"WARNING: Potential matches request for user {user_id} timed out: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                            detail=f"Computing matches for user {user_id} took too long.")
     except FileNotFoundError as e: # Ví dụ lỗi nếu file model/preprocessor không tìm thấy
         print(f"Error during prediction for user {user_id}: {e}")
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="A required ML model file was not found.")
@@ -85,4 +365,101 @@ async def get_potential_matches_for_user(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected error occurred while processing matches for user {user_id}."
-        )
\ No newline at end of file
+        )
+
+
+def _run_batch_potential_matches(service_factory: Callable[[Session], MatchService], user_ids: List[int],
+                                 limit: int, min_score: Optional[float]):
+    """Chạy trong match_executor, với session DB riêng."""
+    db = SessionLocal()
+    try:
+        return service_factory(db).get_ranked_potential_matches_batch(user_ids, limit=limit, min_score=min_score)
+    finally:
+        db.close()
+
+
+@router.post(
+    "/potential-matches:batch",
+    response_model=schemas.match.BatchPotentialMatchesResponse,
+    summary="Get Potential Matches for Many Users",
+    description="""
+    Returns the first page of potential matches for each user in `user_ids` (at most
+    `POTENTIAL_MATCHES_BATCH_MAX_USERS`). The candidate population and its features are loaded once
+    and shared by every user of the batch. A failing user does not fail the batch: its result carries the
+    HTTP `status_code` and `error` it would have received from `GET /users/{user_id}/potential-matches`.
+    """
+)
+async def get_potential_matches_batch(
+    batch_request: schemas.match.BatchPotentialMatchesRequest,
+    match_runtime: Annotated[MatchRuntime, Depends(get_match_runtime)],
+    match_executor: Annotated[BoundedExecutor, Depends(get_match_executor)],
+):
+    user_ids = list(dict.fromkeys(batch_request.user_ids)) # Bỏ id trùng, giữ thứ tự
+    valid_user_ids = [user_id for user_id in user_ids if user_id > 0]
+
+    try:
+        outcomes = await _run_match_job(
+            match_executor, match_runtime, _run_batch_potential_matches, valid_user_ids, batch_request.limit,
+            batch_request.min_score, timeout=settings.POTENTIAL_MATCHES_BATCH_TIMEOUT_SECONDS or None)  # None -> timeout mặc định
+    except ExecutorSaturatedError as e:
+        print(f"WARNING: Rejecting batch potential matches request for {len(user_ids)} users: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many match requests in progress, please retry later.")
+    except ExecutorTimeoutError as e:
+        print(f"WARNING: Batch potential matches request for {len(user_ids)} users timed out: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                            detail=f"Computing matches for {len(user_ids)} users took too long.")
+    except Exception as e:
+        print(f"Unexpected error getting batch potential matches for {len(user_ids)} users: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="An unexpected error occurred while processing the batch.")
+
+    results = []
+    for user_id in user_ids:
+        outcome = outcomes.get(user_id) if user_id > 0 else HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="User ID must be a positive integer.")
+        if isinstance(outcome, HTTPException):
+            results.append(schemas.match.BatchPotentialMatchResult(
+                user_id=user_id, status_code=outcome.status_code, error=outcome.detail))
+            continue
+        ranked_matches, has_more = outcome
+        results.append(schemas.match.BatchPotentialMatchResult(
+            user_id=user_id,
+            potential_match_ids=[match_id for match_id, _ in ranked_matches],
+            matches=[schemas.match.PotentialMatch(user_id=match_id, score=score) for match_id, score in ranked_matches],
+            next_cursor=encode_match_cursor(ranked_matches[-1][1], ranked_matches[-1][0]) if has_more else None
+        ))
+    return schemas.match.BatchPotentialMatchesResponse(results=results)
+
+
+@router.delete(
+    "/users/{user_id}/potential-matches/cache",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_admin_token)],
+    summary="Invalidate Cached Potential Matches for a User",
+    description="""
+    Drops the cached potential matches of the given user_id. Call it when the user's profile changes.
+    Cached results of other users expire after `MATCH_RESULT_CACHE_TTL_SECONDS`. Requires the `X-Admin-Token` header.
+    """
+)
+async def invalidate_potential_matches_cache(user_id: int, request: Request):
+    runtime = getattr(request.app.state, "match_runtime", None)
+    if runtime is not None and runtime.result_cache is not None:
+        runtime.result_cache.invalidate_user(user_id)
+
+
+@router.get(
+    "/potential-matches/cache/stats",
+    response_model=Dict[str, int],
+    dependencies=[Depends(require_admin_token)],
+    summary="Potential Matches Cache Statistics",
+    description="""
+    Hit/miss/invalidation counters of the potential-matches cache and backend counters (entries, evictions,
+    expirations). Requires the `X-Admin-Token` header.
+    """
+)
+async def get_potential_matches_cache_stats(request: Request):
+    runtime = getattr(request.app.state, "match_runtime", None)
+    if runtime is None or runtime.result_cache is None:
+        return {}
+    return runtime.result_cache.stats()
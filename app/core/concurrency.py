@@ -0,0 +1,94 @@
+# app/core/concurrency.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ExecutorSaturatedError(Exception):
+    """Số job đang chạy + đang chờ đã đạt max_pending."""
+
+
+class ExecutorTimeoutError(Exception):
+    """Job không hoàn thành trong thời gian timeout."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool riêng cho các tác vụ đồng bộ nặng (SQLAlchemy, pandas, LightGBM) được gọi từ
+    endpoint async, để event loop của uvicorn không bị chặn.
+
+    - max_workers: số job chạy đồng thời.
+    - max_pending: tổng số job đang chạy + đang chờ; vượt quá -> ExecutorSaturatedError (từ chối ngay
+      thay vì để hàng đợi dài vô hạn).
+    - timeout: thời gian chờ tối đa cho mỗi job -> ExecutorTimeoutError. Job đã bắt đầu chạy thì không
+      dừng được giữa chừng, nó vẫn chiếm slot cho tới khi xong; job chưa bắt đầu thì bị hủy.
+    - on_done (tham số của run): được gọi đúng một lần khi job kết thúc (xong, lỗi hoặc bị hủy, kể cả sau
+      timeout) hoặc khi job bị từ chối, để trả các tài nguyên mà job giữ.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, timeout: Optional[float] = None,
+                 thread_name_prefix: str = "match-worker"):
+        self.max_workers = max(max_workers, 1)
+        self.max_pending = max(max_pending, self.max_workers)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.thread_name_prefix = thread_name_prefix
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Tạo lazily để import module không sinh thread
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix=self.thread_name_prefix)
+        return self._executor
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable[..., T], *args, timeout: Optional[float] = None,
+                  on_done: Optional[Callable[[], None]] = None) -> T:
+        """Chạy func(*args) trong pool và chờ kết quả mà không chặn event loop."""
+        with self._lock:
+            saturated = self._pending >= self.max_pending
+            if not saturated:
+                self._pending += 1
+                executor = self._get_executor()
+        if saturated:
+            if on_done is not None:
+                on_done()
+            raise ExecutorSaturatedError(
+                f"{self._pending} jobs already running or queued (max_pending={self.max_pending}).")
+
+        try:
+            future = executor.submit(func, *args)
+        except Exception:
+            self._release()
+            if on_done is not None:
+                on_done()
+            raise
+        # Slot chỉ được trả khi job thực sự kết thúc (kể cả khi request đã timeout)
+        future.add_done_callback(self._release)
+        if on_done is not None:
+            future.add_done_callback(lambda _future: on_done())
+
+        timeout = timeout if timeout is not None else self.timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()  # Chỉ có tác dụng nếu job còn trong hàng đợi
+            raise ExecutorTimeoutError(f"Job did not finish within {timeout}s.")
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -26,9 +26,101 @@ class Settings(BaseSettings):
     # ML Model paths (nếu cần thiết, nhưng hiện tại chúng ta đang dùng đường dẫn tương đối trong ml modules)
     # MODELS_DIR: str = os.getenv("MODELS_DIR", "ml_models")
 
+    # Version model được tải lúc startup: tên thư mục con của ml_models/ ("root" = các file nằm trực tiếp trong
+    # ml_models/), rỗng = version mới nhất (xem app/ml/model_registry.py).
+    # Đổi version khi đang chạy: POST /admin/model/reload
+    MODEL_VERSION: str = os.getenv("MODEL_VERSION", "")
+    # Tải model từ bundle đã export (python -m app.jobs.export_model_bundle, xem app/ml/model_bundle.py) nếu có:
+    # mảng .npy được mmap nên khởi động nhanh hơn và các worker process dùng chung page; false = luôn dùng .joblib
+    MODEL_BUNDLE_ENABLED: bool = os.getenv("MODEL_BUNDLE_ENABLED", "true").lower() in ("1", "true", "yes")
+
     # Ngưỡng xác suất để coi là match
     MATCH_PROBABILITY_THRESHOLD: float = float(os.getenv("MATCH_PROBABILITY_THRESHOLD", 0.5))
 
+    # Số cặp tối đa cho mỗi lần gọi model.predict_proba khi chấm điểm theo batch (0 = không chia chunk)
+    MATCH_PREDICTION_CHUNK_SIZE: int = int(os.getenv("MATCH_PREDICTION_CHUNK_SIZE", 4096))
+
+    # Suy luận model: "booster" (lightgbm.Booster trên mảng NumPy) hoặc "sklearn" (predict_proba trên DataFrame)
+    # và số thread LightGBM cho mỗi lần predict (âm = số core + 1 + giá trị, như n_jobs của scikit-learn)
+    MATCH_MODEL_INFERENCE: str = os.getenv("MATCH_MODEL_INFERENCE", "booster")
+    MATCH_MODEL_N_JOBS: int = int(os.getenv("MATCH_MODEL_N_JOBS", -1))
+
+    # Đánh giá cây bằng NumPy có early exit khi chỉ cần biết score có vượt một ngưỡng không: endpoint xếp hạng bỏ
+    # qua sớm candidate không thể vào top (ngưỡng = max(threshold, min_score, score thấp nhất của top đã gom được)),
+    # get_potential_matches dùng ngưỡng threshold. Chỉ dùng khi ngưỡng >= MATCH_EARLY_EXIT_MIN_THRESHOLD: ngưỡng thấp
+    # thì evaluator NumPy chậm hơn Booster.predict (điểm hòa vốn phụ thuộc model, đo bằng benchmarks.bench_early_exit)
+    MATCH_EARLY_EXIT_ENABLED: bool = os.getenv("MATCH_EARLY_EXIT_ENABLED", "false").lower() in ("1", "true", "yes")
+    MATCH_EARLY_EXIT_MIN_THRESHOLD: float = float(os.getenv("MATCH_EARLY_EXIT_MIN_THRESHOLD", 0.9))
+
+    # Số candidate tối đa được tải từ DB trong một lần (crud.get_users_profile_raw_data_bulk)
+    CANDIDATE_FETCH_CHUNK_SIZE: int = int(os.getenv("CANDIDATE_FETCH_CHUNK_SIZE", 1000))
+
+    # Giữ snapshot feature của toàn bộ USER trong bộ nhớ (UserFeatureStore), build lúc startup
+    USER_FEATURE_STORE_ENABLED: bool = os.getenv("USER_FEATURE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # Lọc candidate theo location_preference: "off", "soft" (chỉ sắp xếp theo khoảng cách)
+    # hoặc "hard" (chỉ giữ candidate nằm trong bán kính của cả hai phía).
+    # Các endpoint xếp hạng theo score nên "soft" ở đó giống "off"; "soft" chỉ áp dụng cho
+    # MatchService.get_potential_matches (danh sách id không xếp hạng)
+    GEO_FILTER_MODE: str = os.getenv("GEO_FILTER_MODE", "off")
+
+    # Candidate retrieval xấp xỉ trước LightGBM (chỉ khi dùng UserFeatureStore): CosineIVFIndex trên user feature
+    # vector, chỉ ANN_CANDIDATES user tương thích có cosine similarity cao nhất được chấm điểm. Index có ANN_N_LISTS
+    # list (0 = khoảng sqrt(N)), truy vấn quét ANN_N_PROBE list gần nhất (xem python -m benchmarks.bench_ann_recall)
+    ANN_RETRIEVAL_ENABLED: bool = os.getenv("ANN_RETRIEVAL_ENABLED", "false").lower() in ("1", "true", "yes")
+    ANN_CANDIDATES: int = int(os.getenv("ANN_CANDIDATES", 2000))
+    ANN_N_LISTS: int = int(os.getenv("ANN_N_LISTS", 0))
+    ANN_N_PROBE: int = int(os.getenv("ANN_N_PROBE", 16))
+
+    # Số potential match mặc định / tối đa trong một trang của GET /users/{user_id}/potential-matches
+    POTENTIAL_MATCHES_DEFAULT_LIMIT: int = int(os.getenv("POTENTIAL_MATCHES_DEFAULT_LIMIT", 50))
+    POTENTIAL_MATCHES_MAX_LIMIT: int = int(os.getenv("POTENTIAL_MATCHES_MAX_LIMIT", 500))
+
+    # POST /potential-matches:batch: số user tối đa trong một request và timeout của cả batch (giây, 0 = như MATCH_REQUEST_TIMEOUT_SECONDS)
+    POTENTIAL_MATCHES_BATCH_MAX_USERS: int = int(os.getenv("POTENTIAL_MATCHES_BATCH_MAX_USERS", 1000))
+    POTENTIAL_MATCHES_BATCH_TIMEOUT_SECONDS: float = float(os.getenv("POTENTIAL_MATCHES_BATCH_TIMEOUT_SECONDS", 300))
+    # Nguồn của GET /potential-matches: "online" (tính khi có request) hoặc "precomputed" (đọc bảng precomputed_matches
+    # do app/jobs/precompute_matches.py ghi; user chưa được job bao phủ vẫn được tính online)
+    POTENTIAL_MATCHES_SOURCE: str = os.getenv("POTENTIAL_MATCHES_SOURCE", "online")
+
+    # Thread pool riêng cho việc tính potential matches (không chặn event loop):
+    # số request chạy đồng thời, tổng số request chạy + chờ (vượt quá -> 503) và timeout mỗi request (-> 504, 0 = không giới hạn)
+    MATCH_WORKER_THREADS: int = int(os.getenv("MATCH_WORKER_THREADS", 4))
+    MATCH_MAX_PENDING_REQUESTS: int = int(os.getenv("MATCH_MAX_PENDING_REQUESTS", 32))
+    MATCH_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("MATCH_REQUEST_TIMEOUT_SECONDS", 30))
+
+    # Process pool chấm điểm theo shard cho DB path (0 = tắt): số worker process và số candidate mỗi shard
+    MATCH_PROCESS_POOL_WORKERS: int = int(os.getenv("MATCH_PROCESS_POOL_WORKERS", 0))
+    MATCH_PROCESS_POOL_SHARD_SIZE: int = int(os.getenv("MATCH_PROCESS_POOL_SHARD_SIZE", 5000))
+
+    # Cache kết quả potential matches theo user (in-process): TTL (giây) và số user tối đa (LRU)
+    MATCH_RESULT_CACHE_ENABLED: bool = os.getenv("MATCH_RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    MATCH_RESULT_CACHE_TTL_SECONDS: float = float(os.getenv("MATCH_RESULT_CACHE_TTL_SECONDS", 60))
+    MATCH_RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("MATCH_RESULT_CACHE_MAX_ENTRIES", 10000))
+    # Số phần tử đầu của danh sách xếp hạng được cache cho mỗi user (trang nằm sau đó được tính lại bằng heap)
+    MATCH_RESULT_CACHE_TOP_K: int = int(os.getenv("MATCH_RESULT_CACHE_TOP_K", 500))
+    # Cache score theo cặp user trong MatchPredictor (khóa = fingerprint của cả hai user), số cặp tối đa (0 = tắt);
+    # mỗi cặp tốn khoảng 60 byte
+    PAIR_SCORE_CACHE_MAX_ENTRIES: int = int(os.getenv("PAIR_SCORE_CACHE_MAX_ENTRIES", 500000))
+
+    # POST /events/user-updated: các sự kiện của cùng một user được gộp thành một lần chấm điểm lại, chạy khi user
+    # không có sự kiện mới trong USER_EVENTS_COALESCE_SECONDS giây (nhưng không trễ quá USER_EVENTS_MAX_DELAY_SECONDS
+    # kể từ sự kiện đầu tiên); tối đa USER_EVENTS_MAX_BATCH_SIZE user mỗi lần xử lý
+    USER_EVENTS_COALESCE_SECONDS: float = float(os.getenv("USER_EVENTS_COALESCE_SECONDS", 5))
+    USER_EVENTS_MAX_DELAY_SECONDS: float = float(os.getenv("USER_EVENTS_MAX_DELAY_SECONDS", 60))
+    USER_EVENTS_MAX_BATCH_SIZE: int = int(os.getenv("USER_EVENTS_MAX_BATCH_SIZE", 100))
+    # Tối đa USER_EVENTS_MAX_PENDING user chờ xử lý (vượt quá: 503); lô lỗi được thử lại tối đa USER_EVENTS_MAX_RETRIES
+    # lần, sau USER_EVENTS_RETRY_BACKOFF_SECONDS * 2^(lần lỗi - 1) giây
+    USER_EVENTS_MAX_PENDING: int = int(os.getenv("USER_EVENTS_MAX_PENDING", 10000))
+    USER_EVENTS_MAX_RETRIES: int = int(os.getenv("USER_EVENTS_MAX_RETRIES", 5))
+    USER_EVENTS_RETRY_BACKOFF_SECONDS: float = float(os.getenv("USER_EVENTS_RETRY_BACKOFF_SECONDS", 1))
+
+    # Token của admin endpoints (header X-Admin-Token); rỗng = tắt admin endpoints
+    ADMIN_API_TOKEN: str = os.getenv("ADMIN_API_TOKEN", "")
+
+    # Thu thập metric theo stage (latency, số candidate, cache) và xuất ở GET /metrics (Prometheus text format)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
     class Config:
         case_sensitive = True
         # env_file = ".env" # Nếu bạn muốn pydantic-settings tự động tải từ .env
@@ -0,0 +1,283 @@
+# app/core/metrics.py
+import bisect
+import functools
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from app.core.config import settings
+
+# --- Tên stage cố định (label "stage" của amoura_stage_duration_seconds) ---
+# Dashboard được build trên các tên này: chỉ thêm stage mới, không đổi tên stage cũ.
+STAGE_CRUD_LOAD_USER = "crud.load_user"  # crud.get_user_profile_raw_data
+STAGE_CRUD_LOAD_USERS_BULK = "crud.load_users_bulk"  # crud.get_users_profile_raw_data_bulk
+STAGE_CRUD_CANDIDATE_IDS = "crud.candidate_ids"  # crud.get_all_other_user_ids_with_role
+STAGE_USER_FEATURES = "predictor.user_features"  # raw data + user feature vector (gồm cả bio)
+STAGE_BIO = "predictor.bio"  # NLP + TF-IDF của bio (chỉ khi không có trong cache của BioFeatureEncoder)
+STAGE_PAIRWISE_FEATURES = "predictor.pairwise_features"  # PairwiseFeatureEngine.build (gồm cả scaling)
+STAGE_SCALING = "predictor.scaling"  # MinMax scaling các cột pairwise
+STAGE_MODEL = "predictor.model"  # LightGBM (hoặc EarlyExitTreeEvaluator)
+STAGE_STORE_CANDIDATES = "service.store_candidates"  # chọn candidate từ UserFeatureStore
+STAGE_GEO_FILTER = "service.geo_filter"  # lọc / sắp xếp theo location_preference
+STAGE_ANN_RETRIEVAL = "service.ann_retrieval"  # chọn top-M candidate qua CosineIVFIndex
+STAGE_SHARD_SCORING = "service.shard_scoring"  # chấm điểm qua ShardedScoringPool (chờ các worker)
+STAGE_POTENTIAL_MATCHES = "service.potential_matches"  # MatchService.get_potential_matches khi cache miss
+STAGE_RANKED_MATCHES = "service.ranked_matches"  # xếp hạng cho GET /potential-matches khi cache miss
+STAGE_BATCH_MATCHES = "service.batch_matches"  # toàn bộ một lần gọi POST /potential-matches:batch
+STAGE_PRECOMPUTED_MATCHES = "service.precomputed_matches"  # đọc một trang từ bảng precomputed_matches
+STAGE_USER_UPDATES = "events.user_updates"  # chấm điểm lại + cập nhật kết quả cho một lô user đã thay đổi
+STAGES = (
+    STAGE_CRUD_LOAD_USER, STAGE_CRUD_LOAD_USERS_BULK, STAGE_CRUD_CANDIDATE_IDS, STAGE_USER_FEATURES, STAGE_BIO,
+    STAGE_PAIRWISE_FEATURES, STAGE_SCALING, STAGE_MODEL, STAGE_STORE_CANDIDATES, STAGE_GEO_FILTER,
+    STAGE_ANN_RETRIEVAL, STAGE_SHARD_SCORING, STAGE_POTENTIAL_MATCHES, STAGE_RANKED_MATCHES, STAGE_BATCH_MATCHES,
+    STAGE_PRECOMPUTED_MATCHES, STAGE_USER_UPDATES,
+)
+
+# Nguồn candidate (label "source")
+SOURCE_STORE, SOURCE_DB, SOURCE_POOL = "store", "db", "pool"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0)
+COUNT_BUCKETS = (0, 10, 100, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+_INF_LABEL = 'le="+Inf"'
+
+# Một series do collector trả về lúc scrape: (tên, kiểu, mô tả, [(labels, giá trị)])
+CollectedMetric = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+T = TypeVar("T")
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 label_names: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *label_values: str) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+                     for labels, value in values)
+        return lines
+
+
+class Histogram:
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+                 initial_label_values: Iterable[Tuple[str, ...]] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [số lần quan sát rơi vào từng bucket (không cộng dồn), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        for label_values in initial_label_values:
+            self._series[tuple(label_values)] = [[0] * len(self.buckets), 0.0, 0]
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not self.registry.enabled:
+            return
+        # Bucket đầu tiên có cận trên >= value (len(buckets) = chỉ thuộc +Inf)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((labels, (list(counts), total, count))
+                              for labels, (counts, total, count) in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in snapshot:
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{_format_value(upper)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, _INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "stage", "started_at")
+
+    def __init__(self, histogram: Histogram, stage: str):
+        self.histogram = histogram
+        self.stage = stage
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started_at, self.stage)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """
+    Registry metric trong process, xuất ra Prometheus text format (version 0.0.4) qua render().
+
+    - stage(name): context manager đo thời gian một stage vào histogram amoura_stage_duration_seconds;
+      timed(name): decorator tương đương cho hàm.
+    - Counter / Histogram được tạo qua counter() / histogram().
+    - register_collector(func): func được gọi lúc scrape để lấy giá trị có sẵn ở nơi khác (vd: stats của cache).
+    Khi enabled=False, stage() trả về một context manager rỗng dùng chung và observe/inc chỉ kiểm tra một cờ.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List = []
+        self._collectors: Dict[str, Callable[[], Iterable[CollectedMetric]]] = {}
+        self.stage_duration = self.histogram(
+            "amoura_stage_duration_seconds", "Duration of each potential-matches pipeline stage.",
+            label_names=("stage",), initial_label_values=[(stage,) for stage in STAGES])
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(self, name, documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS,
+                  initial_label_values: Iterable[Tuple[str, ...]] = ()) -> Histogram:
+        metric = Histogram(self, name, documentation, label_names, buckets, initial_label_values)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]],
+                           name: Optional[str] = None) -> None:
+        """Đăng ký lại với cùng `name` sẽ thay collector cũ (vd: app.state được tạo lại khi khởi động lại app)."""
+        self._collectors[name if name is not None else f"collector-{id(collector)}"] = collector
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self.stage_duration, name)
+
+    def timed(self, stage: str) -> Callable:
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started_at = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.stage_duration.observe(time.perf_counter() - started_at, stage)
+            return wrapper
+        return decorator
+
+    def timed_iter(self, stage: str, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Bọc một iterator, chỉ cộng thời gian chờ phần tử tiếp theo (không tính thời gian caller xử lý
+        từng phần tử giữa hai lần next()); ghi một lần khi iterator kết thúc hoặc bị đóng.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        elapsed = 0.0
+        try:
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started_at
+                yield item
+        finally:
+            self.stage_duration.observe(elapsed, stage)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in list(self._collectors.values()):
+            try:
+                collected = list(collector())
+            except Exception as e:  # Collector lỗi không được làm hỏng cả trang /metrics
+                print(f"WARNING: Metrics collector failed: {e}")
+                continue
+            for name, metric_type, documentation, samples in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} "
+                                 f"{_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Registry dùng chung cho toàn bộ service
+metrics = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+# Số candidate được chấm điểm
+scored_candidates_total = metrics.counter(
+    "amoura_scored_candidates_total", "Candidates scored by the match model, by candidate source.",
+    label_names=("source",))
+candidates_per_request = metrics.histogram(
+    "amoura_candidates_per_request", "Candidates scored per potential-matches computation.",
+    buckets=COUNT_BUCKETS)
+
+# Sự kiện POST /events/user-updated
+user_events_total = metrics.counter(
+    "amoura_user_events_total",
+    "User-updated events by outcome (received, coalesced into a pending event, rejected because the queue is full, "
+    "processed, retried after a failure, failed after the last retry).",
+    label_names=("outcome",))
+user_event_latency = metrics.histogram(
+    "amoura_user_event_latency_seconds",
+    "Time from the first coalesced user-updated event to its results being updated.")
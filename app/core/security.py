@@ -0,0 +1,15 @@
+# app/core/security.py
+import hmac
+from typing import Annotated, Optional
+
+from fastapi import Header, HTTPException, status
+
+from app.core.config import settings
+
+
+def require_admin_token(x_admin_token: Annotated[Optional[str], Header()] = None) -> None:
+    """Header X-Admin-Token phải bằng ADMIN_API_TOKEN; ADMIN_API_TOKEN rỗng = tắt mọi admin endpoint."""
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled.")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), settings.ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token.")
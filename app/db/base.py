@@ -5,5 +5,6 @@ from app.db.models import Base # noqa
 from app.db.models import ( # noqa
     Role, User, BodyType, Orientation, JobIndustry,
     DrinkStatus, SmokeStatus, EducationLevel, Pet, Interest, Language,
-    Profile, Location, UserPet, UserInterest, UserLanguage
+    Profile, Location, UserPet, UserInterest, UserLanguage,
+    PrecomputedMatch, MatchPrecomputeChunk
 )
\ No newline at end of file
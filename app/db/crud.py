@@ -1,9 +1,12 @@
 # app/db/crud.py
+from sqlalchemy import and_, func, insert, or_
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional, Tuple, Any
+from typing import List, Optional, Tuple, Any, Dict
 
 from . import models  # models.py đã định nghĩa ở Giai đoạn 2
 from app import schemas  # schemas.py đã định nghĩa ở Giai đoạn 2
+from app.core.metrics import (STAGE_CRUD_CANDIDATE_IDS, STAGE_CRUD_LOAD_USER, STAGE_CRUD_LOAD_USERS_BULK,
+                              metrics)
 
 
 # --- User CRUD ---
@@ -27,6 +30,7 @@ def get_user_role_name(db: Session, user_id: int) -> Optional[str]:
 
 
 # --- Profile & Related CRUD ---
+@metrics.timed(STAGE_CRUD_LOAD_USER)
 def get_user_profile_raw_data(db: Session, user_id: int) -> Optional[Tuple[
     models.User,
     Optional[models.Profile],
@@ -95,17 +99,270 @@ def get_user_profile_raw_data(db: Session, user_id: int) -> Optional[Tuple[
     )
 
 
-def get_all_other_user_ids_with_role(db: Session, current_user_id: int, role_name: str = "USER") -> List[int]:
+@metrics.timed(STAGE_CRUD_LOAD_USERS_BULK)
+def get_users_profile_raw_data_bulk(db: Session, user_ids: List[int]) -> Dict[int, Tuple]:
+    """
+    Phiên bản bulk của get_user_profile_raw_data cho nhiều user cùng lúc.
+    Dùng một số lượng query cố định (không phụ thuộc số user) thay vì 6 query cho mỗi user:
+    users, profiles (join sẵn tên các bảng tham chiếu), locations, pets, interests, languages.
+
+    Trả về dict {user_id: tuple} với tuple cùng thứ tự và ý nghĩa như get_user_profile_raw_data.
+    Các phần tử user/profile/location là Row gọn nhẹ (truy cập theo tên thuộc tính) thay vì
+    ORM object; profile/location là None nếu user không có bản ghi tương ứng.
+    User không tồn tại sẽ không có trong dict.
+    """
+    if not user_ids:
+        return {}
+    user_ids = list(set(user_ids))
+
+    users = db.query(models.User.id).filter(models.User.id.in_(user_ids)).all()
+    if not users:
+        return {}
+
+    profiles = db.query(
+        models.Profile.user_id,
+        models.Profile.date_of_birth,
+        models.Profile.height,
+        models.Profile.sex,
+        models.Profile.interested_in_new_language,
+        models.Profile.drop_out,
+        models.Profile.location_preference,
+        models.Profile.bio,
+        models.BodyType.name.label("body_type_name"),
+        models.Orientation.name.label("orientation_name"),
+        models.JobIndustry.name.label("job_industry_name"),
+        models.DrinkStatus.name.label("drink_status_name"),
+        models.SmokeStatus.name.label("smoke_status_name"),
+        models.EducationLevel.name.label("education_level_name"),
+    ). \
+        outerjoin(models.BodyType, models.Profile.body_type_id == models.BodyType.id). \
+        outerjoin(models.Orientation, models.Profile.orientation_id == models.Orientation.id). \
+        outerjoin(models.JobIndustry, models.Profile.job_industry_id == models.JobIndustry.id). \
+        outerjoin(models.DrinkStatus, models.Profile.drink_status_id == models.DrinkStatus.id). \
+        outerjoin(models.SmokeStatus, models.Profile.smoke_status_id == models.SmokeStatus.id). \
+        outerjoin(models.EducationLevel, models.Profile.education_level_id == models.EducationLevel.id). \
+        filter(models.Profile.user_id.in_(user_ids)). \
+        all()
+    profiles_by_user = {p.user_id: p for p in profiles}
+
+    locations = db.query(
+        models.Location.user_id,
+        models.Location.latitudes,
+        models.Location.longitudes,
+        models.Location.country,
+        models.Location.state,
+        models.Location.city,
+    ).filter(models.Location.user_id.in_(user_ids)).all()
+    locations_by_user = {loc.user_id: loc for loc in locations}
+
+    pet_names = _group_names_by_user(
+        db.query(models.UserPet.user_id, models.Pet.name).join(models.Pet, models.UserPet.pet_id == models.Pet.id).
+        filter(models.UserPet.user_id.in_(user_ids)).all())
+    interest_names = _group_names_by_user(
+        db.query(models.UserInterest.user_id, models.Interest.name).
+        join(models.Interest, models.UserInterest.interest_id == models.Interest.id).
+        filter(models.UserInterest.user_id.in_(user_ids)).all())
+    language_names = _group_names_by_user(
+        db.query(models.UserLanguage.user_id, models.Language.name).
+        join(models.Language, models.UserLanguage.language_id == models.Language.id).
+        filter(models.UserLanguage.user_id.in_(user_ids)).all())
+
+    result: Dict[int, Tuple] = {}
+    for user in users:
+        profile = profiles_by_user.get(user.id)
+        result[user.id] = (
+            user,
+            profile,
+            locations_by_user.get(user.id),
+            pet_names.get(user.id, []),
+            interest_names.get(user.id, []),
+            language_names.get(user.id, []),
+            profile.body_type_name if profile else None,
+            profile.orientation_name if profile else None,
+            profile.job_industry_name if profile else None,
+            profile.drink_status_name if profile else None,
+            profile.smoke_status_name if profile else None,
+            profile.education_level_name if profile else None
+        )
+    return result
+
+
+def _group_names_by_user(rows: List[Tuple[int, str]]) -> Dict[int, List[str]]:
+    grouped: Dict[int, List[str]] = {}
+    for user_id, name in rows:
+        grouped.setdefault(user_id, []).append(name)
+    return grouped
+
+
+@metrics.timed(STAGE_CRUD_CANDIDATE_IDS)
+def get_all_other_user_ids_with_role(
+        db: Session,
+        current_user_id: int,
+        role_name: str = "USER",
+        sex_orientation_buckets: Optional[List[Tuple[str, str]]] = None,
+        bounding_boxes: Optional[List[Tuple[float, float, float, float]]] = None
+) -> List[int]:
     """
     Lấy ID của tất cả user khác có vai trò (role_name) cụ thể.
+    Nếu truyền sex_orientation_buckets (các cặp (sex, orientation) lower-case) thì chỉ lấy
+    user thuộc một trong các bucket đó (lọc ngay trong SQL).
+    Nếu truyền bounding_boxes (các box (min_lat, max_lat, min_lon, max_lon)) thì chỉ lấy user
+    có vị trí nằm trong một trong các box đó.
     """
-    user_ids = db.query(models.User.id). \
+    query = db.query(models.User.id). \
         join(models.Role). \
-        filter(models.Role.name == role_name, models.User.id != current_user_id). \
-        all()
+        filter(models.Role.name == role_name, models.User.id != current_user_id)
+    if sex_orientation_buckets is not None:
+        if not sex_orientation_buckets:
+            return []
+        query = query. \
+            join(models.Profile, models.Profile.user_id == models.User.id). \
+            join(models.Orientation, models.Profile.orientation_id == models.Orientation.id). \
+            filter(or_(*[
+                and_(func.lower(models.Profile.sex) == sex, func.lower(models.Orientation.name) == orientation)
+                for sex, orientation in sex_orientation_buckets
+            ]))
+    if bounding_boxes is not None:
+        query = query. \
+            join(models.Location, models.Location.user_id == models.User.id). \
+            filter(or_(*[
+                and_(models.Location.latitudes.between(min_lat, max_lat),
+                     models.Location.longitudes.between(min_lon, max_lon))
+                for min_lat, max_lat, min_lon, max_lon in bounding_boxes
+            ]))
+    user_ids = query.all()
     return [uid[0] for uid in user_ids]
 
 
+def get_sex_orientation_buckets(db: Session, role_name: str = "USER") -> List[Tuple[str, str]]:
+    """
+    Lấy các cặp (sex, orientation) lower-case khác nhau đang có trong DB của các user có role_name.
+    User thiếu sex hoặc orientation không thuộc bucket nào (không tương thích với ai).
+    """
+    rows = db.query(func.lower(models.Profile.sex), func.lower(models.Orientation.name)). \
+        join(models.User, models.Profile.user_id == models.User.id). \
+        join(models.Role, models.User.role_id == models.Role.id). \
+        join(models.Orientation, models.Profile.orientation_id == models.Orientation.id). \
+        filter(models.Role.name == role_name, models.Profile.sex.isnot(None), models.Orientation.name.isnot(None)). \
+        distinct(). \
+        all()
+    return [(sex, orientation) for sex, orientation in rows]
+
+
+def get_user_ids_with_role(db: Session, role_name: str = "USER", user_ids: Optional[List[int]] = None) -> List[int]:
+    """
+    Lấy ID của tất cả user có vai trò (role_name) cụ thể.
+    Nếu truyền user_ids thì chỉ lọc trong tập ID đó.
+    """
+    query = db.query(models.User.id). \
+        join(models.Role). \
+        filter(models.Role.name == role_name)
+    if user_ids is not None:
+        query = query.filter(models.User.id.in_(user_ids))
+    return [uid[0] for uid in query.all()]
+
+
+# --- Precomputed matches (app/jobs/precompute_matches.py) ---
+def _owned_by_chunk(chunk_start: int, chunk_end: int):
+    """Điều kiện SQL: cặp có user id nhỏ hơn nằm trong [chunk_start, chunk_end) (cặp thuộc chunk đó)."""
+    pm = models.PrecomputedMatch
+    return or_(
+        and_(pm.user_id >= chunk_start, pm.user_id < chunk_end, pm.candidate_id > pm.user_id),
+        and_(pm.candidate_id >= chunk_start, pm.candidate_id < chunk_end, pm.user_id > pm.candidate_id),
+    )
+
+
+def get_precompute_chunks(db: Session, model_version: str) -> List[models.MatchPrecomputeChunk]:
+    return db.query(models.MatchPrecomputeChunk). \
+        filter(models.MatchPrecomputeChunk.model_version == model_version). \
+        order_by(models.MatchPrecomputeChunk.chunk_start). \
+        all()
+
+
+def create_precompute_chunks(db: Session, model_version: str, boundaries: List[Tuple[int, int]],
+                             threshold: float, geo_filter_mode: str) -> None:
+    db.add_all([models.MatchPrecomputeChunk(model_version=model_version, chunk_start=start, chunk_end=end,
+                                            threshold=threshold, geo_filter_mode=geo_filter_mode)
+                for start, end in boundaries])
+    db.commit()
+
+
+def delete_precomputed_matches(db: Session, model_version: str) -> None:
+    """Xóa toàn bộ kết quả và kế hoạch chunk của model_version (chạy lại job từ đầu)."""
+    db.query(models.PrecomputedMatch).filter(models.PrecomputedMatch.model_version == model_version). \
+        delete(synchronize_session=False)
+    db.query(models.MatchPrecomputeChunk).filter(models.MatchPrecomputeChunk.model_version == model_version). \
+        delete(synchronize_session=False)
+    db.commit()
+
+
+def save_precomputed_chunk(db: Session, model_version: str, chunk_start: int, chunk_end: int,
+                           rows: List[Dict[str, Any]]) -> None:
+    """
+    Thay toàn bộ cặp thuộc chunk bằng `rows` và đánh dấu chunk đã xong, trong cùng một transaction:
+    chunk bị ngắt giữa chừng không để lại dữ liệu dở dang, chạy lại chunk cho cùng kết quả.
+    """
+    db.query(models.PrecomputedMatch). \
+        filter(models.PrecomputedMatch.model_version == model_version, _owned_by_chunk(chunk_start, chunk_end)). \
+        delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(models.PrecomputedMatch), [dict(row, model_version=model_version) for row in rows])
+    db.query(models.MatchPrecomputeChunk). \
+        filter(models.MatchPrecomputeChunk.model_version == model_version,
+               models.MatchPrecomputeChunk.chunk_start == chunk_start). \
+        update({models.MatchPrecomputeChunk.n_pairs: len(rows),
+                models.MatchPrecomputeChunk.completed_at: func.now()}, synchronize_session=False)
+    db.commit()
+
+
+def replace_precomputed_matches_for_user(db: Session, model_version: str, user_id: int,
+                                         rows: List[Dict[str, Any]]) -> None:
+    """Thay mọi cặp chứa user_id (cả hai chiều) bằng `rows`, sau khi profile của user_id thay đổi."""
+    pm = models.PrecomputedMatch
+    db.query(pm). \
+        filter(pm.model_version == model_version, or_(pm.user_id == user_id, pm.candidate_id == user_id)). \
+        delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(pm), [dict(row, model_version=model_version) for row in rows])
+    db.commit()
+
+
+def get_precompute_status(db: Session, model_version: str) -> Optional[Dict[str, Any]]:
+    """
+    Trạng thái job precompute của model_version: số chunk (tổng / đã xong), user id lớn nhất được bao phủ
+    (chunk_end cuối), threshold và geo_filter_mode lúc chạy. None nếu chưa từng chạy.
+    """
+    chunk = models.MatchPrecomputeChunk
+    row = db.query(func.count(chunk.chunk_start), func.count(chunk.completed_at), func.max(chunk.chunk_end),
+                   func.max(chunk.threshold), func.min(chunk.geo_filter_mode)). \
+        filter(chunk.model_version == model_version). \
+        one()
+    total, completed, covered_until, threshold, geo_filter_mode = row
+    if not total:
+        return None
+    return {"total_chunks": total, "completed_chunks": completed, "covered_until": covered_until,
+            "threshold": threshold, "geo_filter_mode": geo_filter_mode}
+
+
+def get_precomputed_matches(db: Session, user_id: int, model_version: str, threshold: float, limit: int,
+                            min_score: Optional[float] = None,
+                            after: Optional[Tuple[float, int]] = None) -> List[Tuple[int, float]]:
+    """
+    Tối đa `limit` candidate đã tính trước của user_id có score > threshold (và >= min_score), theo score
+    giảm dần, hòa thì candidate id tăng dần; after = (score, candidate_id) của phần tử cuối trang trước.
+    """
+    pm = models.PrecomputedMatch
+    query = db.query(pm.candidate_id, pm.score). \
+        filter(pm.model_version == model_version, pm.user_id == user_id, pm.score > threshold)
+    if min_score is not None:
+        query = query.filter(pm.score >= min_score)
+    if after is not None:
+        after_score, after_id = after
+        query = query.filter(or_(pm.score < after_score, and_(pm.score == after_score, pm.candidate_id > after_id)))
+    rows = query.order_by(pm.score.desc(), pm.candidate_id.asc()).limit(limit).all()
+    return [(int(candidate_id), float(score)) for candidate_id, score in rows]
+
+
 # --- Helper functions for reference tables (body_type, orientation, etc.) ---
 # Bạn có thể thêm các hàm CRUD cho các bảng tham chiếu này nếu cần
 # Ví dụ:
@@ -1,6 +1,6 @@
 # app/db/models.py
 from sqlalchemy import (Column, Integer, String, Date, Boolean, Text, ForeignKey,
-                        DECIMAL, TIMESTAMP, BigInteger, UniqueConstraint)
+                        DECIMAL, TIMESTAMP, BigInteger, UniqueConstraint, Float, Index)
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -168,4 +168,30 @@ class UserLanguage(Base):
     __tablename__ = "users_languages"
     user_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
     language_id = Column(BigInteger, ForeignKey("languages.id"), primary_key=True)
-    __table_args__ = (UniqueConstraint('user_id', 'language_id', name='uq_user_language'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('user_id', 'language_id', name='uq_user_language'),)
+
+
+# --- Kết quả chấm điểm được tính trước (app/jobs/precompute_matches.py) ---
+class PrecomputedMatch(Base):
+    """Một cặp (user -> candidate) có score > threshold lúc chạy job, theo model version."""
+    __tablename__ = "precomputed_matches"
+    model_version = Column(String(64), primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    candidate_id = Column(BigInteger, primary_key=True)
+    score = Column(Float(precision=53), nullable=False)
+    __table_args__ = (Index('ix_precomputed_matches_ranking', 'model_version', 'user_id', 'score'),)
+
+
+class MatchPrecomputeChunk(Base):
+    """
+    Một khoảng user id [chunk_start, chunk_end) của job precompute. Chunk sở hữu mọi cặp có user id nhỏ hơn
+    nằm trong khoảng; completed_at = NULL nghĩa là chunk chưa xong (job chạy lại sẽ làm lại chunk này).
+    """
+    __tablename__ = "match_precompute_chunks"
+    model_version = Column(String(64), primary_key=True)
+    chunk_start = Column(BigInteger, primary_key=True)
+    chunk_end = Column(BigInteger, nullable=False)
+    threshold = Column(Float(precision=53), nullable=False)
+    geo_filter_mode = Column(String(16), nullable=False)
+    n_pairs = Column(BigInteger)
+    completed_at = Column(TIMESTAMP(timezone=False))
\ No newline at end of file
@@ -0,0 +1,95 @@
+# app/jobs/export_model_bundle.py
+"""
+Export các file .joblib của một version model thành bundle (app/ml/model_bundle.py) trong thư mục bundle/ của
+version đó, rồi kiểm tra bundle cho kết quả giống hệt các file .joblib.
+
+    python -m app.jobs.export_model_bundle                 # version MODEL_VERSION (rỗng = mới nhất)
+    python -m app.jobs.export_model_bundle --version 2025-07-01
+    python -m app.jobs.export_model_bundle --all
+
+- Bundle gồm manifest.json (danh sách cột, top-N list, category one-hot, tham số, hash, kích thước và thời điểm sửa
+  của file nguồn), các mảng .npy (scaler dạng min/scale, vocabulary và idf TF-IDF, cấu trúc cây cho early exit) và
+  model LightGBM dạng text.
+- MatchPredictor tự dùng bundle nếu có và các file .joblib không đổi kể từ lúc export (MODEL_BUNDLE_ENABLED; file
+  khác kích thước hoặc thời điểm sửa mới bị hash lại để so sánh); sau khi đổi file .joblib phải export lại, nếu
+  không bundle cũ bị bỏ qua (có cảnh báo).
+- Kiểm tra: với các user tổng hợp, user feature vector, xác suất (đường batch và đường DataFrame cũ) và kết quả
+  early exit của bundle phải bằng từng bit kết quả khi tải từ .joblib. Bundle được kiểm tra trong thư mục tạm
+  trước khi thay bundle cũ: nếu khác (hoặc kiểm tra bị lỗi), bundle mới bị xóa và bundle cũ (nếu có) được giữ.
+"""
+import argparse
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.model_bundle import export_bundle
+from app.ml.model_registry import ModelRegistry
+from app.ml.predictor import MatchPredictor
+
+VERIFY_USERS = 64
+
+
+def verify_bundle(models_dir: str, bundle_dir: Optional[str] = None, n_users: int = VERIFY_USERS) -> None:
+    """
+    Ném ValueError nếu predictor tải từ bundle (bundle_dir, mặc định bundle/ của models_dir) cho kết quả khác
+    predictor tải từ các file .joblib.
+    """
+    reference = MatchPredictor(models_dir, early_exit=True, use_bundle=False)
+    bundled = MatchPredictor(models_dir, early_exit=True, use_bundle=True, bundle_dir=bundle_dir)
+    if bundled.bundle is None:
+        raise ValueError("the bundle could not be opened")
+    if bundled.model_version != reference.model_version:
+        raise ValueError(f"model version {bundled.model_version} != {reference.model_version}")
+
+    user_ids = [-(index + 1) for index in range(n_users)]  # Id âm: không trùng user thật
+    user_data = [reference.synthetic_user_data_tuple(user_id) for user_id in user_ids]
+    reference_columns, _ = reference.build_user_columns(user_data, user_ids=user_ids, raise_errors=True)
+    bundled_columns, _ = bundled.build_user_columns(user_data, user_ids=user_ids, raise_errors=True)
+    if not np.array_equal(reference_columns.feature_matrix, bundled_columns.feature_matrix):
+        raise ValueError("user feature vectors differ")
+    for anchor_row in range(min(n_users, 4)):
+        if not np.array_equal(reference.predict_match_proba_columns(reference_columns, reference_columns, anchor_row),
+                              bundled.predict_match_proba_columns(bundled_columns, bundled_columns, anchor_row)):
+            raise ValueError(f"probabilities differ for anchor {anchor_row}")
+        if reference.tree_evaluator is not None and not np.array_equal(
+                reference.predict_match_above_threshold_columns(
+                    reference_columns, reference_columns, settings.MATCH_PROBABILITY_THRESHOLD, anchor_row),
+                bundled.predict_match_above_threshold_columns(
+                    bundled_columns, bundled_columns, settings.MATCH_PROBABILITY_THRESHOLD, anchor_row)):
+            raise ValueError(f"early-exit results differ for anchor {anchor_row}")
+    # Đường DataFrame cũ (predict_match_proba) dùng scaler / encoder / vectorizer dựng lại từ bundle
+    for first, second in zip(user_data[:8], user_data[1:9]):
+        if reference.predict_match_proba(first, second) != bundled.predict_match_proba(first, second):
+            raise ValueError(f"predict_match_proba differs for users {first[0]} and {second[0]}")
+
+
+def run(versions, verify: bool) -> int:
+    registry = ModelRegistry()
+    failed = 0
+    for version in versions:
+        started_at = time.perf_counter()
+        try:
+            version, models_dir = registry.resolve(version)
+            path = export_bundle(models_dir, verify=(lambda bundle_dir: verify_bundle(models_dir, bundle_dir))
+                                 if verify else None)
+        except Exception as e:  # Lỗi của một version (vd: lỗi LightGBM, lỗi đọc/ghi file) không dừng các version khác
+            print(f"CRITICAL: Model version '{version}' was not exported, keeping its previous bundle (if any): "
+                  f"{type(e).__name__}: {e}")
+            failed += 1
+            continue
+        print(f"INFO: Exported model version '{version}' to {path} in {time.perf_counter() - started_at:.2f}s"
+              f"{' (verified)' if verify else ''}.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", default=settings.MODEL_VERSION,
+                        help="Model version to export (default: MODEL_VERSION, empty = latest).")
+    parser.add_argument("--all", action="store_true", help="Export every version of the model registry.")
+    parser.add_argument("--no-verify", action="store_true", help="Skip the parity check against the .joblib files.")
+    args = parser.parse_args()
+    sys.exit(run(ModelRegistry().list_versions() if args.all else [args.version], not args.no_verify))
@@ -0,0 +1,185 @@
+# app/jobs/precompute_matches.py
+"""
+Job offline tính trước potential matches của toàn bộ USER vào bảng precomputed_matches.
+
+    python -m app.jobs.precompute_matches --chunk-size 1000 --workers 4
+
+- Các USER (theo user id tăng dần) được chia thành các chunk `chunk_size` user. Chunk sở hữu mọi cặp
+  {u, v} có min(u, v) nằm trong chunk: feature của cặp chỉ tính một lần và được chấm điểm cả hai chiều
+  u -> v và v -> u (PairwiseFeatureEngine.build_both_directions).
+- Một chiều được ghi nếu score > MATCH_PROBABILITY_THRESHOLD và candidate được chọn giống như khi phục vụ
+  online (bucket sex/orientation tương thích; GEO_FILTER_MODE=hard thì trong bán kính của cả hai phía).
+- Resumable: kết quả của chunk và dấu hoàn thành được ghi trong cùng một transaction; chạy lại lệnh chỉ làm
+  các chunk chưa xong. --restart xóa kết quả của model version hiện tại và làm lại từ đầu.
+- Song song: --workers N process, mỗi process nạp model + population một lần rồi nhận từng chunk.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db import crud, models
+from app.ml.feature_store import UserFeatureSnapshot, UserFeatureStore
+from app.ml.geo_index import GEO_FILTER_MODES, GEO_FILTER_OFF
+from app.ml.model_registry import ModelRegistry
+from app.ml.predictor import MatchPredictor
+from app.services.match_service import score_both_directions
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# --- Trạng thái của process xử lý chunk (tạo một lần bởi _init_worker) ---
+_job_predictor: Optional[MatchPredictor] = None
+_job_snapshot: Optional[UserFeatureSnapshot] = None
+_job_session_factory = None
+_job_options: Dict[str, Any] = {}
+
+
+def _geo_filter_mode() -> str:
+    mode = settings.GEO_FILTER_MODE.lower()
+    return mode if mode in GEO_FILTER_MODES else GEO_FILTER_OFF
+
+
+def _init_worker(database_url: str, models_dir: str, n_jobs: int, model_version: str, threshold: float,
+                 geo_filter_mode: str) -> None:
+    """Nạp model và population của toàn bộ USER (một lần cho mỗi process)."""
+    global _job_predictor, _job_snapshot, _job_session_factory
+    _job_predictor = MatchPredictor(models_dir, inference_mode=settings.MATCH_MODEL_INFERENCE.lower(), n_jobs=n_jobs,
+                                    use_bundle=settings.MODEL_BUNDLE_ENABLED)
+    if _job_predictor.model_version != model_version:
+        raise RuntimeError(f"Model changed while the job was starting "
+                           f"({_job_predictor.model_version} != {model_version}).")
+    _job_session_factory = sessionmaker(autocommit=False, autoflush=False,
+                                        bind=create_engine(database_url, pool_pre_ping=True))
+    store = UserFeatureStore(_job_predictor, fetch_chunk_size=settings.CANDIDATE_FETCH_CHUNK_SIZE)
+    db = _job_session_factory()
+    try:
+        store.build(db)
+    finally:
+        db.close()
+    _job_snapshot = store.snapshot()
+    _job_options.update(model_version=model_version, threshold=threshold, geo_filter_mode=geo_filter_mode)
+
+
+def score_chunk_pairs(predictor: MatchPredictor, snapshot: UserFeatureSnapshot, chunk_start: int, chunk_end: int,
+                      threshold: float, geo_filter_mode: str) -> List[Dict[str, Any]]:
+    """Các chiều (user_id, candidate_id, score) có score > threshold của mọi cặp thuộc chunk."""
+    ids = snapshot.columns.ids.astype(np.int64)
+    result: List[Dict[str, Any]] = []
+    for anchor_row in np.flatnonzero((ids >= chunk_start) & (ids < chunk_end)):
+        user_id = int(ids[anchor_row])
+        candidate_ids, probas, reverse_probas = score_both_directions(
+            predictor, snapshot, anchor_row, geo_filter_mode, candidate_mask=ids > user_id)
+        with np.errstate(invalid='ignore'):
+            forward, reverse = probas > threshold, reverse_probas > threshold
+        result.extend({"user_id": user_id, "candidate_id": int(candidate_id), "score": float(score)}
+                      for candidate_id, score in zip(candidate_ids[forward], probas[forward]))
+        result.extend({"user_id": int(candidate_id), "candidate_id": user_id, "score": float(score)}
+                      for candidate_id, score in zip(candidate_ids[reverse], reverse_probas[reverse]))
+    return result
+
+
+def _process_chunk(chunk_start: int, chunk_end: int) -> Tuple[int, int, float]:
+    """Tính và ghi một chunk; trả về (chunk_start, số dòng đã ghi, số giây)."""
+    started_at = time.perf_counter()
+    rows = score_chunk_pairs(_job_predictor, _job_snapshot, chunk_start, chunk_end,
+                             _job_options["threshold"], _job_options["geo_filter_mode"])
+    db = _job_session_factory()
+    try:
+        crud.save_precomputed_chunk(db, _job_options["model_version"], chunk_start, chunk_end, rows)
+    finally:
+        db.close()
+    return chunk_start, len(rows), time.perf_counter() - started_at
+
+
+def plan_chunks(db: Session, model_version: str, chunk_size: int, threshold: float,
+                geo_filter_mode: str) -> List[models.MatchPrecomputeChunk]:
+    """
+    Kế hoạch chunk của model_version: dùng lại kế hoạch đã lưu (resume) hoặc tạo mới từ danh sách USER hiện tại.
+    Kế hoạch cũ với threshold / geo_filter_mode khác không được trộn với lần chạy mới (cần --restart).
+    """
+    chunks = crud.get_precompute_chunks(db, model_version)
+    if chunks:
+        if any(chunk.threshold != threshold or chunk.geo_filter_mode != geo_filter_mode for chunk in chunks):
+            raise ValueError("Existing precompute run used a different threshold or GEO_FILTER_MODE; "
+                             "rerun with --restart.")
+        return chunks
+
+    user_ids = sorted(crud.get_user_ids_with_role(db, role_name="USER"))
+    boundaries = [
+        (user_ids[start], user_ids[start + chunk_size] if start + chunk_size < len(user_ids) else user_ids[-1] + 1)
+        for start in range(0, len(user_ids), chunk_size)
+    ]
+    crud.create_precompute_chunks(db, model_version, boundaries, threshold, geo_filter_mode)
+    return crud.get_precompute_chunks(db, model_version)
+
+
+def run(database_url: str, chunk_size: int, workers: int, restart: bool) -> int:
+    started_at = time.perf_counter()
+    engine = create_engine(database_url, pool_pre_ping=True)
+    models.Base.metadata.create_all(
+        engine, tables=[models.PrecomputedMatch.__table__, models.MatchPrecomputeChunk.__table__])
+    # Cùng version model với API (MODEL_VERSION, rỗng = mới nhất), đã được kiểm tra bởi ModelRegistry
+    version, predictor = ModelRegistry().load(settings.MODEL_VERSION,
+                                              inference_mode=settings.MATCH_MODEL_INFERENCE.lower(),
+                                              use_bundle=settings.MODEL_BUNDLE_ENABLED)
+    models_dir, model_version = predictor.models_dir, predictor.model_version
+    threshold, geo_filter_mode = settings.MATCH_PROBABILITY_THRESHOLD, _geo_filter_mode()
+
+    with Session(engine) as db:
+        if restart:
+            crud.delete_precomputed_matches(db, model_version)
+        try:
+            chunks = plan_chunks(db, model_version, chunk_size, threshold, geo_filter_mode)
+        except ValueError as e:
+            print(f"CRITICAL: {e}")
+            return 1
+        pending = [(chunk.chunk_start, chunk.chunk_end) for chunk in chunks if chunk.completed_at is None]
+    engine.dispose()
+    print(f"INFO: Model {version} ({model_version}): {len(chunks)} chunks, {len(pending)} to compute "
+          f"(threshold={threshold}, geo_filter_mode={geo_filter_mode}).")
+    if not pending:
+        return 0
+
+    workers = max(min(workers, len(pending)), 1)
+    n_jobs = max((os.cpu_count() or 1) // workers, 1)
+    initargs = (database_url, models_dir, n_jobs, model_version, threshold, geo_filter_mode)
+    done = 0
+
+    def report(chunk_start: int, n_rows: int, seconds: float) -> None:
+        nonlocal done
+        done += 1
+        print(f"INFO: Chunk starting at user {chunk_start}: {n_rows} matches in {seconds:.2f}s "
+              f"({done}/{len(pending)}).")
+
+    if workers == 1:
+        _init_worker(*initargs)
+        for chunk_start, chunk_end in pending:
+            report(*_process_chunk(chunk_start, chunk_end))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=initargs) as executor:
+            futures = [executor.submit(_process_chunk, chunk_start, chunk_end) for chunk_start, chunk_end in pending]
+            for future in as_completed(futures):
+                report(*future.result())
+    print(f"INFO: Precomputed matches for model {model_version} in {time.perf_counter() - started_at:.1f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Users per chunk (only used when planning a new run).")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel worker processes.")
+    parser.add_argument("--restart", action="store_true",
+                        help="Drop results of the current model version and start over.")
+    parser.add_argument("--database-url", default=settings.SQLALCHEMY_DATABASE_URL)
+    args = parser.parse_args()
+    sys.exit(run(args.database_url, max(args.chunk_size, 1), args.workers, args.restart))
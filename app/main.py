@@ -1,56 +1,70 @@
 # app/main.py
-from fastapi import FastAPI
-from contextlib import asynccontextmanager
-import nltk  # Để tải dữ liệu NLTK
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 
 from app.api.v1.api import api_router_v1
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.db.session import engine  # Để tạo bảng (nếu cần, nhưng Alembic tốt hơn)
+from app.api.v1.endpoints import admin, events, matches
 from app.db import base  # Import base để Base.metadata biết về các models
+from app.ml.preprocessing import find_missing_nltk_resources
 
 
-# --- NLTK Data Download ---
-# Hàm này nên được gọi một lần. Trong production, nó có thể nằm trong Dockerfile
-# hoặc một script setup riêng.
-
-def download_nltk_data():
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt', quiet=True)
-
-    try:
-        nltk.data.find('corpora/stopwords')
-    except LookupError:
-        nltk.download('stopwords', quiet=True)
-
+@contextmanager
+def startup_phase(name: str, timings: Dict[str, float]):
+    """Đo và log thời gian của một bước khởi động (kể cả khi bước đó lỗi)."""
+    started_at = time.perf_counter()
     try:
-        nltk.data.find('corpora/wordnet')
-    except LookupError:
-        nltk.download('wordnet', quiet=True)
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started_at
+        print(f"INFO: Startup phase '{name}' took {timings[name]:.3f}s")
 
-    print("NLTK data checked/downloaded.")
 
 # --- Lifespan Events (cho FastAPI 0.90+) ---
-# Dùng để thực hiện các tác vụ khi khởi động và tắt ứng dụng
-# Ví dụ: tải model ML, kết nối DB, tải dữ liệu NLTK
+# Khởi động không truy cập mạng: dữ liệu NLTK và model phải có sẵn trên đĩa.
+# Uvicorn chỉ nhận request sau khi lifespan startup chạy xong, nên warmup xong mới "ready".
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Code to run on app startup
     print("Application startup...")
-    download_nltk_data()
-    # base.Base.metadata.create_all(bind=engine) # Tạo bảng nếu chưa có, Alembic tốt hơn cho production
+    timings: Dict[str, float] = {}
+    started_at = time.perf_counter()
+
+    with startup_phase("nltk_check", timings):
+        missing_nltk = find_missing_nltk_resources()
+        if missing_nltk:
+            print(f"WARNING: Missing NLTK data {missing_nltk}. Bio features fall back to empty text "
+                  f"(install with: python -m nltk.downloader {' '.join(missing_nltk)}).")
+
+    matches.init_match_state(app.state)
+    with startup_phase("model_load", timings):
+        runtime = matches.load_match_runtime(app.state.model_registry, settings.MODEL_VERSION)
+    # Warmup, build UserFeatureStore và khởi động ShardedScoringPool (mỗi bước được đo như một phase)
+    if runtime is not None:
+        runtime.start(lambda name: startup_phase(name, timings))
+    app.state.match_runtime = runtime
 
-    # Khởi tạo MatchPredictor ở đây nếu muốn quản lý tập trung
-    # app.state.match_predictor = MatchPredictor()
-    # sau đó trong dependency get_match_service, bạn có thể lấy từ request.app.state.match_predictor
-    # Hiện tại, MatchPredictor đang được khởi tạo ở global scope của matches.py
+    # Thread xử lý POST /events/user-updated (chấm điểm lại các cặp của user đã thay đổi)
+    events.init_event_state(app.state)
+    # Reload model qua POST /admin/model/reload
+    admin.init_admin_state(app.state)
 
+    app.state.startup_timings = timings
     print(f"Match probability threshold set to: {settings.MATCH_PROBABILITY_THRESHOLD}")
+    print(f"INFO: Application ready in {time.perf_counter() - started_at:.3f}s "
+          f"({', '.join(f'{name}={seconds:.3f}s' for name, seconds in timings.items())})")
     yield
     # Code to run on app shutdown
     print("Application shutdown...")
+    events.shutdown_event_state(app.state)
+    matches.shutdown_match_state(app.state)
 
 
 app = FastAPI(
@@ -65,4 +79,12 @@ app.include_router(api_router_v1, prefix=settings.API_V1_STR)
 
 @app.get("/", tags=["Root"])
 async def read_root():
-    return {"message": f"Welcome to {settings.PROJECT_NAME}!"}
\ No newline at end of file
+    return {"message": f"Welcome to {settings.PROJECT_NAME}!"}
+
+
+# Prometheus scrape endpoint (ngoài /api/v1, không xuất hiện trong OpenAPI schema)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
\ No newline at end of file
@@ -0,0 +1,146 @@
+# app/ml/ann_index.py
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Số dòng mỗi block khi gán vector vào centroid (giới hạn bộ nhớ của ma trận similarity block x n_lists)
+ASSIGN_BLOCK_SIZE = 4096
+# Số vector tối đa dùng để train centroid cho mỗi list
+TRAIN_SAMPLES_PER_LIST = 64
+DEFAULT_TRAIN_ITERATIONS = 10
+# search() quét tiếp các list cho tới khi có ít nhất SEARCH_OVERFETCH * k user được phép: với k lớn, dừng ngay khi
+# đủ k user thì bỏ sót nhiều user gần hơn nằm ở các list chưa quét
+SEARCH_OVERFETCH = 2
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Chuẩn hóa L2 từng dòng (float32); dòng toàn 0 giữ nguyên (cosine = 0 với mọi vector, như _feature_similarity)."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _assign(unit_vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Centroid gần nhất (cosine lớn nhất) của từng vector."""
+    assignment = np.empty(len(unit_vectors), dtype=np.int64)
+    for start in range(0, len(unit_vectors), ASSIGN_BLOCK_SIZE):
+        block = unit_vectors[start:start + ASSIGN_BLOCK_SIZE]
+        assignment[start:start + ASSIGN_BLOCK_SIZE] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(unit_vectors: np.ndarray, n_lists: int, iterations: int = DEFAULT_TRAIN_ITERATIONS,
+                    seed: int = 0) -> np.ndarray:
+    """Spherical k-means (centroid chuẩn hóa L2) trên một mẫu tối đa n_lists * TRAIN_SAMPLES_PER_LIST vector."""
+    rng = np.random.default_rng(seed)
+    n_samples = min(len(unit_vectors), n_lists * TRAIN_SAMPLES_PER_LIST)
+    sample = unit_vectors[np.sort(rng.choice(len(unit_vectors), n_samples, replace=False))]
+    centroids = sample[rng.choice(n_samples, n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.flatnonzero(np.bincount(assignment, minlength=n_lists) == 0)
+        # List rỗng được khởi tạo lại từ một vector ngẫu nhiên của mẫu
+        sums[empty] = sample[rng.choice(n_samples, len(empty))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class CosineIVFIndex:
+    """
+    Index xấp xỉ nearest neighbour theo cosine similarity của user feature vector (cùng vector với feature
+    user_features_cosine_sim), kiểu IVF: các vector (đã chuẩn hóa L2) được chia vào n_lists list theo centroid
+    gần nhất; truy vấn chỉ tính cosine chính xác với các user thuộc n_probe list có centroid gần truy vấn nhất.
+
+    Index bất biến như UserFeatureSnapshot: updated(...) trả về index mới, dùng chung các list không bị đổi với
+    index cũ, nên request đang đọc index cũ không cần khóa. Centroid chỉ được train lại khi build().
+    """
+
+    def __init__(self, centroids: np.ndarray, list_ids: List[np.ndarray], list_vectors: List[np.ndarray]):
+        self.centroids = centroids
+        self.list_ids = list_ids
+        self.list_vectors = list_vectors
+
+    @classmethod
+    def build(cls, ids: np.ndarray, vectors: np.ndarray, n_lists: int = 0, seed: int = 0) -> 'CosineIVFIndex':
+        """ids: user id của từng dòng của vectors (N x F). n_lists <= 0: tự chọn khoảng sqrt(N)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        unit_vectors = normalize_rows(vectors)
+        if n_lists <= 0:
+            n_lists = int(round(np.sqrt(len(ids))))
+        n_lists = max(min(n_lists, len(ids)), 1)
+        if len(ids) == 0:
+            return cls(np.zeros((1, unit_vectors.shape[1]), dtype=np.float32), [ids], [unit_vectors])
+        centroids = train_centroids(unit_vectors, n_lists, seed=seed)
+        return cls(centroids, *cls._split_by_list(centroids, ids, unit_vectors))
+
+    @staticmethod
+    def _split_by_list(centroids: np.ndarray, ids: np.ndarray,
+                       unit_vectors: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        assignment = _assign(unit_vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        list_rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+        return [ids[rows] for rows in list_rows], [unit_vectors[rows] for rows in list_rows]
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return sum(len(members) for members in self.list_ids)
+
+    def updated(self, changed_ids: Sequence[int], ids: np.ndarray, vectors: np.ndarray) -> 'CosineIVFIndex':
+        """
+        Index mới sau khi bỏ các changed_ids (user đã sửa / bị xóa) rồi thêm (ids, vectors) vào list của centroid
+        gần nhất: chỉ các list có user bị đổi được tạo lại.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        dropped = np.union1d(np.asarray(list(changed_ids), dtype=np.int64), ids)
+        list_ids, list_vectors = list(self.list_ids), list(self.list_vectors)
+        if dropped.size:
+            for i, members in enumerate(self.list_ids):
+                keep = ~np.isin(members, dropped, assume_unique=True)
+                if not keep.all():
+                    list_ids[i], list_vectors[i] = members[keep], self.list_vectors[i][keep]
+
+        if ids.size:
+            added_ids, added_vectors = self._split_by_list(self.centroids, ids, normalize_rows(vectors))
+            for i in np.flatnonzero([len(members) for members in added_ids]):
+                list_ids[i] = np.concatenate([list_ids[i], added_ids[i]])
+                list_vectors[i] = np.concatenate([list_vectors[i], added_vectors[i]])
+        return CosineIVFIndex(self.centroids, list_ids, list_vectors)
+
+    def search(self, vector: np.ndarray, k: int, n_probe: int,
+               accept: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tối đa k user có cosine similarity với vector lớn nhất, giảm dần (hòa thì user id tăng dần).
+        Quét n_probe list gần nhất; accept(ids) -> mask bool lọc các user được phép (vd: bucket tương thích).
+        Nếu sau n_probe list chưa đủ SEARCH_OVERFETCH * k user được phép thì quét thêm các list kế tiếp.
+        Trả về (user ids, cosine similarity).
+        """
+        query = normalize_rows(vector)[0]
+        probe_order = np.argsort(-(self.centroids @ query), kind='stable')
+        id_parts: List[np.ndarray] = []
+        similarity_parts: List[np.ndarray] = []
+        n_found = 0
+        for probed, list_index in enumerate(probe_order):
+            if probed >= n_probe and n_found >= SEARCH_OVERFETCH * k:
+                break
+            members = self.list_ids[list_index]
+            if members.size == 0:
+                continue
+            similarities = self.list_vectors[list_index] @ query
+            if accept is not None:
+                allowed = accept(members)
+                members, similarities = members[allowed], similarities[allowed]
+            id_parts.append(members)
+            similarity_parts.append(similarities)
+            n_found += len(members)
+
+        if not id_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, similarities = np.concatenate(id_parts), np.concatenate(similarity_parts)
+        order = np.lexsort((ids, -similarities))[:k]
+        return ids[order], similarities[order]
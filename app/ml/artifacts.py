@@ -0,0 +1,87 @@
+# app/ml/artifacts.py
+import os
+import threading
+from typing import List, Optional
+
+import joblib
+from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# --- Constants ---
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "ml_models")
+
+# Tên các cột gốc được đưa vào OneHotEncoder (đúng thứ tự lúc fit trong notebook)
+CATEGORICAL_COLS_ONEHOT = ['sex', 'orientation', 'body_type', 'drink', 'smoke']
+
+
+class PreprocessingArtifacts:
+    """
+    Gom toàn bộ các preprocessor (scaler, encoder, top-N list, TF-IDF, danh sách cột)
+    cần cho create_user_feature_vector và tải chúng MỘT LẦN từ thư mục ml_models.
+
+    Sau khi khởi tạo, object chỉ được đọc (read-only) nên có thể dùng chung giữa các
+    request và các thread mà không cần khóa (riêng bio_encoder có cache nội bộ với khóa riêng).
+    bundle (ModelBundle, tùy chọn): tải từ bundle đã export thay vì các file .joblib.
+    """
+
+    def __init__(self, models_dir: str = MODELS_DIR, bundle=None):
+        self.models_dir = models_dir
+        self.bundle = bundle
+
+        # Scalers
+        self.scaler_age: MinMaxScaler = self._load("scaler_age.joblib")
+        self.scaler_height: MinMaxScaler = self._load("scaler_height.joblib")
+        self.latitude_scaler: MinMaxScaler = self._load("latitude_scaler.joblib")
+        self.longitude_scaler: MinMaxScaler = self._load("longitude_scaler.joblib")
+        self.location_preference_scaler: MinMaxScaler = self._load("location_preference_scaler.joblib")
+
+        # Categorical encoders
+        self.onehot_encoder_categorical: OneHotEncoder = self._load("onehot_encoder_categorical.joblib")
+        self.top_n_job_categories: List[str] = self._load("top_n_job_categories.joblib")
+        self.top_n_edu_categories: List[str] = self._load("top_n_edu_categories.joblib")
+
+        # Multi-value items
+        self.top_interests_items: List[str] = self._load("top_interests_items.joblib")
+        self.top_languages_items: List[str] = self._load("top_languages_items.joblib")
+        self.top_pets_items: List[str] = self._load("top_pets_items.joblib")
+
+        # Bio
+        self.tfidf_vectorizer_bio: TfidfVectorizer = self._load("tfidf_vectorizer_bio.joblib")
+
+        # Thứ tự cột cuối cùng của user feature vector
+        self.user_features_final_columns: List[str] = list(self._load("user_features_final_columns.joblib"))
+
+        # Các giá trị dẫn xuất, tính sẵn một lần thay vì tính lại mỗi lần gọi
+        self.onehot_feature_names: List[str] = list(
+            self.onehot_encoder_categorical.get_feature_names_out(CATEGORICAL_COLS_ONEHOT))
+        self.bio_feature_names: Optional[List[str]] = None
+        if hasattr(self.tfidf_vectorizer_bio, 'get_feature_names_out'):
+            self.bio_feature_names = [f"bio_tfidf_{name.replace(' ', '_')}" for name in
+                                      self.tfidf_vectorizer_bio.get_feature_names_out()]
+
+        # Import tại đây để tránh vòng import (bio_features -> preprocessing -> artifacts)
+        from app.ml.bio_features import BioFeatureEncoder
+        from app.ml.feature_schema import UserFeatureSchema
+        self.bio_encoder = BioFeatureEncoder(self.tfidf_vectorizer_bio)
+        # Offset của từng cột cho user feature vector dạng mảng (create_user_feature_array)
+        self.user_feature_schema = UserFeatureSchema(self)
+
+    def _load(self, filename: str):
+        if self.bundle is not None:
+            return self.bundle.load(filename)
+        return joblib.load(os.path.join(self.models_dir, filename))
+
+
+# --- Instance mặc định (lazy) cho các caller không truyền artifacts vào ---
+_default_artifacts: Optional[PreprocessingArtifacts] = None
+_default_artifacts_lock = threading.Lock()
+
+
+def get_default_artifacts() -> PreprocessingArtifacts:
+    """Trả về PreprocessingArtifacts dùng chung của process, tải ở lần gọi đầu tiên."""
+    global _default_artifacts
+    if _default_artifacts is None:
+        with _default_artifacts_lock:
+            if _default_artifacts is None:
+                _default_artifacts = PreprocessingArtifacts()
+    return _default_artifacts
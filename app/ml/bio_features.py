@@ -0,0 +1,74 @@
+# app/ml/bio_features.py
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.core.metrics import STAGE_BIO, metrics
+from app.ml.preprocessing import preprocess_text
+
+# Số user tối đa được ghi nhớ vector TF-IDF của bio (LRU)
+BIO_CACHE_MAX_USERS = 100000
+
+
+def bio_hash(bio: Optional[str]) -> str:
+    return hashlib.sha1(("" if bio is None else str(bio)).encode("utf-8")).hexdigest()
+
+
+class BioFeatureEncoder:
+    """
+    preprocess_text + tfidf_vectorizer_bio.transform cho bio, kết quả là một dòng sparse (1 x vocab).
+
+    Bio là bước tốn kém nhất khi tính user feature vector (unidecode, regex, tokenize, stopword,
+    lemmatize, TF-IDF), trong khi bio hiếm khi thay đổi: kết quả được ghi nhớ theo (user id, hash của bio),
+    mỗi user giữ một entry và entry tự mất hiệu lực khi bio đổi. Bio không có user id được ghi nhớ theo hash.
+    """
+
+    def __init__(self, tfidf_vectorizer: TfidfVectorizer, max_entries: int = BIO_CACHE_MAX_USERS):
+        self.tfidf_vectorizer = tfidf_vectorizer
+        self.max_entries = max(max_entries, 1)
+        self._lock = threading.Lock()
+        self._rows: "OrderedDict[Hashable, Tuple[str, sp.csr_matrix]]" = OrderedDict()  # key -> (bio hash, row)
+        self._empty_row: Optional[sp.csr_matrix] = None
+        self._hits = 0
+        self._misses = 0
+
+    def transform(self, bio: Optional[str], user_id: Optional[int] = None) -> sp.csr_matrix:
+        digest = bio_hash(bio)
+        key = ("user", user_id) if user_id is not None else ("bio", digest)
+        with self._lock:
+            cached = self._rows.get(key)
+            if cached is not None and cached[0] == digest:
+                self._rows.move_to_end(key)
+                self._hits += 1
+                return cached[1]
+            self._misses += 1
+
+        with metrics.stage(STAGE_BIO):
+            row = self._transform_uncached(bio)
+        with self._lock:
+            self._rows[key] = (digest, row)
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.max_entries:
+                self._rows.popitem(last=False)
+        return row
+
+    def _transform_uncached(self, bio: Optional[str]) -> sp.csr_matrix:
+        processed_bio = preprocess_text(bio)
+        if not processed_bio:
+            # Bio rỗng (hoặc thiếu dữ liệu NLTK) luôn cho cùng một vector, chỉ transform một lần
+            if self._empty_row is None:
+                self._empty_row = sp.csr_matrix(self.tfidf_vectorizer.transform([""]))
+            return self._empty_row
+        return sp.csr_matrix(self.tfidf_vectorizer.transform([processed_bio]))
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._rows.pop(("user", user_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._rows), "hits": self._hits, "misses": self._misses}
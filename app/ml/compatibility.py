@@ -0,0 +1,83 @@
+# app/ml/compatibility.py
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.ml.preprocessing import orientation_compatibility
+
+# Bucket = (sex, orientation) đã chuẩn hóa lower-case; None giữ nguyên
+Bucket = Tuple[Optional[str], Optional[str]]
+
+# Miền giá trị đã biết (theo OneHotEncoder và bảng orientations)
+KNOWN_SEXES = ('male', 'female', 'non-binary', 'prefer not to say')
+KNOWN_ORIENTATIONS = ('straight', 'homosexual', 'bisexual', 'prefer not to say')
+
+
+def bucket_key(sex: Optional[str], orientation: Optional[str]) -> Bucket:
+    """
+    orientation_compatibility chỉ phụ thuộc vào giá trị lower-case của sex/orientation
+    (và việc chúng có là None hay không), nên bucket được chuẩn hóa về lower-case.
+    """
+    return (sex.lower() if sex is not None else None,
+            orientation.lower() if orientation is not None else None)
+
+
+class OrientationCompatibilityTable:
+    """
+    Bảng tương thích orientation giữa hai bucket, tính sẵn trên miền hữu hạn
+    KNOWN_SEXES x KNOWN_ORIENTATIONS. Bucket ngoài miền này (giá trị lạ trong DB)
+    được tính một lần rồi ghi nhớ.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table: Dict[Tuple[Bucket, Bucket], bool] = {}
+        known_buckets = [(sex, orientation) for sex in KNOWN_SEXES for orientation in KNOWN_ORIENTATIONS]
+        for bucket_a in known_buckets:
+            for bucket_b in known_buckets:
+                self._table[(bucket_a, bucket_b)] = orientation_compatibility(*bucket_a, *bucket_b)
+
+    def is_compatible(self, bucket_a: Bucket, bucket_b: Bucket) -> bool:
+        # Thiếu sex hoặc orientation ở bất kỳ phía nào -> không tương thích
+        if None in bucket_a or None in bucket_b:
+            return False
+        key = (bucket_a, bucket_b)
+        compatible = self._table.get(key)
+        if compatible is None:
+            compatible = orientation_compatibility(*bucket_a, *bucket_b)
+            with self._lock:
+                self._table[key] = compatible
+        return compatible
+
+    def compatible_buckets(self, anchor: Bucket, buckets: Iterable[Bucket]) -> List[Bucket]:
+        """Lọc các bucket (trong `buckets`) tương thích với bucket của anchor."""
+        return [bucket for bucket in buckets if self.is_compatible(anchor, bucket)]
+
+
+# Dùng chung cho cả process (chỉ đọc, ngoại trừ phần ghi nhớ bucket lạ có khóa)
+ORIENTATION_COMPATIBILITY_TABLE = OrientationCompatibilityTable()
+
+
+class OrientationBucketIndex:
+    """Index từ bucket (sex, orientation) tới các vị trí dòng (hoặc user id) thuộc bucket đó."""
+
+    def __init__(self, sexes: Sequence[Optional[str]], orientations: Sequence[Optional[str]]):
+        rows_by_bucket: Dict[Bucket, List[int]] = {}
+        for row, (sex, orientation) in enumerate(zip(sexes, orientations)):
+            rows_by_bucket.setdefault(bucket_key(sex, orientation), []).append(row)
+        self.rows_by_bucket: Dict[Bucket, np.ndarray] = {
+            bucket: np.asarray(rows, dtype=np.int64) for bucket, rows in rows_by_bucket.items()
+        }
+
+    @property
+    def buckets(self) -> List[Bucket]:
+        return list(self.rows_by_bucket.keys())
+
+    def compatible_rows(self, anchor: Bucket,
+                        table: OrientationCompatibilityTable = ORIENTATION_COMPATIBILITY_TABLE) -> np.ndarray:
+        """Các dòng thuộc bucket tương thích với anchor, theo thứ tự tăng dần."""
+        parts = [self.rows_by_bucket[bucket] for bucket in table.compatible_buckets(anchor, self.rows_by_bucket)]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
@@ -0,0 +1,99 @@
+# app/ml/feature_schema.py
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+from app.ml.artifacts import CATEGORICAL_COLS_ONEHOT
+
+# dtype mặc định của user feature vector dạng mảng (một nửa bộ nhớ so với float64)
+USER_FEATURE_DTYPE = np.float32
+
+
+def _clean_top_n_category(category) -> str:
+    # Giống cách đặt tên cột trong _apply_top_n_categorical_encoding_single
+    return unidecode(str(category)).lower().replace(' ', '_').replace('/', '_').replace('(', '').replace(
+        ')', '').replace('.', '')
+
+
+class UserFeatureSchema:
+    """
+    Schema cột dùng chung cho user feature vector dạng mảng NumPy (thứ tự user_features_final_columns).
+
+    Tính sẵn một lần vị trí (offset) của từng cột mà create_user_feature_array ghi vào, thay cho
+    dict theo tên cột + pd.Series + reindex của create_user_feature_vector. Offset -1 nghĩa là
+    cột không có trong user_features_final_columns (giá trị bị bỏ, giống reindex).
+    """
+
+    def __init__(self, artifacts, dtype=USER_FEATURE_DTYPE):
+        self.columns: List[str] = list(artifacts.user_features_final_columns)
+        self.index: Dict[str, int] = {col: i for i, col in enumerate(self.columns)}
+        self.dtype = np.dtype(dtype)
+
+        # 1. Age / Height: (offset, scale, min, clip range) của MinMaxScaler
+        self.age = (self.offset('age_scaled'),) + self._scaler_params(artifacts.scaler_age)
+        self.height = (self.offset('height_scaled'),) + self._scaler_params(artifacts.scaler_height)
+
+        # 2. One-hot: theo từng cột gốc, giá trị category -> offset
+        self.onehot: List[Tuple[str, Dict[object, int]]] = []
+        feature_names = iter(artifacts.onehot_feature_names)
+        for col, categories in zip(CATEGORICAL_COLS_ONEHOT, artifacts.onehot_encoder_categorical.categories_):
+            self.onehot.append((col, {category: self.offset(next(feature_names)) for category in categories}))
+
+        # 3. Top-N categorical: [(offset, category đã chuẩn hóa)], offset của cột "other", tập category
+        self.job = self._top_n(artifacts.top_n_job_categories, 'job')
+        self.edu = self._top_n(artifacts.top_n_edu_categories, 'edu')
+
+        # 4. Binary indicators
+        self.dropped_out_school = self.offset('dropped_out_school')
+        self.interested_in_new_language = self.offset('interested_in_new_language')
+
+        # 5. Multi-value: [(offset, item)]
+        self.interests = self._multi_value(artifacts.top_interests_items, 'interest')
+        self.languages = self._multi_value(artifacts.top_languages_items, 'lang')
+        self.pets = self._multi_value(artifacts.top_pets_items, 'pet')
+
+        # 6. Bio: offset theo chỉ số cột của vector TF-IDF
+        n_bio_features = len(artifacts.tfidf_vectorizer_bio.vocabulary_)
+        bio_names = artifacts.bio_feature_names
+        if bio_names is None or len(bio_names) != n_bio_features:
+            bio_names = [f"bio_tfidf_{i}" for i in range(n_bio_features)]
+        self.bio_offsets = np.array([self.offset(name) for name in bio_names], dtype=np.int64)
+        # Không cột bio nào nằm trong vector cuối cùng -> có thể bỏ qua hoàn toàn bước xử lý bio
+        self.bio_needed = bool((self.bio_offsets >= 0).any())
+
+        # 7. Geographic
+        self.loc_pref_is_everywhere = self.offset('loc_pref_is_everywhere')
+        self.location_preference = (self.offset('location_preference_km_scaled'),) + self._scaler_params(
+            artifacts.location_preference_scaler)
+        self.latitude = (self.offset('latitude_scaled'),) + self._scaler_params(artifacts.latitude_scaler)
+        self.longitude = (self.offset('longitude_scaled'),) + self._scaler_params(artifacts.longitude_scaler)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def offset(self, column: str) -> int:
+        return self.index.get(column, -1)
+
+    def new_vector(self) -> np.ndarray:
+        """Vector làm việc (float64, toàn 0) để ghi theo offset trước khi ép về self.dtype."""
+        return np.zeros(len(self.columns), dtype=np.float64)
+
+    def to_series(self, vector: np.ndarray) -> pd.Series:
+        """Chuyển vector dạng mảng về pd.Series theo tên cột (tương thích với API cũ)."""
+        return pd.Series(np.asarray(vector, dtype=np.float64), index=self.columns)
+
+    @staticmethod
+    def _scaler_params(scaler) -> Tuple[float, float, Optional[Tuple[float, float]]]:
+        clip_range = tuple(scaler.feature_range) if getattr(scaler, 'clip', False) else None
+        return float(scaler.scale_[0]), float(scaler.min_[0]), clip_range
+
+    def _top_n(self, top_categories: list, prefix: str) -> Tuple[List[Tuple[int, str]], int, set]:
+        categories = [(self.offset(f"{prefix}_{_clean_top_n_category(category)}"), str(category).strip().lower())
+                      for category in top_categories]
+        return categories, self.offset(f"{prefix}_other"), {category for _, category in categories}
+
+    def _multi_value(self, top_items: list, prefix: str) -> List[Tuple[int, str]]:
+        return [(self.offset(prefix + '_' + re.sub(r'\W+', '_', item)), item) for item in top_items]
@@ -0,0 +1,150 @@
+# app/ml/feature_store.py
+import threading
+import time
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.db import crud
+from app.ml.ann_index import CosineIVFIndex
+from app.ml.compatibility import OrientationBucketIndex
+from app.ml.geo_index import GeoIndex
+from app.ml.pairwise_engine import UserColumns
+from app.ml.predictor import MatchPredictor
+
+
+class UserFeatureSnapshot:
+    """
+    Một phiên bản bất biến của population: columns, index user id -> dòng, index theo bucket và
+    (nếu bật ANN retrieval) CosineIVFIndex trên user feature vector.
+    """
+
+    def __init__(self, columns: UserColumns, ann_index: Optional[CosineIVFIndex] = None):
+        self.columns = columns
+        self.row_by_id: Dict[int, int] = {int(uid): row for row, uid in enumerate(columns.ids)}
+        self.bucket_index = OrientationBucketIndex(columns.sex, columns.orientation)
+        self.ann_index = ann_index
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    @cached_property
+    def _rows_by_sorted_id(self) -> Tuple[np.ndarray, np.ndarray]:
+        ids = self.columns.ids.astype(np.int64)
+        order = np.argsort(ids)
+        return ids[order], order
+
+    def rows_for_ids(self, user_ids: np.ndarray) -> np.ndarray:
+        """Dòng của từng user id (vector hóa, các id phải có trong snapshot)."""
+        sorted_ids, order = self._rows_by_sorted_id
+        return order[np.searchsorted(sorted_ids, user_ids)]
+
+    def similar_rows(self, vector: np.ndarray, candidate_rows: np.ndarray, k: int, n_probe: int) -> np.ndarray:
+        """Tối đa k dòng trong candidate_rows có cosine similarity (xấp xỉ, qua ann_index) lớn nhất, tăng dần."""
+        allowed = np.zeros(len(self), dtype=bool)
+        allowed[candidate_rows] = True
+        retrieved_ids, _ = self.ann_index.search(vector, k, n_probe, accept=lambda ids: allowed[self.rows_for_ids(ids)])
+        return np.sort(self.rows_for_ids(retrieved_ids))
+
+    @cached_property
+    def geo_index(self) -> GeoIndex:
+        # Chỉ build khi cần (GEO_FILTER_MODE = hard)
+        return GeoIndex(self.columns.latitude, self.columns.longitude)
+
+
+class UserFeatureStore:
+    """
+    Snapshot trong bộ nhớ của toàn bộ user có role USER, ở dạng mảng NumPy liên tục
+    (UserColumns): ma trận user feature vector theo thứ tự user_features_final_columns
+    cùng các cột thô cần cho pairwise features (age, height, lat/lon, location_preference,
+    sex/orientation, các tập multi-value).
+
+    - build(db): tải toàn bộ population (lúc startup).
+    - refresh(db, user_ids): chỉ tính lại các user đã thay đổi (thêm/sửa/xóa).
+    ann_enabled: kèm theo mỗi snapshot một CosineIVFIndex (ann_n_lists list, 0 = tự chọn); build() train lại
+    centroid, refresh() chỉ cập nhật các list chứa user đã thay đổi.
+    Mỗi lần build/refresh tạo ra một snapshot mới và thay thế nguyên khối, nên các request
+    đang đọc snapshot cũ không bị ảnh hưởng và không cần khóa khi đọc.
+    """
+
+    def __init__(self, predictor: MatchPredictor, role_name: str = "USER", fetch_chunk_size: int = 1000,
+                 ann_enabled: bool = False, ann_n_lists: int = 0):
+        self.predictor = predictor
+        self.role_name = role_name
+        self.fetch_chunk_size = max(fetch_chunk_size, 1)
+        self.ann_enabled = ann_enabled
+        self.ann_n_lists = ann_n_lists
+        self._write_lock = threading.Lock()
+        self._state: Optional[UserFeatureSnapshot] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._state is not None
+
+    def __len__(self) -> int:
+        state = self._state
+        return len(state) if state else 0
+
+    def snapshot(self) -> UserFeatureSnapshot:
+        """Trả về snapshot hiện tại."""
+        state = self._state
+        if state is None:
+            raise RuntimeError("UserFeatureStore has not been built yet.")
+        return state
+
+    def build(self, db: Session) -> None:
+        """Tải và tính feature cho toàn bộ user có role `role_name`."""
+        started_at = time.perf_counter()
+        with self._write_lock:
+            user_ids = crud.get_user_ids_with_role(db, role_name=self.role_name)
+            columns = self._load_columns(db, user_ids)
+            ann_index = None
+            if self.ann_enabled:
+                ann_index = CosineIVFIndex.build(columns.ids.astype(np.int64), columns.feature_matrix,
+                                                 n_lists=self.ann_n_lists)
+            self._state = UserFeatureSnapshot(columns, ann_index)
+        print(f"INFO: UserFeatureStore built with {len(columns)} users "
+              f"{f'(ANN index: {ann_index.n_lists} lists) ' if ann_index is not None else ''}"
+              f"in {time.perf_counter() - started_at:.2f}s.")
+
+    def refresh(self, db: Session, user_ids: List[int]) -> None:
+        """
+        Cập nhật snapshot cho các user_ids đã thay đổi: user còn role `role_name` được tính lại,
+        user bị xóa hoặc không còn role đó bị loại khỏi snapshot.
+        """
+        if not user_ids:
+            return
+        if not self.is_ready:
+            self.build(db)
+            return
+
+        with self._write_lock:
+            columns, row_by_id = self._state.columns, self._state.row_by_id
+            changed_ids = set(user_ids)
+            still_eligible_ids = crud.get_user_ids_with_role(db, role_name=self.role_name,
+                                                             user_ids=list(changed_ids))
+            refreshed = self._load_columns(db, still_eligible_ids)
+
+            keep_rows = np.array([row for uid, row in row_by_id.items() if uid not in changed_ids], dtype=np.int64)
+            keep_rows.sort()
+            new_columns = UserColumns.concat([columns.take(keep_rows), refreshed])
+            ann_index = self._state.ann_index
+            if ann_index is not None:
+                ann_index = ann_index.updated(list(changed_ids), refreshed.ids.astype(np.int64),
+                                              refreshed.feature_matrix)
+            self._state = UserFeatureSnapshot(new_columns, ann_index)
+
+    def _load_columns(self, db: Session, user_ids: List[int]) -> UserColumns:
+        parts: List[UserColumns] = []
+        for chunk_start in range(0, len(user_ids), self.fetch_chunk_size):
+            chunk_ids = user_ids[chunk_start:chunk_start + self.fetch_chunk_size]
+            chunk_data = crud.get_users_profile_raw_data_bulk(db, chunk_ids)
+            present_ids = [uid for uid in chunk_ids if chunk_data.get(uid) and chunk_data[uid][0]]
+            chunk_columns, _ = self.predictor.build_user_columns(
+                [chunk_data[uid] for uid in present_ids], user_ids=present_ids)
+            parts.append(chunk_columns)
+        if not parts:
+            return self.predictor.build_user_columns([])[0]
+        return UserColumns.concat(parts) if len(parts) > 1 else parts[0]
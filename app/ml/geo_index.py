@@ -0,0 +1,113 @@
+# app/ml/geo_index.py
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from app.ml.pairwise_engine import MISSING_COORDS_DISTANCE_KM, UserColumns, geodesic_distance_km_vectorized
+
+# Các chế độ lọc theo vị trí (settings.GEO_FILTER_MODE)
+GEO_FILTER_OFF = "off"      # không dùng vị trí để lọc/sắp xếp candidate
+GEO_FILTER_SOFT = "soft"    # không loại candidate, chỉ sắp xếp theo khoảng cách tăng dần (danh sách không xếp hạng)
+GEO_FILTER_HARD = "hard"    # chỉ giữ candidate nằm trong location_preference của cả hai phía
+GEO_FILTER_MODES = (GEO_FILTER_OFF, GEO_FILTER_SOFT, GEO_FILTER_HARD)
+
+_EARTH_MEAN_RADIUS_KM = 6371.0088
+# BallTree dùng haversine trên mặt cầu, còn khoảng cách của model tính trên ellipsoid WGS-84
+# (lệch tối đa ~0.6%) -> nới bán kính khi truy vấn index rồi lọc lại bằng khoảng cách chính xác
+_RADIUS_MARGIN_RATIO = 0.01
+_RADIUS_MARGIN_KM = 1.0
+# Độ dài nhỏ nhất của 1 độ vĩ / 1 độ kinh tại xích đạo (km), dùng cho bounding box
+_KM_PER_DEGREE_LAT_MIN = 110.574
+_KM_PER_DEGREE_LON_EQUATOR = 111.320
+
+
+def _search_radius_km(radius_km: float) -> float:
+    return radius_km * (1 + _RADIUS_MARGIN_RATIO) + _RADIUS_MARGIN_KM
+
+
+class GeoIndex:
+    """BallTree (metric haversine) trên latitude/longitude của các dòng có đủ tọa độ."""
+
+    def __init__(self, latitude: np.ndarray, longitude: np.ndarray):
+        has_coords = ~(np.isnan(latitude) | np.isnan(longitude))
+        self.rows_with_coords = np.flatnonzero(has_coords)
+        self.rows_without_coords = np.flatnonzero(~has_coords)
+        self._tree: Optional[BallTree] = None
+        if self.rows_with_coords.size:
+            points = np.radians(np.column_stack([latitude[has_coords], longitude[has_coords]]))
+            self._tree = BallTree(points, metric='haversine')
+
+    def rows_within(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """
+        Các dòng (có tọa độ) nằm trong bán kính radius_km quanh (latitude, longitude), tăng dần.
+        Kết quả có thể dư một ít ở sát biên (bán kính đã được nới), cần lọc lại bằng khoảng cách chính xác.
+        """
+        if self._tree is None:
+            return np.empty(0, dtype=np.int64)
+        query = np.radians([[latitude, longitude]])
+        hits = self._tree.query_radius(query, r=_search_radius_km(radius_km) / _EARTH_MEAN_RADIUS_KM)[0]
+        return np.sort(self.rows_with_coords[hits])
+
+
+def has_finite_radius(location_preference: float) -> bool:
+    """location_preference giới hạn được tập candidate (khác -1 và nhỏ hơn khoảng cách mặc định khi thiếu tọa độ)."""
+    return (not np.isnan(location_preference) and location_preference != -1
+            and location_preference < MISSING_COORDS_DISTANCE_KM)
+
+
+def mutual_location_mask(anchor_location_preference: float, candidate_location_preference: np.ndarray,
+                         distances_km: np.ndarray) -> np.ndarray:
+    """
+    Candidate nằm trong location_preference của cả hai phía (-1 = mọi nơi), giống hai feature
+    user1_within_user2_loc_pref và user2_within_user1_loc_pref đều bằng 1.
+    """
+    with np.errstate(invalid='ignore'):
+        within_candidate_pref = (candidate_location_preference == -1) | (distances_km <= candidate_location_preference)
+        if anchor_location_preference == -1:
+            return within_candidate_pref
+        return within_candidate_pref & (distances_km <= anchor_location_preference)
+
+
+def apply_location_filter(mode: str, anchor: UserColumns, candidates: UserColumns,
+                          anchor_row: int = 0) -> Tuple[UserColumns, np.ndarray]:
+    """
+    Áp dụng chế độ lọc vị trí lên candidates.
+    Trả về (candidates sau khi lọc/sắp xếp, khoảng cách km tương ứng).
+    """
+    distances = geodesic_distance_km_vectorized(
+        anchor.latitude[anchor_row], anchor.longitude[anchor_row], candidates.latitude, candidates.longitude)
+    if mode == GEO_FILTER_HARD:
+        keep = np.flatnonzero(mutual_location_mask(
+            anchor.location_preference[anchor_row], candidates.location_preference, distances))
+        return candidates.take(keep), distances[keep]
+    if mode == GEO_FILTER_SOFT:
+        order = np.argsort(distances, kind='stable')
+        return candidates.take(order), distances[order]
+    return candidates, distances
+
+
+def bounding_boxes(latitude: float, longitude: float, radius_km: float) -> Optional[List[Tuple[float, float, float, float]]]:
+    """
+    Các bounding box (min_lat, max_lat, min_lon, max_lon) chứa trọn vòng tròn bán kính radius_km,
+    dùng để lọc sơ bộ trong SQL. Vòng tròn cắt kinh tuyến 180 được tách thành hai box.
+    Trả về None nếu không giới hạn được kinh độ (vòng tròn chứa cực).
+    """
+    radius_km = _search_radius_km(radius_km)
+    delta_lat = radius_km / _KM_PER_DEGREE_LAT_MIN
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return None
+
+    widest_lat = max(abs(min_lat), abs(max_lat))
+    delta_lon = radius_km / (_KM_PER_DEGREE_LON_EQUATOR * math.cos(math.radians(widest_lat)))
+    if delta_lon >= 180:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+
+    min_lon, max_lon = longitude - delta_lon, longitude + delta_lon
+    if min_lon < -180:
+        return [(min_lat, max_lat, min_lon + 360, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
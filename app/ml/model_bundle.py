@@ -0,0 +1,291 @@
+# app/ml/model_bundle.py
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+
+from app.ml.tree_evaluator import dump_trees
+
+# Bundle nằm trong thư mục con BUNDLE_DIRNAME của thư mục model (vd: ml_models/2025-07-01/bundle/)
+BUNDLE_DIRNAME = "bundle"
+MANIFEST_FILENAME = "manifest.json"
+ARRAYS_DIRNAME = "arrays"
+BUNDLE_FORMAT = "amoura-model-bundle"
+BUNDLE_FORMAT_VERSION = 1
+MODEL_FILENAME = "best_overall_model.joblib"
+LIGHTGBM_MODEL_FILENAME = "model.txt"
+
+# Tham số của TfidfVectorizer được lưu trong manifest (tham số là callable thì không export được)
+_TFIDF_PARAMS = ("analyzer", "binary", "decode_error", "encoding", "input", "lowercase", "max_df", "max_features",
+                 "min_df", "ngram_range", "norm", "smooth_idf", "stop_words", "strip_accents", "sublinear_tf",
+                 "token_pattern", "use_idf")
+# Mảng phẳng của các cây (nối liền theo thứ tự cây, index node là index trong cây), xem tree_evaluator._flatten_tree
+_TREE_ARRAYS = {"feature": np.int64, "threshold": np.float64, "default_left": bool, "missing_type": np.int8,
+                "left": np.int64, "right": np.int64, "value": np.float64}
+
+
+def bundle_path(models_dir: str) -> str:
+    return os.path.join(models_dir, BUNDLE_DIRNAME)
+
+
+def has_bundle(models_dir: str) -> bool:
+    return os.path.isfile(os.path.join(bundle_path(models_dir), MANIFEST_FILENAME))
+
+
+def _file_sha256(path: str) -> str:
+    with open(path, "rb") as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+
+def _file_stat(path: str) -> Dict[str, int]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _json_value(value: Any) -> Any:
+    """Giá trị Python thuần (list, str, số) của value NumPy/pandas, để ghi vào manifest."""
+    if isinstance(value, (np.ndarray, pd.Index, list, tuple)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class _BundleWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.arrays: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(os.path.join(path, ARRAYS_DIRNAME))
+
+    def array(self, name: str, values: np.ndarray) -> str:
+        values = np.ascontiguousarray(values)
+        np.save(os.path.join(self.path, ARRAYS_DIRNAME, f"{name}.npy"), values, allow_pickle=False)
+        self.arrays[name] = {"dtype": values.dtype.str, "shape": list(values.shape)}
+        return name
+
+    def object_entry(self, name: str, value: Any) -> Dict[str, Any]:
+        """Entry của manifest cho object được joblib.load từ file `name`; ném ValueError nếu không export được."""
+        stem = os.path.splitext(name)[0]
+        if isinstance(value, MinMaxScaler):
+            feature_names = getattr(value, "feature_names_in_", None)
+            return {"kind": "min_max_scaler", "feature_range": _json_value(value.feature_range), "clip": value.clip,
+                    "n_samples_seen": _json_value(value.n_samples_seen_),
+                    "feature_names": _json_value(feature_names) if feature_names is not None else None,
+                    # Các dòng: min_, scale_, data_min_, data_max_, data_range_
+                    "array": self.array(stem, np.vstack([value.min_, value.scale_, value.data_min_, value.data_max_,
+                                                         value.data_range_]).astype(np.float64))}
+        if isinstance(value, OneHotEncoder):
+            if value.drop is not None or value.min_frequency is not None or value.max_categories is not None:
+                raise ValueError(f"{name}: only OneHotEncoder without drop/infrequent categories can be exported")
+            return {"kind": "onehot_encoder", "categories": _json_value(value.categories_),
+                    "feature_names": _json_value(value.feature_names_in_), "handle_unknown": value.handle_unknown,
+                    "sparse_output": value.sparse_output, "dtype": np.dtype(value.dtype).name}
+        if isinstance(value, TfidfVectorizer):
+            params = value.get_params()
+            if any(callable(params[key]) for key in ("preprocessor", "tokenizer", "analyzer")) or not value.use_idf:
+                raise ValueError(f"{name}: only TfidfVectorizer with use_idf and without a custom "
+                                 f"preprocessor/tokenizer can be exported")
+            terms = sorted(value.vocabulary_, key=value.vocabulary_.get)
+            return {"kind": "tfidf_vectorizer", "params": {key: _json_value(params[key]) for key in _TFIDF_PARAMS},
+                    "dtype": np.dtype(value.dtype).name,
+                    "vocabulary": self.array(f"{stem}.vocabulary", np.array(terms)),
+                    "idf": self.array(f"{stem}.idf", value.idf_)}
+        if hasattr(value, "booster_"):
+            return self._lightgbm_entry(name, value)
+        if isinstance(value, (list, tuple, pd.Index, np.ndarray)):
+            return {"kind": "list", "values": _json_value(value)}
+        raise ValueError(f"{name}: cannot export {type(value).__name__}")
+
+    def _lightgbm_entry(self, name: str, model) -> Dict[str, Any]:
+        if callable(getattr(model, "objective", None)) or getattr(model, "n_classes_", 2) != 2:
+            raise ValueError(f"{name}: only binary LightGBM models with a built-in objective can be exported")
+        booster = model.booster_
+        booster.save_model(os.path.join(self.path, LIGHTGBM_MODEL_FILENAME))
+        entry = {"kind": "lightgbm_booster", "file": LIGHTGBM_MODEL_FILENAME, "n_jobs": getattr(model, "n_jobs", None),
+                 "trees": None}
+        try:
+            trees, sigmoid = dump_trees(booster)
+        except ValueError as e:
+            # Model vẫn được export; EarlyExitTreeEvaluator (nếu bật) sẽ báo lỗi như khi tải từ joblib
+            print(f"WARNING: {name}: tree structures are not exported: {e}")
+            return entry
+        node_counts = [len(tree["feature"]) for tree in trees]
+        entry["trees"] = {"sigmoid": sigmoid,
+                          "offsets": self.array("trees.offsets", np.concatenate([[0], np.cumsum(node_counts)])),
+                          "depth": self.array("trees.depth", np.array([tree["depth"] for tree in trees]))}
+        for key, dtype in _TREE_ARRAYS.items():
+            entry["trees"][key] = self.array(f"trees.{key}", np.concatenate(
+                [np.asarray(tree[key], dtype=dtype) for tree in trees]))
+        return entry
+
+
+def export_bundle(models_dir: str, verify: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Gom mọi file .joblib của models_dir vào bundle_path(models_dir): manifest.json (danh sách, tham số, hash, kích
+    thước và thời điểm sửa của file nguồn) + các mảng .npy (scaler dạng min/scale, vocabulary và idf TF-IDF, cấu
+    trúc cây) + model LightGBM dạng text. Bundle được ghi vào thư mục tạm; verify(thư mục tạm), nếu có, được gọi
+    trước khi bundle mới thay bundle cũ bằng rename. Trả về đường dẫn bundle; ném ValueError nếu có object không
+    export được, hoặc lỗi của verify: khi đó bundle cũ (nếu có) được giữ nguyên.
+    """
+    path = bundle_path(models_dir)
+    temp_path, old_path = f"{path}.tmp-{os.getpid()}", f"{path}.old-{os.getpid()}"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    filenames = sorted(name for name in os.listdir(models_dir) if name.endswith(".joblib"))
+    if MODEL_FILENAME not in filenames:
+        raise ValueError(f"{MODEL_FILENAME} not found in {models_dir}")
+    try:
+        writer = _BundleWriter(temp_path)
+        objects = {name: writer.object_entry(name, joblib.load(os.path.join(models_dir, name)))
+                   for name in filenames}
+        source_stats = {name: _file_stat(os.path.join(models_dir, name)) for name in filenames}
+        sources = {name: _file_sha256(os.path.join(models_dir, name)) for name in filenames}
+        manifest = {"format": BUNDLE_FORMAT, "format_version": BUNDLE_FORMAT_VERSION,
+                    # Cùng giá trị với MatchPredictor.model_version khi tải từ joblib (namespace cache, precompute)
+                    "model_version": sources[MODEL_FILENAME][:12],
+                    "sources": sources, "source_stats": source_stats, "objects": objects, "arrays": writer.arrays}
+        with open(os.path.join(temp_path, MANIFEST_FILENAME), "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, ensure_ascii=False)
+        if verify is not None:
+            verify(temp_path)
+    except Exception:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    # Process đang mmap bundle cũ vẫn đọc được file cũ sau khi bị xóa
+    if os.path.isdir(path):
+        os.rename(path, old_path)
+    os.rename(temp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return path
+
+
+class ModelBundle:
+    """
+    Bundle của một version model (export_bundle), thay cho các file .joblib khi tải MatchPredictor.
+
+    Mảng được mở bằng np.load(mmap_mode='r'): không giải mã pickle, và các worker (uvicorn/gunicorn, process pool)
+    dùng chung page của file trong page cache thay vì mỗi process giữ một bản sao. Mảng mở ra là read-only.
+    load(filename) dựng lại object tương đương với joblib.load(filename) của file nguồn.
+    """
+
+    def __init__(self, path: str, source_dir: Optional[str] = None):
+        """
+        source_dir: nếu có, các file nguồn còn nằm ở đó phải khớp với lúc export (bundle không cũ). File có cùng
+        kích thước và thời điểm sửa được coi là không đổi; chỉ file khác một trong hai mới bị hash lại để so sánh.
+        """
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILENAME), encoding="utf-8") as manifest_file:
+            self.manifest: Dict[str, Any] = json.load(manifest_file)
+        if (self.manifest.get("format") != BUNDLE_FORMAT
+                or self.manifest.get("format_version") != BUNDLE_FORMAT_VERSION):
+            raise ValueError(f"unsupported bundle format {self.manifest.get('format')} "
+                             f"v{self.manifest.get('format_version')}")
+        if source_dir is not None:
+            changed = self._changed_sources(source_dir)
+            if changed:
+                raise ValueError(f"bundle is out of date, re-export it ({', '.join(changed)} changed)")
+        self.model_version: str = self.manifest["model_version"]
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def _changed_sources(self, source_dir: str) -> List[str]:
+        source_stats = self.manifest.get("source_stats", {})  # Không có ở bundle export trước khi lưu stat
+        changed = []
+        for name, digest in self.manifest["sources"].items():
+            source_path = os.path.join(source_dir, name)
+            if not os.path.isfile(source_path):
+                continue
+            recorded, stat = source_stats.get(name), _file_stat(source_path)
+            if recorded == stat:
+                continue
+            if (recorded is not None and recorded["size"] != stat["size"]) or _file_sha256(source_path) != digest:
+                changed.append(name)
+        return changed
+
+    def array(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            # np.asarray: ndarray thường (vẫn đọc từ file mmap), slice của np.memmap chậm hơn nhiều
+            self._arrays[name] = np.asarray(np.load(os.path.join(self.path, ARRAYS_DIRNAME, f"{name}.npy"),
+                                                    mmap_mode="r", allow_pickle=False))
+        return self._arrays[name]
+
+    def load(self, filename: str) -> Any:
+        entry = self.manifest["objects"].get(filename)
+        if entry is None:
+            raise FileNotFoundError(f"{filename} is not in model bundle {self.path}")
+        kind = entry["kind"]
+        if kind == "list":
+            return list(entry["values"])
+        if kind == "min_max_scaler":
+            return self._min_max_scaler(entry)
+        if kind == "onehot_encoder":
+            return self._onehot_encoder(entry)
+        if kind == "tfidf_vectorizer":
+            return self._tfidf_vectorizer(entry)
+        if kind == "lightgbm_booster":
+            # model_str: Booster(model_file=...) tốn thêm khoảng 15 ms và 15 MB RSS cho cùng một model
+            with open(os.path.join(self.path, entry["file"]), encoding="utf-8") as model_file:
+                return lgb.Booster(model_str=model_file.read())
+        raise ValueError(f"{filename}: unknown bundle object kind '{kind}'")
+
+    def trees(self, filename: str = MODEL_FILENAME) -> Optional[Tuple[List[Dict[str, np.ndarray]], float]]:
+        """(cây, sigmoid) cho EarlyExitTreeEvaluator, các mảng là view trên file mmap; None nếu không được export."""
+        tree_entry = self.manifest["objects"][filename].get("trees")
+        if tree_entry is None:
+            return None
+        offsets, depths = self.array(tree_entry["offsets"]), self.array(tree_entry["depth"])
+        arrays = {key: self.array(tree_entry[key]) for key in _TREE_ARRAYS}
+        trees = []
+        for index, depth in enumerate(depths):
+            tree = {key: values[offsets[index]:offsets[index + 1]] for key, values in arrays.items()}
+            tree["leaves"] = np.flatnonzero(tree["left"] == np.arange(len(tree["left"])))
+            tree["depth"] = int(depth)
+            trees.append(tree)
+        return trees, float(tree_entry["sigmoid"])
+
+    def _min_max_scaler(self, entry: Dict[str, Any]) -> MinMaxScaler:
+        scaler = MinMaxScaler(feature_range=tuple(entry["feature_range"]), clip=entry["clip"])
+        scaler.min_, scaler.scale_, scaler.data_min_, scaler.data_max_, scaler.data_range_ = self.array(entry["array"])
+        scaler.n_features_in_ = scaler.scale_.shape[0]
+        scaler.n_samples_seen_ = entry["n_samples_seen"]
+        if entry["feature_names"] is not None:
+            scaler.feature_names_in_ = np.asarray(entry["feature_names"], dtype=object)
+        return scaler
+
+    @staticmethod
+    def _onehot_encoder(entry: Dict[str, Any]) -> OneHotEncoder:
+        categories = [np.asarray(values, dtype=object) for values in entry["categories"]]
+        encoder = OneHotEncoder(categories=categories, handle_unknown=entry["handle_unknown"],
+                                sparse_output=entry["sparse_output"], dtype=np.dtype(entry["dtype"]))
+        # Category cố định: fit chỉ kiểm tra và dựng trạng thái nội bộ, một dòng mẫu là đủ
+        return encoder.fit(pd.DataFrame([[values[0] for values in categories]], columns=entry["feature_names"]))
+
+    def _tfidf_vectorizer(self, entry: Dict[str, Any]) -> TfidfVectorizer:
+        params = dict(entry["params"])
+        params["ngram_range"] = tuple(params["ngram_range"])
+        terms = self.array(entry["vocabulary"])
+        vectorizer = TfidfVectorizer(**params, dtype=np.dtype(entry["dtype"]),
+                                     vocabulary={str(term): index for index, term in enumerate(terms)})
+        vectorizer.idf_ = self.array(entry["idf"])
+        return vectorizer
+
+
+def open_bundle(models_dir: str, path: Optional[str] = None) -> Optional[ModelBundle]:
+    """
+    Bundle của models_dir (path: thư mục bundle khác bundle_path(models_dir), vd: bundle tạm đang được kiểm tra),
+    hoặc None nếu chưa export hay không dùng được (khi đó tải các file .joblib).
+    """
+    path = path or bundle_path(models_dir)
+    if not os.path.isfile(os.path.join(path, MANIFEST_FILENAME)):
+        return None
+    try:
+        return ModelBundle(path, source_dir=models_dir)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"WARNING: Ignoring model bundle in {models_dir}: {e}")
+        return None
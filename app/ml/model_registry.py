@@ -0,0 +1,143 @@
+# app/ml/model_registry.py
+import os
+import re
+from typing import List, Tuple
+
+from app.ml.artifacts import CATEGORICAL_COLS_ONEHOT, MODELS_DIR
+from app.ml.model_bundle import MODEL_FILENAME, has_bundle
+from app.ml.predictor import MatchPredictor
+
+# Version của các file nằm trực tiếp trong thư mục gốc (bố cục cũ, chưa chia version)
+ROOT_VERSION = "root"
+# Tên version hợp lệ: tên thư mục con, không chứa dấu phân cách đường dẫn
+_VERSION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def _has_model(models_dir: str) -> bool:
+    """Thư mục là một version model nếu có best_overall_model.joblib hoặc bundle đã export."""
+    return os.path.isfile(os.path.join(models_dir, MODEL_FILENAME)) or has_bundle(models_dir)
+
+
+def _natural_key(name: str) -> list:
+    """Sắp xếp "v2" trước "v10", "2025-06-12" trước "2025-07-01"."""
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"(\d+)", name)]
+
+
+def validate_predictor(predictor: MatchPredictor) -> List[str]:
+    """
+    Kiểm tra model, danh sách cột và các scaler của một version có khớp với nhau không.
+    Ném ValueError (liệt kê mọi lỗi) nếu không dùng được; trả về các cảnh báo không chặn việc dùng version.
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+    pairwise_columns = list(predictor.pairwise_input_columns)
+
+    n_model_features = (predictor.booster.num_feature() if predictor.booster is not None
+                        else getattr(predictor.model, "n_features_in_", None))
+    if n_model_features is not None and n_model_features != len(pairwise_columns):
+        errors.append(f"model expects {n_model_features} features but pairwise_model_input_columns has "
+                      f"{len(pairwise_columns)}")
+
+    scaled_columns = list(predictor.numerical_pairwise_cols_to_scale)
+    missing_scaled = [col for col in scaled_columns if col not in pairwise_columns]
+    if missing_scaled:
+        errors.append(f"numerical_pairwise_cols_to_scale not in pairwise_model_input_columns: {missing_scaled}")
+    scaler = predictor.pairwise_features_scaler
+    scaler_columns = getattr(scaler, "feature_names_in_", None)
+    if scaler_columns is not None and list(scaler_columns) != scaled_columns:
+        errors.append(f"pairwise_features_scaler was fitted on {list(scaler_columns)}, "
+                      f"expected numerical_pairwise_cols_to_scale {scaled_columns}")
+    elif getattr(scaler, "n_features_in_", len(scaled_columns)) != len(scaled_columns):
+        errors.append(f"pairwise_features_scaler expects {scaler.n_features_in_} columns, "
+                      f"numerical_pairwise_cols_to_scale has {len(scaled_columns)}")
+
+    artifacts = predictor.artifacts
+    for name in ("scaler_age", "scaler_height", "latitude_scaler", "longitude_scaler", "location_preference_scaler"):
+        n_features = getattr(getattr(artifacts, name), "n_features_in_", 1)
+        if n_features != 1:
+            errors.append(f"{name} expects {n_features} columns, expected 1")
+    n_onehot_columns = len(artifacts.onehot_encoder_categorical.categories_)
+    if n_onehot_columns != len(CATEGORICAL_COLS_ONEHOT):
+        errors.append(f"onehot_encoder_categorical was fitted on {n_onehot_columns} columns, "
+                      f"expected {CATEGORICAL_COLS_ONEHOT}")
+
+    # Cột của user feature vector không được preprocessor nào ghi vào thì luôn bằng 0
+    schema = artifacts.user_feature_schema
+    written = {offset for offset in _schema_offsets(schema) if offset >= 0}
+    unwritten = [col for index, col in enumerate(schema.columns) if index not in written]
+    if len(written) == 0:
+        errors.append("no user_features_final_columns are produced by the preprocessing artifacts")
+    elif unwritten:
+        warnings.append(f"{len(unwritten)} of {len(schema.columns)} user_features_final_columns are not produced by "
+                        f"the preprocessing artifacts and stay 0 (e.g. {unwritten[:3]})")
+
+    if errors:
+        raise ValueError("; ".join(errors))
+    return warnings
+
+
+def _schema_offsets(schema) -> List[int]:
+    offsets = [schema.age[0], schema.height[0], schema.dropped_out_school, schema.interested_in_new_language,
+               schema.loc_pref_is_everywhere, schema.location_preference[0], schema.latitude[0], schema.longitude[0]]
+    for _, offsets_by_category in schema.onehot:
+        offsets.extend(offsets_by_category.values())
+    for categories, other_offset, _ in (schema.job, schema.edu):
+        offsets.extend(offset for offset, _ in categories)
+        offsets.append(other_offset)
+    for items in (schema.interests, schema.languages, schema.pets):
+        offsets.extend(offset for offset, _ in items)
+    offsets.extend(schema.bio_offsets.tolist())
+    return offsets
+
+
+class ModelRegistry:
+    """
+    Các version model trong root_dir (ml_models/): mỗi thư mục con có best_overall_model.joblib cùng bộ
+    artifacts đi kèm (hoặc chỉ có bundle của chúng, xem app/ml/model_bundle.py) là một version, tên version =
+    tên thư mục (vd: ml_models/2025-06-12/). Các file nằm trực tiếp trong root_dir (bố cục cũ) là version
+    ROOT_VERSION, cũ hơn mọi thư mục con.
+    Version mới nhất là version cuối cùng theo thứ tự tên tự nhiên ("v2" < "v10").
+    """
+
+    def __init__(self, root_dir: str = MODELS_DIR):
+        self.root_dir = root_dir
+
+    def list_versions(self) -> List[str]:
+        """Các version có trên đĩa, cũ trước mới sau."""
+        versions = []
+        if os.path.isdir(self.root_dir):
+            versions = sorted((name for name in os.listdir(self.root_dir)
+                               if _VERSION_NAME.match(name) and name != ROOT_VERSION
+                               and _has_model(os.path.join(self.root_dir, name))),
+                              key=_natural_key)
+        if _has_model(self.root_dir):
+            versions.insert(0, ROOT_VERSION)
+        return versions
+
+    def resolve(self, version: str = "") -> Tuple[str, str]:
+        """(tên version, thư mục) của `version` ("" = mới nhất); ném LookupError nếu không có."""
+        if not version:
+            versions = self.list_versions()
+            if not versions:
+                raise LookupError(f"No model versions found in {self.root_dir}.")
+            version = versions[-1]
+        if version == ROOT_VERSION:
+            models_dir = self.root_dir
+        elif _VERSION_NAME.match(version):
+            models_dir = os.path.join(self.root_dir, version)
+        else:
+            raise LookupError(f"Invalid model version name '{version}'.")
+        if not _has_model(models_dir):
+            raise LookupError(f"Model version '{version}' not found in {self.root_dir}.")
+        return version, models_dir
+
+    def load(self, version: str = "", **predictor_kwargs) -> Tuple[str, MatchPredictor]:
+        """
+        Tải và kiểm tra một version (validate_predictor); predictor_kwargs được truyền cho MatchPredictor.
+        Trả về (tên version, predictor). Lỗi tải / kiểm tra được ném ra cho caller.
+        """
+        version, models_dir = self.resolve(version)
+        predictor = MatchPredictor(models_dir, **predictor_kwargs)
+        for warning in validate_predictor(predictor):
+            print(f"WARNING: Model version '{version}': {warning}")
+        return version, predictor
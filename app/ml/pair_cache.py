@@ -0,0 +1,253 @@
+# app/ml/pair_cache.py
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Hằng số nhân (Fibonacci hashing) để trộn hai fingerprint thành khóa sắp xếp 64-bit
+_KEY_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def user_fingerprint(raw_record: Dict[str, Any]) -> int:
+    """
+    Hash 64-bit của raw data của user (dict từ MatchPredictor._transform_raw_user_data_to_ml_input, gồm cả id
+    và tuổi): mọi thay đổi ảnh hưởng tới feature của user (profile, vị trí, sở thích, sinh nhật) đổi fingerprint.
+    """
+    payload = repr(sorted(raw_record.items())).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), "little")
+
+
+# Score của một chiều chưa được tính (score hợp lệ nằm trong [0, 1], NaN = cặp không hợp lệ)
+_UNKNOWN = -1.0
+
+
+class _Generation:
+    """Thế hệ cũ của PairScoreCache: các mảng song song sắp xếp theo `keys`, không sửa sau khi tạo."""
+
+    __slots__ = ("keys", "low", "high", "low_to_high", "high_to_low")
+
+    def __init__(self, keys: np.ndarray, low: np.ndarray, high: np.ndarray, low_to_high: np.ndarray,
+                 high_to_low: np.ndarray):
+        self.keys = keys
+        self.low = low
+        self.high = high
+        self.low_to_high = low_to_high
+        self.high_to_low = high_to_low
+
+    @classmethod
+    def empty(cls) -> '_Generation':
+        no_keys = np.empty(0, dtype=np.uint64)
+        no_scores = np.empty(0, dtype=np.float64)
+        return cls(no_keys, no_keys, no_keys, no_scores, no_scores)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find(self, keys: np.ndarray, low: np.ndarray, high: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(vị trí, found) của từng cặp; cặp trùng `keys` nhưng khác fingerprint được coi là không có."""
+        if len(self.keys) == 0:
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        # Tra theo thứ tự khóa tăng dần: searchsorted đi tuần tự trên mảng, nhanh hơn nhiều so với thứ tự ngẫu nhiên
+        order = np.argsort(keys)
+        positions = np.empty(len(keys), dtype=np.int64)
+        positions[order] = np.minimum(np.searchsorted(self.keys, keys[order]), len(self.keys) - 1)
+        found = (self.keys[positions] == keys) & (self.low[positions] == low) & (self.high[positions] == high)
+        return positions, found
+
+
+class _Staging:
+    """
+    Thế hệ hiện tại của PairScoreCache: entry được ghi nối tiếp vào các mảng cấp sẵn `capacity` dòng (không dịch
+    chuyển entry cũ khi ghi), tra bằng bảng băm địa chỉ mở (dò tuyến tính, tải <= 1/2) trên NumPy cho cả chunk.
+    Chỉ được sắp xếp một lần khi đầy (sorted(), thành thế hệ cũ). Entry được ghi xong trước khi slot trỏ tới nó và
+    dòng đã ghi chỉ được sửa để điền chiều _UNKNOWN, nên lookup không cần khóa.
+    """
+
+    __slots__ = ("capacity", "size", "keys", "low", "high", "low_to_high", "high_to_low", "_slots", "_mask")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.keys = np.empty(capacity, dtype=np.uint64)
+        self.low = np.empty(capacity, dtype=np.uint64)
+        self.high = np.empty(capacity, dtype=np.uint64)
+        self.low_to_high = np.empty(capacity, dtype=np.float64)
+        self.high_to_low = np.empty(capacity, dtype=np.float64)
+        n_slots = 1 << (2 * capacity - 1).bit_length()
+        self._slots = np.full(n_slots, -1, dtype=np.int64)  # slot -> vị trí entry (-1 = trống)
+        self._mask = np.uint64(n_slots - 1)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def find(self, keys: np.ndarray, low: np.ndarray, high: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(vị trí, found) của từng cặp; cặp trùng `keys` nhưng khác fingerprint được coi là không có."""
+        positions = np.full(len(keys), -1, dtype=np.int64)
+        rows = np.arange(len(keys))
+        slots = keys & self._mask
+        while rows.size:
+            at = self._slots[slots]
+            occupied = at >= 0
+            same_key = np.zeros(rows.size, dtype=bool)
+            same_key[occupied] = self.keys[at[occupied]] == keys[rows[occupied]]
+            positions[rows[same_key]] = at[same_key]
+            probe = occupied & ~same_key
+            rows, slots = rows[probe], (slots[probe] + np.uint64(1)) & self._mask
+        found = positions >= 0
+        rows = np.flatnonzero(found)
+        found[rows] = (self.low[positions[rows]] == low[rows]) & (self.high[positions[rows]] == high[rows])
+        return positions, found
+
+    def write(self, keys: np.ndarray, low: np.ndarray, high: np.ndarray, low_to_high: np.ndarray,
+              high_to_low: np.ndarray) -> np.ndarray:
+        """
+        Ghi các cặp (gọi khi giữ khóa ghi của PairScoreCache): cặp đã có chỉ được điền các chiều còn _UNKNOWN.
+        Trả về mask các cặp chưa ghi được vì thế hệ đã đầy.
+        """
+        positions, found = self.find(keys, low, high)
+        at = positions[found]
+        for values, new in ((self.low_to_high, low_to_high[found]), (self.high_to_low, high_to_low[found])):
+            fill = values[at] == _UNKNOWN
+            values[at[fill]] = new[fill]
+
+        new_rows = np.flatnonzero(~found)
+        new_rows = new_rows[np.unique(keys[new_rows], return_index=True)[1]]
+        overflow = np.zeros(len(keys), dtype=bool)
+        overflow[new_rows[self.capacity - self.size:]] = True
+        new_rows = new_rows[:self.capacity - self.size]
+        if new_rows.size:
+            at = np.arange(self.size, self.size + new_rows.size)
+            self.keys[at], self.low[at], self.high[at] = keys[new_rows], low[new_rows], high[new_rows]
+            self.low_to_high[at], self.high_to_low[at] = low_to_high[new_rows], high_to_low[new_rows]
+            self._claim_slots(keys[new_rows], at)
+            self.size += new_rows.size
+        return overflow
+
+    def _claim_slots(self, keys: np.ndarray, positions: np.ndarray) -> None:
+        pending = np.arange(len(keys))
+        slots = keys & self._mask
+        while pending.size:
+            free = np.flatnonzero(self._slots[slots] < 0)
+            # Nhiều entry cùng trỏ vào một slot trống: entry đầu tiên lấy slot, các entry còn lại dò slot tiếp theo
+            winners = free[np.unique(slots[free], return_index=True)[1]]
+            self._slots[slots[winners]] = positions[pending[winners]]
+            placed = np.zeros(pending.size, dtype=bool)
+            placed[winners] = True
+            pending, slots = pending[~placed], (slots[~placed] + np.uint64(1)) & self._mask
+
+    def sorted(self) -> _Generation:
+        """Các entry đã ghi, sắp xếp theo keys."""
+        order = np.argsort(self.keys[:self.size], kind='stable')
+        return _Generation(self.keys[order], self.low[order], self.high[order], self.low_to_high[order],
+                           self.high_to_low[order])
+
+
+class PairScoreCache:
+    """
+    Cache xác suất match theo cặp user, khóa là cặp không thứ tự {fingerprint A, fingerprint B}.
+
+    Mỗi entry giữ score của hai chiều (fingerprint nhỏ -> lớn, lớn -> nhỏ); một chiều chưa tính thì là _UNKNOWN.
+    Potential matches của A chỉ chấm chiều A -> B; khi B yêu cầu potential matches, chiều B -> A được chấm và điền
+    vào cùng entry. Các job cần cả hai chiều (MatchPredictor.predict_match_proba_both_directions) ghi cả hai một lần.
+    User sửa profile -> fingerprint mới, các entry cũ của user không bao giờ được đọc lại (không cần invalidate)
+    và bị đẩy ra dần.
+
+    Entry nằm trong các mảng NumPy (khoảng 60 byte mỗi cặp), tra cả một chunk candidate một lúc thay vì từng cặp
+    trong Python. Giới hạn bộ nhớ bằng hai thế hệ (gần đúng LRU): entry mới được ghi nối tiếp vào thế hệ hiện tại
+    (_Staging), entry đọc được từ thế hệ cũ được chuyển lên; thế hệ hiện tại đủ max_entries / 2 entry thì được sắp
+    xếp một lần thành thế hệ cũ (_Generation, tra bằng np.searchsorted) và thế hệ cũ trước đó bị bỏ.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(max_entries, 2)
+        self._generation_size = self.max_entries // 2
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._current = _Staging(self._generation_size)
+        self._previous = _Generation.empty()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _pairs(anchor_fingerprint: int,
+               candidate_fingerprints: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(khóa, fingerprint nhỏ, fingerprint lớn, mask "anchor là phía nhỏ") của từng cặp."""
+        anchor = np.uint64(anchor_fingerprint)
+        anchor_first = anchor <= candidate_fingerprints
+        low = np.where(anchor_first, anchor, candidate_fingerprints)
+        high = np.where(anchor_first, candidate_fingerprints, anchor)
+        return (low * _KEY_MULTIPLIER) ^ high, low, high, anchor_first
+
+    def lookup(self, anchor_fingerprint: int, candidate_fingerprints: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score anchor -> candidate đã cache của từng candidate.
+        Trả về (probas, found): probas là NaN ở các cặp chưa có score chiều này (hoặc cặp không hợp lệ đã cache).
+        """
+        keys, low, high, anchor_first = self._pairs(anchor_fingerprint, candidate_fingerprints)
+        current, previous = self._current, self._previous
+        probas = np.full(len(keys), np.nan, dtype=np.float64)
+        found = np.zeros(len(keys), dtype=bool)
+
+        positions, in_current = current.find(keys, low, high)
+        rows = np.flatnonzero(in_current)
+        self._take_scores(probas, found, rows, anchor_first[rows], current.low_to_high[positions[rows]],
+                          current.high_to_low[positions[rows]])
+
+        missing = np.flatnonzero(~found)
+        if missing.size and len(previous):
+            positions, in_previous = previous.find(keys[missing], low[missing], high[missing])
+            rows, positions = missing[in_previous], positions[in_previous]
+            if rows.size:
+                low_to_high, high_to_low = previous.low_to_high[positions], previous.high_to_low[positions]
+                self._take_scores(probas, found, rows, anchor_first[rows], low_to_high, high_to_low)
+                self._insert(keys[rows], low[rows], high[rows], low_to_high, high_to_low)
+
+        n_found = int(found.sum())
+        with self._stats_lock:
+            self._hits += n_found
+            self._misses += len(keys) - n_found
+        return probas, found
+
+    @staticmethod
+    def _take_scores(probas: np.ndarray, found: np.ndarray, rows: np.ndarray, anchor_first: np.ndarray,
+                     low_to_high: np.ndarray, high_to_low: np.ndarray) -> None:
+        values = np.where(anchor_first, low_to_high, high_to_low)
+        known = values != _UNKNOWN
+        probas[rows[known]] = values[known]
+        found[rows[known]] = True
+
+    def store(self, anchor_fingerprint: int, candidate_fingerprints: np.ndarray, probas: np.ndarray,
+              reverse_probas: Optional[np.ndarray] = None) -> None:
+        """
+        Ghi score anchor -> candidate (probas) và candidate -> anchor (reverse_probas, None = chưa tính) của từng
+        cặp; chiều đã có score trong cache được giữ nguyên.
+        """
+        if len(candidate_fingerprints) == 0:
+            return
+        if reverse_probas is None:
+            reverse_probas = np.full(len(candidate_fingerprints), _UNKNOWN, dtype=np.float64)
+        keys, low, high, anchor_first = self._pairs(anchor_fingerprint, candidate_fingerprints)
+        self._insert(keys, low, high, np.where(anchor_first, probas, reverse_probas),
+                     np.where(anchor_first, reverse_probas, probas))
+
+    def _insert(self, keys: np.ndarray, low: np.ndarray, high: np.ndarray, low_to_high: np.ndarray,
+                high_to_low: np.ndarray) -> None:
+        with self._write_lock:
+            while True:
+                overflow = self._current.write(keys, low, high, low_to_high, high_to_low)
+                if len(self._current) >= self._generation_size:
+                    self._previous, self._current = self._current.sorted(), _Staging(self._generation_size)
+                if not overflow.any():
+                    return
+                keys, low, high = keys[overflow], low[overflow], high[overflow]
+                low_to_high, high_to_low = low_to_high[overflow], high_to_low[overflow]
+
+    def clear(self) -> None:
+        with self._write_lock:
+            self._current, self._previous = _Staging(self._generation_size), _Generation.empty()
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+        return {"entries": len(self._current) + len(self._previous), "hits": hits, "misses": misses}
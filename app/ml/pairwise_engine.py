@@ -0,0 +1,444 @@
+# app/ml/pairwise_engine.py
+"""
+Engine tính pairwise features theo cột (columnar) cho một anchor user và N candidate.
+
+Kết quả khớp với create_pairwise_features_vector (bản tính từng cặp) với sai số:
+    - geo_distance_km: Vincenty trên ellipsoid WGS-84 so với geopy.geodesic (Karney),
+      lệch < 1e-6 km; các cặp gần đối tâm (Vincenty không hội tụ) dùng lại geodesic.
+    - user_features_cosine_sim / user_features_mae_diff: lệch do thứ tự làm tròn, < 1e-12 với
+      user feature vector float64; với vector float32 (UserFeatureSchema) lệch thêm do làm tròn float32, ~1e-7.
+    - các cột còn lại: khớp tuyệt đối.
+Sau khi scale, toàn bộ ma trận khớp với bản từng cặp trong phạm vi PAIRWISE_PARITY_ATOL.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from geopy.distance import geodesic
+from sklearn.preprocessing import MinMaxScaler
+
+from app.core.metrics import STAGE_SCALING, metrics
+from app.ml.pair_cache import user_fingerprint
+from app.ml.preprocessing import orientation_compatibility
+
+# Sai số tuyệt đối tối đa (sau scaling) so với create_pairwise_features_vector
+PAIRWISE_PARITY_ATOL = 1e-6
+
+# Các cặp cột có hướng (user1 = anchor, user2 = candidate), đổi chỗ cho nhau khi đổi vai trò hai user;
+# mọi cột pairwise còn lại đối xứng
+DIRECTIONAL_COLUMN_PAIRS = [
+    ('user1_within_user2_loc_pref', 'user2_within_user1_loc_pref'),
+    ('orientation_compatible_user1_to_user2', 'orientation_compatible_user2_to_user1'),
+    ('user1_wants_learn_lang', 'user2_wants_learn_lang'),
+]
+
+# Khoảng cách mặc định khi thiếu tọa độ (giống haversine_distance)
+MISSING_COORDS_DISTANCE_KM = 10000.0
+
+# Số dòng mỗi block khi tính cosine/MAE trên ma trận user feature float32 (ép về float64 theo block)
+SIMILARITY_BLOCK_SIZE = 8192
+
+# --- WGS-84 ---
+_WGS84_A = 6378137.0
+_WGS84_F = 1 / 298.257223563
+_WGS84_B = (1 - _WGS84_F) * _WGS84_A
+
+
+def geodesic_distance_km_vectorized(lat1: float, lon1: float, lat2: np.ndarray, lon2: np.ndarray,
+                                    max_iter: int = 200, tol: float = 1e-12) -> np.ndarray:
+    """
+    Khoảng cách (km) từ một điểm (lat1, lon1) tới N điểm (lat2, lon2) theo công thức Vincenty
+    trên ellipsoid WGS-84. NaN ở bất kỳ tọa độ nào cho ra MISSING_COORDS_DISTANCE_KM.
+    """
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    lon2 = np.asarray(lon2, dtype=np.float64)
+    distances = np.full(lat2.shape, MISSING_COORDS_DISTANCE_KM, dtype=np.float64)
+    if pd.isna(lat1) or pd.isna(lon1):
+        return distances
+
+    has_coords = ~(np.isnan(lat2) | np.isnan(lon2))
+    if not has_coords.any():
+        return distances
+
+    phi2 = np.radians(lat2[has_coords])
+    big_l = np.radians(lon2[has_coords] - lon1)
+    u1 = np.arctan((1 - _WGS84_F) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - _WGS84_F) * np.tan(phi2))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    lam = big_l.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    sin_sigma = cos_sigma = sigma = cos2_alpha = cos_2sigma_m = np.zeros_like(lam)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt((cos_u2 * sin_lam) ** 2 + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Đường xích đạo: cos2_alpha = 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = _WGS84_F / 16 * cos2_alpha * (4 + _WGS84_F * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = big_l + (1 - c) * _WGS84_F * sin_alpha * (
+                    sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) < tol
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (_WGS84_A ** 2 - _WGS84_B ** 2) / _WGS84_B ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+                big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        result = _WGS84_B * big_a * (sigma - delta_sigma) / 1000.0
+
+    # Các cặp gần đối tâm có thể không hội tụ -> tính lại bằng geodesic
+    not_converged = ~converged | ~np.isfinite(result)
+    if not_converged.any():
+        lat2_valid, lon2_valid = lat2[has_coords], lon2[has_coords]
+        for i in np.flatnonzero(not_converged):
+            result[i] = geodesic((lat1, lon1), (lat2_valid[i], lon2_valid[i])).km
+
+    distances[has_coords] = result
+    return distances
+
+
+def _split_multi_value(value_str: Optional[str], separator: str = '-') -> frozenset:
+    """Tách chuỗi multi-value giống jaccard_similarity (strip + lower, bỏ phần tử rỗng)."""
+    if pd.isna(value_str):
+        return frozenset()
+    return frozenset(item.strip().lower() for item in str(value_str).split(separator) if item.strip())
+
+
+class MultiValueColumn:
+    """Cột multi-value (interests, languages, pets) ở dạng ma trận nhị phân thưa N x V."""
+
+    def __init__(self, item_sets: Sequence[frozenset], vocabulary: Optional[Dict[str, int]] = None,
+                 matrix: Optional[sparse.csr_matrix] = None):
+        self.item_sets = np.empty(len(item_sets), dtype=object)
+        self.item_sets[:] = list(item_sets)
+        if vocabulary is not None and matrix is not None:
+            # Dùng lại vocabulary/ma trận có sẵn (vd: khi lấy tập con các dòng)
+            self.vocabulary = vocabulary
+            self.matrix = matrix
+            self.sizes = np.diff(self.matrix.indptr).astype(np.float64)
+            return
+
+        self.vocabulary: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        for items in item_sets:
+            for item in items:
+                indices.append(self.vocabulary.setdefault(item, len(self.vocabulary)))
+            indptr.append(len(indices))
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(item_sets), max(len(self.vocabulary), 1))
+        )
+        self.sizes = np.diff(self.matrix.indptr).astype(np.float64)
+
+    def jaccard_with(self, anchor_items: frozenset) -> np.ndarray:
+        """Jaccard similarity giữa tập của anchor và từng dòng (0.0 nếu hợp rỗng)."""
+        anchor_indicator = np.zeros(self.matrix.shape[1], dtype=np.float64)
+        for item in anchor_items:
+            col = self.vocabulary.get(item)
+            if col is not None:
+                anchor_indicator[col] = 1.0
+        intersection = self.matrix @ anchor_indicator
+        union = self.sizes + len(anchor_items) - intersection
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(union > 0, intersection / union, 0.0)
+
+    def take(self, indices: np.ndarray) -> 'MultiValueColumn':
+        return MultiValueColumn(self.item_sets[indices], vocabulary=self.vocabulary, matrix=self.matrix[indices])
+
+
+class UserColumns:
+    """
+    Dữ liệu của N user ở dạng struct-of-arrays, đủ để tính pairwise features:
+    các cột số (NaN nếu thiếu), các cột phân loại (object array, giữ nguyên None),
+    bucket (sex, orientation), tập multi-value, ma trận user feature vector N x F và fingerprint
+    (uint64, xem pair_cache.user_fingerprint) của raw data từng user.
+    """
+
+    def __init__(self, ids: np.ndarray, age: np.ndarray, height: np.ndarray,
+                 latitude: np.ndarray, longitude: np.ndarray, location_preference: np.ndarray,
+                 sex: np.ndarray, orientation: np.ndarray, drink: np.ndarray, smoke: np.ndarray,
+                 education_level: np.ndarray, wants_learn_lang: np.ndarray,
+                 interests: MultiValueColumn, languages: MultiValueColumn, pets: MultiValueColumn,
+                 feature_matrix: np.ndarray, fingerprints: np.ndarray):
+        self.ids = ids
+        self.age = age
+        self.height = height
+        self.latitude = latitude
+        self.longitude = longitude
+        self.location_preference = location_preference
+        self.sex = sex
+        self.orientation = orientation
+        self.drink = drink
+        self.smoke = smoke
+        self.education_level = education_level
+        self.wants_learn_lang = wants_learn_lang
+        self.interests = interests
+        self.languages = languages
+        self.pets = pets
+        self.feature_matrix = feature_matrix
+        self.fingerprints = fingerprints
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_raw_records(cls, raw_records: Sequence[Dict[str, Any]], feature_matrix: np.ndarray,
+                         ids: Optional[Sequence[int]] = None) -> 'UserColumns':
+        """
+        raw_records: các dict từ MatchPredictor._transform_raw_user_data_to_ml_input.
+        feature_matrix: ma trận N x F, dòng i là user feature vector của raw_records[i].
+        ids: user id của từng dòng (mặc định lấy từ khóa 'id' của raw_records).
+        """
+        def numeric(key: str) -> np.ndarray:
+            values = [record.get(key) for record in raw_records]
+            return np.array([np.nan if pd.isna(v) else float(v) for v in values], dtype=np.float64)
+
+        def categorical(key: str) -> np.ndarray:
+            column = np.empty(len(raw_records), dtype=object)
+            column[:] = [record.get(key) for record in raw_records]
+            return column
+
+        return cls(
+            ids=np.asarray(ids if ids is not None else [r.get('id') for r in raw_records], dtype=object),
+            age=numeric('age'),
+            height=numeric('height'),
+            latitude=numeric('latitude'),
+            longitude=numeric('longitude'),
+            location_preference=numeric('location_preference'),
+            sex=categorical('sex'),
+            orientation=categorical('orientation'),
+            drink=categorical('drink'),
+            smoke=categorical('smoke'),
+            education_level=categorical('education_level'),
+            wants_learn_lang=np.array(
+                [1.0 if r.get('interested_in_new_language', False) else 0.0 for r in raw_records], dtype=np.float64),
+            interests=MultiValueColumn([_split_multi_value(r.get('interests')) for r in raw_records]),
+            languages=MultiValueColumn([_split_multi_value(r.get('languages')) for r in raw_records]),
+            pets=MultiValueColumn([_split_multi_value(r.get('pets')) for r in raw_records]),
+            feature_matrix=_as_feature_matrix(feature_matrix),
+            fingerprints=np.array([user_fingerprint(r) for r in raw_records], dtype=np.uint64),
+        )
+
+    def take(self, indices: Iterable[int]) -> 'UserColumns':
+        """Trả về UserColumns con gồm các dòng `indices` (theo thứ tự đã cho)."""
+        indices = np.asarray(list(indices) if not isinstance(indices, np.ndarray) else indices, dtype=np.int64)
+        return UserColumns(
+            ids=self.ids[indices], age=self.age[indices], height=self.height[indices],
+            latitude=self.latitude[indices], longitude=self.longitude[indices],
+            location_preference=self.location_preference[indices],
+            sex=self.sex[indices], orientation=self.orientation[indices],
+            drink=self.drink[indices], smoke=self.smoke[indices],
+            education_level=self.education_level[indices], wants_learn_lang=self.wants_learn_lang[indices],
+            interests=self.interests.take(indices), languages=self.languages.take(indices),
+            pets=self.pets.take(indices), feature_matrix=self.feature_matrix[indices],
+            fingerprints=self.fingerprints[indices],
+        )
+
+
+    @classmethod
+    def concat(cls, parts: Sequence['UserColumns']) -> 'UserColumns':
+        """Nối nhiều UserColumns (cùng số cột feature) thành một."""
+        def item_sets(name: str) -> List[frozenset]:
+            return [items for part in parts for items in getattr(part, name).item_sets]
+
+        return cls(
+            ids=np.concatenate([part.ids for part in parts]),
+            age=np.concatenate([part.age for part in parts]),
+            height=np.concatenate([part.height for part in parts]),
+            latitude=np.concatenate([part.latitude for part in parts]),
+            longitude=np.concatenate([part.longitude for part in parts]),
+            location_preference=np.concatenate([part.location_preference for part in parts]),
+            sex=np.concatenate([part.sex for part in parts]),
+            orientation=np.concatenate([part.orientation for part in parts]),
+            drink=np.concatenate([part.drink for part in parts]),
+            smoke=np.concatenate([part.smoke for part in parts]),
+            education_level=np.concatenate([part.education_level for part in parts]),
+            wants_learn_lang=np.concatenate([part.wants_learn_lang for part in parts]),
+            interests=MultiValueColumn(item_sets('interests')),
+            languages=MultiValueColumn(item_sets('languages')),
+            pets=MultiValueColumn(item_sets('pets')),
+            feature_matrix=np.ascontiguousarray(np.vstack([part.feature_matrix for part in parts])),
+            fingerprints=np.concatenate([part.fingerprints for part in parts]),
+        )
+
+
+def _as_feature_matrix(feature_matrix: np.ndarray) -> np.ndarray:
+    """Ma trận 2 chiều; giữ nguyên float32/float64 (float32 = vector theo UserFeatureSchema), kiểu khác -> float64."""
+    feature_matrix = np.atleast_2d(np.asarray(feature_matrix))
+    if feature_matrix.dtype not in (np.float32, np.float64):
+        feature_matrix = feature_matrix.astype(np.float64)
+    return feature_matrix
+
+
+def _feature_similarity(a_vec: np.ndarray, c_mat: np.ndarray,
+                        block_size: int = SIMILARITY_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine similarity và MAE giữa a_vec và từng dòng của c_mat, luôn tính bằng float64.
+    Ma trận float32 được ép kiểu theo từng block dòng, nên không tạo bản sao float64 của cả ma trận.
+    """
+    a_vec = a_vec.astype(np.float64)
+    a_norm = np.linalg.norm(a_vec)
+    n = c_mat.shape[0]
+    cosine_sim = np.empty(n, dtype=np.float64)
+    mae_diff = np.empty(n, dtype=np.float64)
+    for start in range(0, n, block_size):
+        block = c_mat[start:start + block_size].astype(np.float64, copy=False)
+        denom = np.linalg.norm(block, axis=1) * a_norm
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cosine_sim[start:start + block_size] = np.where(denom > 0, (block @ a_vec) / denom, 0.0)
+        mae_diff[start:start + block_size] = np.mean(np.abs(a_vec - block), axis=1)
+    return cosine_sim, mae_diff
+
+
+def _object_equals(column: np.ndarray, value: Any) -> np.ndarray:
+    """So sánh bằng từng phần tử như `a == b` trong Python (None == None là True)."""
+    return np.fromiter((v == value for v in column), dtype=bool, count=len(column))
+
+
+class PairwiseFeatureEngine:
+    """
+    Tạo ma trận pairwise features (N x len(pairwise_input_columns)) cho một anchor và N candidate.
+    Kế hoạch scaling (vị trí cột, min_/scale_) được tính sẵn một lần khi khởi tạo.
+    """
+
+    def __init__(self, pairwise_input_columns: List[str], pairwise_features_scaler: MinMaxScaler,
+                 numerical_cols_to_scale: List[str]):
+        self.pairwise_input_columns = list(pairwise_input_columns)
+        self.column_index = {col: i for i, col in enumerate(self.pairwise_input_columns)}
+
+        cols_to_scale = [col for col in numerical_cols_to_scale if col in self.column_index]
+        scaler_columns = list(getattr(pairwise_features_scaler, 'feature_names_in_', cols_to_scale))
+        if sorted(scaler_columns) != sorted(cols_to_scale):
+            raise ValueError(f"Pairwise scaler columns {scaler_columns} do not match columns to scale {cols_to_scale}.")
+        # Giữ đúng thứ tự cột của scaler để dùng min_/scale_ theo vị trí
+        self.scale_positions = np.array([self.column_index[col] for col in scaler_columns], dtype=np.int64)
+        self.scale_ = np.asarray(pairwise_features_scaler.scale_, dtype=np.float64)
+        self.min_ = np.asarray(pairwise_features_scaler.min_, dtype=np.float64)
+        self.clip_range: Optional[Tuple[float, float]] = (
+            pairwise_features_scaler.feature_range if getattr(pairwise_features_scaler, 'clip', False) else None)
+        # Vị trí các cột có hướng (chỉ các cặp có đủ hai cột trong model)
+        self.directional_positions = np.array(
+            [(self.column_index[a], self.column_index[b]) for a, b in DIRECTIONAL_COLUMN_PAIRS
+             if a in self.column_index and b in self.column_index], dtype=np.int64).reshape(-1, 2)
+
+    def build(self, anchor: UserColumns, candidates: UserColumns, anchor_row: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Trả về (matrix, valid):
+            matrix: ma trận N x F đã scale, thứ tự cột theo pairwise_input_columns.
+            valid: mask các dòng hợp lệ. Dòng không hợp lệ tương ứng với các cặp mà bản từng cặp
+                   sẽ ném lỗi (thiếu height hoặc location_preference).
+        """
+        matrix, valid = self._build_unscaled(anchor, candidates, anchor_row)
+        return self._scale(matrix), valid
+
+    def build_both_directions(self, anchor: UserColumns, candidates: UserColumns,
+                              anchor_row: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Trả về (matrix, reverse_matrix, valid): matrix như build(); reverse_matrix là ma trận của chiều ngược lại
+        (candidate là user1, anchor là user2). Các feature đối xứng chỉ được tính một lần cho mỗi cặp, chiều ngược
+        chỉ đổi chỗ các cột có hướng (DIRECTIONAL_COLUMN_PAIRS) trước khi scale. reverse_matrix khớp với build()
+        khi đổi vai trò hai bên trong phạm vi PAIRWISE_PARITY_ATOL (geo_distance_km / cosine lệch ở mức làm tròn).
+        """
+        matrix, valid = self._build_unscaled(anchor, candidates, anchor_row)
+        reverse_matrix = matrix.copy()
+        if self.directional_positions.size:
+            reverse_matrix[:, self.directional_positions.ravel()] = matrix[:, self.directional_positions[:, ::-1].ravel()]
+        return self._scale(matrix), self._scale(reverse_matrix), valid
+
+    def _build_unscaled(self, anchor: UserColumns, candidates: UserColumns,
+                        anchor_row: int) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(candidates)
+        features: Dict[str, np.ndarray] = {}
+
+        a_age, a_height = anchor.age[anchor_row], anchor.height[anchor_row]
+        a_lat, a_lon = anchor.latitude[anchor_row], anchor.longitude[anchor_row]
+        a_pref = anchor.location_preference[anchor_row]
+
+        valid = ~np.isnan(candidates.height) & ~np.isnan(candidates.location_preference)
+        if np.isnan(a_height) or np.isnan(a_pref):
+            valid[:] = False
+
+        # 1. Basic differences
+        features['age_diff'] = np.abs(a_age - candidates.age)
+        features['height_diff'] = np.abs(a_height - candidates.height)
+
+        # 2. Geographical distance
+        dist = geodesic_distance_km_vectorized(a_lat, a_lon, candidates.latitude, candidates.longitude)
+        features['geo_distance_km'] = dist
+
+        # 3. Location preference compatibility
+        c_pref = candidates.location_preference
+        with np.errstate(invalid='ignore'):
+            features['user1_within_user2_loc_pref'] = ((c_pref == -1) | (dist <= c_pref)).astype(np.float64)
+            features['user2_within_user1_loc_pref'] = (
+                np.ones(n) if a_pref == -1 else (dist <= a_pref).astype(np.float64))
+
+        # 4. Orientation compatibility: chỉ phụ thuộc vào bucket (sex, orientation) của hai phía
+        a_sex, a_orient = anchor.sex[anchor_row], anchor.orientation[anchor_row]
+        bucket_cache: Dict[Tuple[Any, Any], Tuple[float, float]] = {}
+        comp_u1_u2 = np.empty(n, dtype=np.float64)
+        comp_u2_u1 = np.empty(n, dtype=np.float64)
+        for i, bucket in enumerate(zip(candidates.sex, candidates.orientation)):
+            compat = bucket_cache.get(bucket)
+            if compat is None:
+                compat = (
+                    1.0 if orientation_compatibility(a_sex, a_orient, bucket[0], bucket[1]) else 0.0,
+                    1.0 if orientation_compatibility(bucket[0], bucket[1], a_sex, a_orient) else 0.0,
+                )
+                bucket_cache[bucket] = compat
+            comp_u1_u2[i], comp_u2_u1[i] = compat
+        features['orientation_compatible_user1_to_user2'] = comp_u1_u2
+        features['orientation_compatible_user2_to_user1'] = comp_u2_u1
+        features['orientation_compatible_final'] = np.maximum(comp_u1_u2, comp_u2_u1)
+
+        # 5-6. Similar habits & education
+        features['drink_match'] = _object_equals(candidates.drink, anchor.drink[anchor_row]).astype(np.float64)
+        features['smoke_match'] = _object_equals(candidates.smoke, anchor.smoke[anchor_row]).astype(np.float64)
+        features['education_match'] = _object_equals(
+            candidates.education_level, anchor.education_level[anchor_row]).astype(np.float64)
+
+        # 7. Jaccard similarity
+        features['interests_jaccard'] = candidates.interests.jaccard_with(anchor.interests.item_sets[anchor_row])
+        features['languages_jaccard'] = candidates.languages.jaccard_with(anchor.languages.item_sets[anchor_row])
+        features['pets_jaccard'] = candidates.pets.jaccard_with(anchor.pets.item_sets[anchor_row])
+
+        # 8. Language interest match
+        a_wants = anchor.wants_learn_lang[anchor_row]
+        features['user1_wants_learn_lang'] = np.full(n, a_wants)
+        features['user2_wants_learn_lang'] = candidates.wants_learn_lang
+        features['language_interest_match'] = ((candidates.wants_learn_lang == 1.0) & (a_wants == 1.0)).astype(
+            np.float64)
+
+        # 9. Similarity of user feature vectors
+        features['user_features_cosine_sim'], features['user_features_mae_diff'] = _feature_similarity(
+            anchor.feature_matrix[anchor_row], candidates.feature_matrix)
+
+        # --- Ghép ma trận theo đúng thứ tự cột, NaN/thiếu -> 0.0 ---
+        matrix = np.zeros((n, len(self.pairwise_input_columns)), dtype=np.float64)
+        for col, values in features.items():
+            position = self.column_index.get(col)
+            if position is not None:
+                matrix[:, position] = values
+        matrix[np.isnan(matrix)] = 0.0
+        return matrix, valid
+
+    def _scale(self, matrix: np.ndarray) -> np.ndarray:
+        # --- Một lần scaling cho tất cả các cột số ---
+        with metrics.stage(STAGE_SCALING):
+            scaled = matrix[:, self.scale_positions] * self.scale_ + self.min_
+            if self.clip_range is not None:
+                np.clip(scaled, self.clip_range[0], self.clip_range[1], out=scaled)
+            matrix[:, self.scale_positions] = scaled
+        return matrix
@@ -1,12 +1,23 @@
 # app/ml/predictor.py
+import datetime
+import hashlib
 import joblib
+import lightgbm as lgb
 import os
 import pandas as pd
 import numpy as np
+from types import SimpleNamespace
 from typing import Dict, Any, Tuple, List
 
+from app.core.metrics import STAGE_MODEL, STAGE_PAIRWISE_FEATURES, STAGE_USER_FEATURES, metrics
+from app.ml.artifacts import PreprocessingArtifacts
+from app.ml.model_bundle import open_bundle
+from app.ml.pair_cache import PairScoreCache
+from app.ml.pairwise_engine import PairwiseFeatureEngine, UserColumns
+from app.ml.tree_evaluator import EarlyExitTreeEvaluator
 from app.ml.preprocessing import (
     create_user_feature_vector,
+    create_user_feature_array,
     create_pairwise_features_vector,
     calculate_age,
     orientation_compatibility # Import thêm hàm này để dùng ở service
@@ -16,19 +27,49 @@ from sklearn.preprocessing import MinMaxScaler
 # --- Constants ---
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "ml_models")
 
+# Chế độ suy luận của model:
+# - "booster": gọi thẳng lightgbm.Booster trên mảng C-contiguous (không tạo pd.DataFrame cho mỗi lần predict)
+# - "sklearn": LGBMClassifier.predict_proba trên pd.DataFrame (cách cũ)
+INFERENCE_MODES = ("booster", "sklearn")
+
+# Warmup: số candidate tổng hợp được chấm điểm với một anchor tổng hợp
+WARMUP_CANDIDATES = 64
+WARMUP_BIO = "Love travelling, live music and cooking dinner for friends on weekends."
+
 
 class MatchPredictor:
-    def __init__(self, models_dir: str = MODELS_DIR):
+    def __init__(self, models_dir: str = MODELS_DIR, inference_mode: str = "booster", n_jobs: int | None = -1,
+                 early_exit: bool = False, pair_cache_size: int = 0, use_bundle: bool = True,
+                 early_exit_min_threshold: float = 0.0, bundle_dir: str | None = None):
+        """
+        inference_mode: xem INFERENCE_MODES; cả hai chế độ cho xác suất giống nhau từng bit.
+        n_jobs: số thread LightGBM dùng khi predict (âm = số core + 1 + n_jobs, như scikit-learn;
+        None = giá trị n_jobs lưu trong model).
+        early_exit: dùng EarlyExitTreeEvaluator khi chỉ cần biết score có vượt một ngưỡng không
+        (predict_match_above_threshold_columns, tham số floor của predict_match_proba_columns).
+        early_exit_min_threshold: chỉ dùng EarlyExitTreeEvaluator khi ngưỡng >= giá trị này; ngưỡng thấp thì phần lớn
+        dòng phải đi qua gần hết các cây và evaluator NumPy chậm hơn Booster.predict (xem benchmarks/bench_early_exit).
+        pair_cache_size: số cặp tối đa của PairScoreCache (0 = không cache score theo cặp).
+        use_bundle: tải từ bundle (app/ml/model_bundle.py) nếu models_dir có bundle còn khớp với các file .joblib:
+        không qua pickle, mảng được mmap và dùng chung giữa các process; cho xác suất giống hệt.
+        bundle_dir: thư mục bundle khác bundle/ của models_dir (vd: bundle vừa export, đang được kiểm tra).
+        """
         self.models_dir = models_dir
         print(f"DEBUG: Attempting to load models from: {self.models_dir}")  # In đường dẫn khi khởi tạo
+        self.bundle = open_bundle(self.models_dir, bundle_dir) if use_bundle else None
         try:
-            self.model = joblib.load(os.path.join(self.models_dir, "best_overall_model.joblib"))
-            self.pairwise_input_columns: List[str] = joblib.load(
-                os.path.join(self.models_dir, "pairwise_model_input_columns.joblib"))
-            self.user_feature_columns: List[str] = joblib.load(
-                os.path.join(self.models_dir, "user_features_final_columns.joblib"))
-            self.pairwise_features_scaler: MinMaxScaler = joblib.load(
-                os.path.join(self.models_dir, "pairwise_features_scaler.joblib"))
+            self.model = self._load("best_overall_model.joblib")
+            # Version của model = hash nội dung file, dùng làm namespace cho cache kết quả
+            if self.bundle is not None:
+                self.model_version: str = self.bundle.model_version
+            else:
+                with open(os.path.join(self.models_dir, "best_overall_model.joblib"), "rb") as model_file:
+                    self.model_version = hashlib.sha256(model_file.read()).hexdigest()[:12]
+            self.pairwise_input_columns: List[str] = self._load("pairwise_model_input_columns.joblib")
+            # Tải toàn bộ preprocessor cho user feature vector một lần, dùng chung cho mọi request
+            self.artifacts = PreprocessingArtifacts(self.models_dir, bundle=self.bundle)
+            self.user_feature_columns: List[str] = self.artifacts.user_features_final_columns
+            self.pairwise_features_scaler: MinMaxScaler = self._load("pairwise_features_scaler.joblib")
         except FileNotFoundError as e:
             print(f"DEBUG ERROR: File not found during MatchPredictor init: {e}")
             raise e  # Ném lại lỗi để thấy rõ hơn
@@ -36,12 +77,8 @@ class MatchPredictor:
             print(f"DEBUG ERROR: Generic error during MatchPredictor init: {e}")
             raise e
 
-        # Các preprocessor này có thể không cần tải ở đây nếu create_user_feature_vector đã tự tải
-        # Tuy nhiên, để minh bạch, có thể tải ở đây và truyền vào nếu cần.
-        # Hiện tại, create_user_feature_vector đang tự tải.
         try:
-            self.numerical_pairwise_cols_to_scale: List[str] = joblib.load(
-                os.path.join(self.models_dir, "numerical_pairwise_cols_to_scale.joblib"))
+            self.numerical_pairwise_cols_to_scale: List[str] = self._load("numerical_pairwise_cols_to_scale.joblib")
         except FileNotFoundError:
             print(
                 "WARNING: 'numerical_pairwise_cols_to_scale.joblib' not found. Falling back to a default list or attempting to infer.")
@@ -66,6 +103,119 @@ class MatchPredictor:
                 if col not in boolean_cols_in_pairwise
             ]
 
+        self._init_inference(inference_mode, n_jobs)
+        self.tree_evaluator: EarlyExitTreeEvaluator | None = None
+        self.early_exit_min_threshold = early_exit_min_threshold
+        if early_exit:
+            try:
+                if self.booster is not None:
+                    dumped = self.bundle.trees() if self.bundle is not None else None
+                    trees, sigmoid = dumped if dumped is not None else (None, 1.0)
+                    self.tree_evaluator = EarlyExitTreeEvaluator(self.booster, trees=trees, sigmoid=sigmoid,
+                                                                 num_threads=self.num_threads)
+            except ValueError as e:
+                print(f"WARNING: Early-exit tree evaluation is disabled: {e}")
+            if self.tree_evaluator is None:
+                print("WARNING: Early-exit tree evaluation needs a LightGBM booster, using exact probabilities.")
+
+        # Score theo cặp user, tra trước khi tính pairwise features (xem PairScoreCache)
+        self.pair_score_cache: PairScoreCache | None = PairScoreCache(pair_cache_size) if pair_cache_size > 0 else None
+
+        # Engine tính pairwise features theo cột cho chấm điểm theo batch
+        self.pairwise_engine = PairwiseFeatureEngine(
+            pairwise_input_columns=self.pairwise_input_columns,
+            pairwise_features_scaler=self.pairwise_features_scaler,
+            numerical_cols_to_scale=list(self.numerical_pairwise_cols_to_scale)
+        )
+
+    def warmup(self, n_candidates: int = WARMUP_CANDIDATES, threshold: float = 0.5) -> int:
+        """
+        Chấm điểm một anchor tổng hợp với n_candidates user tổng hợp qua đúng đường đi của request
+        (user feature, bio, pairwise, model, early exit nếu bật), không cần DB, để các phần khởi tạo lười
+        (đọc WordNet, thread pool của LightGBM, ...) xong trước request đầu tiên.
+        Trả về số cặp được chấm điểm; lỗi của pipeline được ném ra cho caller.
+        """
+        user_ids = [-(index + 1) for index in range(n_candidates + 1)]  # Id âm: không trùng user thật
+        try:
+            columns, _ = self.build_user_columns(
+                [self.synthetic_user_data_tuple(user_id) for user_id in user_ids], user_ids=user_ids,
+                raise_errors=True)
+            probas = self.predict_match_proba_columns(columns, columns, anchor_row=0)
+            if self.tree_evaluator is not None:
+                self.predict_match_above_threshold_columns(
+                    columns, columns, max(threshold, self.early_exit_min_threshold), anchor_row=0)
+        finally:
+            for user_id in user_ids:
+                self.artifacts.bio_encoder.invalidate(user_id)
+            if self.pair_score_cache is not None:
+                self.pair_score_cache.clear()
+        return int(np.isfinite(probas).sum())
+
+    def synthetic_user_data_tuple(self, user_id: int) -> Tuple:
+        """Tuple cùng dạng với crud.get_user_profile_raw_data, giá trị xoay vòng theo các category lúc train."""
+        index = -user_id
+
+        def pick(values, offset: int = 0):
+            values = list(values)
+            return values[(index + offset) % len(values)] if values else None
+
+        artifacts = self.artifacts
+        sex, orientation, body_type, drink, smoke = (
+            pick(categories) for categories in artifacts.onehot_encoder_categorical.categories_)
+        profile = SimpleNamespace(
+            date_of_birth=datetime.date(1985 + index % 20, 1 + index % 12, 1 + index % 28),
+            height=60 + index % 20, sex=sex, interested_in_new_language=index % 2 == 0, drop_out=index % 5 == 0,
+            location_preference=pick([-1, 10, 50, 100]), bio=WARMUP_BIO)
+        location = SimpleNamespace(latitudes=21.0 + 0.01 * (index % 10), longitudes=105.8 + 0.01 * (index % 7),
+                                   country=None, state=None, city=None)
+        return (user_id, profile, location, [pick(artifacts.top_pets_items)],
+                [pick(artifacts.top_interests_items), pick(artifacts.top_interests_items, 1)],
+                [pick(artifacts.top_languages_items)], body_type, orientation,
+                pick(artifacts.top_n_job_categories), drink, smoke, pick(artifacts.top_n_edu_categories))
+
+    def _init_inference(self, inference_mode: str, n_jobs: int | None) -> None:
+        """Lấy Booster từ LGBMClassifier một lần và kiểm tra thứ tự cột so với pairwise_model_input_columns."""
+        if inference_mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode '{inference_mode}', expected one of {INFERENCE_MODES}")
+        # Bundle chỉ có Booster (không có LGBMClassifier), chỉ export được model binary có objective có sẵn
+        self.booster = self.model if isinstance(self.model, lgb.Booster) else getattr(self.model, "booster_", None)
+        if inference_mode == "sklearn" and self.model is self.booster:
+            print("WARNING: Model loaded from a bundle has no scikit-learn wrapper, using booster inference.")
+            inference_mode = "booster"
+        if self.booster is not None:
+            # Model đọc cột theo vị trí (predict_proba không sắp xếp lại cột DataFrame theo tên),
+            # nên thứ tự cột lúc fit phải khớp chính xác với pairwise_model_input_columns
+            model_columns = list(self.booster.feature_name())
+            if model_columns != list(self.pairwise_input_columns):
+                raise ValueError(
+                    f"Model feature order does not match pairwise_model_input_columns: "
+                    f"model={model_columns}, expected={list(self.pairwise_input_columns)}")
+        elif inference_mode == "booster":
+            print(f"WARNING: Model {type(self.model).__name__} has no LightGBM booster, using sklearn inference.")
+            inference_mode = "sklearn"
+        if inference_mode == "booster" and (callable(getattr(self.model, "objective", None))
+                                            or getattr(self.model, "n_classes_", 2) != 2):
+            # predict_proba chỉ là [1 - p, p] của Booster.predict với objective binary có sẵn
+            print("WARNING: Model is not a built-in binary objective, using sklearn inference.")
+            inference_mode = "sklearn"
+        self.inference_mode = inference_mode
+
+        if n_jobs is None:
+            n_jobs = (getattr(self.model, "n_jobs", None) if self.bundle is None
+                      else self.bundle.manifest["objects"]["best_overall_model.joblib"]["n_jobs"])
+        if n_jobs is None:
+            n_jobs = 0  # 0 = mặc định của OpenMP
+        elif n_jobs < 0:
+            n_jobs = max((os.cpu_count() or 1) + 1 + n_jobs, 1)
+        self.num_threads: int = n_jobs
+        if self.inference_mode == "sklearn" and hasattr(self.model, "set_params"):
+            self.model.set_params(n_jobs=self.num_threads)
+
+    def _load(self, filename: str):
+        if self.bundle is not None:
+            return self.bundle.load(filename)
+        return joblib.load(os.path.join(self.models_dir, filename))
+
     def _transform_raw_user_data_to_ml_input(
             self,
             user_id: int,
@@ -86,7 +236,8 @@ class MatchPredictor:
         có cấu trúc giống `profiles_df` trong notebook để dùng cho feature engineering.
         """
         raw_data = {
-            'id': user_id,
+            # crud trả về models.User ở vị trí đầu tuple: chỉ giữ id (khóa cache bio, id của UserColumns)
+            'id': getattr(user_id, 'id', user_id),
             'date_of_birth': str(profile_db.date_of_birth) if profile_db and profile_db.date_of_birth else None,
             'height': profile_db.height if profile_db else None,
             'body_type': body_type_name,  # đã join từ ID
@@ -126,7 +277,7 @@ class MatchPredictor:
             body_type_name, orientation_name, job_industry_name,
             drink_status_name, smoke_status_name, education_level_name
         )
-        feature_vector = create_user_feature_vector(user_raw_data)
+        feature_vector = create_user_feature_vector(user_raw_data, artifacts=self.artifacts)
         # Đảm bảo vector có đúng các cột và thứ tự như khi huấn luyện
         return feature_vector.reindex(self.user_feature_columns).fillna(0)
 
@@ -160,20 +311,239 @@ class MatchPredictor:
             numerical_cols_to_scale_in_notebook=self.numerical_pairwise_cols_to_scale
         )
 
-        # --- THAY ĐỔI CHÍNH Ở ĐÂY ---
-        # Chuyển pd.Series thành pd.DataFrame một dòng, giữ nguyên tên cột
-        # self.pairwise_input_columns là danh sách tên cột mà model mong đợi
-        pair_feature_df_for_prediction = pd.DataFrame([pair_feature_vector_series.values],
-                                                      columns=self.pairwise_input_columns)
-        # Đảm bảo thứ tự cột của DataFrame này khớp với thứ tự khi fit model.
-        # pair_feature_vector_series đã được trả về với index là self.pairwise_input_columns,
-        # nên khi tạo DataFrame từ values và columns này thì thứ tự sẽ đúng.
-
-        # Hoặc cách khác an toàn hơn:
-        # pair_feature_df_for_prediction = pd.DataFrame(pair_feature_vector_series).T
-        # # .T để chuyển Series thành DataFrame một dòng, cột là index của Series
-        # # Sau đó, đảm bảo thứ tự cột khớp với lúc fit:
-        # pair_feature_df_for_prediction = pair_feature_df_for_prediction[self.pairwise_input_columns]
-
-        proba = self.model.predict_proba(pair_feature_df_for_prediction)  # Truyền DataFrame
-        return float(proba[0, 1])
\ No newline at end of file
+        # pair_feature_vector_series có index là self.pairwise_input_columns (đúng thứ tự khi fit model)
+        proba = self._predict_proba_matrix(np.asarray([pair_feature_vector_series.values]))
+        return float(proba[0])
+
+    def predict_match_proba_batch(
+            self,
+            current_user: Tuple,
+            candidates: List[Tuple],
+            chunk_size: int | None = None
+    ) -> np.ndarray:
+        """
+        Tính xác suất match giữa current_user và nhiều candidate cùng lúc.
+        current_user / candidates: các tuple giống kết quả của crud.get_user_profile_raw_data.
+        chunk_size: số dòng tối đa cho mỗi lần gọi predict_proba (None = một lần cho cả batch).
+
+        Trả về mảng xác suất có cùng thứ tự với `candidates`. Candidate nào không tạo được
+        feature vector sẽ có giá trị NaN (tương đương việc bỏ qua cặp đó ở bản tính từng cặp).
+        """
+        probas = np.full(len(candidates), np.nan, dtype=np.float64)
+        if not candidates:
+            return probas
+
+        # Dữ liệu của current_user chỉ cần tính một lần cho cả batch
+        anchor_columns, _ = self.build_user_columns([current_user], raise_errors=True)
+        candidate_columns, row_positions = self.build_user_columns(candidates)
+        if not row_positions:
+            return probas
+
+        probas[row_positions] = self.predict_match_proba_columns(
+            anchor_columns, candidate_columns, chunk_size=chunk_size)
+        return probas
+
+    @metrics.timed(STAGE_USER_FEATURES)
+    def build_user_columns(
+            self,
+            user_data_tuples: List[Tuple],
+            user_ids: List[int] | None = None,
+            raise_errors: bool = False
+    ) -> Tuple[UserColumns, List[int]]:
+        """
+        Tính raw data + user feature vector cho từng tuple và gom thành UserColumns.
+        Trả về (columns, positions): positions là vị trí (trong user_data_tuples) của các user
+        tạo được feature; user lỗi bị bỏ qua (hoặc ném lỗi nếu raise_errors=True).
+        """
+        raw_records: List[Dict[str, Any]] = []
+        feature_rows: List[np.ndarray] = []
+        positions: List[int] = []
+        for position, user_data_tuple in enumerate(user_data_tuples):
+            try:
+                raw_record = self._transform_raw_user_data_to_ml_input(*user_data_tuple)
+                # Vector dạng mảng float32 theo schema cột (không qua pd.Series/reindex)
+                feature_row = create_user_feature_array(raw_record, artifacts=self.artifacts)
+            except Exception as e:
+                if raise_errors:
+                    raise
+                print(f"Error building user features for user at position {position}: {e}")
+                continue
+            raw_records.append(raw_record)
+            feature_rows.append(feature_row)
+            positions.append(position)
+
+        ids = [user_ids[position] for position in positions] if user_ids is not None else None
+        schema = self.artifacts.user_feature_schema
+        feature_matrix = np.vstack(feature_rows) if feature_rows else np.empty((0, len(schema)), dtype=schema.dtype)
+        return UserColumns.from_raw_records(raw_records, feature_matrix, ids=ids), positions
+
+    def predict_match_proba_columns(
+            self,
+            anchor_columns: UserColumns,
+            candidate_columns: UserColumns,
+            anchor_row: int = 0,
+            chunk_size: int | None = None,
+            floor: float | None = None
+    ) -> np.ndarray:
+        """
+        Chấm điểm anchor (dòng `anchor_row` của anchor_columns) với toàn bộ candidate_columns.
+        Không truy cập DB; cặp không hợp lệ (xem PairwiseFeatureEngine.build) có giá trị NaN.
+        Có pair_score_cache: cặp đã có score chiều anchor -> candidate trong cache không cần tính lại; các cặp còn
+        lại chỉ được chấm chiều này rồi ghi vào cache (chiều ngược lại được chấm khi candidate yêu cầu potential
+        matches).
+        floor: caller chỉ cần các score > floor (vd: score thấp nhất còn vào được top-K). Nếu early exit dùng được
+        với ngưỡng này (_uses_early_exit), cặp chắc chắn có score <= floor được trả về NaN mà không tính hết các
+        cây, chỉ các cặp còn lại được tính score chính xác (và được cache).
+        """
+        if self.pair_score_cache is None:
+            probas, _ = self._predict_proba_scored(anchor_columns, candidate_columns, anchor_row, chunk_size, floor)
+            return probas
+
+        anchor_fingerprint = anchor_columns.fingerprints[anchor_row]
+        probas, found = self.pair_score_cache.lookup(anchor_fingerprint, candidate_columns.fingerprints)
+        missing = np.flatnonzero(~found)
+        if missing.size:
+            missing_columns = candidate_columns.take(missing)
+            probas[missing], scored = self._predict_proba_scored(anchor_columns, missing_columns, anchor_row,
+                                                                 chunk_size, floor)
+            self.pair_score_cache.store(anchor_fingerprint, missing_columns.fingerprints[scored],
+                                        probas[missing[scored]])
+        return probas
+
+    def _predict_proba_scored(self, anchor_columns: UserColumns, candidate_columns: UserColumns, anchor_row: int,
+                              chunk_size: int | None, floor: float | None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (probas, scored) của predict_match_proba_columns khi không dùng cache: scored đánh dấu các cặp có kết quả
+        chính xác (score, hoặc NaN vì cặp không hợp lệ), tức là không bị early exit loại theo floor.
+        """
+        probas = np.full(len(candidate_columns), np.nan, dtype=np.float64)
+        scored = np.ones(len(candidate_columns), dtype=bool)
+        if len(candidate_columns) == 0:
+            return probas, scored
+
+        with metrics.stage(STAGE_PAIRWISE_FEATURES):
+            pair_feature_matrix, valid = self.pairwise_engine.build(anchor_columns, candidate_columns, anchor_row)
+        rows = np.flatnonzero(valid)
+        if floor is not None and self._uses_early_exit(floor) and rows.size:
+            with metrics.stage(STAGE_MODEL):
+                above = self._predict_above_early_exit(pair_feature_matrix[rows], floor, chunk_size)
+            scored[rows[~above]] = False
+            rows = rows[above]
+        if rows.size:
+            probas[rows] = self._predict_proba_matrix(pair_feature_matrix[rows], chunk_size)
+        return probas, scored
+
+    def predict_match_proba_both_directions(
+            self,
+            anchor_columns: UserColumns,
+            candidate_columns: UserColumns,
+            anchor_row: int = 0,
+            chunk_size: int | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Xác suất của cả hai chiều cho mỗi cặp (anchor, candidate): (anchor -> candidate, candidate -> anchor).
+        Feature đối xứng của cặp chỉ tính một lần (PairwiseFeatureEngine.build_both_directions);
+        cặp không hợp lệ có giá trị NaN ở cả hai chiều. Kết quả được ghi vào pair_score_cache (nếu có).
+        """
+        n_candidates = len(candidate_columns)
+        probas = np.full(n_candidates, np.nan, dtype=np.float64)
+        reverse_probas = np.full(n_candidates, np.nan, dtype=np.float64)
+        if n_candidates == 0:
+            return probas, reverse_probas
+
+        with metrics.stage(STAGE_PAIRWISE_FEATURES):
+            pair_feature_matrix, reverse_matrix, valid = self.pairwise_engine.build_both_directions(
+                anchor_columns, candidate_columns, anchor_row)
+        n_valid = int(valid.sum())
+        if n_valid:
+            both = self._predict_proba_matrix(np.vstack([pair_feature_matrix[valid], reverse_matrix[valid]]), chunk_size)
+            probas[valid], reverse_probas[valid] = both[:n_valid], both[n_valid:]
+        if self.pair_score_cache is not None:
+            self.pair_score_cache.store(anchor_columns.fingerprints[anchor_row], candidate_columns.fingerprints,
+                                        probas, reverse_probas)
+        return probas, reverse_probas
+
+    def _uses_early_exit(self, threshold: float) -> bool:
+        """Quyết định "score > threshold" bằng EarlyExitTreeEvaluator (bật early_exit và threshold đủ cao)."""
+        return self.tree_evaluator is not None and threshold >= self.early_exit_min_threshold
+
+    def predict_match_above_threshold_columns(
+            self,
+            anchor_columns: UserColumns,
+            candidate_columns: UserColumns,
+            threshold: float,
+            anchor_row: int = 0,
+            chunk_size: int | None = None
+    ) -> np.ndarray:
+        """
+        Giống predict_match_proba_columns(...) > threshold (cặp không hợp lệ = False) nhưng chỉ trả về mảng bool.
+        Nếu dùng early exit (_uses_early_exit), các cặp được đánh giá bằng EarlyExitTreeEvaluator (dừng sớm khi các
+        cây còn lại không thể đưa xác suất qua threshold); dùng predict_match_proba_columns khi cần score để xếp hạng.
+        Có pair_score_cache: cặp đã cache dùng score đã cache, chỉ các cặp còn lại qua EarlyExitTreeEvaluator.
+        """
+        if not self._uses_early_exit(threshold):
+            with np.errstate(invalid='ignore'):
+                return self.predict_match_proba_columns(
+                    anchor_columns, candidate_columns, anchor_row, chunk_size) > threshold
+        if self.pair_score_cache is None:
+            return self._predict_above_threshold_early_exit(
+                anchor_columns, candidate_columns, threshold, anchor_row, chunk_size)
+
+        probas, found = self.pair_score_cache.lookup(anchor_columns.fingerprints[anchor_row],
+                                                     candidate_columns.fingerprints)
+        with np.errstate(invalid='ignore'):
+            matched = probas > threshold
+        missing = np.flatnonzero(~found)
+        if missing.size:
+            matched[missing] = self._predict_above_threshold_early_exit(
+                anchor_columns, candidate_columns.take(missing), threshold, anchor_row, chunk_size)
+        return matched
+
+    def _predict_above_threshold_early_exit(self, anchor_columns: UserColumns, candidate_columns: UserColumns,
+                                            threshold: float, anchor_row: int,
+                                            chunk_size: int | None) -> np.ndarray:
+        matched = np.zeros(len(candidate_columns), dtype=bool)
+        if len(candidate_columns) == 0:
+            return matched
+        with metrics.stage(STAGE_PAIRWISE_FEATURES):
+            pair_feature_matrix, valid = self.pairwise_engine.build(anchor_columns, candidate_columns, anchor_row)
+        valid_rows = np.flatnonzero(valid)
+        with metrics.stage(STAGE_MODEL):
+            matched[valid_rows] = self._predict_above_early_exit(pair_feature_matrix[valid_rows], threshold,
+                                                                 chunk_size)
+        return matched
+
+    def _predict_above_early_exit(self, pair_feature_matrix: np.ndarray, threshold: float,
+                                  chunk_size: int | None) -> np.ndarray:
+        """Mask "xác suất > threshold" của từng dòng bằng EarlyExitTreeEvaluator, theo từng chunk chunk_size dòng."""
+        n_rows = pair_feature_matrix.shape[0]
+        above = np.zeros(n_rows, dtype=bool)
+        if not chunk_size or chunk_size <= 0:
+            chunk_size = max(n_rows, 1)
+        for start in range(0, n_rows, chunk_size):
+            above[start:start + chunk_size] = self.tree_evaluator.predict_above(
+                pair_feature_matrix[start:start + chunk_size], threshold)
+        return above
+
+    @metrics.timed(STAGE_MODEL)
+    def _predict_proba_matrix(self, pair_feature_matrix: np.ndarray, chunk_size: int | None = None) -> np.ndarray:
+        """Gọi model trên ma trận N x F (theo từng chunk nếu cần), trả về xác suất lớp 1."""
+        if pair_feature_matrix.dtype not in (np.float32, np.float64):
+            pair_feature_matrix = pair_feature_matrix.astype(np.float64)
+        n_rows = pair_feature_matrix.shape[0]
+        if not chunk_size or chunk_size <= 0:
+            chunk_size = n_rows
+
+        result = np.empty(n_rows, dtype=np.float64)
+        for start in range(0, n_rows, chunk_size):
+            end = min(start + chunk_size, n_rows)
+            result[start:end] = self._predict_proba_chunk(pair_feature_matrix[start:end])
+        return result
+
+    def _predict_proba_chunk(self, chunk: np.ndarray) -> np.ndarray:
+        if self.inference_mode == "booster":
+            # Giống hệt LGBMClassifier.predict_proba: DataFrame cùng dtype được LightGBM chuyển về đúng mảng này,
+            # rồi Booster.predict (num_iteration=None -> best_iteration) cho xác suất lớp 1 của objective binary
+            return self.booster.predict(np.ascontiguousarray(chunk), num_threads=self.num_threads)
+        chunk_df = pd.DataFrame(chunk, columns=self.pairwise_input_columns)
+        return self.model.predict_proba(chunk_df)[:, 1]
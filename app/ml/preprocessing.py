@@ -1,12 +1,9 @@
 # app/ml/preprocessing.py
-import ssl
-
 import nltk
 import pandas as pd
 import numpy as np
 import re
 from datetime import datetime
-import joblib
 import os
 
 from sklearn.preprocessing import MinMaxScaler  # OneHotEncoder sẽ được tải từ file
@@ -15,36 +12,52 @@ from sklearn.metrics.pairwise import cosine_similarity
 
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
+from nltk.tokenize import NLTKWordTokenizer, word_tokenize
 from unidecode import unidecode
+from functools import lru_cache
 from geopy.distance import geodesic
 from collections import Counter
 
+from app.ml.artifacts import PreprocessingArtifacts, get_default_artifacts, CATEGORICAL_COLS_ONEHOT
+
 # --- Constants ---
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "ml_models")  # Đường dẫn tương đối
 
-# --- NLTK Setup (cần tải dữ liệu một lần khi ứng dụng chạy hoặc trong Dockerfile) ---
+# --- NLTK Setup ---
+# Dữ liệu NLTK phải được tải sẵn lúc build image (xem README), service không bao giờ tải qua mạng.
+# (tên package cho nltk.downloader, đường dẫn cho nltk.data.find); punkt_tab chỉ cần cho word_tokenize
+NLTK_RESOURCES = [("stopwords", "corpora/stopwords"), ("wordnet", "corpora/wordnet"),
+                  ("punkt_tab", "tokenizers/punkt_tab")]
+
+
+def find_missing_nltk_resources() -> list:
+    """Tên các package NLTK chưa có trong nltk.data.path (chỉ kiểm tra trên đĩa)."""
+    missing = []
+    for package, resource_path in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            missing.append(package)
+    return missing
 
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
 
 try:
     stop_words_en = set(stopwords.words('english'))
-    lemmatizer = WordNetLemmatizer()
-    # Đảm bảo nltk data đã được tải. Nếu không, cần có bước tải riêng.
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-    nltk.download('wordnet', quiet=True)
+    nltk.data.find('corpora/wordnet')
+    lemmatizer = WordNetLemmatizer()  # WordNet chỉ được đọc ở lần lemmatize đầu tiên (xem MatchPredictor.warmup)
 except LookupError:
-    print("NLTK data not found. Please download them (punkt, stopwords, wordnet).")
-    # Có thể raise lỗi ở đây để dừng ứng dụng nếu cần thiết.
+    print("WARNING: NLTK data not found (stopwords, wordnet), bio text features are disabled. "
+          "Run: python -m nltk.downloader stopwords wordnet punkt_tab")
     stop_words_en = set()
     lemmatizer = None
 
+# Số từ tối đa được ghi nhớ kết quả lemmatize (WordNet lookup khá chậm, còn từ vựng của bio thì nhỏ)
+LEMMA_CACHE_SIZE = 65536
+
+# Các quy tắc tách từ ghép ("cannot" -> "can not", "gonna" -> "gon na", ...) của tokenizer mà word_tokenize dùng.
+# Với text đã bỏ hết dấu câu, đây là các quy tắc duy nhất của NLTKWordTokenizer còn có tác dụng.
+_TOKENIZER_CONTRACTIONS = NLTKWordTokenizer.CONTRACTIONS2 + NLTKWordTokenizer.CONTRACTIONS3
+
 
 # --- Helper Functions from Notebooks (đã được refactor) ---
 
@@ -58,16 +71,33 @@ def calculate_age(born_str: str) -> int | float:
         return np.nan
 
 
-def preprocess_text(text: str | None, use_lemmatization: bool = True) -> str:
+def fast_word_tokenize(text_normalized: str) -> list:
+    """
+    Tách từ cho text đã chuẩn hóa trong preprocess_text (chỉ còn chữ/số và khoảng trắng).
+    Cho kết quả giống word_tokenize trên loại text này: không có dấu câu thì Punkt không tách câu
+    và NLTKWordTokenizer chỉ còn áp dụng các quy tắc contraction, nên không cần gọi cả pipeline.
+    """
+    text_normalized = " " + text_normalized + " "
+    for regexp in _TOKENIZER_CONTRACTIONS:
+        text_normalized = regexp.sub(r" \1 \2 ", text_normalized)
+    return text_normalized.split()
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemmatize_cached(word: str) -> str:
+    return lemmatizer.lemmatize(word)
+
+
+def preprocess_text(text: str | None, use_lemmatization: bool = True, fast_tokenizer: bool = True) -> str:
     if pd.isnull(text) or not lemmatizer:
         return ""
     text_normalized = unidecode(str(text).lower())
     text_normalized = re.sub(r'[^\w\s]', '', text_normalized)
     text_normalized = re.sub(r'\d+', '', text_normalized)
-    tokens = word_tokenize(text_normalized)
+    tokens = fast_word_tokenize(text_normalized) if fast_tokenizer else word_tokenize(text_normalized)
     tokens = [word for word in tokens if word not in stop_words_en and len(word) > 1]
     if use_lemmatization:
-        tokens = [lemmatizer.lemmatize(word) for word in tokens]
+        tokens = [_lemmatize_cached(word) for word in tokens]
     return " ".join(tokens)
 
 
@@ -164,21 +194,26 @@ def jaccard_similarity(list1_str: str | None, list2_str: str | None, separator:
 # ... (các import và hàm helper khác giữ nguyên) ...
 
 # --- Hàm chính để tạo User Feature Vector ---
-def create_user_feature_vector(user_raw_data: dict) -> pd.Series:
+def create_user_feature_vector(user_raw_data: dict, artifacts: PreprocessingArtifacts | None = None) -> pd.Series:
     """
     Tạo vector đặc trưng cho một người dùng từ dữ liệu thô.
     user_raw_data: dictionary chứa thông tin người dùng tương tự một dòng profiles_df.
                    Bao gồm các trường đã được join tên (vd: sex, orientation, job,...)
                    và các trường multi-value đã được ghép thành chuỗi (interests, languages, pets).
+    artifacts: các preprocessor đã được tải sẵn (xem PreprocessingArtifacts). Nếu None,
+               dùng instance mặc định của process.
     """
+    if artifacts is None:
+        artifacts = get_default_artifacts()
+
     user_features_dict = {}  # Sử dụng dict để dễ quản lý rồi chuyển sang Series
 
     # 1. Age and Height
     age = user_raw_data.get('age', np.nan)
     height = user_raw_data.get('height', np.nan)
 
-    scaler_age = joblib.load(os.path.join(MODELS_DIR, "scaler_age.joblib"))
-    scaler_height = joblib.load(os.path.join(MODELS_DIR, "scaler_height.joblib"))
+    scaler_age = artifacts.scaler_age
+    scaler_height = artifacts.scaler_height
 
     age_median_fallback = 25
     height_median_fallback = 68
@@ -191,8 +226,8 @@ def create_user_feature_vector(user_raw_data: dict) -> pd.Series:
     user_features_dict['height_scaled'] = scaler_height.transform(height_df_to_transform)[0, 0]
 
     # 2. Categorical Features (OneHotEncoded)
-    onehot_encoder_categorical = joblib.load(os.path.join(MODELS_DIR, "onehot_encoder_categorical.joblib"))
-    categorical_cols_onehot = ['sex', 'orientation', 'body_type', 'drink', 'smoke']  # Đây là tên các cột gốc
+    onehot_encoder_categorical = artifacts.onehot_encoder_categorical
+    categorical_cols_onehot = CATEGORICAL_COLS_ONEHOT  # Đây là tên các cột gốc
 
     modes = {
         'sex': 'male', 'orientation': 'straight', 'body_type': 'average',
@@ -206,18 +241,18 @@ def create_user_feature_vector(user_raw_data: dict) -> pd.Series:
     encoded_cat_array = onehot_encoder_categorical.transform(cat_df_to_transform)
 
     # Lấy tên cột từ onehot_encoder (đã được fit với tên)
-    onehot_feature_names = onehot_encoder_categorical.get_feature_names_out(categorical_cols_onehot)
+    onehot_feature_names = artifacts.onehot_feature_names
     for i, col_name in enumerate(onehot_feature_names):
         user_features_dict[col_name] = encoded_cat_array[0, i]
 
     # 3. High-Cardinality Categorical (Job, Education)
     # Job
-    top_n_job_categories = joblib.load(os.path.join(MODELS_DIR, "top_n_job_categories.joblib"))
+    top_n_job_categories = artifacts.top_n_job_categories
     job_series = _apply_top_n_categorical_encoding_single(user_raw_data.get('job'), top_n_job_categories, 'job')
     user_features_dict.update(job_series.to_dict())
 
     # Education
-    top_n_edu_categories = joblib.load(os.path.join(MODELS_DIR, "top_n_edu_categories.joblib"))
+    top_n_edu_categories = artifacts.top_n_edu_categories
     edu_series = _apply_top_n_categorical_encoding_single(user_raw_data.get('education_level'), top_n_edu_categories,
                                                           'edu')
     user_features_dict.update(edu_series.to_dict())
@@ -228,48 +263,42 @@ def create_user_feature_vector(user_raw_data: dict) -> pd.Series:
 
     # 5. Multi-value text features (Interests, Languages, Pets)
     # Interests
-    top_interests_items = joblib.load(os.path.join(MODELS_DIR, "top_interests_items.joblib"))
+    top_interests_items = artifacts.top_interests_items
     interests_series = _apply_multivalue_binary_features_single(user_raw_data.get('interests'), top_interests_items,
                                                                 '-', 'interest')
     user_features_dict.update(interests_series.to_dict())
 
     # Languages
-    top_languages_items = joblib.load(os.path.join(MODELS_DIR, "top_languages_items.joblib"))
+    top_languages_items = artifacts.top_languages_items
     languages_series = _apply_multivalue_binary_features_single(user_raw_data.get('languages'), top_languages_items,
                                                                 '-', 'lang')
     user_features_dict.update(languages_series.to_dict())
 
     # Pets
-    top_pets_items = joblib.load(os.path.join(MODELS_DIR, "top_pets_items.joblib"))
+    top_pets_items = artifacts.top_pets_items
     pets_series = _apply_multivalue_binary_features_single(user_raw_data.get('pets'), top_pets_items, '-', 'pet')
     user_features_dict.update(pets_series.to_dict())
 
     # 6. TF-IDF for Bio
-    tfidf_vectorizer_bio = joblib.load(os.path.join(MODELS_DIR, "tfidf_vectorizer_bio.joblib"))
-    processed_bio = preprocess_text(user_raw_data.get('bio'))
-    bio_tfidf_matrix = tfidf_vectorizer_bio.transform([processed_bio])
-    bio_tfidf_array = bio_tfidf_matrix.toarray()[0]
+    # Vector TF-IDF dạng sparse (1 x vocab), được ghi nhớ theo (user id, hash của bio)
+    bio_tfidf_row = artifacts.bio_encoder.transform(user_raw_data.get('bio'), user_id=user_raw_data.get('id'))
+    n_bio_features = bio_tfidf_row.shape[1]
 
     # Lấy tên cột từ TfidfVectorizer (nếu được lưu và có thể truy cập)
     # Hoặc giả định tên cột là bio_tfidf_0, bio_tfidf_1, ...
     # Để an toàn, ta sẽ dùng cách đặt tên theo index nếu không có feature_names_out
-    if hasattr(tfidf_vectorizer_bio, 'get_feature_names_out'):
-        bio_feature_names = [f"bio_tfidf_{name.replace(' ', '_')}" for name in
-                             tfidf_vectorizer_bio.get_feature_names_out()]
-        # Giới hạn số lượng nếu cần, hoặc sử dụng tên cột theo index
-        if len(bio_feature_names) == bio_tfidf_array.shape[0]:
-            for i, col_name in enumerate(bio_feature_names):
-                user_features_dict[col_name] = bio_tfidf_array[i]  # Sửa ở đây
-        else:  # Fallback nếu tên không khớp hoặc max_features làm thay đổi số cột
-            for i in range(bio_tfidf_array.shape[0]):
-                user_features_dict[f"bio_tfidf_{i}"] = bio_tfidf_array[i]
-    else:  # Fallback cho scikit-learn phiên bản cũ hơn
-        for i in range(bio_tfidf_array.shape[0]):
-            user_features_dict[f"bio_tfidf_{i}"] = bio_tfidf_array[i]
+    if artifacts.bio_feature_names is not None and len(artifacts.bio_feature_names) == n_bio_features:
+        bio_feature_names = artifacts.bio_feature_names
+    else:  # Fallback nếu tên không khớp (max_features làm thay đổi số cột) hoặc scikit-learn phiên bản cũ hơn
+        bio_feature_names = [f"bio_tfidf_{i}" for i in range(n_bio_features)]
+    # Chỉ ghi các phần tử khác 0 thay vì densify cả vector
+    user_features_dict.update(dict.fromkeys(bio_feature_names, 0.0))
+    for i, value in zip(bio_tfidf_row.indices, bio_tfidf_row.data):
+        user_features_dict[bio_feature_names[i]] = value
 
     # 7. Geographic Features
     # Location Preference
-    loc_pref_scaler = joblib.load(os.path.join(MODELS_DIR, "location_preference_scaler.joblib"))
+    loc_pref_scaler = artifacts.location_preference_scaler
     loc_pref = user_raw_data.get('location_preference', -1)
     user_features_dict['loc_pref_is_everywhere'] = 1 if loc_pref == -1 else 0
     loc_pref_km = 0 if loc_pref == -1 else loc_pref
@@ -279,8 +308,8 @@ def create_user_feature_vector(user_raw_data: dict) -> pd.Series:
     user_features_dict['location_preference_km_scaled'] = loc_pref_scaler.transform(loc_pref_df_to_transform)[0, 0]
 
     # Latitude/Longitude
-    lat_scaler = joblib.load(os.path.join(MODELS_DIR, "latitude_scaler.joblib"))
-    lon_scaler = joblib.load(os.path.join(MODELS_DIR, "longitude_scaler.joblib"))
+    lat_scaler = artifacts.latitude_scaler
+    lon_scaler = artifacts.longitude_scaler
 
     lat_median_fallback = 21.0
     lon_median_fallback = 105.8
@@ -298,7 +327,7 @@ def create_user_feature_vector(user_raw_data: dict) -> pd.Series:
     user_features_dict['longitude_scaled'] = lon_scaler.transform(lon_df_to_transform)[0, 0]
 
     # Đảm bảo thứ tự cột và đầy đủ các cột như trong user_features_final_columns.joblib
-    user_features_final_columns = joblib.load(os.path.join(MODELS_DIR, "user_features_final_columns.joblib"))
+    user_features_final_columns = artifacts.user_features_final_columns
 
     final_feature_vector_data = {}
     for col in user_features_final_columns:
@@ -307,6 +336,92 @@ def create_user_feature_vector(user_raw_data: dict) -> pd.Series:
     return pd.Series(final_feature_vector_data, index=user_features_final_columns)
 
 
+def _scale(value: float, scaler_params) -> float:
+    # Giống MinMaxScaler.transform: X * scale_ + min_ (rồi clip nếu scaler có clip=True)
+    scale, min_, clip_range = scaler_params
+    scaled = value * scale + min_
+    if clip_range is not None:
+        scaled = min(max(scaled, clip_range[0]), clip_range[1])
+    return scaled
+
+
+def create_user_feature_array(user_raw_data: dict, artifacts: PreprocessingArtifacts | None = None) -> np.ndarray:
+    """
+    Như create_user_feature_vector(...).reindex(...).fillna(0) nhưng trả về mảng np.float32 theo thứ tự
+    cột của artifacts.user_feature_schema: các giá trị được ghi thẳng vào vị trí (offset) tính sẵn,
+    không qua dict theo tên cột, pd.Series hay reindex. Scaler được áp dụng bằng tham số scale_/min_.
+    """
+    if artifacts is None:
+        artifacts = get_default_artifacts()
+    schema = artifacts.user_feature_schema
+    vector = schema.new_vector()
+
+    def put(offset: int, value) -> None:
+        if offset >= 0:
+            vector[offset] = value
+
+    # 1. Age and Height
+    age = user_raw_data.get('age', np.nan)
+    height = user_raw_data.get('height', np.nan)
+    put(schema.age[0], _scale(float(age if pd.notnull(age) else 25), schema.age[1:]))
+    put(schema.height[0], _scale(float(height if pd.notnull(height) else 68), schema.height[1:]))
+
+    # 2. Categorical Features (One-hot, category lạ/None -> toàn 0 như handle_unknown='ignore')
+    modes = {
+        'sex': 'male', 'orientation': 'straight', 'body_type': 'average',
+        'drink': 'socially', 'smoke': 'no'
+    }
+    for col, offsets_by_category in schema.onehot:
+        value = user_raw_data.get(col, modes.get(col))
+        offset = offsets_by_category.get(value, -1) if isinstance(value, str) else -1
+        put(offset, 1.0)
+
+    # 3. High-Cardinality Categorical (Job, Education)
+    for key, (categories, other_offset, known_categories) in (('job', schema.job), ('education_level', schema.edu)):
+        value = user_raw_data.get(key)
+        value_normalized = str(value).strip().lower() if pd.notnull(value) else 'unknown'
+        for offset, category in categories:
+            put(offset, 1.0 if value_normalized == category else 0.0)
+        put(other_offset, 1.0 if value_normalized not in known_categories else 0.0)
+
+    # 4. Binary Indicators
+    put(schema.dropped_out_school, int(user_raw_data.get('dropped_out_school', 0) or 0))
+    put(schema.interested_in_new_language, int(user_raw_data.get('interested_in_new_language', 0) or 0))
+
+    # 5. Multi-value text features (Interests, Languages, Pets)
+    for key, items in (('interests', schema.interests), ('languages', schema.languages), ('pets', schema.pets)):
+        value_str = user_raw_data.get(key)
+        items_in_value = set()
+        if pd.notnull(value_str):
+            items_in_value = set(
+                unidecode(item.strip().lower()) for item in str(value_str).split('-') if item.strip())
+        for offset, item in items:
+            put(offset, 1.0 if item in items_in_value else 0.0)
+
+    # 6. TF-IDF for Bio (bỏ qua nếu không cột bio nào có trong vector cuối cùng)
+    if schema.bio_needed:
+        bio_tfidf_row = artifacts.bio_encoder.transform(user_raw_data.get('bio'), user_id=user_raw_data.get('id'))
+        bio_offsets = schema.bio_offsets[bio_tfidf_row.indices]
+        present = bio_offsets >= 0
+        vector[bio_offsets[present]] = bio_tfidf_row.data[present]
+
+    # 7. Geographic Features
+    loc_pref = user_raw_data.get('location_preference', -1)
+    put(schema.loc_pref_is_everywhere, 1 if loc_pref == -1 else 0)
+    loc_pref_km = 0 if loc_pref == -1 else loc_pref
+    put(schema.location_preference[0],
+        _scale(float(loc_pref_km) if pd.notnull(loc_pref_km) else np.nan, schema.location_preference[1:]))
+
+    latitude = user_raw_data.get('latitude', 21.0)
+    longitude = user_raw_data.get('longitude', 105.8)
+    put(schema.latitude[0], _scale(float(latitude if pd.notnull(latitude) else 21.0), schema.latitude[1:]))
+    put(schema.longitude[0], _scale(float(longitude if pd.notnull(longitude) else 105.8), schema.longitude[1:]))
+
+    # Giá trị thiếu (NaN) -> 0, giống fillna(0) sau reindex
+    vector[np.isnan(vector)] = 0.0
+    return vector.astype(schema.dtype)
+
+
 # --- Hàm chính để tạo Pairwise Feature Vector ---
 # app/ml/preprocessing.py
 # ... (các import và hàm helper khác giữ nguyên, bao gồm cả MODELS_DIR) ...
@@ -0,0 +1,216 @@
+# app/ml/tree_evaluator.py
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Số cây được đánh giá cùng lúc giữa hai lần kiểm tra early exit
+TREE_GROUP_SIZE = 10
+# Sai số cho phép khi so sánh raw score với ngưỡng (thứ tự cộng khác LightGBM); dòng nằm trong
+# khoảng này sau khi đã cộng đủ các cây được tính lại bằng Booster để quyết định chính xác
+RAW_SCORE_MARGIN = 1e-9
+
+# missing_type trong tree dump của LightGBM
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+# kZeroThreshold của LightGBM: |x| <= giá trị này được coi là 0 (missing_type "Zero")
+ZERO_THRESHOLD = 1e-35
+
+
+def _flatten_tree(structure: dict) -> Dict[str, list]:
+    tree = {key: [] for key in ("feature", "threshold", "default_left", "missing_type", "left", "right",
+                                "value", "leaves")}
+    depth = 0
+    stack = [(structure, 0, None, None)]  # (node, depth, parent index, nhánh trái?)
+    while stack:
+        node, node_depth, parent, is_left = stack.pop()
+        index = len(tree["feature"])
+        if parent is not None:
+            tree["left" if is_left else "right"][parent] = index
+        if "split_index" not in node:
+            tree["feature"].append(0)
+            tree["threshold"].append(np.inf)
+            tree["default_left"].append(True)
+            tree["missing_type"].append(MISSING_NONE)
+            tree["left"].append(index)
+            tree["right"].append(index)
+            tree["value"].append(float(node["leaf_value"]))
+            tree["leaves"].append(index)
+            depth = max(depth, node_depth)
+            continue
+        if node["decision_type"] != "<=":
+            raise ValueError(f"Unsupported decision type '{node['decision_type']}' (categorical split)")
+        tree["feature"].append(int(node["split_feature"]))
+        tree["threshold"].append(float(node["threshold"]))
+        tree["default_left"].append(bool(node["default_left"]))
+        tree["missing_type"].append(_MISSING_TYPES[node["missing_type"]])
+        tree["left"].append(index)
+        tree["right"].append(index)
+        tree["value"].append(0.0)
+        stack.append((node["right_child"], node_depth + 1, index, False))
+        stack.append((node["left_child"], node_depth + 1, index, True))
+    tree["depth"] = depth
+    return tree
+
+
+def dump_trees(booster) -> Tuple[List[Dict[str, list]], float]:
+    """
+    Các cây của model LightGBM binary dưới dạng phẳng (_flatten_tree) và hệ số sigmoid của objective.
+    Ném ValueError nếu model không được hỗ trợ (không phải binary, random forest, split categorical).
+    """
+    dump = booster.dump_model()
+    objective = str(dump.get("objective", "")).split()
+    if not objective or objective[0] != "binary" or dump.get("num_tree_per_iteration", 1) != 1:
+        raise ValueError(f"Early-exit evaluation only supports binary models, got '{dump.get('objective')}'")
+    sigmoid = 1.0
+    for param in objective[1:]:
+        if param.startswith("sigmoid:"):
+            sigmoid = float(param.split(":", 1)[1])
+    if dump.get("average_output"):
+        raise ValueError("Early-exit evaluation does not support averaged output (random forest)")
+    # Cùng số cây với Booster.predict(num_iteration=None) (best_iteration nếu có)
+    trees = [_flatten_tree(tree_info["tree_structure"]) for tree_info in dump["tree_info"]]
+    if not trees:
+        raise ValueError("Model has no trees")
+    return trees, sigmoid
+
+
+class _TreeGroup:
+    """
+    Một nhóm cây liên tiếp dưới dạng mảng phẳng (cây i chiếm các node [i * width, (i + 1) * width)).
+    Lá cũng là node, có hai con là chính nó, nên duyệt đủ `depth` bước là mọi dòng đều ở lá.
+
+    Node k được đánh số 2k: thuộc tính của node được lặp 2 lần và children[2k] / children[2k + 1]
+    là con trái / phải (đã nhân 2), nên mỗi bước chỉ cần một lần gather: children[node + go_right].
+    """
+
+    def __init__(self, trees: List[Dict[str, list]]):
+        self.size = len(trees)
+        width = max(len(tree["feature"]) for tree in trees)
+        self.depth = max(tree["depth"] for tree in trees)
+        self.roots = np.arange(self.size, dtype=np.int64) * width * 2
+
+        def stack(key, dtype, fill, offset=False):
+            values = np.full((self.size, width), fill, dtype=dtype)
+            for i, tree in enumerate(trees):
+                values[i, :len(tree[key])] = tree[key]
+                if offset:
+                    values[i] += i * width
+            return values.ravel()
+
+        self.feature = np.repeat(stack("feature", np.int64, 0), 2)
+        self.threshold = np.repeat(stack("threshold", np.float64, np.inf), 2)
+        self.default_left = np.repeat(stack("default_left", bool, True), 2)
+        self.missing_type = np.repeat(stack("missing_type", np.int8, MISSING_NONE), 2)
+        self.value = np.repeat(stack("value", np.float64, 0.0), 2)
+        self.children = np.empty(self.feature.size, dtype=np.int64)
+        self.children[0::2] = stack("left", np.int64, 0, offset=True) * 2
+        self.children[1::2] = stack("right", np.int64, 0, offset=True) * 2
+        self.has_zero_missing = bool((self.missing_type == MISSING_ZERO).any())
+
+    def raw_scores(self, matrix: np.ndarray, has_nan: bool) -> np.ndarray:
+        """Tổng leaf value của các cây trong nhóm cho từng dòng của matrix (float64, C-contiguous)."""
+        n_rows, n_features = matrix.shape
+        flat = matrix.ravel()
+        row_base = np.arange(n_rows, dtype=np.int64)[:, None] * n_features
+        node = np.broadcast_to(self.roots, (n_rows, self.size)).copy()
+        for _ in range(self.depth):
+            values = flat[row_base + self.feature[node]]
+            if has_nan or self.has_zero_missing:
+                # Giống Tree::NumericalDecision: NaN thành 0 nếu missing_type khác NaN,
+                # giá trị missing (0 với "Zero", NaN với "NaN") đi theo default_left
+                missing_type = self.missing_type[node]
+                use_default = np.zeros(values.shape, dtype=bool)
+                if has_nan:
+                    is_nan = np.isnan(values)
+                    use_default |= is_nan & (missing_type == MISSING_NAN)
+                    values = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, values)
+                if self.has_zero_missing:
+                    use_default |= (missing_type == MISSING_ZERO) & (np.abs(values) <= ZERO_THRESHOLD)
+                go_right = np.where(use_default, ~self.default_left[node], ~(values <= self.threshold[node]))
+            else:
+                go_right = ~(values <= self.threshold[node])
+            node = self.children[node + go_right]
+        return self.value[node].sum(axis=1)
+
+
+class EarlyExitTreeEvaluator:
+    """
+    Đánh giá model LightGBM binary bằng NumPy từ tree dump, chỉ để trả lời "proba > threshold?".
+
+    Raw score được cộng dần theo từng nhóm TREE_GROUP_SIZE cây; sau mỗi nhóm, dòng nào có
+    raw + tổng leaf value lớn nhất (nhỏ nhất) của các cây còn lại vẫn dưới (trên) ngưỡng raw
+    tương ứng với threshold thì đã chắc chắn kết quả và được bỏ khỏi các nhóm sau.
+    Dòng còn sát ngưỡng sau khi cộng đủ các cây được tính lại bằng Booster, nên kết quả luôn
+    giống hệt Booster.predict(...) > threshold. Không cho xác suất: cần xếp hạng thì dùng Booster.
+    """
+
+    def __init__(self, booster, group_size: int = TREE_GROUP_SIZE, margin: float = RAW_SCORE_MARGIN,
+                 trees: Optional[List[Dict[str, Sequence]]] = None, sigmoid: float = 1.0, num_threads: int = 0):
+        """
+        trees, sigmoid: kết quả của dump_trees(booster) nếu đã có sẵn (vd: từ ModelBundle), tránh dump lại model.
+        num_threads: số thread LightGBM khi tính lại bằng Booster.predict (như MatchPredictor.num_threads).
+        """
+        if trees is None:
+            trees, sigmoid = dump_trees(booster)
+        self.sigmoid = sigmoid
+        self.booster = booster
+        self.num_threads = num_threads
+        self.num_features = booster.num_feature()
+        self.margin = margin
+        self.num_trees = len(trees)
+        self.groups = [_TreeGroup(trees[start:start + group_size]) for start in range(0, len(trees), group_size)]
+
+        # Tổng leaf value lớn nhất / nhỏ nhất của các nhóm còn lại sau nhóm thứ i
+        leaf_values = [np.asarray(tree["value"], dtype=np.float64)[tree["leaves"]] for tree in trees]
+        group_max = [sum(float(values.max()) for values in leaf_values[start:start + group_size])
+                     for start in range(0, len(trees), group_size)]
+        group_min = [sum(float(values.min()) for values in leaf_values[start:start + group_size])
+                     for start in range(0, len(trees), group_size)]
+        self.remaining_max = np.append(np.cumsum(group_max[::-1])[::-1][1:], 0.0)
+        self.remaining_min = np.append(np.cumsum(group_min[::-1])[::-1][1:], 0.0)
+
+    def raw_threshold(self, threshold: float) -> Optional[float]:
+        """Ngưỡng raw score tương ứng với xác suất `threshold` (None nếu threshold ngoài (0, 1))."""
+        if not 0.0 < threshold < 1.0:
+            return None
+        return math.log(threshold / (1.0 - threshold)) / self.sigmoid
+
+    def predict_above(self, matrix: np.ndarray, threshold: float, stats: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """
+        Mảng bool: xác suất lớp 1 của từng dòng > threshold (giống hệt Booster.predict(matrix) > threshold).
+        stats (nếu có) được ghi: số dòng, số dòng phải tính lại bằng Booster, tỉ lệ (dòng x cây) đã đánh giá.
+        """
+        matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+        n_rows = matrix.shape[0]
+        raw_threshold = self.raw_threshold(threshold)
+        if raw_threshold is None or n_rows == 0:
+            if n_rows == 0:
+                return np.zeros(0, dtype=bool)
+            return self.booster.predict(matrix, num_threads=self.num_threads) > threshold
+
+        above = np.zeros(n_rows, dtype=bool)
+        active = np.arange(n_rows)
+        raw = np.zeros(n_rows, dtype=np.float64)
+        active_matrix = matrix
+        has_nan = bool(np.isnan(matrix).any())
+        tree_evaluations = 0
+        for group, remaining_max, remaining_min in zip(self.groups, self.remaining_max, self.remaining_min):
+            raw += group.raw_scores(active_matrix, has_nan)
+            tree_evaluations += group.size * active.size
+            decided_above = raw + remaining_min > raw_threshold + self.margin
+            decided = decided_above | (raw + remaining_max < raw_threshold - self.margin)
+            if decided.any():
+                above[active[decided_above]] = True
+                undecided = ~decided
+                active, raw, active_matrix = active[undecided], raw[undecided], active_matrix[undecided]
+                if active.size == 0:
+                    break
+
+        if active.size:
+            # Sát ngưỡng: quyết định bằng xác suất chính xác của Booster
+            above[active] = self.booster.predict(matrix[active], num_threads=self.num_threads) > threshold
+        if stats is not None:
+            stats.update({"rows": n_rows, "exact_fallback_rows": int(active.size),
+                          "tree_fraction": tree_evaluations / (n_rows * self.num_trees)})
+        return above
@@ -3,5 +3,8 @@ from .user import (UserBase, UserCreate, UserResponse, ProfileBase, ProfileCreat
                    ProfileResponse, LocationBase, LocationCreate, LocationUpdate, LocationResponse,
                    PetResponse, InterestResponse, LanguageResponse, ProfileDetailForML,
                    RoleBase, RoleCreate, RoleResponse) # Thêm Role schemas vào đây
-from .match import PotentialMatchResponse
+from .match import (PotentialMatch, PotentialMatchResponse, BatchPotentialMatchesRequest, BatchPotentialMatchResult,
+                    BatchPotentialMatchesResponse)
+from .event import UserUpdatedEvent, UserUpdatedEventAccepted
+from .admin import ModelReloadRequest, ModelReloadStatus, ModelStatusResponse
 # from .token import Token, TokenData # Nếu có auth
\ No newline at end of file
@@ -0,0 +1,24 @@
+# app/schemas/admin.py
+from datetime import datetime
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class ModelReloadRequest(BaseModel):
+    version: Optional[str] = None # Tên thư mục version trong ml_models/ (None = version mới nhất)
+
+
+class ModelReloadStatus(BaseModel):
+    state: str # "idle", "loading" hoặc "failed" (lần reload gần nhất bị lỗi, model cũ vẫn đang được dùng)
+    target_version: Optional[str] = None # Version của lần reload gần nhất
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ModelStatusResponse(BaseModel):
+    active_version: Optional[str] = None # None nếu chưa tải được model nào
+    model_version: Optional[str] = None # Hash của best_overall_model.joblib (namespace của cache kết quả)
+    loaded_at: Optional[datetime] = None
+    available_versions: List[str] # Cũ trước mới sau
+    reload: ModelReloadStatus
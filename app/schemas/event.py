@@ -0,0 +1,12 @@
+# app/schemas/event.py
+from pydantic import BaseModel, Field
+
+
+class UserUpdatedEvent(BaseModel):
+    user_id: int = Field(gt=0) # User có profile / location / sở thích vừa thay đổi (hoặc bị xóa, đổi role)
+
+
+class UserUpdatedEventAccepted(BaseModel):
+    user_id: int
+    coalesced: bool # True nếu được gộp vào sự kiện đang chờ xử lý của cùng user
+    queue_depth: int # Số user đang chờ chấm điểm lại
@@ -1,12 +1,40 @@
 # app/schemas/match.py
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from app.core.config import settings
 
 # Hiện tại API chỉ nhận user_id, không cần request body phức tạp
 # class MatchPredictionRequest(BaseModel):
 #     user1_id: int
 # user2_id: int # Hoặc list user_ids để check
 
+class PotentialMatch(BaseModel):
+    user_id: int
+    score: float # Xác suất match do model dự đoán
+
+
 class PotentialMatchResponse(BaseModel):
     user_id: int
-    potential_match_ids: List[int]
\ No newline at end of file
+    potential_match_ids: List[int] # Giữ lại cho client cũ, cùng thứ tự với `matches`
+    matches: List[PotentialMatch] = [] # Xếp theo score giảm dần
+    next_cursor: Optional[str] = None # None nếu không còn trang sau
+
+
+class BatchPotentialMatchesRequest(BaseModel):
+    user_ids: List[int] = Field(min_length=1, max_length=settings.POTENTIAL_MATCHES_BATCH_MAX_USERS)
+    limit: int = Field(default=settings.POTENTIAL_MATCHES_DEFAULT_LIMIT, ge=1, le=settings.POTENTIAL_MATCHES_MAX_LIMIT)
+    min_score: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+
+
+class BatchPotentialMatchResult(BaseModel):
+    user_id: int
+    status_code: int = 200 # HTTP status của riêng user này (400/403/404/500 nếu lỗi)
+    error: Optional[str] = None
+    potential_match_ids: List[int] = []
+    matches: List[PotentialMatch] = []
+    next_cursor: Optional[str] = None # Dùng với GET /users/{user_id}/potential-matches để lấy trang sau
+
+
+class BatchPotentialMatchesResponse(BaseModel):
+    results: List[BatchPotentialMatchResult] # Cùng thứ tự với user_ids của request (đã bỏ id trùng)
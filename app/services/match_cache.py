@@ -0,0 +1,356 @@
+# app/services/match_cache.py
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+def _rank_key(entry) -> Tuple[float, int]:
+    """Thứ tự xếp hạng của [user_id, score]: score giảm dần, hòa thì user id tăng dần."""
+    return -entry[1], entry[0]
+
+
+class MatchCacheBackend(ABC):
+    """
+    Interface cho backend lưu kết quả potential matches. Giá trị là list/dict/số (JSON-serializable)
+    để backend dùng chung giữa các process (vd: Redis, memcached) có thể tự serialize.
+    TTL do backend quản lý.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Giá trị của key, None nếu không có hoặc đã hết hạn."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        """Ghi value cho key, hết hạn sau ttl_seconds giây."""
+
+    @abstractmethod
+    def delete(self, keys: Iterable[str]) -> None:
+        """Xóa các key (key không có thì bỏ qua)."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Xóa mọi entry."""
+
+    def stats(self) -> Dict[str, int]:
+        """Counter riêng của backend (vd: evictions); mặc định không có."""
+        return {}
+
+
+class InMemoryMatchCacheBackend(MatchCacheBackend):
+    """Backend trong process: TTL theo từng entry và giới hạn số entry theo LRU."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max(max_entries, 1)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "evictions": self._evictions, "expirations": self._expirations}
+
+
+class _IndexedEntry:
+    """Thông tin của một entry đã ghi (trong reverse index của MatchResultCache)."""
+
+    __slots__ = ("owner_id", "members", "last", "complete", "expires_at")
+
+    def __init__(self, owner_id: int, members: Tuple[int, ...], last: Optional[list], complete: bool,
+                 expires_at: float):
+        self.owner_id = owner_id
+        self.members = members  # User id có trong entry
+        self.last = last  # [user_id, score] cuối của "ranked" (None với "ids")
+        self.complete = complete
+        self.expires_at = expires_at
+
+    def would_include(self, user_id: int, score: float) -> bool:
+        """user_id với score (> threshold) có nằm trong entry nếu entry được tính lại không."""
+        return self.complete or (self.last is not None and _rank_key([user_id, score]) < _rank_key(self.last))
+
+
+class _Change:
+    """Một lần user thay đổi (apply_rescored_user / invalidate_users), để phát hiện ghi cũ (xem set_ranking)."""
+
+    __slots__ = ("seq", "user_id", "owner_ids", "scores")
+
+    def __init__(self, seq: int, user_id: int, reverse_scores: Dict[int, float]):
+        self.seq = seq
+        self.user_id = user_id
+        # Score mới owner -> user_id (> threshold), sắp xếp theo owner id để tra bằng np.searchsorted
+        self.owner_ids = np.fromiter(reverse_scores.keys(), dtype=np.int64, count=len(reverse_scores))
+        self.scores = np.fromiter(reverse_scores.values(), dtype=np.float64, count=len(reverse_scores))
+        order = np.argsort(self.owner_ids)
+        self.owner_ids, self.scores = self.owner_ids[order], self.scores[order]
+
+    def score_for(self, owner_id: int) -> Optional[float]:
+        position = int(np.searchsorted(self.owner_ids, owner_id))
+        if position < len(self.owner_ids) and self.owner_ids[position] == owner_id:
+            return float(self.scores[position])
+        return None
+
+
+class MatchResultCache:
+    """
+    Cache kết quả potential matches theo user id, đặt trước MatchService.
+
+    Key gồm namespace (model version + cấu hình ảnh hưởng kết quả như threshold, GEO_FILTER_MODE),
+    nên đổi model hay cấu hình sẽ không đọc nhầm kết quả cũ. Hai loại entry cho mỗi user:
+    - "ids": kết quả của get_potential_matches (thứ tự giữ nguyên).
+    - "ranked": top-K [(user_id, score)] đã xếp hạng (phần đầu của danh sách, "complete" cho biết đã đủ danh
+      sách chưa); các trang nằm trong top-K được cắt từ đây.
+
+    Khi profile của một user thay đổi, apply_rescored_user (POST /events/user-updated) xóa các entry có chứa user
+    đó hoặc sẽ chứa user đó với score mới, tìm qua reverse index trong process (user id -> các entry chứa nó,
+    tối đa max_indexed_entries entry, entry cũ nhất bị xóa khỏi cả backend khi vượt quá). Index chỉ biết các
+    entry do process này ghi: với backend dùng chung nhiều process, entry của process khác hết hạn theo TTL.
+    Ghi kết quả đã tính từ dữ liệu cũ (request chạy song song với apply_rescored_user) bị bỏ qua: caller lấy
+    write_token() trước khi tính và truyền vào set_ids / set_ranking.
+    """
+
+    KINDS = ("ids", "ranked")
+    # Kích thước tối đa của lịch sử thay đổi (số thay đổi + tổng số owner id của chúng, 16 byte mỗi owner);
+    # token cũ hơn phần lịch sử còn giữ được coi là đã cũ
+    CHANGE_HISTORY_MAX_SIZE = 1_000_000
+
+    def __init__(self, backend: MatchCacheBackend, ttl_seconds: float, namespace: str = "",
+                 max_indexed_entries: int = 10000):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.max_indexed_entries = max(max_indexed_entries, 1)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._stale_writes = 0
+        # Reverse index: key -> entry đã ghi (thứ tự ghi, để bỏ entry cũ nhất), user id -> các key chứa user đó
+        self._index: "OrderedDict[str, _IndexedEntry]" = OrderedDict()
+        self._holders: Dict[int, Set[str]] = {}
+        # Lịch sử thay đổi gần đây (seq tăng dần); token < _history_floor thì không còn đủ lịch sử để kiểm tra
+        self._seq = 0
+        self._changes: Deque[_Change] = deque()
+        self._history_size = 0
+        self._history_floor = 0
+
+    def _key(self, kind: str, user_id: int) -> str:
+        return f"potential-matches:{self.namespace}:{kind}:{user_id}"
+
+    def _get(self, kind: str, user_id: int) -> Optional[Any]:
+        try:
+            value = self.backend.get(self._key(kind, user_id))
+        except Exception as e:  # Backend dùng chung lỗi -> coi như miss, không làm hỏng request
+            print(f"WARNING: Match result cache get failed: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return value
+
+    def _delete(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        try:
+            self.backend.delete(keys)
+        except Exception as e:
+            print(f"WARNING: Match result cache delete failed: {e}")
+
+    def write_token(self) -> int:
+        """Lấy trước khi tính kết quả, truyền vào set_ids / set_ranking để bỏ qua kết quả đã cũ khi ghi."""
+        with self._lock:
+            return self._seq
+
+    def _is_stale(self, owner_id: int, members: Set[int], last: Optional[list], complete: bool, token: int) -> bool:
+        """Có thay đổi nào sau token làm entry (owner_id, members, ...) vừa tính khác đi không (gọi khi giữ _lock)."""
+        if token < self._history_floor:
+            return True
+        for change in reversed(self._changes):
+            if change.seq <= token:
+                break
+            if change.user_id == owner_id or change.user_id in members:
+                return True
+            score = change.score_for(owner_id)
+            if score is not None and (complete or (last is not None and _rank_key([change.user_id, score])
+                                                   < _rank_key(last))):
+                return True
+        return False
+
+    def _unindex(self, key: str) -> None:
+        """Bỏ key khỏi reverse index (gọi khi giữ _lock)."""
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        for member in entry.members:
+            holders = self._holders.get(member)
+            if holders is not None:
+                holders.discard(key)
+                if not holders:
+                    del self._holders[member]
+
+    def _set(self, kind: str, user_id: int, value: Any, members: Tuple[int, ...], last: Optional[list],
+             complete: bool, token: Optional[int]) -> None:
+        key = self._key(kind, user_id)
+        member_set = set(members)
+        evicted: List[str] = []
+        with self._lock:
+            if token is not None and self._is_stale(user_id, member_set, last, complete, token):
+                self._stale_writes += 1
+                return
+            self._unindex(key)
+            now = time.monotonic()
+            self._index[key] = _IndexedEntry(user_id, members, last, complete, now + self.ttl_seconds)
+            for member in member_set:
+                self._holders.setdefault(member, set()).add(key)
+            # Entry hết hạn (TTL như nhau nên nằm ở đầu) hoặc vượt quá max_indexed_entries bị bỏ khỏi index;
+            # entry vượt quá cũng bị xóa khỏi backend để backend không giữ entry mà index không biết
+            while self._index:
+                oldest_key, oldest = next(iter(self._index.items()))
+                if oldest.expires_at > now and len(self._index) <= self.max_indexed_entries:
+                    break
+                if oldest.expires_at > now:
+                    evicted.append(oldest_key)
+                self._unindex(oldest_key)
+        try:
+            self.backend.set(key, value, self.ttl_seconds)
+        except Exception as e:
+            print(f"WARNING: Match result cache set failed: {e}")
+        if token is not None:
+            # Thay đổi xảy ra giữa lần kiểm tra ở trên và lúc ghi xong: apply_rescored_user có thể đã xóa key
+            # trước khi giá trị cũ được ghi
+            with self._lock:
+                if self._is_stale(user_id, member_set, last, complete, token):
+                    self._stale_writes += 1
+                    self._unindex(key)
+                    evicted.append(key)
+        self._delete(evicted)
+
+    def get_ids(self, user_id: int) -> Optional[List[int]]:
+        value = self._get("ids", user_id)
+        return None if value is None else [int(uid) for uid in value]
+
+    def set_ids(self, user_id: int, match_ids: List[int], token: Optional[int] = None) -> None:
+        """token: write_token() lấy trước khi tính match_ids (None = ghi luôn)."""
+        match_ids = [int(uid) for uid in match_ids]
+        self._set("ids", user_id, match_ids, tuple(match_ids), None, True, token)
+
+    def get_ranking(self, user_id: int) -> Optional[Tuple[List[Tuple[int, float]], bool]]:
+        """(phần đầu của danh sách xếp hạng, complete) hoặc None nếu chưa cache."""
+        value = self._get("ranked", user_id)
+        if value is None:
+            return None
+        return [(int(uid), float(score)) for uid, score in value["entries"]], bool(value["complete"])
+
+    def set_ranking(self, user_id: int, ranking: List[Tuple[int, float]], complete: bool,
+                    token: Optional[int] = None) -> None:
+        """
+        ranking: phần đầu của danh sách xếp hạng; complete: ranking là toàn bộ danh sách.
+        token: write_token() lấy trước khi tính ranking (None = ghi luôn).
+        """
+        entries = [[int(uid), float(score)] for uid, score in ranking]
+        self._set("ranked", user_id, {"entries": entries, "complete": complete},
+                  tuple(entry[0] for entry in entries), entries[-1] if entries else None, complete, token)
+
+    def _record_change(self, user_id: int, reverse_scores: Dict[int, float]) -> None:
+        """Ghi lại thay đổi của user_id vào lịch sử (gọi khi giữ _lock)."""
+        self._seq += 1
+        change = _Change(self._seq, user_id, reverse_scores)
+        self._changes.append(change)
+        self._history_size += len(change.owner_ids) + 1
+        while self._history_size > self.CHANGE_HISTORY_MAX_SIZE and len(self._changes) > 1:
+            dropped = self._changes.popleft()
+            self._history_size -= len(dropped.owner_ids) + 1
+            self._history_floor = dropped.seq
+
+    def apply_rescored_user(self, user_id: int, ranking: Optional[Tuple[List[Tuple[int, float]], bool]],
+                            reverse_scores: Dict[int, float]) -> None:
+        """
+        Cập nhật cache sau khi mọi cặp chứa user_id được chấm điểm lại:
+        - kết quả của chính user_id: "ranked" được thay bằng ranking ((entries, complete), None = xóa), "ids" bị xóa.
+        - entry của user khác bị xóa nếu có chứa user_id, hoặc nếu user_id với score mới owner -> user_id
+          (reverse_scores, chỉ gồm score > threshold) sẽ nằm trong phần đã cache. Entry không bị ghi lại
+          (không làm mới TTL / thứ tự LRU của backend); request sau tính lại entry đó.
+        Dùng reverse index nên không đọc backend (O(số entry trong index) phép tra dict), một lần delete cho mọi
+        entry bị ảnh hưởng.
+        """
+        with self._lock:
+            self._record_change(user_id, reverse_scores)
+            stale_keys = set(self._holders.get(user_id, ()))
+            stale_keys.update(self._key(kind, user_id) for kind in self.KINDS)
+            for key, entry in self._index.items():
+                score = reverse_scores.get(entry.owner_id)
+                if score is not None and entry.would_include(user_id, score):
+                    stale_keys.add(key)
+            for key in stale_keys:
+                self._unindex(key)
+        self._delete(sorted(stale_keys))
+        if ranking is not None:
+            self.set_ranking(user_id, *ranking)
+
+    def invalidate_user(self, user_id: int) -> None:
+        self.invalidate_users([user_id])
+
+    def invalidate_users(self, user_ids: Iterable[int]) -> None:
+        """Xóa kết quả của chính các user này (kết quả của user khác có chứa họ thì không)."""
+        user_ids = list(user_ids)
+        keys = [self._key(kind, user_id) for user_id in user_ids for kind in self.KINDS]
+        with self._lock:
+            for user_id in user_ids:
+                self._record_change(user_id, {})
+            for key in keys:
+                self._unindex(key)
+            self._invalidations += len(user_ids)
+        self._delete(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index.clear()
+            self._holders.clear()
+            self._changes.clear()
+            self._history_size = 0
+            self._seq += 1
+            self._history_floor = self._seq
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counters = {"hits": self._hits, "misses": self._misses, "invalidations": self._invalidations,
+                        "stale_writes": self._stale_writes}
+        counters.update(self.backend.stats())
+        return counters
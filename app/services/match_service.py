@@ -1,21 +1,468 @@
 # app/services/match_service.py
+import base64
+import binascii
+import bisect
+import heapq
+import json
+
+import numpy as np
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 from fastapi import HTTPException
 
 from app.db import crud, models
 from app.ml.predictor import MatchPredictor
+from app.ml.feature_store import UserFeatureSnapshot, UserFeatureStore
+from app.services.match_cache import MatchResultCache
+from app.services.scoring_pool import ShardedScoringPool
+from app.ml.pairwise_engine import UserColumns, geodesic_distance_km_vectorized
 from app.core.config import settings
-from app.ml.preprocessing import orientation_compatibility  # Import trực tiếp để sử dụng
+from app.core.metrics import (SOURCE_DB, SOURCE_POOL, SOURCE_STORE, STAGE_ANN_RETRIEVAL, STAGE_BATCH_MATCHES,
+                              STAGE_GEO_FILTER, STAGE_POTENTIAL_MATCHES, STAGE_PRECOMPUTED_MATCHES,
+                              STAGE_RANKED_MATCHES, STAGE_SHARD_SCORING, STAGE_STORE_CANDIDATES, STAGE_USER_UPDATES,
+                              candidates_per_request, metrics, scored_candidates_total)
+from app.ml.compatibility import ORIENTATION_COMPATIBILITY_TABLE, Bucket, bucket_key
+from app.ml.geo_index import (GEO_FILTER_HARD, GEO_FILTER_MODES, GEO_FILTER_OFF, GEO_FILTER_SOFT,
+                              apply_location_filter, bounding_boxes, has_finite_radius, mutual_location_mask)
+
+# Một chunk đã chấm điểm: (user ids, xác suất, khoảng cách km hoặc None nếu không tính).
+# Với threshold_only=True, phần tử thứ hai là mảng bool "xác suất > MATCH_PROBABILITY_THRESHOLD"
+ScoredChunk = Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]
+# Vị trí trong danh sách xếp hạng: (score, user_id) của phần tử cuối trang trước
+MatchCursor = Tuple[float, int]
+# Kết quả của một user trong batch: ([(user_id, score)], has_more) hoặc lỗi riêng của user đó
+BatchMatchResult = Union[Tuple[List[Tuple[int, float]], bool], HTTPException]
+
+# Nguồn của get_ranked_potential_matches (settings.POTENTIAL_MATCHES_SOURCE)
+MATCH_SOURCE_ONLINE = "online"
+MATCH_SOURCE_PRECOMPUTED = "precomputed"
+MATCH_SOURCES = (MATCH_SOURCE_ONLINE, MATCH_SOURCE_PRECOMPUTED)
+
+
+def encode_match_cursor(score: float, user_id: int) -> str:
+    """Mã hóa vị trí (score, user_id) thành cursor dạng chuỗi opaque cho client."""
+    payload = json.dumps({"s": score, "id": user_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_match_cursor(cursor: str) -> MatchCursor:
+    """Giải mã cursor; ném ValueError nếu cursor không hợp lệ."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(payload["s"]), int(payload["id"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class _TopMatches:
+    """
+    Top-`capacity` candidate theo thứ tự xếp hạng (score giảm dần, hòa thì user id tăng dần), chỉ gồm các
+    candidate có score > threshold, >= min_score (nếu có) và đứng sau `after` (nếu có).
+    Dùng min-heap kích thước capacity nên bộ nhớ là O(capacity), không giữ/sắp xếp toàn bộ danh sách đã chấm điểm.
+    """
+
+    def __init__(self, capacity: int, threshold: float, min_score: Optional[float] = None,
+                 after: Optional[MatchCursor] = None):
+        self.capacity = max(capacity, 1)
+        self.threshold = threshold
+        self.min_score = min_score
+        self.after = after
+        # Min-heap theo thứ tự xếp hạng (score, -user_id): phần tử "tệ nhất" nằm ở đỉnh
+        self._heap: List[Tuple[float, int]] = []
+
+    def push(self, ids: np.ndarray, probas: np.ndarray) -> None:
+        with np.errstate(invalid='ignore'):
+            keep = probas > self.threshold
+            if self.min_score is not None:
+                keep &= probas >= self.min_score
+        if self.after is not None:
+            after_score, after_id = self.after
+            id_values = ids.astype(np.int64)
+            keep &= (probas < after_score) | ((probas == after_score) & (id_values > after_id))
+        if not keep.any():
+            return
+
+        chunk_ids, chunk_probas = ids[keep].astype(np.int64), probas[keep]
+        if chunk_probas.size > self.capacity:
+            # Chỉ cần top-capacity của chunk trước khi đưa vào heap
+            top = np.argpartition(-chunk_probas, self.capacity - 1)[:self.capacity]
+            # argpartition không ổn định với các score bằng nhau ở biên -> lấy thêm các phần tử hòa
+            boundary = chunk_probas[top].min()
+            top = np.flatnonzero(chunk_probas >= boundary)
+            chunk_ids, chunk_probas = chunk_ids[top], chunk_probas[top]
+
+        heap = self._heap
+        for uid, score in zip(chunk_ids.tolist(), chunk_probas.tolist()):
+            item = (score, -uid)
+            if len(heap) < self.capacity:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    def floor(self) -> float:
+        """Candidate có score <= giá trị này chắc chắn không vào top (dùng để bỏ qua sớm khi chấm điểm)."""
+        floor = self.threshold
+        if self.min_score is not None:
+            floor = max(floor, float(np.nextafter(self.min_score, -np.inf)))
+        if len(self._heap) >= self.capacity:
+            # Score bằng phần tử tệ nhất vẫn có thể vào heap nếu user id nhỏ hơn
+            floor = max(floor, float(np.nextafter(self._heap[0][0], -np.inf)))
+        return floor
+
+    def page(self) -> Tuple[List[Tuple[int, float]], bool]:
+        """(capacity - 1 phần tử đầu theo thứ tự xếp hạng, còn phần tử sau đó hay không)."""
+        ranked = [(-neg_uid, score) for score, neg_uid in sorted(self._heap, reverse=True)]
+        return ranked[:self.capacity - 1], len(ranked) >= self.capacity
+
+
+def score_both_directions(predictor: MatchPredictor, snapshot: UserFeatureSnapshot, anchor_row: int,
+                          geo_filter_mode: str,
+                          candidate_mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Chấm điểm user ở dòng anchor_row của snapshot với các user khác theo cả hai chiều, feature của mỗi cặp
+    chỉ tính một lần (MatchPredictor.predict_match_proba_both_directions). Mỗi chiều chọn candidate giống
+    nhánh online: bucket (sex, orientation) tương thích theo chiều đó và, với GEO_FILTER_MODE=hard, nằm trong
+    location_preference của cả hai phía.
+    candidate_mask: chỉ xét các dòng có giá trị True (vd: job precompute chỉ xét user id lớn hơn anchor).
+    Trả về (candidate ids, score anchor -> candidate, score candidate -> anchor); score là NaN ở chiều mà
+    cặp không được chọn.
+    """
+    columns = snapshot.columns
+    anchor_bucket = bucket_key(columns.sex[anchor_row], columns.orientation[anchor_row])
+    # forward: candidate nằm trong danh sách của anchor; reverse: anchor nằm trong danh sách của candidate
+    forward_ok = np.zeros(len(columns), dtype=bool)
+    reverse_ok = np.zeros(len(columns), dtype=bool)
+    for bucket, bucket_rows in snapshot.bucket_index.rows_by_bucket.items():
+        forward_ok[bucket_rows] = ORIENTATION_COMPATIBILITY_TABLE.is_compatible(anchor_bucket, bucket)
+        reverse_ok[bucket_rows] = ORIENTATION_COMPATIBILITY_TABLE.is_compatible(bucket, anchor_bucket)
+
+    selected = forward_ok | reverse_ok
+    selected[anchor_row] = False
+    if candidate_mask is not None:
+        selected &= candidate_mask
+    candidate_rows = np.flatnonzero(selected)
+    if geo_filter_mode == GEO_FILTER_HARD and candidate_rows.size:
+        # mutual_location_mask đối xứng: hai chiều cùng giữ hoặc cùng bỏ cặp
+        distances = geodesic_distance_km_vectorized(
+            columns.latitude[anchor_row], columns.longitude[anchor_row],
+            columns.latitude[candidate_rows], columns.longitude[candidate_rows])
+        candidate_rows = candidate_rows[mutual_location_mask(
+            columns.location_preference[anchor_row], columns.location_preference[candidate_rows], distances)]
+
+    probas, reverse_probas = predictor.predict_match_proba_both_directions(
+        columns, columns.take(candidate_rows), anchor_row=anchor_row, chunk_size=settings.MATCH_PREDICTION_CHUNK_SIZE)
+    probas[~forward_ok[candidate_rows]] = np.nan
+    reverse_probas[~reverse_ok[candidate_rows]] = np.nan
+    return columns.ids[candidate_rows].astype(np.int64), probas, reverse_probas
 
 
 class MatchService:
-    def __init__(self, db: Session, predictor: MatchPredictor):
+    def __init__(self, db: Session, predictor: MatchPredictor, feature_store: Optional[UserFeatureStore] = None,
+                 scoring_pool: Optional[ShardedScoringPool] = None, result_cache: Optional[MatchResultCache] = None):
         self.db = db
         self.predictor = predictor
+        self.feature_store = feature_store
+        self.scoring_pool = scoring_pool
+        self.result_cache = result_cache
         self.match_threshold = settings.MATCH_PROBABILITY_THRESHOLD
+        self.cache_top_k = max(settings.MATCH_RESULT_CACHE_TOP_K, 1)
+        self.geo_filter_mode = settings.GEO_FILTER_MODE.lower()
+        if self.geo_filter_mode not in GEO_FILTER_MODES:
+            print(f"WARNING: Unknown GEO_FILTER_MODE '{settings.GEO_FILTER_MODE}', location filtering is disabled.")
+            self.geo_filter_mode = GEO_FILTER_OFF
+        self.match_source = settings.POTENTIAL_MATCHES_SOURCE.lower()
+        if self.match_source not in MATCH_SOURCES:
+            print(f"WARNING: Unknown POTENTIAL_MATCHES_SOURCE '{settings.POTENTIAL_MATCHES_SOURCE}', "
+                  f"using '{MATCH_SOURCE_ONLINE}'.")
+            self.match_source = MATCH_SOURCE_ONLINE
 
     def get_potential_matches(self, current_user_id: int) -> List[int]:
+        if self.result_cache is not None:
+            cached_ids = self.result_cache.get_ids(current_user_id)
+            if cached_ids is not None:
+                return cached_ids
+
+        token = self.result_cache.write_token() if self.result_cache is not None else None
+        matched_ids = self._compute_potential_matches(current_user_id)
+        if self.result_cache is not None:
+            self.result_cache.set_ids(current_user_id, matched_ids, token)
+        return matched_ids
+
+    @metrics.timed(STAGE_POTENTIAL_MATCHES)
+    def _compute_potential_matches(self, current_user_id: int) -> List[int]:
+        matched_ids: List[int] = []
+        matched_distances: List[float] = []
+        # Chỉ cần biết score có vượt threshold không (không cần score chính xác để xếp hạng)
+        for ids, matched, distances in self._iter_scored_chunks(current_user_id, threshold_only=True):
+            matched_ids.extend(int(uid) for uid in ids[matched])
+            if distances is not None:
+                matched_distances.extend(distances[matched].tolist())
+
+        if self.geo_filter_mode == GEO_FILTER_SOFT:
+            # Các chunk được sắp xếp riêng, cần sắp xếp lại trên toàn bộ kết quả
+            order = np.argsort(np.asarray(matched_distances), kind='stable')
+            matched_ids = [matched_ids[i] for i in order]
+        return matched_ids
+
+    def get_ranked_potential_matches(
+            self,
+            current_user_id: int,
+            limit: int,
+            min_score: Optional[float] = None,
+            after: Optional[MatchCursor] = None
+    ) -> Tuple[List[Tuple[int, float]], bool]:
+        """
+        Top-`limit` candidate theo score giảm dần (hòa thì user id tăng dần), chỉ gồm các candidate
+        có score > MATCH_PROBABILITY_THRESHOLD và >= min_score (nếu có).
+        after: (score, user_id) của phần tử cuối trang trước -> chỉ lấy các phần tử đứng sau nó.
+
+        Dùng heap kích thước limit + 1 (_TopMatches) nên bộ nhớ là O(limit), không cần giữ/sắp xếp toàn bộ
+        danh sách đã chấm điểm. Trả về ([(user_id, score)], has_more).
+        Nếu có result_cache: chỉ MATCH_RESULT_CACHE_TOP_K phần tử đầu của danh sách xếp hạng được cache (heap
+        kích thước top-K trong cùng lần chấm điểm); trang nằm trong phần đó được cắt từ cache, trang
+        nằm sau được tính lại bằng heap.
+        Với POTENTIAL_MATCHES_SOURCE=precomputed, trang được đọc từ bảng precomputed_matches khi kết quả
+        của job còn dùng được cho user này (xem _get_precomputed_page), nếu không thì tính như bình thường.
+        """
+        if self.match_source == MATCH_SOURCE_PRECOMPUTED:
+            page = self._get_precomputed_page(current_user_id, limit, min_score, after)
+            if page is not None:
+                return page
+        if self.result_cache is None:
+            return self._rank_top_potential_matches(current_user_id, [_TopMatches(
+                limit + 1, self.match_threshold, min_score, after)])[0]
+
+        cached = self.result_cache.get_ranking(current_user_id)
+        if cached is not None:
+            page = self._page_from_ranking(*cached, limit, min_score, after)
+            if page is not None:
+                return page
+            # Trang nằm sau phần đã cache
+            return self._rank_top_potential_matches(current_user_id, [_TopMatches(
+                limit + 1, self.match_threshold, min_score, after)])[0]
+
+        top = _TopMatches(self.cache_top_k + 1, self.match_threshold)
+        collectors = [top]
+        if after is not None or limit >= self.cache_top_k:
+            collectors.append(_TopMatches(limit + 1, self.match_threshold, min_score, after))
+        token = self.result_cache.write_token()
+        results = self._rank_top_potential_matches(current_user_id, collectors)
+        ranking, has_more = results[0]
+        self.result_cache.set_ranking(current_user_id, ranking, not has_more, token)
+        if len(results) > 1:
+            return results[1]
+        return self._page_from_ranking(ranking, not has_more, limit, min_score, after)
+
+    @metrics.timed(STAGE_PRECOMPUTED_MATCHES)
+    def _get_precomputed_page(self, current_user_id: int, limit: int, min_score: Optional[float],
+                              after: Optional[MatchCursor]) -> Optional[Tuple[List[Tuple[int, float]], bool]]:
+        """
+        Trang kết quả từ bảng precomputed_matches, hoặc None nếu phải tính online: job của model hiện tại chưa
+        chạy xong, user được tạo sau lần chạy (id >= covered_until), job chạy với threshold cao hơn hoặc
+        GEO_FILTER_MODE khác, hoặc user không có role USER (để nhánh online trả về đúng lỗi 403/404).
+        """
+        status = crud.get_precompute_status(self.db, self.predictor.model_version)
+        if (status is None or status["completed_chunks"] < status["total_chunks"]
+                or current_user_id >= status["covered_until"] or status["threshold"] > self.match_threshold
+                or status["geo_filter_mode"] != self.geo_filter_mode):
+            return None
+        if crud.get_user_role_name(self.db, current_user_id) != "USER":
+            return None
+        # Lấy thêm 1 phần tử để biết còn trang sau hay không
+        ranked = crud.get_precomputed_matches(self.db, current_user_id, self.predictor.model_version,
+                                              self.match_threshold, limit + 1, min_score=min_score, after=after)
+        return ranked[:limit], len(ranked) > limit
+
+    @metrics.timed(STAGE_RANKED_MATCHES)
+    def _rank_top_potential_matches(
+            self, current_user_id: int,
+            collectors: List[_TopMatches]) -> List[Tuple[List[Tuple[int, float]], bool]]:
+        """
+        Chấm điểm candidate một lần và đưa từng chunk vào mọi collector.
+        Với mỗi collector: (capacity - 1 phần tử đầu, danh sách còn phần tử sau đó hay không).
+        """
+        for ids, probas, _ in self._iter_scored_chunks(
+                current_user_id, floor=lambda: min(collector.floor() for collector in collectors)):
+            for collector in collectors:
+                collector.push(ids, probas)
+        return [collector.page() for collector in collectors]
+
+    @metrics.timed(STAGE_BATCH_MATCHES)
+    def get_ranked_potential_matches_batch(self, user_ids: List[int], limit: int,
+                                           min_score: Optional[float] = None) -> Dict[int, BatchMatchResult]:
+        """
+        Trang đầu của get_ranked_potential_matches cho nhiều user trong một lần gọi.
+        Population candidate được tải và tính feature MỘT lần cho cả batch (snapshot của UserFeatureStore nếu
+        sẵn sàng, nếu không thì một snapshot tạm chỉ dùng cho batch này) rồi dùng lại cho mọi anchor;
+        feature của các anchor được tính từ DB (một lần bulk load) như ở bản từng user.
+        Lỗi của một user (404 / 403 / 500) được trả về trong kết quả của user đó, không làm hỏng cả batch.
+        """
+        results: Dict[int, BatchMatchResult] = {}
+        anchor_data = crud.get_users_profile_raw_data_bulk(self.db, user_ids)
+        user_role_ids = set(crud.get_user_ids_with_role(self.db, role_name="USER", user_ids=list(user_ids)))
+        pending_ids: List[int] = []
+        for user_id in user_ids:
+            data_tuple = anchor_data.get(user_id)
+            if not data_tuple or not data_tuple[0]:
+                results[user_id] = HTTPException(status_code=404,
+                                                 detail=f"User with id {user_id} not found or profile incomplete.")
+            elif user_id not in user_role_ids:
+                results[user_id] = HTTPException(status_code=403,
+                                                 detail=f"User with id {user_id} does not have 'USER' role.")
+            else:
+                cached = self.result_cache.get_ranking(user_id) if self.result_cache is not None else None
+                page = self._page_from_ranking(*cached, limit, min_score, None) if cached is not None else None
+                if page is not None:
+                    results[user_id] = page
+                else:
+                    pending_ids.append(user_id)
+        if not pending_ids:
+            return results
+
+        token = self.result_cache.write_token() if self.result_cache is not None else None
+        anchors, positions = self.predictor.build_user_columns(
+            [anchor_data[user_id] for user_id in pending_ids], user_ids=pending_ids)
+        anchor_rows = {pending_ids[position]: row for row, position in enumerate(positions)}
+        snapshot, source = self._batch_snapshot()
+        for user_id in pending_ids:
+            row = anchor_rows.get(user_id)
+            if row is None:
+                results[user_id] = HTTPException(status_code=500,
+                                                 detail=f"Failed to build features for user {user_id}.")
+                continue
+            profile, orientation_name = anchor_data[user_id][1], anchor_data[user_id][7]
+            current_user_bucket = bucket_key(profile.sex if profile else None, orientation_name)
+            try:
+                anchor_columns = anchors.take([row])
+                page_top = _TopMatches(limit + 1, self.match_threshold, min_score)
+                cache_top = (_TopMatches(self.cache_top_k + 1, self.match_threshold)
+                             if self.result_cache is not None else None)
+                collectors = [page_top] if cache_top is None else [page_top, cache_top]
+                n_scored = 0
+                candidates = self._get_candidates_from_store(user_id, anchor_columns, current_user_bucket, snapshot)
+                if candidates is not None:
+                    for ids, probas, _ in self._score_candidates_in_chunks(
+                            user_id, anchor_columns, candidates,
+                            lambda: min(collector.floor() for collector in collectors)):
+                        n_scored += len(ids)
+                        for collector in collectors:
+                            collector.push(ids, probas)
+                scored_candidates_total.inc(n_scored, source)
+                candidates_per_request.observe(n_scored)
+            except Exception as e:
+                print(f"Error computing batch potential matches for user {user_id}: {e}")
+                results[user_id] = HTTPException(status_code=500,
+                                                 detail=f"An unexpected error occurred for user {user_id}.")
+                continue
+            if cache_top is not None:
+                ranking, has_more = cache_top.page()
+                self.result_cache.set_ranking(user_id, ranking, not has_more, token)
+            results[user_id] = page_top.page()
+        return results
+
+    def _batch_snapshot(self) -> Tuple[UserFeatureSnapshot, str]:
+        """Snapshot candidate dùng chung cho một batch: của UserFeatureStore nếu sẵn sàng, nếu không thì tải từ DB."""
+        if self.feature_store is not None and self.feature_store.is_ready:
+            return self.feature_store.snapshot(), SOURCE_STORE
+        batch_store = UserFeatureStore(self.predictor, fetch_chunk_size=settings.CANDIDATE_FETCH_CHUNK_SIZE)
+        batch_store.build(self.db)
+        return batch_store.snapshot(), SOURCE_DB
+
+    @metrics.timed(STAGE_USER_UPDATES)
+    def apply_user_updates(self, user_ids: List[int]) -> int:
+        """
+        Cập nhật kết quả sau khi profile của user_ids thay đổi (thêm / sửa / xóa / đổi role), không tính lại
+        toàn bộ: refresh UserFeatureStore cho các user này, chấm điểm lại chỉ các cặp chứa chúng (O(N) mỗi user,
+        cả hai chiều trong một lần, xem score_both_directions) rồi cập nhật
+        - bảng precomputed_matches của model hiện tại (nếu job đã chạy với cùng GEO_FILTER_MODE),
+        - result_cache: danh sách của chính user được thay bằng kết quả mới, danh sách của user khác có (hoặc giờ
+          sẽ có) user này bị xóa (MatchResultCache.apply_rescored_user).
+        Không có UserFeatureStore thì population được tải từ DB một lần cho cả lô (như batch endpoint).
+        Trả về số user còn trong population (đã được chấm điểm lại).
+        """
+        if self.feature_store is not None and self.feature_store.is_ready:
+            self.feature_store.refresh(self.db, user_ids)
+        snapshot, _ = self._batch_snapshot()
+
+        model_version = self.predictor.model_version
+        precompute_status = crud.get_precompute_status(self.db, model_version)
+        table_threshold = (precompute_status["threshold"]
+                           if precompute_status is not None
+                           and precompute_status["geo_filter_mode"] == self.geo_filter_mode else None)
+
+        n_rescored = 0
+        for user_id in user_ids:
+            row = snapshot.row_by_id.get(user_id)
+            if row is None:
+                # Bị xóa, mất role USER hoặc thiếu profile: không còn xuất hiện trong kết quả nào
+                candidate_ids = np.empty(0, dtype=np.int64)
+                probas = reverse_probas = np.empty(0, dtype=np.float64)
+            else:
+                candidate_ids, probas, reverse_probas = score_both_directions(
+                    self.predictor, snapshot, row, self.geo_filter_mode)
+                n_rescored += 1
+            scored_candidates_total.inc(len(candidate_ids), SOURCE_STORE)
+
+            if table_threshold is not None:
+                with np.errstate(invalid='ignore'):
+                    forward, reverse = probas > table_threshold, reverse_probas > table_threshold
+                rows = [{"user_id": user_id, "candidate_id": int(candidate_id), "score": float(score)}
+                        for candidate_id, score in zip(candidate_ids[forward], probas[forward])]
+                rows.extend({"user_id": int(candidate_id), "candidate_id": user_id, "score": float(score)}
+                            for candidate_id, score in zip(candidate_ids[reverse], reverse_probas[reverse]))
+                crud.replace_precomputed_matches_for_user(self.db, model_version, user_id, rows)
+
+            if self.result_cache is not None:
+                with np.errstate(invalid='ignore'):
+                    reverse = reverse_probas > self.match_threshold
+                ranking = None
+                if row is not None:
+                    top = _TopMatches(self.cache_top_k + 1, self.match_threshold)
+                    top.push(candidate_ids, probas)
+                    entries, has_more = top.page()
+                    ranking = (entries, not has_more)
+                reverse_scores = dict(zip(candidate_ids[reverse].tolist(), reverse_probas[reverse].tolist()))
+                self.result_cache.apply_rescored_user(user_id, ranking, reverse_scores)
+        return n_rescored
+
+    @staticmethod
+    def _page_from_ranking(ranking: List[Tuple[int, float]], complete: bool, limit: int, min_score: Optional[float],
+                           after: Optional[MatchCursor]) -> Optional[Tuple[List[Tuple[int, float]], bool]]:
+        """
+        Cắt một trang từ danh sách đã xếp hạng (cùng ngữ nghĩa với nhánh heap).
+        complete=False: ranking chỉ là phần đầu của danh sách; trả về None nếu trang (hoặc việc còn trang sau
+        hay không) nằm ngoài phần đó.
+        """
+        sort_keys = [(-score, uid) for uid, score in ranking]
+        start = bisect.bisect_right(sort_keys, (-after[0], after[1])) if after is not None else 0
+        # Score giảm dần -> các phần tử < min_score nằm liền nhau ở cuối
+        end = bisect.bisect_right(sort_keys, (-min_score, float('inf'))) if min_score is not None else len(ranking)
+        if not complete and end == len(ranking) and start + limit >= end:
+            return None
+        page = ranking[start:min(start + limit, end)]
+        return page, start + limit < end
+
+    def _iter_scored_chunks(self, current_user_id: int, threshold_only: bool = False,
+                            floor: Optional[Callable[[], float]] = None) -> Iterator[ScoredChunk]:
+        """
+        Kiểm tra current_user, chọn candidate (store hoặc DB), lọc theo vị trí và chấm điểm.
+        Sinh ra từng chunk đã chấm điểm để caller tự quyết định cách gom kết quả.
+        threshold_only: chỉ trả về mask score > threshold (xem ScoredChunk), cho phép early exit.
+        floor: hàm trả về score mà caller không cần các score <= nó (vd: phần tử tệ nhất của top-K đã gom được),
+        được gọi trước mỗi chunk; score của các cặp này có thể là NaN (early exit, xem
+        MatchPredictor.predict_match_proba_columns). Không áp dụng cho process pool.
+        """
+        n_scored = 0
+        for source, scored_chunk in self._iter_scored_chunks_by_source(current_user_id, threshold_only, floor):
+            scored_candidates_total.inc(len(scored_chunk[0]), source)
+            n_scored += len(scored_chunk[0])
+            yield scored_chunk
+        candidates_per_request.observe(n_scored)
+
+    def _iter_scored_chunks_by_source(self, current_user_id: int, threshold_only: bool,
+                                      floor: Optional[Callable[[], float]] = None) -> Iterator[Tuple[str, ScoredChunk]]:
+        """Như _iter_scored_chunks nhưng mỗi chunk đi kèm nguồn candidate (SOURCE_STORE / SOURCE_DB / SOURCE_POOL)."""
         current_user_data_tuple = crud.get_user_profile_raw_data(self.db, current_user_id)
         if not current_user_data_tuple or not current_user_data_tuple[0]:
             raise HTTPException(status_code=404,
@@ -25,22 +472,71 @@ class MatchService:
         if current_user_role != "USER":
             raise HTTPException(status_code=403, detail=f"User with id {current_user_id} does not have 'USER' role.")
 
-        other_user_ids = crud.get_all_other_user_ids_with_role(self.db, current_user_id, role_name="USER")
-        if not other_user_ids:
-            return []
+        current_user_sex = current_user_data_tuple[1].sex if current_user_data_tuple[1] else None
+        current_user_orientation_name = current_user_data_tuple[7]  # Lấy từ tuple
+        current_user_bucket = bucket_key(current_user_sex, current_user_orientation_name)
 
-        potential_matches_ids: List[int] = []
+        # Feature của current_user được tính từ DB (luôn mới nhất) và dùng chung cho mọi candidate
+        try:
+            anchor_columns, _ = self.predictor.build_user_columns(
+                [current_user_data_tuple], user_ids=[current_user_id], raise_errors=True)
+        except Exception as e:
+            print(f"Error building features for user {current_user_id}: {e}")
+            return
 
-        # Lấy dữ liệu thô của current_user một lần để truyền vào hàm check orientation
-        # và sau đó là predictor
-        # current_user_raw_for_ml = self.predictor._transform_raw_user_data_to_ml_input(*current_user_data_tuple)
-        # Đoạn trên không cần thiết nếu tuple đã đúng định dạng, nhưng cần sex và orientation name
+        if self.feature_store is not None and self.feature_store.is_ready:
+            candidates = self._get_candidates_from_store(current_user_id, anchor_columns, current_user_bucket)
+            if candidates is None:
+                return
+            if threshold_only:
+                scored_chunk = self._score_candidates(current_user_id, anchor_columns, candidates, threshold_only)
+                if scored_chunk is not None:
+                    yield SOURCE_STORE, scored_chunk
+                return
+            for scored_chunk in self._score_candidates_in_chunks(current_user_id, anchor_columns, candidates, floor):
+                yield SOURCE_STORE, scored_chunk
+            return
 
-        current_user_sex = current_user_data_tuple[1].sex if current_user_data_tuple[1] else None
-        current_user_orientation_name = current_user_data_tuple[7]  # Lấy từ tuple
+        # Chỉ lấy candidate thuộc các bucket (sex, orientation) tương thích, lọc ngay trong SQL
+        compatible_buckets = ORIENTATION_COMPATIBILITY_TABLE.compatible_buckets(
+            current_user_bucket, crud.get_sex_orientation_buckets(self.db, role_name="USER"))
+        other_user_ids = crud.get_all_other_user_ids_with_role(
+            self.db, current_user_id, role_name="USER", sex_orientation_buckets=compatible_buckets,
+            bounding_boxes=self._sql_bounding_boxes(anchor_columns))
 
-        for other_user_id in other_user_ids:
-            other_user_data_tuple = crud.get_user_profile_raw_data(self.db, other_user_id)
+        # Chế độ process pool: chia danh sách id thành shard, mỗi worker process tự tải dữ liệu,
+        # tính feature và chấm điểm shard của mình (kết quả trả về theo đúng thứ tự shard)
+        if self.scoring_pool is not None and self.scoring_pool.should_shard(len(other_user_ids)):
+            shards = self.scoring_pool.score_shards(
+                current_user_id, anchor_columns, current_user_bucket, other_user_ids, self.geo_filter_mode,
+                threshold_only)
+            for scored_chunk in metrics.timed_iter(STAGE_SHARD_SCORING, shards):
+                yield SOURCE_POOL, scored_chunk
+            return
+
+        # Tải dữ liệu candidate theo từng chunk (số query cố định cho mỗi chunk thay vì 6 query/user),
+        # lọc theo orientation compatibility rồi chấm điểm cả chunk bằng một batch
+        chunk_size = max(settings.CANDIDATE_FETCH_CHUNK_SIZE, 1)
+        for chunk_start in range(0, len(other_user_ids), chunk_size):
+            chunk_ids = other_user_ids[chunk_start:chunk_start + chunk_size]
+            scored_chunk = self.score_candidate_ids(current_user_id, anchor_columns, current_user_bucket, chunk_ids,
+                                                    threshold_only, floor() if floor is not None else None)
+            if scored_chunk is not None:
+                yield SOURCE_DB, scored_chunk
+
+    def score_candidate_ids(self, current_user_id: int, anchor_columns: UserColumns, current_user_bucket: Bucket,
+                            candidate_ids: List[int], threshold_only: bool = False,
+                            floor: Optional[float] = None) -> Optional[ScoredChunk]:
+        """
+        Tải dữ liệu của candidate_ids bằng một lần bulk load, lọc lại theo orientation compatibility
+        rồi chấm điểm. Dùng cho từng chunk của DB path và cho từng shard trong worker process.
+        """
+        chunk_data = crud.get_users_profile_raw_data_bulk(self.db, candidate_ids)
+
+        compatible_ids: List[int] = []
+        candidate_data_tuples: List[tuple] = []
+        for other_user_id in candidate_ids:
+            other_user_data_tuple = chunk_data.get(other_user_id)
             if not other_user_data_tuple or not other_user_data_tuple[0]:
                 print(f"Skipping user id {other_user_id} due to missing data.")
                 continue
@@ -48,24 +544,107 @@ class MatchService:
             other_user_sex = other_user_data_tuple[1].sex if other_user_data_tuple[1] else None
             other_user_orientation_name = other_user_data_tuple[7]  # Lấy từ tuple
 
-            # **Kiểm tra orientation compatibility trước**
-            if not orientation_compatibility(
-                    current_user_sex, current_user_orientation_name,
-                    other_user_sex, other_user_orientation_name
-            ):
-                # print(f"Pair ({current_user_id}, {other_user_id}) not compatible by orientation. Skipping ML prediction.")
+            # Kiểm tra lại bằng bảng tương thích (dữ liệu có thể đã đổi giữa hai query)
+            if not ORIENTATION_COMPATIBILITY_TABLE.is_compatible(
+                    current_user_bucket, bucket_key(other_user_sex, other_user_orientation_name)):
                 continue  # Bỏ qua nếu không tương thích
 
-            try:
-                match_proba = self.predictor.predict_match_proba(
-                    user1_data_tuple=current_user_data_tuple,
-                    user2_data_tuple=other_user_data_tuple
-                )
-                if match_proba > self.match_threshold:
-                    potential_matches_ids.append(other_user_id)
+            compatible_ids.append(other_user_id)
+            candidate_data_tuples.append(other_user_data_tuple)
 
-            except Exception as e:
-                print(f"Error predicting match for pair ({current_user_id}, {other_user_id}): {e}")
-                continue
+        if not candidate_data_tuples:
+            return None
+
+        candidates, _ = self.predictor.build_user_columns(candidate_data_tuples, user_ids=compatible_ids)
+        return self._score_candidates(current_user_id, anchor_columns, candidates, threshold_only, floor)
+
+    @metrics.timed(STAGE_STORE_CANDIDATES)
+    def _get_candidates_from_store(self, current_user_id: int, anchor_columns: UserColumns,
+                                   current_user_bucket: Bucket,
+                                   snapshot: Optional[UserFeatureSnapshot] = None) -> Optional[UserColumns]:
+        """
+        Lấy candidate từ UserFeatureStore (hoặc từ `snapshot` nếu truyền vào): không truy cập DB
+        cho candidate, chỉ còn các phép toán trên mảng.
+        Snapshot có ANN index (ANN_RETRIEVAL_ENABLED) thì chỉ giữ ANN_CANDIDATES candidate có user feature vector
+        gần current_user nhất.
+        """
+        if snapshot is None:
+            snapshot = self.feature_store.snapshot()
+
+        # Chỉ lấy các dòng thuộc bucket tương thích (trừ chính user hiện tại)
+        candidate_rows = snapshot.bucket_index.compatible_rows(current_user_bucket)
+        own_row = snapshot.row_by_id.get(current_user_id)
+        if own_row is not None:
+            candidate_rows = candidate_rows[candidate_rows != own_row]
+
+        # Chế độ hard: chỉ giữ các dòng trong bán kính location_preference của current_user (qua GeoIndex)
+        anchor_lat, anchor_lon = anchor_columns.latitude[0], anchor_columns.longitude[0]
+        anchor_pref = anchor_columns.location_preference[0]
+        if (self.geo_filter_mode == GEO_FILTER_HARD and has_finite_radius(anchor_pref)
+                and not np.isnan(anchor_lat) and not np.isnan(anchor_lon)):
+            rows_in_radius = snapshot.geo_index.rows_within(anchor_lat, anchor_lon, anchor_pref)
+            candidate_rows = np.intersect1d(candidate_rows, rows_in_radius, assume_unique=True)
+
+        if snapshot.ann_index is not None and candidate_rows.size > settings.ANN_CANDIDATES:
+            with metrics.stage(STAGE_ANN_RETRIEVAL):
+                candidate_rows = snapshot.similar_rows(anchor_columns.feature_matrix[0], candidate_rows,
+                                                       settings.ANN_CANDIDATES, settings.ANN_N_PROBE)
+
+        if candidate_rows.size == 0:
+            return None
+        return snapshot.columns.take(candidate_rows)
+
+    def _score_candidates_in_chunks(self, current_user_id: int, anchor_columns: UserColumns, candidates: UserColumns,
+                                    floor: Optional[Callable[[], float]]) -> Iterator[ScoredChunk]:
+        """
+        Chấm điểm candidates (từ store) để xếp hạng. Nếu predictor có early exit, candidates được chia thành các chunk
+        MATCH_PREDICTION_CHUNK_SIZE dòng, mỗi chunk chấm với floor() mới nhất: top-K đầy dần nên các chunk sau bỏ qua
+        sớm được nhiều cặp hơn.
+        """
+        chunk_size = settings.MATCH_PREDICTION_CHUNK_SIZE
+        if floor is None or self.predictor.tree_evaluator is None or chunk_size <= 0:
+            chunk_size = max(len(candidates), 1)
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates if chunk_size >= len(candidates) else candidates.take(
+                np.arange(start, min(start + chunk_size, len(candidates))))
+            scored_chunk = self._score_candidates(current_user_id, anchor_columns, chunk,
+                                                  floor=floor() if floor is not None else None)
+            if scored_chunk is not None:
+                yield scored_chunk
+
+    def _score_candidates(self, current_user_id: int, anchor_columns: UserColumns, candidates: UserColumns,
+                          threshold_only: bool = False, floor: Optional[float] = None) -> Optional[ScoredChunk]:
+        """
+        Lọc/sắp xếp theo vị trí (nếu bật) rồi chấm điểm toàn bộ candidates.
+        floor: chỉ cần các score > floor, các score khác có thể là NaN (xem MatchPredictor.predict_match_proba_columns).
+        """
+        distances = None
+        # Chế độ soft chỉ sắp xếp theo khoảng cách: vô nghĩa khi kết quả được xếp hạng theo score
+        geo_filter_mode = (GEO_FILTER_OFF if self.geo_filter_mode == GEO_FILTER_SOFT and not threshold_only
+                           else self.geo_filter_mode)
+        if geo_filter_mode != GEO_FILTER_OFF:
+            with metrics.stage(STAGE_GEO_FILTER):
+                candidates, distances = apply_location_filter(geo_filter_mode, anchor_columns, candidates)
+        if len(candidates) == 0:
+            return None
+
+        try:
+            if threshold_only:
+                match_probas = self.predictor.predict_match_above_threshold_columns(
+                    anchor_columns, candidates, self.match_threshold, chunk_size=settings.MATCH_PREDICTION_CHUNK_SIZE)
+            else:
+                match_probas = self.predictor.predict_match_proba_columns(
+                    anchor_columns, candidates, chunk_size=settings.MATCH_PREDICTION_CHUNK_SIZE, floor=floor)
+        except Exception as e:
+            print(f"Error predicting matches for user {current_user_id}: {e}")
+            return None
+        return candidates.ids, match_probas, distances
 
-        return potential_matches_ids
\ No newline at end of file
+    def _sql_bounding_boxes(self, anchor_columns: UserColumns):
+        """Bounding box để lọc sơ bộ candidate trong SQL (chỉ ở chế độ hard và khi bán kính hữu hạn)."""
+        anchor_lat, anchor_lon = anchor_columns.latitude[0], anchor_columns.longitude[0]
+        anchor_pref = anchor_columns.location_preference[0]
+        if (self.geo_filter_mode != GEO_FILTER_HARD or not has_finite_radius(anchor_pref)
+                or np.isnan(anchor_lat) or np.isnan(anchor_lon)):
+            return None
+        return bounding_boxes(anchor_lat, anchor_lon, anchor_pref)
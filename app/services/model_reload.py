@@ -0,0 +1,60 @@
+# app/services/model_reload.py
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+RELOAD_IDLE = "idle"
+RELOAD_LOADING = "loading"
+RELOAD_FAILED = "failed"
+
+
+class ModelReloader:
+    """
+    Reload version model trong một thread nền (POST /admin/model/reload), tối đa một lần reload tại một thời điểm.
+
+    load_and_swap(version) tải, kiểm tra và khởi động version mới, thay nó cho runtime hiện tại và trả về runtime cũ;
+    nếu lỗi thì runtime hiện tại được giữ nguyên và lỗi được ghi vào status(). Runtime cũ được retire(...) ngay sau
+    khi đổi version; retire tự chờ các request/job đã lấy runtime cũ trước lúc đổi version xong rồi mới dừng nó.
+    """
+
+    def __init__(self, load_and_swap: Callable[[str], Any], retire: Callable[[Any], None]):
+        self.load_and_swap = load_and_swap
+        self.retire = retire
+        self._lock = threading.Lock()
+        self._state = RELOAD_IDLE
+        self._target_version: Optional[str] = None
+        self._error: Optional[str] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    def status(self) -> Dict[str, Any]:
+        """Trạng thái của lần reload gần nhất (state, target_version, error, started_at, finished_at)."""
+        with self._lock:
+            return {"state": self._state, "target_version": self._target_version, "error": self._error,
+                    "started_at": self._started_at, "finished_at": self._finished_at}
+
+    def start(self, version: str) -> bool:
+        """Bắt đầu reload sang version trong thread nền; trả về False nếu đang có một lần reload khác."""
+        with self._lock:
+            if self._state == RELOAD_LOADING:
+                return False
+            self._state, self._target_version, self._error = RELOAD_LOADING, version, None
+            self._started_at, self._finished_at = time.time(), None
+        threading.Thread(target=self._run, args=(version,), name="model-reload", daemon=True).start()
+        return True
+
+    def _run(self, version: str) -> None:
+        print(f"INFO: Reloading model version '{version}'...")
+        try:
+            previous = self.load_and_swap(version)
+            state, error = RELOAD_IDLE, None
+        except Exception as e:
+            print(f"WARNING: Reloading model version '{version}' failed, keeping the current model: {e}")
+            previous, state, error = None, RELOAD_FAILED, str(e)
+        with self._lock:
+            self._state, self._error, self._finished_at = state, error, time.time()
+        if previous is not None:
+            try:
+                self.retire(previous)
+            except Exception as e:
+                print(f"WARNING: Failed to shut down the previous model version: {e}")
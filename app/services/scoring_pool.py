@@ -0,0 +1,161 @@
+# app/services/scoring_pool.py
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional
+
+from app.core.config import settings
+
+# Không import predictor/preprocessing ở đây: module này được import lại trong từng worker process
+# và biến môi trường giới hạn thread phải được đặt trước khi LightGBM/NumPy được nạp (xem _init_worker)
+
+# --- Trạng thái của worker process (được tạo một lần bởi initializer) ---
+_worker_predictor = None
+_worker_session_factory = None
+
+
+def _init_worker(models_dir: str, database_url: str, threads_per_worker: int,
+                 inference_mode: str = "booster", early_exit: bool = False, use_bundle: bool = True,
+                 early_exit_min_threshold: float = 0.0) -> None:
+    """Initializer của worker: nạp model + preprocessing artifacts và tạo engine DB riêng cho process."""
+    global _worker_predictor, _worker_session_factory
+    # Mỗi worker chỉ dùng threads_per_worker thread cho OpenMP/BLAS, tránh N process x N core thread
+    for env_var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(env_var, str(threads_per_worker))
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.ml.predictor import MatchPredictor
+
+    _worker_predictor = MatchPredictor(models_dir, inference_mode=inference_mode, n_jobs=threads_per_worker,
+                                       early_exit=early_exit, use_bundle=use_bundle,
+                                       early_exit_min_threshold=early_exit_min_threshold)
+    try:
+        _worker_predictor.warmup(threshold=settings.MATCH_PROBABILITY_THRESHOLD)
+    except Exception as e:
+        print(f"WARNING: Scoring worker {os.getpid()} warmup failed: {e}")
+    _worker_session_factory = sessionmaker(autocommit=False, autoflush=False,
+                                           bind=create_engine(database_url, pool_pre_ping=True))
+    print(f"INFO: Scoring worker {os.getpid()} initialized.")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _score_shard(current_user_id, anchor_columns, current_user_bucket, shard_ids: List[int],
+                 geo_filter_mode: str, fetch_chunk_size: int, threshold_only: bool = False) -> list:
+    """Chấm điểm một shard candidate id trong worker process, trả về danh sách ScoredChunk."""
+    from app.services.match_service import MatchService
+
+    db = _worker_session_factory()
+    try:
+        service = MatchService(db=db, predictor=_worker_predictor)
+        service.geo_filter_mode = geo_filter_mode  # Dùng đúng chế độ của process cha
+        scored_chunks = []
+        for chunk_start in range(0, len(shard_ids), fetch_chunk_size):
+            scored_chunk = service.score_candidate_ids(
+                current_user_id, anchor_columns, current_user_bucket,
+                shard_ids[chunk_start:chunk_start + fetch_chunk_size], threshold_only)
+            if scored_chunk is not None:
+                scored_chunks.append(scored_chunk)
+        return scored_chunks
+    finally:
+        db.close()
+
+
+class ShardedScoringPool:
+    """
+    Process pool chấm điểm candidate theo shard cho DB path của MatchService.
+
+    Danh sách candidate id được chia thành các shard `shard_size` id; mỗi shard được một worker
+    (đã nạp sẵn model và artifacts qua initializer) tải dữ liệu, tính feature (kể cả bio) và chấm điểm.
+    Kết quả được trả về theo thứ tự shard, nên threshold/top-K/sắp xếp ở MatchService không đổi.
+    Dùng start method "spawn" mặc định: fork một process đã có thread (uvicorn, OpenMP) dễ bị treo.
+    """
+
+    def __init__(self, max_workers: int, shard_size: int, models_dir: Optional[str] = None,
+                 database_url: Optional[str] = None, threads_per_worker: int = 1, start_method: str = "spawn",
+                 min_candidates: Optional[int] = None, inference_mode: str = "booster", early_exit: bool = False,
+                 use_bundle: bool = True, early_exit_min_threshold: float = 0.0):
+        from app.ml.artifacts import MODELS_DIR
+
+        self.max_workers = max(max_workers, 1)
+        self.shard_size = max(shard_size, 1)
+        self.models_dir = models_dir or MODELS_DIR
+        self.database_url = database_url or settings.SQLALCHEMY_DATABASE_URL
+        self.threads_per_worker = max(threads_per_worker, 1)
+        self.start_method = start_method
+        self.inference_mode = inference_mode
+        self.early_exit = early_exit
+        self.use_bundle = use_bundle
+        self.early_exit_min_threshold = early_exit_min_threshold
+        # Số candidate tối thiểu để dùng pool; mặc định chỉ dùng khi có từ 2 shard trở lên (đáng chi phí IPC)
+        self.min_candidates = min_candidates if min_candidates is not None else self.shard_size + 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Pool được tạo lazily từ nhiều request thread cùng lúc: chỉ một thread được tạo (hoặc bỏ) pool
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(self.models_dir, self.database_url, self.threads_per_worker, self.inference_mode,
+                              self.early_exit, self.use_bundle, self.early_exit_min_threshold),
+                )
+            return self._executor
+
+    def _discard_broken(self, executor: ProcessPoolExecutor) -> None:
+        """Bỏ pool hỏng, chỉ khi nó vẫn là pool hiện tại (thread khác có thể đã tạo pool mới cho request khác)."""
+        with self._executor_lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        print("WARNING: ShardedScoringPool is broken, it will be recreated on the next request.")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def warmup(self) -> None:
+        """Khởi động trước các worker (nạp model) để request đầu tiên không phải chờ."""
+        executor = self._get_executor()
+        try:
+            pids = {future.result() for future in [executor.submit(_ping) for _ in range(self.max_workers)]}
+        except BrokenProcessPool:
+            self._discard_broken(executor)
+            raise
+        print(f"INFO: ShardedScoringPool started {len(pids)} worker process(es).")
+
+    def should_shard(self, candidate_count: int) -> bool:
+        return candidate_count >= self.min_candidates
+
+    def score_shards(self, current_user_id: int, anchor_columns, current_user_bucket,
+                     candidate_ids: List[int], geo_filter_mode: str, threshold_only: bool = False) -> Iterator[tuple]:
+        """Gửi tất cả shard cho pool rồi trả về các ScoredChunk theo thứ tự shard."""
+        executor = self._get_executor()
+        fetch_chunk_size = max(settings.CANDIDATE_FETCH_CHUNK_SIZE, 1)
+        futures = [
+            executor.submit(_score_shard, current_user_id, anchor_columns, current_user_bucket,
+                            candidate_ids[shard_start:shard_start + self.shard_size],
+                            geo_filter_mode, fetch_chunk_size, threshold_only)
+            for shard_start in range(0, len(candidate_ids), self.shard_size)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        except BrokenProcessPool:
+            # Worker chết (vd: OOM): bỏ pool hỏng, request sau sẽ tạo pool mới
+            self._discard_broken(executor)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,184 @@
+# app/services/user_events.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.metrics import user_event_latency, user_events_total
+
+
+class UserUpdateQueueFullError(Exception):
+    """Số user đang chờ hoặc đang được xử lý đã đạt max_pending."""
+
+
+class UserUpdateQueue:
+    """
+    Hàng đợi sự kiện "user đã thay đổi" (POST /events/user-updated), xử lý tuần tự trong một thread nền.
+
+    Sự kiện được gộp theo user: khi user đã có sự kiện đang chờ, sự kiện mới chỉ lùi thời điểm xử lý.
+    Một user được xử lý khi không có sự kiện mới trong `coalesce_seconds` giây, nhưng không muộn hơn
+    `max_delay_seconds` kể từ sự kiện đầu tiên (user sửa liên tục vẫn được cập nhật). Các user đến hạn
+    được xử lý cùng lúc (tối đa `max_batch_size`) bằng process_batch(user_ids).
+    Sự kiện đến trong lúc user đang được xử lý tạo một lần xử lý mới sau đó, nên không bị mất.
+    Lô bị lỗi được đưa lại vào hàng đợi, thử lại sau retry_backoff_seconds * 2^(lần lỗi - 1) giây (tối đa
+    max_delay_seconds), tối đa max_retries lần. Tối đa max_pending user đang chờ hoặc đang xử lý: user mới vượt
+    quá bị từ chối (UserUpdateQueueFullError), sự kiện của user đã có trong hàng đợi vẫn được gộp.
+    """
+
+    def __init__(self, process_batch: Callable[[List[int]], None], coalesce_seconds: float = 5.0,
+                 max_delay_seconds: float = 60.0, max_batch_size: int = 100, max_pending: int = 10000,
+                 max_retries: int = 5, retry_backoff_seconds: float = 1.0):
+        self.process_batch = process_batch
+        self.coalesce_seconds = max(coalesce_seconds, 0.0)
+        self.max_delay_seconds = max(max_delay_seconds, self.coalesce_seconds)
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_pending = max(max_pending, 1)
+        self.max_retries = max(max_retries, 0)
+        self.retry_backoff_seconds = max(retry_backoff_seconds, 0.0)
+        self._condition = threading.Condition()
+        # user_id -> (nhận lần đầu, nhận lần cuối, số lần lỗi, không xử lý trước thời điểm này)
+        self._pending: Dict[int, Tuple[float, float, int, float]] = {}
+        self._processing = 0
+        self._paused = 0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def depth(self) -> int:
+        """Số user đang chờ hoặc đang được xử lý."""
+        with self._condition:
+            return len(self._pending) + self._processing
+
+    def submit(self, user_id: int) -> bool:
+        """
+        Thêm sự kiện của user_id; trả về True nếu được gộp vào sự kiện đang chờ của user đó.
+        Ném UserUpdateQueueFullError nếu user chưa có trong hàng đợi và hàng đợi đã đầy.
+        """
+        now = time.monotonic()
+        with self._condition:
+            pending = self._pending.get(user_id)
+            coalesced = pending is not None
+            if not coalesced and len(self._pending) + self._processing >= self.max_pending:
+                user_events_total.inc(1, "rejected")
+                raise UserUpdateQueueFullError(f"{self.max_pending} users are already waiting to be processed")
+            self._pending[user_id] = (pending[0], now, pending[2], pending[3]) if coalesced else (now, now, 0, now)
+            self._condition.notify()
+        user_events_total.inc(1, "received")
+        if coalesced:
+            user_events_total.inc(1, "coalesced")
+        return coalesced
+
+    def start(self) -> None:
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="user-update-events", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Dừng thread nền; các sự kiện chưa đến hạn bị bỏ (kết quả liên quan vẫn hết hạn theo TTL)."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        if self._pending:
+            print(f"WARNING: Dropping {len(self._pending)} pending user-updated events on shutdown.")
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """
+        Không xử lý sự kiện nào trong khối with (đợi lô đang xử lý xong trước khi vào khối); sự kiện mới vẫn được
+        nhận và gộp, rồi được xử lý khi ra khỏi khối (vd: trong lúc đổi version model).
+        """
+        with self._condition:
+            self._paused += 1
+            while self._processing:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._paused -= 1
+                self._condition.notify_all()
+
+    def drain(self) -> None:
+        """Xử lý ngay mọi sự kiện đang chờ trong thread hiện tại, không đợi đến hạn (vd: benchmark, script)."""
+        while True:
+            batch = self._take_batch(float("inf"))
+            if not batch:
+                return
+            self._process(batch)
+
+    def _due_at(self, first_received_at: float, last_received_at: float, failures: int, not_before: float) -> float:
+        return max(min(last_received_at + self.coalesce_seconds, first_received_at + self.max_delay_seconds),
+                   not_before)
+
+    def _take_batch(self, now: float) -> List[Tuple[int, float, int]]:
+        """Lấy các user đã đến hạn (sớm nhất trước): [(user_id, thời điểm nhận lần đầu, số lần lỗi)]."""
+        with self._condition:
+            if self._paused:
+                return []
+            due = sorted((self._due_at(*received), user_id) for user_id, received in self._pending.items()
+                         if self._due_at(*received) <= now)[:self.max_batch_size]
+            batch = []
+            for _, user_id in due:
+                first_received_at, _, failures, _ = self._pending.pop(user_id)
+                batch.append((user_id, first_received_at, failures))
+            self._processing += len(batch)
+            return batch
+
+    def _process(self, batch: List[Tuple[int, float, int]]) -> None:
+        failed = False
+        try:
+            self.process_batch([user_id for user_id, _, _ in batch])
+        except Exception as e:  # Lỗi của một lô không được làm dừng thread xử lý sự kiện
+            print(f"WARNING: Failed to process user-updated events for {len(batch)} users: {e}")
+            failed = True
+        finished_at = time.monotonic()
+        finished, retried = batch, []
+        with self._condition:
+            self._processing -= len(batch)
+            if failed:
+                finished = [event for event in batch if event[2] >= self.max_retries]
+                retried = [event for event in batch if event[2] < self.max_retries]
+                for user_id, first_received_at, failures in retried:
+                    self._requeue(user_id, first_received_at, failures + 1, finished_at)
+            self._condition.notify_all()
+        for _, first_received_at, _ in finished:
+            user_event_latency.observe(finished_at - first_received_at)
+        if failed:
+            if finished:
+                print(f"WARNING: Dropping user-updated events for {len(finished)} users after "
+                      f"{self.max_retries} retries.")
+            user_events_total.inc(len(retried), "retried")
+            user_events_total.inc(len(finished), "failed")
+        else:
+            user_events_total.inc(len(batch), "processed")
+
+    def _requeue(self, user_id: int, first_received_at: float, failures: int, now: float) -> None:
+        """Đưa lại user của lô bị lỗi vào hàng đợi với backoff (gọi khi giữ _condition)."""
+        retry_at = now + min(self.retry_backoff_seconds * 2 ** (failures - 1), self.max_delay_seconds)
+        pending = self._pending.get(user_id)
+        if pending is None:
+            self._pending[user_id] = (first_received_at, first_received_at, failures, retry_at)
+        else:  # Có sự kiện mới trong lúc xử lý: gộp, giữ thời điểm nhận đầu tiên của sự kiện cũ hơn
+            self._pending[user_id] = (min(first_received_at, pending[0]), pending[1], failures, retry_at)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    now = time.monotonic()
+                    next_due = None if self._paused else min(
+                        (self._due_at(*received) for received in self._pending.values()), default=None)
+                    if next_due is not None and next_due <= now:
+                        break
+                    self._condition.wait(None if next_due is None else next_due - now)
+                if self._stopped:
+                    return
+            batch = self._take_batch(time.monotonic())
+            if batch:
+                self._process(batch)
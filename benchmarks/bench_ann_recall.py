@@ -0,0 +1,131 @@
+# benchmarks/bench_ann_recall.py
+"""
+Recall@M của ANN candidate retrieval (CosineIVFIndex, ANN_RETRIEVAL_ENABLED) so với chấm điểm toàn bộ candidate.
+
+    python -m benchmarks.bench_ann_recall --users 20000 --anchors 50 --candidates 500,1000,2000,5000 --n-probe 16
+
+Population tổng hợp (benchmarks.synthetic, dùng lại file trong --data-dir) được nạp vào UserFeatureStore có
+ANN index. Với mỗi anchor, toàn bộ candidate tương thích (bucket sex/orientation, GEO_FILTER_MODE=off) được
+chấm điểm bằng LightGBM làm chuẩn; sau đó với mỗi M, chỉ M candidate do index trả về được giữ lại. In ra
+(cộng dồn trên mọi anchor):
+- top-K recall: phần trăm top-K match của bản chấm điểm toàn bộ nằm trong M candidate,
+- match recall: phần trăm mọi match (score > MATCH_PROBABILITY_THRESHOLD) nằm trong M candidate,
+- index recall: phần trăm top-M theo cosine similarity chính xác mà index tìm được,
+- random: recall kỳ vọng nếu chọn M candidate ngẫu nhiên (M / số candidate),
+- thời gian truy vấn index + chấm điểm M candidate so với chấm điểm toàn bộ.
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.ml.ann_index import normalize_rows
+from app.ml.compatibility import bucket_key
+from app.ml.feature_store import UserFeatureStore
+from app.ml.predictor import MatchPredictor
+from benchmarks.synthetic import DEFAULT_DATA_DIR, synthetic_database_url
+
+
+def _top_rows(rows: np.ndarray, scores: np.ndarray, ids: np.ndarray, k: int) -> np.ndarray:
+    """k dòng có score lớn nhất (hòa thì user id tăng dần), cùng thứ tự xếp hạng của MatchService."""
+    return rows[np.lexsort((ids, -scores))[:k]]
+
+
+def run(n_users: int, n_anchors: int, candidate_counts, n_probe: int, n_lists: int, top_k: int,
+        data_dir: str) -> int:
+    predictor = MatchPredictor(inference_mode=settings.MATCH_MODEL_INFERENCE.lower(), n_jobs=settings.MATCH_MODEL_N_JOBS)
+    threshold = settings.MATCH_PROBABILITY_THRESHOLD
+    engine = create_engine(synthetic_database_url(data_dir, n_users))
+    store = UserFeatureStore(predictor, fetch_chunk_size=settings.CANDIDATE_FETCH_CHUNK_SIZE, ann_enabled=True,
+                             ann_n_lists=n_lists)
+    started_at = time.perf_counter()
+    with Session(engine) as db:
+        store.build(db)
+    engine.dispose()
+    snapshot = store.snapshot()
+    columns = snapshot.columns
+    ids = columns.ids.astype(np.int64)
+    unit_vectors = normalize_rows(columns.feature_matrix)
+    print(f"{len(snapshot)} users, {snapshot.ann_index.n_lists} lists, n_probe={n_probe}, top-K={top_k}, "
+          f"threshold={threshold}, store + index built in {time.perf_counter() - started_at:.1f}s")
+
+    # Cộng dồn trên mọi anchor, theo từng M
+    totals = {m: {"top_hits": 0, "match_hits": 0, "index_hits": 0, "index_total": 0, "random": 0.0,
+                  "search": 0.0, "score": 0.0} for m in candidate_counts}
+    n_top = n_matches = 0
+    exhaustive_seconds = 0.0
+    anchor_rows = np.linspace(0, len(snapshot) - 1, min(n_anchors, len(snapshot))).astype(np.int64)
+    for anchor_row in anchor_rows:
+        anchor = columns.take([anchor_row])
+        candidate_rows = snapshot.bucket_index.compatible_rows(
+            bucket_key(columns.sex[anchor_row], columns.orientation[anchor_row]))
+        candidate_rows = candidate_rows[candidate_rows != anchor_row]
+        if candidate_rows.size == 0:
+            continue
+
+        scoring_started_at = time.perf_counter()
+        probas = predictor.predict_match_proba_columns(anchor, columns.take(candidate_rows))
+        exhaustive_seconds += time.perf_counter() - scoring_started_at
+        matched = probas > threshold
+        top = set(_top_rows(candidate_rows[matched], probas[matched], ids[candidate_rows[matched]], top_k).tolist())
+        matches = set(candidate_rows[matched].tolist())
+        n_top += len(top)
+        n_matches += len(matches)
+        cosine = unit_vectors[candidate_rows] @ unit_vectors[anchor_row]
+
+        for m in candidate_counts:
+            search_started_at = time.perf_counter()
+            retrieved = snapshot.similar_rows(columns.feature_matrix[anchor_row], candidate_rows, m, n_probe)
+            search_finished_at = time.perf_counter()
+            predictor.predict_match_proba_columns(anchor, columns.take(retrieved))
+            total = totals[m]
+            total["search"] += search_finished_at - search_started_at
+            total["score"] += time.perf_counter() - search_finished_at
+            retrieved_set = set(retrieved.tolist())
+            exact = set(_top_rows(candidate_rows, cosine, ids[candidate_rows], m).tolist())
+            total["top_hits"] += len(top & retrieved_set)
+            total["match_hits"] += len(matches & retrieved_set)
+            total["index_hits"] += len(exact & retrieved_set)
+            total["index_total"] += len(exact)
+            total["random"] += min(m / candidate_rows.size, 1.0) * len(top)
+
+    def ratio(hits: float, count: int) -> float:
+        return hits / count if count else math.nan
+
+    n_measured = len(anchor_rows)
+    print(f"{n_measured} anchors, {n_top} top-K matches, {n_matches} matches, "
+          f"exhaustive scoring {exhaustive_seconds / n_measured * 1e3:.1f} ms/anchor")
+    print(f"{'M':>6} {'top-K':>7} {'matches':>8} {'index':>7} {'random':>7} {'search ms':>10} {'score ms':>9} "
+          f"{'speedup':>7}")
+    for m in candidate_counts:
+        total = totals[m]
+        retrieval_seconds = total["search"] + total["score"]
+        print(f"{m:>6} {ratio(total['top_hits'], n_top):>7.1%} {ratio(total['match_hits'], n_matches):>8.1%} "
+              f"{ratio(total['index_hits'], total['index_total']):>7.1%} {ratio(total['random'], n_top):>7.1%} "
+              f"{total['search'] / n_measured * 1e3:>10.2f} {total['score'] / n_measured * 1e3:>9.1f} "
+              f"{exhaustive_seconds / retrieval_seconds:>7.2f}")
+    return 0
+
+
+def _int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000, help="Synthetic population size.")
+    parser.add_argument("--anchors", type=int, default=50, help="Number of anchor users (evenly spaced).")
+    parser.add_argument("--candidates", type=_int_list, default=[500, 1000, 2000, 5000],
+                        help="Comma-separated candidate counts M retrieved by the index.")
+    parser.add_argument("--n-probe", type=int, default=settings.ANN_N_PROBE, help="Lists scanned per query.")
+    parser.add_argument("--n-lists", type=int, default=settings.ANN_N_LISTS, help="Index lists (0 = about sqrt(N)).")
+    parser.add_argument("--top-k", type=int, default=settings.POTENTIAL_MATCHES_DEFAULT_LIMIT,
+                        help="Size of the exhaustive top-K used for top-K recall.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Directory of the generated SQLite files.")
+    args = parser.parse_args()
+    sys.exit(run(args.users, args.anchors, args.candidates, args.n_probe, args.n_lists, args.top_k, args.data_dir))
@@ -0,0 +1,120 @@
+# benchmarks/bench_bio_preprocessing.py
+"""
+Parity + thời gian xử lý bio: pipeline gốc (word_tokenize, lemmatize không cache, TF-IDF densify)
+so với fast path (fast_word_tokenize, lemmatize có LRU) và BioFeatureEncoder (ghi nhớ theo user).
+
+    python -m benchmarks.bench_bio_preprocessing                        # corpus tổng hợp
+    python -m benchmarks.bench_bio_preprocessing --database-url URL    # bio thật trong bảng profiles
+
+Thoát với mã lỗi 1 nếu fast tokenizer cho token khác word_tokenize trên bất kỳ bio nào của corpus.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from nltk.tokenize import word_tokenize
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from unidecode import unidecode
+
+from app.db import models
+from app.ml import preprocessing
+from app.ml.artifacts import PreprocessingArtifacts
+from app.ml.bio_features import BioFeatureEncoder
+from benchmarks.synthetic import BIO_SENTENCES
+
+# Các trường hợp đặc biệt của tokenizer (contraction, dấu, xuống dòng, chữ số)
+EDGE_CASE_BIOS = [
+    "I cannot wait, gonna travel!!", "wanna grab coffee? lemme know", "gotta love dogs... cats too",
+    "Café crème & naïve résumé 2024", "'tis the season, d'ye know", "Music\nmovies\tand   books",
+    "GIMME pizza, more'n anything", "", None,
+]
+
+
+def _normalize(text: str) -> str:
+    # Giống các bước trước khi tokenize trong preprocessing.preprocess_text
+    text = unidecode(str(text).lower())
+    text = re.sub(r'[^\w\s]', '', text)
+    return re.sub(r'\d+', '', text)
+
+
+def _reference_tokenize(text: str) -> list:
+    try:
+        return word_tokenize(text)
+    except LookupError:  # Thiếu dữ liệu Punkt: text không có dấu câu nên chỉ là một câu
+        return word_tokenize(text, preserve_line=True)
+
+
+def _load_corpus(database_url: str, size: int, seed: int) -> list:
+    if database_url:
+        with Session(create_engine(database_url)) as db:
+            return [bio for bio in db.scalars(select(models.Profile.bio)) if bio is not None] + EDGE_CASE_BIOS
+    rnd = random.Random(seed)
+    return [" ".join(rnd.sample(BIO_SENTENCES, rnd.randint(1, 3))) for _ in range(size)] + EDGE_CASE_BIOS
+
+
+def check_tokenizer_parity(corpus: list) -> int:
+    mismatches = 0
+    for bio in corpus:
+        if bio is None:
+            continue
+        text = _normalize(bio)
+        expected, actual = _reference_tokenize(text), preprocessing.fast_word_tokenize(text)
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH: {bio!r}: {expected} != {actual}")
+    return mismatches
+
+
+def _timed(func) -> float:
+    started_at = time.perf_counter()
+    func()
+    return time.perf_counter() - started_at
+
+
+def run(database_url: str, size: int, seed: int) -> int:
+    corpus = _load_corpus(database_url, size, seed)
+    mismatches = check_tokenizer_parity(corpus)
+    print(f"Tokenizer parity: {len(corpus) - mismatches}/{len(corpus)} bios identical")
+    if preprocessing.lemmatizer is None:
+        print("WARNING: NLTK data not found, preprocess_text returns '' and the timings below are not meaningful.")
+
+    vectorizer = PreprocessingArtifacts().tfidf_vectorizer_bio
+
+    def reference_pipeline():
+        for bio in corpus:
+            processed = preprocessing.preprocess_text(bio, fast_tokenizer=False)
+            vectorizer.transform([processed]).toarray()
+
+    def fast_pipeline():
+        for bio in corpus:
+            vectorizer.transform([preprocessing.preprocess_text(bio)])
+
+    encoder = BioFeatureEncoder(vectorizer)
+
+    def memoized_pipeline():
+        for user_id, bio in enumerate(corpus):
+            encoder.transform(bio, user_id=user_id)
+
+    reference_seconds = _timed(reference_pipeline)
+    rows = [
+        ("reference (word_tokenize, dense)", reference_seconds),
+        ("fast tokenizer + lemma LRU", _timed(fast_pipeline)),
+        ("BioFeatureEncoder, cold", _timed(memoized_pipeline)),
+        ("BioFeatureEncoder, warm", _timed(memoized_pipeline)),
+    ]
+    print(f"{'pipeline':<34} {'seconds':>8} {'us/bio':>8} {'speedup':>8}")
+    for name, seconds in rows:
+        print(f"{name:<34} {seconds:>8.3f} {seconds / len(corpus) * 1e6:>8.1f} {reference_seconds / seconds:>8.1f}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="", help="Read bios from the profiles table of this database.")
+    parser.add_argument("--size", type=int, default=5000, help="Synthetic corpus size.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(run(args.database_url, args.size, args.seed))
@@ -0,0 +1,62 @@
+# benchmarks/bench_booster_inference.py
+"""
+Thời gian suy luận: LGBMClassifier.predict_proba trên pd.DataFrame (chế độ "sklearn")
+so với lightgbm.Booster trên mảng NumPy (chế độ "booster") của MatchPredictor.
+
+    python -m benchmarks.bench_booster_inference
+    python -m benchmarks.bench_booster_inference --n-jobs 1
+
+Hai chế độ cho xác suất giống nhau từng bit, được kiểm tra trong test/test_booster_inference.py.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.ml.predictor import MatchPredictor
+
+
+def random_feature_matrix(rng: np.random.Generator, n_rows: int, n_features: int) -> np.ndarray:
+    matrix = rng.random((n_rows, n_features))
+    # Một phần cột là cờ 0/1 (orientation_compatible_*, *_match), một phần giá trị nằm ngoài [0, 1]
+    binary_cols = rng.random(n_features) < 0.3
+    matrix[:, binary_cols] = np.round(matrix[:, binary_cols])
+    matrix[rng.random((n_rows, n_features)) < 0.02] *= rng.choice([-3.0, 5.0])
+    matrix[rng.random((n_rows, n_features)) < 0.01] = np.nan
+    return matrix
+
+
+def _timed(func, repeat: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started_at) / repeat
+
+
+def run(n_jobs: int, seed: int) -> int:
+    reference = MatchPredictor(inference_mode="sklearn", n_jobs=n_jobs, use_bundle=False)
+    candidate = MatchPredictor(inference_mode="booster", n_jobs=n_jobs, use_bundle=False)
+    if candidate.inference_mode != "booster":
+        print("WARNING: Model has no usable LightGBM booster, nothing to compare.")
+        return 1
+
+    rng = np.random.default_rng(seed + 1)
+    n_features = len(reference.pairwise_input_columns)
+    print(f"{'rows':>8} {'sklearn ms':>11} {'booster ms':>11} {'speedup':>8}")
+    for n_rows in (1, 100, 10000):
+        matrix = random_feature_matrix(rng, n_rows, n_features)
+        repeat = max(10000 // n_rows, 3)
+        sklearn_seconds = _timed(lambda: reference._predict_proba_matrix(matrix), repeat)
+        booster_seconds = _timed(lambda: candidate._predict_proba_matrix(matrix), repeat)
+        print(f"{n_rows:>8} {sklearn_seconds * 1e3:>11.3f} {booster_seconds * 1e3:>11.3f} "
+              f"{sklearn_seconds / booster_seconds:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="LightGBM threads for both modes.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(run(args.n_jobs, args.seed))
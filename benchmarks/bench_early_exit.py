@@ -0,0 +1,95 @@
+# benchmarks/bench_early_exit.py
+"""
+Speedup của EarlyExitTreeEvaluator (chỉ trả lời "proba > threshold?") so với Booster.predict đầy đủ.
+
+    python -m benchmarks.bench_early_exit --users 3000 --anchors 20 --thresholds 0.3,0.5,0.7
+
+Ma trận pairwise feature thật được tính từ một population tổng hợp (benchmarks.synthetic, SQLite tạm):
+`anchors` user đầu tiên ghép với toàn bộ population. Với mỗi threshold in ra tỉ lệ (dòng x cây) thực sự
+được đánh giá, số dòng phải tính lại bằng Booster và thời gian. Thoát với mã lỗi 1 nếu quyết định của
+evaluator khác Booster.predict(...) > threshold ở bất kỳ dòng nào. MATCH_EARLY_EXIT_MIN_THRESHOLD nên là threshold
+nhỏ nhất có speedup > 1: dưới đó service dùng Booster.predict.
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.db import crud
+from app.ml.predictor import MatchPredictor
+from benchmarks.synthetic import create_synthetic_database
+
+
+def build_pair_matrix(predictor: MatchPredictor, n_users: int, n_anchors: int, seed: int) -> np.ndarray:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_synthetic_database(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}", n_users, seed=seed)
+        with Session(engine) as db:
+            user_ids = list(range(1, n_users + 1))
+            raw_data = crud.get_users_profile_raw_data_bulk(db, user_ids)
+        engine.dispose()
+    present_ids = [user_id for user_id in user_ids if raw_data.get(user_id)]
+    columns, positions = predictor.build_user_columns([raw_data[user_id] for user_id in present_ids])
+
+    matrices = []
+    for anchor_row in range(min(n_anchors, len(positions))):
+        pair_feature_matrix, valid = predictor.pairwise_engine.build(columns, columns, anchor_row)
+        matrices.append(pair_feature_matrix[valid])
+    return np.ascontiguousarray(np.vstack(matrices))
+
+
+def _timed(func, repeat: int):
+    best, result = math.inf, None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started_at)
+    return best, result
+
+
+def run(n_users: int, n_anchors: int, thresholds, n_jobs: int, repeat: int, seed: int) -> int:
+    predictor = MatchPredictor(n_jobs=n_jobs, early_exit=True)
+    evaluator = predictor.tree_evaluator
+    if evaluator is None:
+        print("WARNING: Early-exit evaluator is not available for this model.")
+        return 1
+
+    matrix = build_pair_matrix(predictor, n_users, n_anchors, seed)
+    booster_seconds, probas = _timed(lambda: predictor.booster.predict(matrix, num_threads=predictor.num_threads),
+                                     repeat)
+    print(f"{matrix.shape[0]} pairs, {evaluator.num_trees} trees, {len(evaluator.groups)} tree groups, "
+          f"LightGBM threads: {predictor.num_threads}")
+    print(f"{'threshold':>9} {'matched':>8} {'trees':>6} {'exact':>6} {'booster s':>9} {'early s':>8} {'speedup':>7}")
+
+    mismatches = 0
+    for threshold in thresholds:
+        stats = {}
+        early_seconds, above = _timed(lambda: evaluator.predict_above(matrix, threshold, stats), repeat)
+        expected = probas > threshold
+        mismatches += int((above != expected).sum())
+        print(f"{threshold:>9.2f} {expected.mean():>8.1%} {stats['tree_fraction']:>6.1%} "
+              f"{stats['exact_fallback_rows']:>6} {booster_seconds:>9.3f} {early_seconds:>8.3f} "
+              f"{booster_seconds / early_seconds:>7.2f}")
+    print(f"Decision parity: {mismatches} mismatching rows")
+    return 1 if mismatches else 0
+
+
+def _float_list(value: str):
+    return [float(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=3000, help="Synthetic population size.")
+    parser.add_argument("--anchors", type=int, default=20, help="Number of anchor users paired with everyone.")
+    parser.add_argument("--thresholds", type=_float_list, default=[0.3, 0.5, 0.7, 0.9],
+                        help="Comma-separated probability thresholds.")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="LightGBM threads for Booster.predict.")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(run(args.users, args.anchors, args.thresholds, args.n_jobs, args.repeat, args.seed))
@@ -0,0 +1,65 @@
+# benchmarks/bench_model_load.py
+"""
+Thời gian khởi tạo MatchPredictor: các file .joblib (pickle) so với bundle (app/ml/model_bundle.py).
+
+    python -m benchmarks.bench_model_load --runs 5
+
+Các file .joblib của --models-dir được copy vào một thư mục tạm và export thành bundle ở đó (không ghi vào
+--models-dir). Mỗi lần đo chạy trong một process Python mới (import đã xong trước khi bấm giờ), với early exit
+tắt và bật (EarlyExitTreeEvaluator dựng lại cấu trúc cây từ dump của model hoặc từ mảng của bundle).
+In ra median thời gian khởi tạo và RSS tăng thêm của process sau khi khởi tạo.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from app.ml.artifacts import MODELS_DIR
+from app.ml.model_bundle import export_bundle
+
+_CHILD = """
+import json, resource, sys, time
+from app.ml.predictor import MatchPredictor
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started_at = time.perf_counter()
+MatchPredictor(sys.argv[1], early_exit=sys.argv[2] == "1", use_bundle=sys.argv[3] == "1")
+seconds = time.perf_counter() - started_at
+print(json.dumps({"seconds": seconds, "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before}))
+"""
+
+
+def _measure(models_dir: str, early_exit: bool, use_bundle: bool) -> dict:
+    output = subprocess.run([sys.executable, "-c", _CHILD, models_dir, str(int(early_exit)), str(int(use_bundle))],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(models_dir: str, runs: int) -> int:
+    work_dir = tempfile.mkdtemp(prefix="amoura-bundle-")
+    try:
+        for name in os.listdir(models_dir):
+            if name.endswith(".joblib"):
+                shutil.copy(os.path.join(models_dir, name), work_dir)
+        export_bundle(work_dir)
+        print(f"{'early exit':>10} {'source':>7} {'init ms':>8} {'RSS +MB':>8}")
+        for early_exit in (False, True):
+            for use_bundle in (False, True):
+                samples = [_measure(work_dir, early_exit, use_bundle) for _ in range(runs)]
+                print(f"{'on' if early_exit else 'off':>10} {'bundle' if use_bundle else 'joblib':>7} "
+                      f"{statistics.median(s['seconds'] for s in samples) * 1e3:>8.1f} "
+                      f"{statistics.median(s['rss_kb'] for s in samples) / 1024:>8.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models-dir", default=MODELS_DIR, help="Directory with the .joblib files to compare.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per configuration.")
+    args = parser.parse_args()
+    sys.exit(run(args.models_dir, max(args.runs, 1)))
@@ -0,0 +1,96 @@
+# benchmarks/bench_sharded_scoring.py
+"""
+Đường cong speedup của ShardedScoringPool theo số candidate và số worker process.
+
+    python -m benchmarks.bench_sharded_scoring --candidates 2000,5000,10000 --workers 1,2,4,8
+
+Mỗi kích thước population được sinh vào một SQLite file tạm (benchmarks.synthetic), sau đó đo
+MatchService.get_potential_matches (DB path, không dùng UserFeatureStore) chạy trong process hiện tại
+và chạy qua ShardedScoringPool với từng số worker. Kết quả của pool được kiểm tra khớp với bản tuần tự.
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.db import crud, models
+from app.ml.predictor import MatchPredictor
+from app.services.match_service import MatchService
+from app.services.scoring_pool import ShardedScoringPool
+from benchmarks.synthetic import create_synthetic_database
+
+ANCHOR_USER_ID = 1
+BISEXUAL_ORIENTATION_ID = 3
+
+
+def _prepare_anchor(engine) -> None:
+    # Anchor bisexual, không giới hạn khoảng cách -> tập candidate lớn nhất có thể
+    with Session(engine) as db:
+        db.execute(update(models.User).where(models.User.id == ANCHOR_USER_ID).values(role_id=1))
+        db.execute(update(models.Profile).where(models.Profile.user_id == ANCHOR_USER_ID)
+                   .values(orientation_id=BISEXUAL_ORIENTATION_ID, location_preference=-1))
+        db.commit()
+
+
+def _timed(func, repeat: int):
+    best, result = math.inf, None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started_at)
+    return best, result
+
+
+def run(candidate_counts, worker_counts, repeat: int, shard_size: int = 0) -> None:
+    predictor = MatchPredictor()
+    print(f"CPU count: {os.cpu_count()}")
+    print(f"{'users':>8} {'candidates':>10} {'workers':>7} {'shard':>6} {'seconds':>8} {'speedup':>7}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_users in candidate_counts:
+            database_url = f"sqlite:///{os.path.join(tmp_dir, f'bench_{n_users}.db')}"
+            engine = create_synthetic_database(database_url, n_users)
+            _prepare_anchor(engine)
+
+            with Session(engine) as db:
+                candidate_count = len(crud.get_all_other_user_ids_with_role(db, ANCHOR_USER_ID))
+                baseline_seconds, expected = _timed(
+                    lambda: MatchService(db, predictor).get_potential_matches(ANCHOR_USER_ID), repeat)
+                print(f"{n_users:>8} {candidate_count:>10} {'-':>7} {'-':>6} {baseline_seconds:>8.2f} {1.0:>7.2f}")
+
+                for workers in worker_counts:
+                    # Mặc định: mỗi worker nhận một shard
+                    shard = shard_size or max(math.ceil(candidate_count / workers), 1)
+                    # min_candidates=1: kể cả 1 worker / 1 shard cũng đi qua pool (đo được chi phí IPC)
+                    pool = ShardedScoringPool(workers, shard, database_url=database_url, min_candidates=1)
+                    try:
+                        pool.warmup()
+                        seconds, result = _timed(
+                            lambda: MatchService(db, predictor, scoring_pool=pool).get_potential_matches(
+                                ANCHOR_USER_ID), repeat)
+                    finally:
+                        pool.shutdown()
+                    assert result == expected, "Sharded scoring returned different matches"
+                    print(f"{n_users:>8} {candidate_count:>10} {workers:>7} {shard:>6} {seconds:>8.2f} "
+                          f"{baseline_seconds / seconds:>7.2f}")
+            engine.dispose()
+
+
+def _int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=_int_list, default=[1000, 5000, 20000],
+                        help="Comma-separated population sizes.")
+    parser.add_argument("--workers", type=_int_list, default=[1, 2, 4],
+                        help="Comma-separated worker process counts.")
+    parser.add_argument("--shard-size", type=int, default=0,
+                        help="Candidates per shard (default: candidates / workers).")
+    parser.add_argument("--repeat", type=int, default=1, help="Best of N runs.")
+    args = parser.parse_args()
+    run(args.candidates, args.workers, args.repeat, args.shard_size)
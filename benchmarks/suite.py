@@ -0,0 +1,248 @@
+# benchmarks/suite.py
+"""
+Bộ benchmark offline (không cần Postgres): population tổng hợp trong SQLite + microbenchmark kiểu
+pytest-benchmark cho các bước chính của service, kết quả ghi ra JSON để so sánh giữa các commit.
+
+    python -m benchmarks.suite                                   # 1k, 10k, 100k user
+    python -m benchmarks.suite --sizes 1000,10000 --output before.json
+    python -m benchmarks.suite --sizes 1000,10000 --compare before.json
+
+Population được sinh một lần vào --data-dir (benchmarks/data) và dùng lại ở các lần chạy sau.
+Mỗi benchmark chạy ít nhất `min_rounds` vòng và tới khi hết `max_time` giây; thống kê (min, max, mean,
+stddev, median, iqr, ops) tính theo một lần gọi, giống format JSON của pytest-benchmark.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db import crud
+from app.ml import preprocessing
+from app.ml.feature_store import UserFeatureStore
+from app.ml.predictor import MatchPredictor
+from app.services.match_service import MatchService
+from benchmarks.synthetic import DEFAULT_DATA_DIR, POPULATION_SIZES, synthetic_database_url
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# Số user mẫu (role USER) dùng cho các microbenchmark theo từng user / từng cặp
+SAMPLE_USERS = 200
+# Số anchor user được xoay vòng trong benchmark end-to-end
+END_TO_END_ANCHORS = 5
+
+
+def benchmark_stats(round_seconds: List[float], iterations: int) -> Dict[str, float]:
+    """Thống kê theo một lần gọi từ thời gian của từng vòng (mỗi vòng gọi `iterations` lần)."""
+    per_call = sorted(seconds / iterations for seconds in round_seconds)
+    rounds = len(per_call)
+    if rounds >= 2:
+        q1, _, q3 = statistics.quantiles(per_call, n=4, method="inclusive")
+    else:
+        q1 = q3 = per_call[0]
+    mean = statistics.fmean(per_call)
+    return {
+        "min": per_call[0], "max": per_call[-1], "mean": mean,
+        "stddev": statistics.stdev(per_call) if rounds >= 2 else 0.0,
+        "median": statistics.median(per_call), "q1": q1, "q3": q3, "iqr": q3 - q1,
+        "rounds": rounds, "iterations": iterations, "total": sum(round_seconds),
+        "ops": 1.0 / mean if mean > 0 else math.inf,
+    }
+
+
+def run_benchmark(target: Callable[[], object], iterations: int = 1, min_rounds: int = 5, max_time: float = 1.0,
+                  warmup_rounds: int = 1) -> Dict[str, float]:
+    """Gọi target theo vòng (mỗi vòng `iterations` lần) cho tới khi đủ min_rounds và hết max_time giây."""
+    for _ in range(warmup_rounds):
+        for _ in range(iterations):
+            target()
+    round_seconds: List[float] = []
+    started_at = time.perf_counter()
+    while len(round_seconds) < min_rounds or time.perf_counter() - started_at < max_time:
+        round_started_at = time.perf_counter()
+        for _ in range(iterations):
+            target()
+        round_seconds.append(time.perf_counter() - round_started_at)
+    return benchmark_stats(round_seconds, iterations)
+
+
+class PopulationContext:
+    """Dữ liệu dùng chung cho các benchmark của một population: session, predictor, user mẫu."""
+
+    def __init__(self, predictor: MatchPredictor, database_url: str, n_users: int):
+        self.predictor = predictor
+        self.n_users = n_users
+        self.engine = create_engine(database_url)
+        self.db = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)()
+
+        self.user_ids = crud.get_user_ids_with_role(self.db, role_name="USER")
+        raw_data = crud.get_users_profile_raw_data_bulk(self.db, self.user_ids[:SAMPLE_USERS])
+        self.sample_tuples = [raw_data[user_id] for user_id in self.user_ids[:SAMPLE_USERS] if user_id in raw_data]
+        self.sample_raw = [predictor._transform_raw_user_data_to_ml_input(*user_tuple)
+                           for user_tuple in self.sample_tuples]
+        self.sample_vectors = [predictor._get_user_feature_vector(*user_tuple) for user_tuple in self.sample_tuples]
+        # Cặp (i, j) cố định giữa các user mẫu
+        n_samples = len(self.sample_tuples)
+        self.sample_pairs = [(i, (i * 7 + 3) % n_samples) for i in range(n_samples) if (i * 7 + 3) % n_samples != i]
+        self.anchor_ids = self.user_ids[:END_TO_END_ANCHORS]
+
+    def close(self) -> None:
+        self.db.close()
+        self.engine.dispose()
+
+
+def _cycle(items) -> Callable[[], object]:
+    iterator = itertools.cycle(items)
+    return lambda: next(iterator)
+
+
+def define_benchmarks(ctx: PopulationContext) -> List[dict]:
+    """Danh sách benchmark của một population: group, name, target và tham số chạy."""
+    predictor = ctx.predictor
+    artifacts = predictor.artifacts
+    next_raw = _cycle(ctx.sample_raw)
+    next_pair = _cycle(ctx.sample_pairs)
+    next_anchor = _cycle(ctx.anchor_ids)
+
+    def pairwise_vector():
+        i, j = next_pair()
+        return preprocessing.create_pairwise_features_vector(
+            ctx.sample_raw[i], ctx.sample_vectors[i], ctx.sample_raw[j], ctx.sample_vectors[j],
+            pairwise_input_columns_list=predictor.pairwise_input_columns,
+            pairwise_features_scaler=predictor.pairwise_features_scaler,
+            numerical_cols_to_scale_in_notebook=predictor.numerical_pairwise_cols_to_scale)
+
+    def predict_pair():
+        i, j = next_pair()
+        return predictor.predict_match_proba(ctx.sample_tuples[i], ctx.sample_tuples[j])
+
+    feature_store = UserFeatureStore(predictor, fetch_chunk_size=settings.CANDIDATE_FETCH_CHUNK_SIZE)
+
+    def build_store():
+        feature_store.build(ctx.db)
+
+    return [
+        {"group": "user_features", "name": "create_user_feature_vector",
+         "target": lambda: preprocessing.create_user_feature_vector(next_raw(), artifacts=artifacts), "iterations": 20},
+        {"group": "user_features", "name": "create_user_feature_array",
+         "target": lambda: preprocessing.create_user_feature_array(next_raw(), artifacts=artifacts), "iterations": 20},
+        {"group": "pairwise", "name": "create_pairwise_features_vector", "target": pairwise_vector, "iterations": 20},
+        {"group": "predict", "name": "predict_match_proba", "target": predict_pair, "iterations": 10},
+        {"group": "end_to_end", "name": "get_potential_matches[db]",
+         "target": lambda: MatchService(ctx.db, predictor).get_potential_matches(next_anchor()),
+         "min_rounds": 1, "warmup_rounds": 0},
+        {"group": "end_to_end", "name": "feature_store_build", "target": build_store,
+         "min_rounds": 1, "warmup_rounds": 0, "max_time": 0.0},
+        {"group": "end_to_end", "name": "get_potential_matches[store]",
+         "target": lambda: MatchService(ctx.db, predictor, feature_store=feature_store).get_potential_matches(
+             next_anchor()), "min_rounds": 3},
+    ]
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def commit_info() -> Dict[str, object]:
+    return {"id": _git("rev-parse", "HEAD"), "branch": _git("rev-parse", "--abbrev-ref", "HEAD"),
+            "time": _git("log", "-1", "--format=%cI"), "dirty": bool(_git("status", "--porcelain"))}
+
+
+def machine_info() -> Dict[str, object]:
+    return {"node": platform.node(), "machine": platform.machine(), "system": platform.system(),
+            "release": platform.release(), "python_version": platform.python_version(),
+            "python_implementation": platform.python_implementation(), "cpu": {"count": os.cpu_count()}}
+
+
+def run(sizes: List[int], data_dir: str, max_time: float, name_filter: str) -> dict:
+    predictor = MatchPredictor(inference_mode=settings.MATCH_MODEL_INFERENCE.lower(), n_jobs=settings.MATCH_MODEL_N_JOBS)
+    if preprocessing.lemmatizer is None:
+        print("WARNING: NLTK data not found, bios are not preprocessed and the timings are not representative.")
+
+    results = []
+    print(f"{'users':>7} {'benchmark':<34} {'mean ms':>10} {'median ms':>10} {'stddev ms':>10} {'rounds':>6}")
+    for n_users in sizes:
+        started_at = time.perf_counter()
+        database_url = synthetic_database_url(data_dir, n_users)
+        print(f"INFO: Population of {n_users} users ready in {time.perf_counter() - started_at:.1f}s ({database_url})")
+        ctx = PopulationContext(predictor, database_url, n_users)
+        try:
+            for bench in define_benchmarks(ctx):
+                if name_filter and name_filter not in bench["name"]:
+                    continue
+                stats = run_benchmark(bench["target"], iterations=bench.get("iterations", 1),
+                                      min_rounds=bench.get("min_rounds", 5),
+                                      max_time=bench.get("max_time", max_time),
+                                      warmup_rounds=bench.get("warmup_rounds", 1))
+                results.append({"group": bench["group"], "name": bench["name"],
+                                "fullname": f"{bench['name']}[users={n_users}]",
+                                "params": {"users": n_users}, "stats": stats})
+                print(f"{n_users:>7} {bench['name']:<34} {stats['mean'] * 1e3:>10.3f} {stats['median'] * 1e3:>10.3f} "
+                      f"{stats['stddev'] * 1e3:>10.3f} {stats['rounds']:>6}")
+        finally:
+            ctx.close()
+
+    return {"machine_info": machine_info(), "commit_info": commit_info(),
+            "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(), "benchmarks": results}
+
+
+def compare(current: dict, previous: dict) -> None:
+    """In thời gian trung bình của hai lần chạy theo fullname (ratio < 1 là nhanh hơn lần trước)."""
+    previous_by_name = {bench["fullname"]: bench for bench in previous.get("benchmarks", [])}
+    previous_commit = (previous.get("commit_info") or {}).get("id") or "previous"
+    print(f"\nComparison with {previous_commit[:12]}:")
+    print(f"{'benchmark':<50} {'before ms':>10} {'after ms':>10} {'ratio':>7}")
+    for bench in current["benchmarks"]:
+        before = previous_by_name.get(bench["fullname"])
+        if before is None:
+            continue
+        before_mean, after_mean = before["stats"]["mean"], bench["stats"]["mean"]
+        print(f"{bench['fullname']:<50} {before_mean * 1e3:>10.3f} {after_mean * 1e3:>10.3f} "
+              f"{after_mean / before_mean:>7.2f}")
+
+
+def _int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=_int_list, default=list(POPULATION_SIZES),
+                        help="Comma-separated population sizes.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Directory of the generated SQLite files.")
+    parser.add_argument("--output", default="",
+                        help="JSON result file (default: benchmarks/results/<commit>_<timestamp>.json).")
+    parser.add_argument("--compare", default="", help="Previous JSON result file to compare against.")
+    parser.add_argument("--max-time", type=float, default=1.0, help="Seconds per benchmark after min rounds.")
+    parser.add_argument("-k", dest="name_filter", default="", help="Only run benchmarks whose name contains this.")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.data_dir, args.max_time, args.name_filter)
+    output = args.output
+    if not output:
+        commit_id = (report["commit_info"]["id"] or "nocommit")[:12]
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        output = os.path.join(DEFAULT_RESULTS_DIR, f"{commit_id}_{timestamp}.json")
+    with open(output, "w") as result_file:
+        json.dump(report, result_file, indent=2)
+    print(f"INFO: Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            compare(report, json.load(previous_file))
+    sys.exit(0)
@@ -0,0 +1,224 @@
+# benchmarks/synthetic.py
+"""
+Sinh population user tổng hợp vào một database bất kỳ theo schema app/db/models.py (thường là SQLite).
+
+    python -m benchmarks.synthetic --users 10000 --output benchmarks/data/synthetic_10000.db
+
+Phân phối bám theo dữ liệu lúc train model: giá trị lookup theo đúng miền giá trị của các encoder
+(thứ tự phổ biến giảm dần, chọn theo trọng số Zipf), tuổi lệch về 20-35, chiều cao theo giới tính,
+tọa độ tập trung quanh Hà Nội và vài thành phố khác, một phần nhỏ thiếu location / lookup / bio.
+"""
+import argparse
+import datetime
+import functools
+import os
+import random
+from typing import List, Optional, Sequence
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.db import models
+
+# Kích thước population chuẩn của bộ benchmark
+POPULATION_SIZES = (1000, 10000, 100000)
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# Giá trị lookup theo miền giá trị lúc train model, xếp theo độ phổ biến giảm dần
+LOOKUP_VALUES = {
+    models.BodyType: ['average', 'athletic', 'slim', 'curvy', 'muscular', 'plus-size', 'prefer not to say'],
+    models.Orientation: ['straight', 'homosexual', 'bisexual', 'prefer not to say'],
+    models.JobIndustry: ['student', 'information technology (it)', 'business/management', 'finance/accounting',
+                         'education/training', 'healthcare/medical', 'engineering/architecture', 'art/creative',
+                         'hospitality/tourism', 'government/legal', 'skilled trades/labor', 'unemployed',
+                         'prefer not to say', 'other'],
+    models.DrinkStatus: ['socially', 'occasionally', 'never', 'regularly', 'prefer not to say'],
+    models.SmokeStatus: ['never', 'occasionally', 'former smoker', 'regularly', 'prefer not to say'],
+    models.EducationLevel: ["bachelor's degree", 'high school', "master's degree",
+                            'college diploma / associate degree', 'doctorate / phd', 'prefer not to say'],
+    models.Pet: ['dog', 'cat', 'fish', 'bird', 'hamster', 'rabbit', 'reptile', 'horse', 'other'],
+    models.Interest: ['travel', 'music', 'movies & tv', 'cooking & food', 'fitness & sports', 'reading',
+                      'nature & outdoors', 'gaming', 'art & design', 'volunteering'],
+    models.Language: ['vietnamese', 'english', 'french', 'japanese', 'korean', 'mandarin', 'german', 'spanish',
+                      'russian', 'italian', 'portuguese', 'hindi', 'arabic', 'urdu', 'marathi'],
+}
+SEXES = ['male', 'female', 'non-binary', 'prefer not to say']
+SEX_WEIGHTS = [0.48, 0.48, 0.025, 0.015]
+ORIENTATION_WEIGHTS = [0.78, 0.09, 0.10, 0.03]
+# Chiều cao (inch) theo giới tính: (trung bình, độ lệch chuẩn)
+HEIGHT_BY_SEX = {'male': (68.0, 3.0), 'female': (63.5, 2.5)}
+DEFAULT_HEIGHT = (66.0, 3.5)
+# location_preference (km, -1 = mọi nơi) và trọng số
+LOCATION_PREFERENCES = [-1, 5, 10, 20, 50, 100]
+LOCATION_PREFERENCE_WEIGHTS = [0.2, 0.1, 0.15, 0.2, 0.2, 0.15]
+# Thành phố: (lat, lon, độ lệch chuẩn theo độ, trọng số, tên)
+CITIES = [
+    (21.0285, 105.8542, 0.10, 0.75, "Hanoi"),
+    (20.8449, 106.6881, 0.05, 0.08, "Hai Phong"),
+    (21.1861, 106.0763, 0.04, 0.07, "Bac Ninh"),
+    (10.8231, 106.6297, 0.08, 0.07, "Ho Chi Minh City"),
+    (16.0544, 108.2022, 0.05, 0.03, "Da Nang"),
+]
+BIO_SENTENCES = [
+    "I love hiking and exploring new places on weekends.",
+    "Coffee lover, dog person and amateur photographer.",
+    "Looking for someone kind, funny and curious about the world.",
+    "Software engineer by day, guitarist by night.",
+    "Trying every street food stall in the city, one bowl at a time.",
+    "Learning French and planning my next trip to Europe!",
+    "Books, board games and long walks by the river.",
+    "Gym in the morning, pho in the evening.",
+    "Ask me about my cat, she is the real boss here.",
+    "Teacher, volunteer and part-time baker.",
+    "Not great at texting, better over coffee.",
+    "Movie nights, indie music and too many houseplants.",
+]
+MISSING_LOCATION_RATIO = 0.03
+MISSING_LOOKUP_RATIO = 0.05
+EMPTY_BIO_RATIO = 0.1
+
+
+@functools.lru_cache(maxsize=None)
+def _zipf_weights(n: int, exponent: float = 0.8) -> List[float]:
+    return [1.0 / (rank + 1) ** exponent for rank in range(n)]
+
+
+def _sample_items(rnd: random.Random, ids: Sequence[int], count: int) -> List[int]:
+    """Chọn `count` id khác nhau theo trọng số Zipf (id đầu danh sách phổ biến hơn)."""
+    weights = _zipf_weights(len(ids))
+    chosen: List[int] = []
+    while len(chosen) < min(count, len(ids)):
+        item_id = rnd.choices(ids, weights=weights)[0]
+        if item_id not in chosen:
+            chosen.append(item_id)
+    return chosen
+
+
+def _maybe(rnd: random.Random, ids: list, none_ratio: float = MISSING_LOOKUP_RATIO) -> Optional[int]:
+    return None if rnd.random() < none_ratio else rnd.choices(ids, weights=_zipf_weights(len(ids)))[0]
+
+
+def _date_of_birth(rnd: random.Random, today: datetime.date) -> datetime.date:
+    age_years = rnd.triangular(18, 60, 26)
+    return today - datetime.timedelta(days=int(age_years * 365.25))
+
+
+def _height(rnd: random.Random, sex: str) -> int:
+    mean, std = HEIGHT_BY_SEX.get(sex, DEFAULT_HEIGHT)
+    return int(min(max(round(rnd.gauss(mean, std)), 55), 83))
+
+
+def _location(rnd: random.Random, user_id: int) -> Optional[dict]:
+    if rnd.random() < MISSING_LOCATION_RATIO:
+        return None
+    lat, lon, std, _, city = rnd.choices(CITIES, weights=[city[3] for city in CITIES])[0]
+    return {"user_id": user_id, "latitudes": round(rnd.gauss(lat, std), 6),
+            "longitudes": round(rnd.gauss(lon, std), 6), "country": "Vietnam", "city": city}
+
+
+def _bio(rnd: random.Random) -> Optional[str]:
+    if rnd.random() < EMPTY_BIO_RATIO:
+        return rnd.choice([None, ""])
+    return " ".join(rnd.sample(BIO_SENTENCES, rnd.randint(1, 4)))
+
+
+def create_synthetic_database(database_url: str, n_users: int, seed: int = 0,
+                              user_role_ratio: float = 0.95) -> Engine:
+    """
+    Tạo schema và sinh n_users user ngẫu nhiên (có profile, location, pets/interests/languages)
+    trên database_url (vd: "sqlite:///bench.db"). Kết quả tất định theo `seed`.
+    """
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(engine)
+    rnd = random.Random(seed)
+    today = datetime.date(2025, 1, 1)  # Cố định để tuổi không đổi theo ngày chạy
+
+    with Session(engine) as db:
+        db.execute(insert(models.Role), [{"id": 1, "name": "USER"}, {"id": 2, "name": "ADMIN"}])
+        lookup_ids = {}
+        for model, names in LOOKUP_VALUES.items():
+            db.execute(insert(model), [{"id": i + 1, "name": name} for i, name in enumerate(names)])
+            lookup_ids[model] = list(range(1, len(names) + 1))
+        orientation_ids = lookup_ids[models.Orientation]
+        vietnamese_id, english_id = lookup_ids[models.Language][:2]
+
+        users, profiles, locations = [], [], []
+        user_pets, user_interests, user_languages = [], [], []
+        for user_id in range(1, n_users + 1):
+            users.append({"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+                          "phone_number": f"+84{user_id:09d}",
+                          "role_id": 1 if rnd.random() < user_role_ratio else 2})
+            sex = rnd.choices(SEXES, weights=SEX_WEIGHTS)[0]
+            profiles.append({
+                "user_id": user_id,
+                "date_of_birth": _date_of_birth(rnd, today),
+                "height": _height(rnd, sex),
+                "sex": sex,
+                "orientation_id": rnd.choices(orientation_ids, weights=ORIENTATION_WEIGHTS)[0],
+                "body_type_id": _maybe(rnd, lookup_ids[models.BodyType]),
+                "job_industry_id": _maybe(rnd, lookup_ids[models.JobIndustry]),
+                "drink_status_id": _maybe(rnd, lookup_ids[models.DrinkStatus]),
+                "smoke_status_id": _maybe(rnd, lookup_ids[models.SmokeStatus]),
+                "education_level_id": _maybe(rnd, lookup_ids[models.EducationLevel]),
+                "interested_in_new_language": rnd.random() < 0.4,
+                "drop_out": rnd.random() < 0.05,
+                "location_preference": rnd.choices(LOCATION_PREFERENCES, weights=LOCATION_PREFERENCE_WEIGHTS)[0],
+                "bio": _bio(rnd),
+            })
+            location = _location(rnd, user_id)
+            if location is not None:
+                locations.append(location)
+
+            user_interests.extend({"user_id": user_id, "interest_id": item_id}
+                                  for item_id in _sample_items(rnd, lookup_ids[models.Interest], rnd.randint(1, 6)))
+            user_pets.extend({"user_id": user_id, "pet_id": item_id}
+                             for item_id in _sample_items(rnd, lookup_ids[models.Pet],
+                                                          rnd.choices([0, 1, 2], weights=[0.5, 0.4, 0.1])[0]))
+            # Hầu hết nói tiếng Việt, nhiều người nói thêm tiếng Anh và đôi khi một ngoại ngữ khác
+            languages = [vietnamese_id] if rnd.random() < 0.92 else []
+            if rnd.random() < 0.6:
+                languages.append(english_id)
+            if rnd.random() < 0.2:
+                languages.extend(item_id for item_id in _sample_items(rnd, lookup_ids[models.Language][2:], 1))
+            user_languages.extend({"user_id": user_id, "language_id": item_id} for item_id in languages)
+
+        db.execute(insert(models.User), users)
+        db.execute(insert(models.Profile), profiles)
+        if locations:
+            db.execute(insert(models.Location), locations)
+        for model, rows in ((models.UserPet, user_pets), (models.UserInterest, user_interests),
+                            (models.UserLanguage, user_languages)):
+            if rows:
+                db.execute(insert(model), rows)
+        db.commit()
+    return engine
+
+
+def synthetic_database_url(data_dir: str, n_users: int, seed: int = 0) -> str:
+    """
+    URL SQLite của population (n_users, seed) trong data_dir; file chỉ được sinh ở lần gọi đầu tiên
+    (sinh 100k user mất khá lâu, các lần chạy benchmark sau dùng lại file).
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{n_users}_{seed}.db")
+    database_url = f"sqlite:///{path}"
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        create_synthetic_database(f"sqlite:///{tmp_path}", n_users, seed=seed).dispose()
+        os.replace(tmp_path, path)  # Không để lại file dở dang nếu bị ngắt giữa chừng
+    return database_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=POPULATION_SIZES[0], help="Population size.")
+    parser.add_argument("--output", required=True, help="SQLite file to create.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    create_synthetic_database(f"sqlite:///{args.output}", args.users, seed=args.seed).dispose()
+    print(f"INFO: Created {args.users} synthetic users in {args.output}")
@@ -0,0 +1,9 @@
+# test/conftest.py
+import pytest
+
+
+@pytest.fixture(scope="session")
+def predictor():
+    """MatchPredictor tải từ ml_models/ của repo (dùng chung cho cả phiên test)."""
+    from app.ml.predictor import MatchPredictor
+    return MatchPredictor()
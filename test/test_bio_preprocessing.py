@@ -0,0 +1,56 @@
+# test/test_bio_preprocessing.py
+import re
+
+import nltk
+import pytest
+from nltk.stem import WordNetLemmatizer
+from nltk.tokenize import NLTKWordTokenizer
+from unidecode import unidecode
+
+from app.ml import preprocessing
+
+BIOS = [
+    "I cannot wait, gonna travel!!", "wanna grab coffee? lemme know", "gotta love dogs... cats too",
+    "Café crème & naïve résumé 2024", "'tis the season, d'ye know", "Music\nmovies\tand   books",
+    "GIMME pizza, more'n anything", "I don't think we're gonna make it; can't you?",
+    "hiking/biking (weekends) -- coffee @ 7am #blessed", "Cannot, cannot... CANNOT!", "  ", "",
+    "gonnawannagotta cannotcannot", "it's 'quoted' \"twice\" - ok?",
+]
+
+WORDS = ["dogs", "cats", "running", "movies", "books", "geese", "leaves", "was", "better", "travelling",
+         "wolves", "cacti", "data", "news", "is", "hiking", "activities", "mice", "children", "xyzzy"]
+
+
+def _normalize(text: str) -> str:
+    # Các bước trước khi tokenize trong preprocessing.preprocess_text
+    text = unidecode(str(text).lower())
+    text = re.sub(r'[^\w\s]', '', text)
+    return re.sub(r'\d+', '', text)
+
+
+@pytest.mark.parametrize("bio", BIOS)
+def test_fast_tokenizer_matches_nltk_word_tokenizer(bio):
+    text = _normalize(bio)
+    assert preprocessing.fast_word_tokenize(text) == NLTKWordTokenizer().tokenize(text)
+
+
+def test_fast_tokenizer_splits_contractions():
+    assert preprocessing.fast_word_tokenize("i cannot wait gonna travel") == ["i", "can", "not", "wait", "gon",
+                                                                              "na", "travel"]
+
+
+def _has_wordnet() -> bool:
+    try:
+        nltk.data.find("corpora/wordnet")
+    except LookupError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(not _has_wordnet(), reason="NLTK wordnet data not installed")
+def test_cached_lemmatizer_matches_uncached():
+    reference = WordNetLemmatizer()
+    for _ in range(2):  # Lần hai đọc từ LRU cache
+        for word in WORDS:
+            assert preprocessing._lemmatize_cached(word) == reference.lemmatize(word)
+    assert preprocessing._lemmatize_cached.cache_info().hits >= len(WORDS)
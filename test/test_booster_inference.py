@@ -0,0 +1,54 @@
+# test/test_booster_inference.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ml.predictor import MatchPredictor
+
+
+@pytest.fixture(scope="module")
+def sklearn_predictor():
+    # Không dùng bundle: bundle chỉ có Booster, không có LGBMClassifier cho chế độ "sklearn"
+    predictor = MatchPredictor(inference_mode="sklearn", use_bundle=False)
+    if predictor.booster is None:
+        pytest.skip("model has no LightGBM booster")
+    return predictor
+
+
+@pytest.fixture(scope="module")
+def booster_predictor(sklearn_predictor):
+    predictor = MatchPredictor(inference_mode="booster", use_bundle=False)
+    assert predictor.inference_mode == "booster"
+    return predictor
+
+
+def random_feature_matrix(rng: np.random.Generator, n_rows: int, n_features: int) -> np.ndarray:
+    matrix = rng.random((n_rows, n_features))
+    # Một phần cột là cờ 0/1 (orientation_compatible_*, *_match), một phần giá trị nằm ngoài [0, 1]
+    binary_cols = rng.random(n_features) < 0.3
+    matrix[:, binary_cols] = np.round(matrix[:, binary_cols])
+    matrix[rng.random((n_rows, n_features)) < 0.02] *= rng.choice([-3.0, 5.0])
+    matrix[rng.random((n_rows, n_features)) < 0.05] = np.nan
+    return matrix
+
+
+@pytest.mark.parametrize("n_rows", [1, 2, 37, 1000, 5000])
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_booster_predict_is_bit_identical_to_predict_proba(sklearn_predictor, n_rows, dtype):
+    rng = np.random.default_rng(n_rows)
+    matrix = random_feature_matrix(rng, n_rows, len(sklearn_predictor.pairwise_input_columns)).astype(dtype)
+    matrix[0, :] = np.nan  # Một dòng toàn NaN
+    expected = sklearn_predictor.model.predict_proba(
+        pd.DataFrame(matrix, columns=sklearn_predictor.pairwise_input_columns))[:, 1]
+    actual = sklearn_predictor.booster.predict(matrix, num_threads=sklearn_predictor.num_threads)
+    assert np.array_equal(expected, actual)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 333])
+def test_inference_modes_are_bit_identical(sklearn_predictor, booster_predictor, chunk_size):
+    rng = np.random.default_rng(0)
+    matrix = np.asfortranarray(random_feature_matrix(rng, 2000, len(sklearn_predictor.pairwise_input_columns)))
+    expected = sklearn_predictor._predict_proba_matrix(matrix, chunk_size)
+    actual = booster_predictor._predict_proba_matrix(matrix, chunk_size)
+    assert np.array_equal(expected, actual)
+    assert not np.isnan(actual).any()
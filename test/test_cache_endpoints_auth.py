@@ -0,0 +1,31 @@
+# test/test_cache_endpoints_auth.py
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import matches
+from app.core.config import settings
+
+CACHE_REQUESTS = [("DELETE", "/users/1/potential-matches/cache"), ("GET", "/potential-matches/cache/stats")]
+
+
+@pytest.fixture
+def client():
+    # Chỉ router của matches, không có lifespan (không có match_runtime): chỉ kiểm tra phần xác thực
+    app = FastAPI()
+    app.include_router(matches.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("method, path", CACHE_REQUESTS)
+def test_cache_endpoints_require_admin_token(client, monkeypatch, method, path):
+    monkeypatch.setattr(settings, "ADMIN_API_TOKEN", "secret")
+    assert client.request(method, path).status_code == 401
+    assert client.request(method, path, headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.request(method, path, headers={"X-Admin-Token": "secret"}).status_code < 300
+
+
+@pytest.mark.parametrize("method, path", CACHE_REQUESTS)
+def test_cache_endpoints_disabled_without_admin_token(client, monkeypatch, method, path):
+    monkeypatch.setattr(settings, "ADMIN_API_TOKEN", "")
+    assert client.request(method, path, headers={"X-Admin-Token": ""}).status_code == 403
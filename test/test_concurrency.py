@@ -0,0 +1,150 @@
+# test/test_concurrency.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.concurrency import BoundedExecutor, ExecutorSaturatedError, ExecutorTimeoutError
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_jobs_overlap():
+    executor = BoundedExecutor(max_workers=2, max_pending=4)
+    barrier = threading.Barrier(2, timeout=5)  # Chỉ qua được khi cả hai job cùng đang chạy
+    windows = []
+
+    def blocking_job():
+        started_at = time.monotonic()
+        barrier.wait()
+        time.sleep(0.05)
+        windows.append((started_at, time.monotonic()))
+
+    async def main():
+        await asyncio.gather(executor.run(blocking_job), executor.run(blocking_job))
+
+    try:
+        _run(main())
+    finally:
+        executor.shutdown()
+    (start_a, end_a), (start_b, end_b) = windows
+    assert max(start_a, start_b) < min(end_a, end_b)
+
+
+def test_event_loop_is_not_blocked():
+    executor = BoundedExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def main():
+        job = asyncio.ensure_future(executor.run(release.wait, 5))
+        ticks = 0
+        while ticks < 5:  # Event loop vẫn chạy coroutine khác trong khi job đang chặn thread của pool
+            await asyncio.sleep(0.01)
+            ticks += 1
+        release.set()
+        assert await job is True
+
+    try:
+        _run(main())
+    finally:
+        executor.shutdown()
+
+
+def test_max_workers_bounds_concurrency():
+    executor = BoundedExecutor(max_workers=2, max_pending=10)
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def job():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*(executor.run(job) for _ in range(6)))
+
+    try:
+        _run(main())
+    finally:
+        executor.shutdown()
+    assert peak[0] == 2
+    assert executor.pending == 0
+
+
+def test_rejects_when_max_pending_reached():
+    executor = BoundedExecutor(max_workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def main():
+        jobs = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0)  # Cho hai job được submit
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(release.wait, 5)
+        release.set()
+        await asyncio.gather(*jobs)
+
+    try:
+        _run(main())
+    finally:
+        executor.shutdown()
+    assert executor.pending == 0
+
+
+def test_timeout_keeps_slot_until_job_finishes():
+    executor = BoundedExecutor(max_workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+
+    async def main():
+        with pytest.raises(ExecutorTimeoutError):
+            await executor.run(release.wait, 5)
+        # Job đã bắt đầu vẫn chiếm slot sau timeout
+        assert executor.pending == 1
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(time.sleep, 0)
+        release.set()
+        for _ in range(100):
+            if executor.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.pending == 0
+        assert await executor.run(sum, [1, 2]) == 3
+
+    try:
+        _run(main())
+    finally:
+        executor.shutdown()
+
+
+def test_on_done_called_once_when_job_ends_or_is_rejected():
+    executor = BoundedExecutor(max_workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+    done = []
+
+    async def main():
+        with pytest.raises(ExecutorTimeoutError):
+            await executor.run(release.wait, 5, on_done=lambda: done.append("timed_out"))
+        # Job vẫn đang chạy sau timeout: on_done chưa được gọi
+        assert done == []
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(time.sleep, 0, on_done=lambda: done.append("rejected"))
+        assert done == ["rejected"]
+        release.set()
+        for _ in range(100):
+            if executor.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert done == ["rejected", "timed_out"]
+        assert await executor.run(sum, [1, 2], on_done=lambda: done.append("finished")) == 3
+
+    try:
+        _run(main())
+    finally:
+        executor.shutdown()
+    assert done == ["rejected", "timed_out", "finished"]
@@ -0,0 +1,243 @@
+# test/test_match_cache.py
+from collections import OrderedDict
+
+import pytest
+
+from app.services import match_cache
+from app.services.match_cache import InMemoryMatchCacheBackend, MatchCacheBackend, MatchResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBackend(MatchCacheBackend):
+    """Backend giả trong bộ nhớ với đồng hồ điều khiển tay: TTL theo entry, LRU theo max_entries."""
+
+    def __init__(self, clock: FakeClock, max_entries: int = 100):
+        self.clock = clock
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evicted = []
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl_seconds):
+        self.entries[key] = (self.clock() + ttl_seconds, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.evicted.append(self.entries.popitem(last=False)[0])
+
+    def delete(self, keys):
+        for key in keys:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class FailingBackend(FakeBackend):
+    def get(self, key):
+        raise ConnectionError("backend down")
+
+    def set(self, key, value, ttl_seconds):
+        raise ConnectionError("backend down")
+
+    def delete(self, keys):
+        raise ConnectionError("backend down")
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        MatchCacheBackend()
+
+
+def test_get_set_round_trip(clock):
+    cache = MatchResultCache(FakeBackend(clock), ttl_seconds=60, namespace="v1")
+    assert cache.get_ids(1) is None
+    assert cache.get_ranking(1) is None
+
+    cache.set_ids(1, [5, 3, 9])
+    cache.set_ranking(1, [(5, 0.9), (3, 0.75)], complete=False)
+    assert cache.get_ids(1) == [5, 3, 9]
+    assert cache.get_ranking(1) == ([(5, 0.9), (3, 0.75)], False)
+    assert cache.get_ids(2) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 3)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = MatchResultCache(FakeBackend(clock), ttl_seconds=60)
+    cache.set_ids(1, [2])
+    clock.now += 59
+    assert cache.get_ids(1) == [2]
+    clock.now += 1
+    assert cache.get_ids(1) is None
+
+
+def test_lru_eviction_keeps_recently_read_entries(clock):
+    backend = FakeBackend(clock, max_entries=2)
+    cache = MatchResultCache(backend, ttl_seconds=60)
+    cache.set_ids(1, [10])
+    cache.set_ids(2, [20])
+    assert cache.get_ids(1) == [10]  # user 1 vừa được đọc -> user 2 là entry cũ nhất
+    cache.set_ids(3, [30])
+    assert backend.evicted == [cache._key("ids", 2)]
+    assert cache.get_ids(2) is None
+    assert cache.get_ids(1) == [10]
+    assert cache.get_ids(3) == [30]
+
+
+def test_namespace_separates_model_versions(clock):
+    backend = FakeBackend(clock)
+    old = MatchResultCache(backend, ttl_seconds=60, namespace="v1:t0.5")
+    new = MatchResultCache(backend, ttl_seconds=60, namespace="v2:t0.5")
+    old.set_ids(1, [2, 3])
+    assert new.get_ids(1) is None
+    new.set_ids(1, [4])
+    assert old.get_ids(1) == [2, 3]
+    assert new.get_ids(1) == [4]
+
+
+def test_invalidate_user_drops_both_kinds(clock):
+    cache = MatchResultCache(FakeBackend(clock), ttl_seconds=60)
+    for user_id in (1, 2):
+        cache.set_ids(user_id, [7])
+        cache.set_ranking(user_id, [(7, 0.8)], complete=True)
+    cache.invalidate_user(1)
+    assert cache.get_ids(1) is None and cache.get_ranking(1) is None
+    assert cache.get_ids(2) == [7]
+    assert cache.get_ranking(2) == ([(7, 0.8)], True)
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_clear_drops_everything(clock):
+    cache = MatchResultCache(FakeBackend(clock), ttl_seconds=60)
+    cache.set_ids(1, [2])
+    cache.clear()
+    assert cache.get_ids(1) is None
+
+
+def test_backend_errors_are_treated_as_miss(clock):
+    cache = MatchResultCache(FailingBackend(clock), ttl_seconds=60)
+    cache.set_ids(1, [2])
+    assert cache.get_ids(1) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_backend_delete_errors_are_logged_not_raised(clock):
+    cache = MatchResultCache(FailingBackend(clock), ttl_seconds=60)
+    cache.invalidate_user(1)
+    cache.apply_rescored_user(1, None, {})
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_in_memory_backend_ttl_and_lru(clock, monkeypatch):
+    monkeypatch.setattr(match_cache.time, "monotonic", clock)
+    backend = InMemoryMatchCacheBackend(max_entries=2)
+    backend.set("a", 1, ttl_seconds=10)
+    backend.set("b", 2, ttl_seconds=100)
+    assert backend.get("a") == 1
+    backend.set("c", 3, ttl_seconds=100)  # "b" ít được dùng gần đây nhất -> bị evict
+    assert backend.get("b") is None
+    clock.now += 10
+    assert backend.get("a") is None
+    assert backend.get("c") == 3
+    assert backend.stats() == {"entries": 1, "evictions": 1, "expirations": 1}
+
+
+class CountingBackend(FakeBackend):
+    def __init__(self, clock: FakeClock, max_entries: int = 100):
+        super().__init__(clock, max_entries)
+        self.gets = 0
+        self.sets = 0
+        self.on_set = None
+
+    def get(self, key):
+        self.gets += 1
+        return super().get(key)
+
+    def set(self, key, value, ttl_seconds):
+        self.sets += 1
+        super().set(key, value, ttl_seconds)
+        if self.on_set is not None:
+            on_set, self.on_set = self.on_set, None
+            on_set()
+
+
+def test_apply_rescored_user_invalidates_holders_without_reading_backend(clock):
+    backend = CountingBackend(clock)
+    cache = MatchResultCache(backend, ttl_seconds=60)
+    cache.set_ranking(1, [(9, 0.9), (5, 0.8)], complete=True)   # Chứa user 5
+    cache.set_ranking(2, [(9, 0.9), (8, 0.85)], complete=False)  # Bị cắt ở 0.85
+    cache.set_ranking(3, [(9, 0.9)], complete=True)
+    cache.set_ids(4, [9])
+    sets_before = backend.sets
+
+    cache.apply_rescored_user(5, ([(9, 0.7)], True), reverse_scores={2: 0.6, 4: 0.55})
+    assert backend.gets == 0
+    assert backend.sets == sets_before + 1  # Chỉ ghi kết quả mới của chính user 5
+    assert cache.get_ranking(1) is None      # Có user 5 với score cũ
+    assert cache.get_ranking(2) is not None  # Score mới 0.6 nằm sau phần đã cache
+    assert cache.get_ranking(3) is not None  # Không liên quan
+    assert cache.get_ids(4) is None          # Danh sách "ids" đầy đủ: user 5 giờ phải có trong đó
+    assert cache.get_ranking(5) == ([(9, 0.7)], True)
+
+    cache.apply_rescored_user(6, None, reverse_scores={2: 0.95, 3: 0.1})
+    assert cache.get_ranking(2) is None  # 0.95 đứng trước phần tử cuối đã cache
+    assert cache.get_ranking(3) is None  # Danh sách đầy đủ
+
+
+def test_write_computed_before_a_change_is_dropped(clock):
+    cache = MatchResultCache(FakeBackend(clock), ttl_seconds=60)
+    token = cache.write_token()
+    cache.apply_rescored_user(5, None, reverse_scores={})
+    cache.set_ranking(1, [(5, 0.8)], complete=True, token=token)  # Tính với dữ liệu cũ của user 5
+    assert cache.get_ranking(1) is None
+
+    token = cache.write_token()
+    cache.apply_rescored_user(6, None, reverse_scores={2: 0.55})
+    cache.set_ranking(2, [(7, 0.9), (8, 0.8)], complete=False, token=token)  # 0.55 nằm sau phần cắt
+    cache.set_ranking(3, [(7, 0.9)], complete=True, token=token)             # User 6 không liên quan
+    assert cache.get_ranking(2) is not None
+    assert cache.get_ranking(3) is not None
+    assert cache.stats()["stale_writes"] == 1
+
+
+def test_change_between_check_and_backend_write_is_not_lost(clock):
+    backend = CountingBackend(clock)
+    cache = MatchResultCache(backend, ttl_seconds=60)
+    token = cache.write_token()
+    # apply_rescored_user chạy trong lúc backend.set của set_ranking đang ghi giá trị cũ
+    backend.on_set = lambda: cache.apply_rescored_user(5, None, reverse_scores={})
+    cache.set_ranking(1, [(5, 0.8)], complete=True, token=token)
+    assert cache.get_ranking(1) is None
+
+
+def test_index_eviction_drops_backend_entry(clock):
+    backend = FakeBackend(clock)
+    cache = MatchResultCache(backend, ttl_seconds=60, max_indexed_entries=2)
+    for owner_id in (1, 2, 3):
+        cache.set_ranking(owner_id, [(9, 0.9)], complete=True)
+    assert cache.get_ranking(1) is None
+    assert cache.get_ranking(3) is not None
+    cache.apply_rescored_user(9, None, reverse_scores={})
+    assert cache.get_ranking(2) is None and cache.get_ranking(3) is None
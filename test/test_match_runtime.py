@@ -0,0 +1,89 @@
+# test/test_match_runtime.py
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.v1.endpoints import matches
+from app.core.concurrency import BoundedExecutor, ExecutorTimeoutError
+
+
+@pytest.fixture
+def make_runtime(predictor):
+    """MatchRuntime không khởi động (không build store, không tạo worker); đếm số lần shutdown()."""
+    def make(version):
+        runtime = matches.MatchRuntime(version, predictor)
+        runtime.shutdowns = 0
+
+        def shutdown():
+            runtime.shutdowns += 1
+        runtime.shutdown = shutdown
+        return runtime
+    return make
+
+
+def test_retired_runtime_shuts_down_after_last_holder(make_runtime):
+    runtime = make_runtime("old")
+    assert runtime.acquire() and runtime.acquire()
+    runtime.retire()
+    runtime.release()
+    assert runtime.shutdowns == 0
+    # Request lấy runtime cũ trước lúc đổi version vẫn giữ được nó cho tới khi runtime dừng
+    assert runtime.acquire()
+    runtime.release()
+    runtime.release()
+    assert runtime.shutdowns == 1
+    assert not runtime.acquire()
+
+
+def test_idle_runtime_shuts_down_on_retire(make_runtime):
+    runtime = make_runtime("old")
+    runtime.retire()
+    assert runtime.shutdowns == 1
+    assert not runtime.acquire()
+
+
+def test_acquire_match_runtime_skips_stopped_runtime(make_runtime):
+    old, new = make_runtime("old"), make_runtime("new")
+    old.retire()
+    state = SimpleNamespace(match_runtime=old)
+
+    def swap():
+        # Mô phỏng reload: app.state đã trỏ tới runtime mới khi request thấy runtime cũ đã dừng
+        state.match_runtime = new
+        return False
+    old.acquire = swap
+    assert matches.acquire_match_runtime(state) is new
+    assert matches.acquire_match_runtime(SimpleNamespace(match_runtime=None)) is None
+
+
+def test_timed_out_job_keeps_retired_runtime_until_it_finishes(make_runtime):
+    runtime = make_runtime("old")
+    executor = BoundedExecutor(max_workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+
+    def job(service_factory):
+        assert service_factory == runtime.service
+        release.wait(5)
+
+    async def main():
+        assert runtime.acquire()  # Giữ bởi request (get_match_runtime)
+        try:
+            with pytest.raises(ExecutorTimeoutError):
+                await matches._run_match_job(executor, runtime, job)
+        finally:
+            runtime.release()
+        runtime.retire()
+        assert runtime.shutdowns == 0
+        release.set()
+        for _ in range(100):
+            if runtime.shutdowns:
+                break
+            await asyncio.sleep(0.01)
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert runtime.shutdowns == 1
@@ -0,0 +1,80 @@
+# test/test_metrics.py
+from app.core.metrics import _NULL_TIMER, STAGES, MetricsRegistry
+
+
+def _samples(text):
+    """Các dòng sample của Prometheus text format: {"tên{labels}": "giá trị"}."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = value
+    return samples
+
+
+def test_histogram_buckets_are_cumulative_and_inf_equals_count():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_latency_seconds", "Test latency.", label_names=("route",),
+                                   buckets=(0.1, 1.0, 0.5))
+    for value in (0.05, 0.1, 0.3, 0.7, 0.9, 5.0, 12.0):
+        histogram.observe(value, "a")
+    histogram.observe(0.2, "b")
+    samples = _samples("\n".join(histogram.collect()))
+
+    # Bucket được sắp xếp, giá trị bằng cận trên thuộc bucket đó, count cộng dồn
+    assert samples['test_latency_seconds_bucket{route="a",le="0.1"}'] == "2"
+    assert samples['test_latency_seconds_bucket{route="a",le="0.5"}'] == "3"
+    assert samples['test_latency_seconds_bucket{route="a",le="1"}'] == "5"
+    assert samples['test_latency_seconds_bucket{route="a",le="+Inf"}'] == "7"
+    assert samples['test_latency_seconds_count{route="a"}'] == "7"
+    assert float(samples['test_latency_seconds_sum{route="a"}']) == sum((0.05, 0.1, 0.3, 0.7, 0.9, 5.0, 12.0))
+    assert samples['test_latency_seconds_bucket{route="b",le="0.1"}'] == "0"
+    assert samples['test_latency_seconds_bucket{route="b",le="+Inf"}'] == "1"
+    assert samples['test_latency_seconds_count{route="b"}'] == "1"
+
+
+def test_render_escapes_label_values():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_events_total", "Test events.", label_names=("name",))
+    counter.inc(2, 'a"b\\c\nd')
+    registry.register_collector(lambda: [("test_gauge", "gauge", "Test gauge.", [({"path": 'x"\n'}, 1.5)])],
+                                name="test")
+    samples = _samples(registry.render())
+    assert samples['test_events_total{name="a\\"b\\\\c\\nd"}'] == "2"
+    assert samples['test_gauge{path="x\\"\\n"}'] == "1.5"
+
+
+def test_failing_collector_does_not_break_render():
+    registry = MetricsRegistry()
+
+    def failing():
+        raise RuntimeError("component not ready")
+    registry.register_collector(failing, name="failing")
+    registry.register_collector(lambda: [("test_gauge", "gauge", "Test gauge.", [({}, 3)])], name="ok")
+    with registry.stage(STAGES[0]):
+        pass
+
+    text = registry.render()
+    samples = _samples(text)
+    assert samples["test_gauge"] == "3"
+    assert samples[f'amoura_stage_duration_seconds_count{{stage="{STAGES[0]}"}}'] == "1"
+    assert text.endswith("\n")
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    counter = registry.counter("test_events_total", "Test events.")
+    assert registry.stage(STAGES[0]) is _NULL_TIMER
+    with registry.stage(STAGES[0]):
+        pass
+    registry.timed(STAGES[1])(lambda: None)()
+    assert list(registry.timed_iter(STAGES[2], [1, 2])) == [1, 2]
+    counter.inc()
+    registry.stage_duration.observe(1.0, STAGES[0])
+
+    samples = _samples(registry.render())
+    assert "test_events_total" not in samples
+    # Các stage cố định vẫn được xuất (với giá trị 0) để dashboard không bị thiếu series
+    for stage in STAGES:
+        assert samples[f'amoura_stage_duration_seconds_count{{stage="{stage}"}}'] == "0"
+        assert samples[f'amoura_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}}'] == "0"
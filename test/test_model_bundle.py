@@ -0,0 +1,78 @@
+# test/test_model_bundle.py
+import os
+import shutil
+
+import joblib
+import pytest
+
+from app.jobs.export_model_bundle import verify_bundle
+from app.ml import model_bundle
+from app.ml.artifacts import MODELS_DIR
+from app.ml.model_bundle import MANIFEST_FILENAME, bundle_path, export_bundle, open_bundle
+
+COLUMNS_FILENAME = "pairwise_model_input_columns.joblib"
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    for name in os.listdir(MODELS_DIR):
+        if name.endswith(".joblib"):
+            shutil.copy(os.path.join(MODELS_DIR, name), tmp_path)
+    return str(tmp_path)
+
+
+def _fail_hashing(monkeypatch):
+    def fail(path):
+        raise AssertionError(f"{path} should not be hashed")
+
+    monkeypatch.setattr(model_bundle, "_file_sha256", fail)
+
+
+def test_unchanged_sources_are_not_hashed(models_dir, monkeypatch):
+    export_bundle(models_dir)
+    _fail_hashing(monkeypatch)
+    bundle = open_bundle(models_dir)
+    assert bundle is not None
+    assert bundle.load(model_bundle.MODEL_FILENAME).num_trees() > 0
+
+
+def test_touched_source_with_same_content_is_still_fresh(models_dir):
+    export_bundle(models_dir)
+    source = os.path.join(models_dir, COLUMNS_FILENAME)
+    os.utime(source, ns=(0, 0))
+    assert open_bundle(models_dir) is not None
+
+
+def test_changed_source_makes_bundle_stale(models_dir):
+    export_bundle(models_dir)
+    source = os.path.join(models_dir, COLUMNS_FILENAME)
+    joblib.dump(list(reversed(joblib.load(source))), source)
+    assert open_bundle(models_dir) is None
+
+
+def test_failed_verification_keeps_previous_bundle(models_dir):
+    path = export_bundle(models_dir)
+    with open(os.path.join(path, MANIFEST_FILENAME), encoding="utf-8") as manifest_file:
+        manifest = manifest_file.read()
+
+    def verify(temp_path):
+        assert open_bundle(models_dir, temp_path) is not None
+        raise OSError("verification crashed")
+
+    with pytest.raises(OSError):
+        export_bundle(models_dir, verify=verify)
+    with open(os.path.join(bundle_path(models_dir), MANIFEST_FILENAME), encoding="utf-8") as manifest_file:
+        assert manifest_file.read() == manifest
+    assert [name for name in os.listdir(models_dir) if not name.endswith(".joblib")] == ["bundle"]
+
+
+def test_export_verifies_temporary_bundle(models_dir):
+    verified = []
+
+    def verify(temp_path):
+        verify_bundle(models_dir, temp_path, n_users=8)
+        verified.append(temp_path)
+
+    path = export_bundle(models_dir, verify=verify)
+    assert verified and verified[0] != path
+    assert open_bundle(models_dir) is not None
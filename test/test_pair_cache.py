@@ -0,0 +1,92 @@
+# test/test_pair_cache.py
+import numpy as np
+
+from app.ml.pair_cache import PairScoreCache
+
+
+def _fingerprints(rng: np.random.Generator, n: int) -> np.ndarray:
+    return rng.integers(0, np.iinfo(np.uint64).max, size=n, dtype=np.uint64, endpoint=True)
+
+
+def test_forward_only_store_leaves_reverse_unknown():
+    cache = PairScoreCache(max_entries=100)
+    anchor, candidates = 7, np.array([3, 11, 20], dtype=np.uint64)
+    cache.store(anchor, candidates, np.array([0.2, np.nan, 0.9]))
+    probas, found = cache.lookup(anchor, candidates)
+    np.testing.assert_array_equal(probas, [0.2, np.nan, 0.9])
+    assert found.all()  # Cặp không hợp lệ (NaN) cũng được cache
+    _, found = cache.lookup(11, np.array([anchor], dtype=np.uint64))
+    assert not found.any()
+
+    # Chiều ngược được điền vào cùng entry, chiều đã có không bị ghi đè
+    cache.store(11, np.array([anchor], dtype=np.uint64), np.array([0.4]), reverse_probas=np.array([0.5]))
+    assert cache.lookup(11, np.array([anchor], dtype=np.uint64))[0][0] == 0.4
+    np.testing.assert_array_equal(cache.lookup(anchor, candidates)[0], [0.2, np.nan, 0.9])
+    assert cache.stats()["entries"] == 3
+
+
+def test_both_directions_store():
+    cache = PairScoreCache(max_entries=100)
+    candidates = np.array([1, 50], dtype=np.uint64)
+    cache.store(10, candidates, np.array([0.1, 0.2]), reverse_probas=np.array([0.3, 0.4]))
+    np.testing.assert_array_equal(cache.lookup(10, candidates)[0], [0.1, 0.2])
+    assert cache.lookup(1, np.array([10], dtype=np.uint64))[0][0] == 0.3
+    assert cache.lookup(50, np.array([10], dtype=np.uint64))[0][0] == 0.4
+
+
+def _score(anchor: int, candidate: int) -> float:
+    # Score giả, khác nhau theo chiều của cặp
+    return (anchor % 1000 * 7 + candidate % 1000) % 1000 / 1000
+
+
+def test_matches_reference_across_generations():
+    rng = np.random.default_rng(0)
+    cache = PairScoreCache(max_entries=2000)
+    users = _fingerprints(rng, 300)
+    n_hits = 0
+    for _ in range(60):
+        anchor = int(rng.choice(users))
+        candidates = rng.choice(users, size=80, replace=False)
+        cache.store(anchor, candidates, np.array([_score(anchor, c) for c in candidates.tolist()]))
+
+        anchor = int(rng.choice(users))
+        candidates = rng.choice(users, size=120, replace=False)
+        probas, found = cache.lookup(anchor, candidates)
+        for candidate, proba in zip(candidates[found].tolist(), probas[found].tolist()):
+            assert proba == _score(anchor, candidate)
+        n_hits += int(found.sum())
+    assert cache.stats()["entries"] <= 2000 and n_hits > 0
+
+
+def test_generation_rotation_keeps_recently_read_entries():
+    cache = PairScoreCache(max_entries=8)  # Thế hệ 4 entry
+    anchor = 1
+    cache.store(anchor, np.arange(10, 14, dtype=np.uint64), np.full(4, 0.5))  # Đầy -> thành thế hệ cũ
+    cache.lookup(anchor, np.array([10], dtype=np.uint64))  # Được chuyển lên thế hệ hiện tại
+    cache.store(anchor, np.arange(20, 23, dtype=np.uint64), np.full(3, 0.6))  # Đầy -> thế hệ cũ trước đó bị bỏ
+    _, found = cache.lookup(anchor, np.array([10, 11, 20, 22], dtype=np.uint64))
+    np.testing.assert_array_equal(found, [True, False, True, True])
+
+
+def test_store_larger_than_a_generation():
+    cache = PairScoreCache(max_entries=10)
+    candidates = np.arange(100, 112, dtype=np.uint64)
+    cache.store(5, candidates, np.linspace(0, 1, 12))
+    probas, found = cache.lookup(5, candidates)
+    assert cache.stats()["entries"] <= 10
+    np.testing.assert_array_equal(probas[found], np.linspace(0, 1, 12)[found])
+    assert found[-2:].all()
+
+
+def test_predictor_scores_with_cache_match_uncached(predictor, monkeypatch):
+    columns, _ = predictor.build_user_columns([predictor.synthetic_user_data_tuple(user_id)
+                                               for user_id in range(1, 41)])
+    expected = [predictor.predict_match_proba_columns(columns, columns, anchor_row) for anchor_row in range(10)]
+    monkeypatch.setattr(predictor, "pair_score_cache", PairScoreCache(max_entries=10000))
+    for _ in range(2):  # Lần đầu chấm và ghi chiều anchor -> candidate, lần hai đọc từ cache
+        for anchor_row in range(10):
+            np.testing.assert_array_equal(predictor.predict_match_proba_columns(columns, columns, anchor_row),
+                                          expected[anchor_row])
+    stats = predictor.pair_score_cache.stats()
+    assert stats["entries"] == 10 * 40 - 45  # Cặp giữa hai anchor chỉ có một entry
+    assert stats["hits"] == 10 * 40  # Lượt đầu không trúng: cặp giữa hai anchor chỉ có chiều ngược
@@ -0,0 +1,95 @@
+# test/test_pairwise_engine.py
+import datetime
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.ml.pairwise_engine import PAIRWISE_PARITY_ATOL
+from app.ml.preprocessing import create_pairwise_features_vector
+
+N_USERS = 60
+
+
+def _user_data_tuple(user_id: int, rnd: random.Random, artifacts) -> tuple:
+    """Tuple cùng dạng với crud.get_user_profile_raw_data, giá trị ngẫu nhiên theo các category lúc train."""
+    sex, orientation, body_type, drink, smoke = (rnd.choice(list(c) + [None])
+                                                 for c in artifacts.onehot_encoder_categorical.categories_)
+    profile = SimpleNamespace(
+        date_of_birth=datetime.date(rnd.randint(1960, 2005), rnd.randint(1, 12), rnd.randint(1, 28)),
+        height=rnd.randint(55, 80), sex=sex, interested_in_new_language=rnd.choice([True, False, None]),
+        drop_out=rnd.choice([True, False]), location_preference=rnd.choice([-1, 10, 50, 100, 500, 2000]), bio=None)
+    location = SimpleNamespace(latitudes=rnd.uniform(8, 23), longitudes=rnd.uniform(102, 110),
+                               country=None, state=None, city=None)
+    return (user_id, profile, location, rnd.sample(list(artifacts.top_pets_items), 2),
+            rnd.sample(list(artifacts.top_interests_items), rnd.randint(0, 4)),
+            rnd.sample(list(artifacts.top_languages_items), rnd.randint(0, 2)), body_type, orientation,
+            rnd.choice(list(artifacts.top_n_job_categories)), drink, smoke,
+            rnd.choice(list(artifacts.top_n_edu_categories)))
+
+
+@pytest.fixture(scope="module")
+def population(predictor):
+    """
+    (raw records, user feature vectors pd.Series, UserColumns) của N_USERS user, gồm cả user thiếu dữ liệu.
+    UserColumns được tạo như trong production (build_user_columns: vector float32 của create_user_feature_array),
+    bản tính từng cặp dùng vector pd.Series float64 cũ.
+    """
+    rnd = random.Random(7)
+    user_data = [_user_data_tuple(user_id, rnd, predictor.artifacts) for user_id in range(1, N_USERS + 1)]
+    user_data[3][1].height = None               # Thiếu height -> mọi cặp với user này không hợp lệ
+    user_data[5][1].location_preference = None  # Thiếu location_preference -> không hợp lệ
+    user_data[8] = user_data[8][:2] + (None,) + user_data[8][3:]  # Thiếu tọa độ -> khoảng cách mặc định
+    user_data[9][2].latitudes, user_data[9][2].longitudes = -12.0, -75.0  # Gần đối tâm với các user còn lại
+    raw_records = [predictor._transform_raw_user_data_to_ml_input(*data) for data in user_data]
+    feature_vectors = [predictor._get_user_feature_vector(*data) for data in user_data]
+    columns, positions = predictor.build_user_columns(user_data, raise_errors=True)
+    assert positions == list(range(N_USERS))
+    return raw_records, feature_vectors, columns
+
+
+def _baseline(predictor, raw_records, feature_vectors, i: int, j: int):
+    """Vector của bản tính từng cặp (user i là user1), None nếu bản từng cặp ném lỗi."""
+    try:
+        return create_pairwise_features_vector(
+            raw_records[i], feature_vectors[i], raw_records[j], feature_vectors[j], predictor.pairwise_input_columns,
+            predictor.pairwise_features_scaler, predictor.numerical_pairwise_cols_to_scale).values.astype(np.float64)
+    except (TypeError, ValueError):
+        return None
+
+
+@pytest.mark.parametrize("anchor_row", [0, 3, 5, 8, 9, 17])
+def test_build_matches_per_pair_baseline(predictor, population, anchor_row):
+    raw_records, feature_vectors, columns = population
+    matrix, valid = predictor.pairwise_engine.build(columns, columns, anchor_row)
+    assert matrix.shape == (N_USERS, len(predictor.pairwise_input_columns))
+    for j in range(N_USERS):
+        expected = _baseline(predictor, raw_records, feature_vectors, anchor_row, j)
+        assert bool(valid[j]) == (expected is not None), f"validity differs for pair ({anchor_row}, {j})"
+        if expected is not None:
+            np.testing.assert_allclose(matrix[j], expected, rtol=0, atol=PAIRWISE_PARITY_ATOL)
+
+
+@pytest.mark.parametrize("anchor_row", [0, 8, 9])
+def test_build_both_directions_matches_per_pair_baseline(predictor, population, anchor_row):
+    raw_records, feature_vectors, columns = population
+    matrix, reverse_matrix, valid = predictor.pairwise_engine.build_both_directions(columns, columns, anchor_row)
+    forward, forward_valid = predictor.pairwise_engine.build(columns, columns, anchor_row)
+    np.testing.assert_array_equal(valid, forward_valid)
+    np.testing.assert_array_equal(matrix[valid], forward[valid])
+    for j in range(N_USERS):
+        expected = _baseline(predictor, raw_records, feature_vectors, j, anchor_row)
+        assert bool(valid[j]) == (expected is not None), f"validity differs for pair ({j}, {anchor_row})"
+        if expected is not None:
+            np.testing.assert_allclose(reverse_matrix[j], expected, rtol=0, atol=PAIRWISE_PARITY_ATOL)
+
+
+def test_missing_height_and_location_preference_are_invalid(predictor, population):
+    _, _, columns = population
+    _, valid = predictor.pairwise_engine.build(columns, columns, anchor_row=0)
+    assert not valid[3] and not valid[5]
+    assert valid[[0, 8, 9]].all()
+    for anchor_row in (3, 5):
+        _, valid = predictor.pairwise_engine.build(columns, columns, anchor_row=anchor_row)
+        assert not valid.any()
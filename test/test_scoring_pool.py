@@ -0,0 +1,80 @@
+# test/test_scoring_pool.py
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import crud
+from app.ml.compatibility import bucket_key
+from app.services.match_service import MatchService
+from app.services.scoring_pool import ShardedScoringPool
+from benchmarks.synthetic import create_synthetic_database
+
+ANCHOR_USER_ID = 1
+SHARD_SIZE = 7
+
+
+@pytest.fixture(scope="module")
+def database_url(tmp_path_factory):
+    database_url = f"sqlite:///{tmp_path_factory.mktemp('scoring_pool') / 'synthetic.db'}"
+    create_synthetic_database(database_url, 60, user_role_ratio=1.0).dispose()
+    return database_url
+
+
+@pytest.fixture(scope="module")
+def pool(database_url):
+    pool = ShardedScoringPool(max_workers=2, shard_size=SHARD_SIZE, database_url=database_url, min_candidates=1)
+    yield pool
+    pool.shutdown()
+
+
+def _assert_chunks_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for actual_chunk, expected_chunk in zip(actual, expected):
+        for actual_part, expected_part in zip(actual_chunk, expected_chunk):
+            if expected_part is None:
+                assert actual_part is None
+            else:
+                np.testing.assert_array_equal(actual_part, expected_part)
+
+
+@pytest.mark.parametrize("threshold_only", [False, True])
+def test_score_shards_matches_in_process_scoring(predictor, database_url, pool, monkeypatch, threshold_only):
+    monkeypatch.setattr(settings, "CANDIDATE_FETCH_CHUNK_SIZE", 3)  # Nhiều chunk trong mỗi shard
+    engine = create_engine(database_url)
+    with Session(engine) as db:
+        anchor_data = crud.get_user_profile_raw_data(db, ANCHOR_USER_ID)
+        anchor_columns, _ = predictor.build_user_columns([anchor_data], user_ids=[ANCHOR_USER_ID], raise_errors=True)
+        bucket = bucket_key(anchor_data[1].sex, anchor_data[7])
+        candidate_ids = crud.get_all_other_user_ids_with_role(db, ANCHOR_USER_ID)
+        assert len(candidate_ids) > 3 * SHARD_SIZE
+
+        service = MatchService(db, predictor)
+        expected = []
+        for shard_start in range(0, len(candidate_ids), SHARD_SIZE):
+            shard_ids = candidate_ids[shard_start:shard_start + SHARD_SIZE]
+            for chunk_start in range(0, len(shard_ids), 3):
+                chunk = service.score_candidate_ids(ANCHOR_USER_ID, anchor_columns, bucket,
+                                                    shard_ids[chunk_start:chunk_start + 3], threshold_only)
+                if chunk is not None:
+                    expected.append(chunk)
+    engine.dispose()
+
+    actual = list(pool.score_shards(ANCHOR_USER_ID, anchor_columns, bucket, candidate_ids, service.geo_filter_mode,
+                                    threshold_only))
+    _assert_chunks_equal(actual, expected)
+
+
+def test_discard_broken_keeps_replacement_pool(database_url):
+    """Một request báo pool cũ bị hỏng sau khi pool đã được tạo lại thì không được bỏ pool mới."""
+    pool = ShardedScoringPool(max_workers=1, shard_size=SHARD_SIZE, database_url=database_url)
+    broken = pool._get_executor()
+    pool._discard_broken(broken)
+    replacement = pool._get_executor()
+    try:
+        assert replacement is not broken
+        pool._discard_broken(broken)
+        assert pool._executor is replacement
+    finally:
+        pool.shutdown()
@@ -0,0 +1,53 @@
+# test/test_tree_evaluator.py
+import numpy as np
+import pytest
+
+from app.ml.tree_evaluator import EarlyExitTreeEvaluator
+
+
+@pytest.fixture(scope="module")
+def evaluator(predictor):
+    if predictor.booster is None:
+        pytest.skip("model has no LightGBM booster")
+    return EarlyExitTreeEvaluator(predictor.booster, num_threads=1)
+
+
+def _random_matrix(rng: np.random.Generator, n_rows: int, n_features: int) -> np.ndarray:
+    matrix = rng.random((n_rows, n_features))
+    matrix[rng.random((n_rows, n_features)) < 0.05] = np.nan
+    matrix[rng.random((n_rows, n_features)) < 0.05] = 0.0
+    return matrix
+
+
+@pytest.mark.parametrize("threshold", [0.05, 0.3, 0.5, 0.7, 0.9, 0.99])
+def test_predict_above_matches_booster(predictor, evaluator, threshold):
+    matrix = _random_matrix(np.random.default_rng(1), 3000, evaluator.num_features)
+    probas = predictor.booster.predict(matrix)
+    stats = {}
+    np.testing.assert_array_equal(evaluator.predict_above(matrix, threshold, stats), probas > threshold)
+    assert stats["rows"] == 3000 and 0 < stats["tree_fraction"] <= 1
+
+
+def test_exact_fallback_on_threshold_boundary(predictor, evaluator):
+    matrix = _random_matrix(np.random.default_rng(2), 50, evaluator.num_features)
+    probas = predictor.booster.predict(matrix)
+    stats = {}
+    # Threshold bằng đúng score của một dòng: dòng đó phải được Booster tính lại
+    above = evaluator.predict_above(matrix, float(probas[0]), stats)
+    np.testing.assert_array_equal(above, probas > probas[0])
+    assert stats["exact_fallback_rows"] >= 1
+
+
+def test_booster_fallback_gets_num_threads(predictor, evaluator, monkeypatch):
+    calls = []
+    original = evaluator.booster.predict
+
+    def predict(data, **kwargs):
+        calls.append(kwargs.get("num_threads"))
+        return original(data, **kwargs)
+
+    monkeypatch.setattr(evaluator.booster, "predict", predict)
+    matrix = _random_matrix(np.random.default_rng(3), 20, evaluator.num_features)
+    evaluator.predict_above(matrix, 1.0)  # Ngoài (0, 1): quyết định hoàn toàn bằng Booster
+    evaluator.predict_above(matrix, float(original(matrix)[0]))
+    assert calls == [1, 1]
@@ -0,0 +1,120 @@
+# test/test_user_events.py
+import pytest
+
+from app.services import user_events
+from app.services.user_events import UserUpdateQueue, UserUpdateQueueFullError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FlakyProcessor:
+    """process_batch giả: lỗi `failures` lần đầu, sau đó ghi lại các lô đã xử lý."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, user_ids):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database down")
+        self.batches.append(sorted(user_ids))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(user_events.time, "monotonic", clock)
+    return clock
+
+
+def _process_due(queue: UserUpdateQueue, clock: FakeClock) -> None:
+    # Một vòng của thread nền, không chạy thread
+    batch = queue._take_batch(clock())
+    if batch:
+        queue._process(batch)
+
+
+def test_events_are_coalesced_until_due(clock):
+    processor = FlakyProcessor()
+    queue = UserUpdateQueue(processor, coalesce_seconds=5, max_delay_seconds=60)
+    assert queue.submit(1) is False
+    clock.now += 3
+    assert queue.submit(1) is True
+    queue.submit(2)
+    clock.now += 4  # User 1: 4s sau sự kiện cuối
+    _process_due(queue, clock)
+    assert processor.batches == []
+    clock.now += 1
+    _process_due(queue, clock)
+    assert processor.batches == [[1, 2]]
+    assert queue.depth == 0
+
+
+def test_failed_batch_is_retried_with_backoff(clock):
+    processor = FlakyProcessor(failures=2)
+    queue = UserUpdateQueue(processor, coalesce_seconds=0, max_delay_seconds=60, retry_backoff_seconds=2)
+    queue.submit(1)
+    queue.submit(2)
+    _process_due(queue, clock)  # Lỗi lần 1 -> thử lại sau 2s
+    assert queue.depth == 2
+    clock.now += 1.9
+    _process_due(queue, clock)
+    assert processor.failures == 1
+    clock.now += 0.1
+    _process_due(queue, clock)  # Lỗi lần 2 -> thử lại sau 4s
+    clock.now += 3.9
+    _process_due(queue, clock)
+    assert processor.batches == []
+    clock.now += 0.1
+    _process_due(queue, clock)
+    assert processor.batches == [[1, 2]]
+    assert queue.depth == 0
+
+
+def test_event_during_failed_batch_is_merged_into_retry(clock):
+    queue = UserUpdateQueue(lambda user_ids: None, coalesce_seconds=0, retry_backoff_seconds=10)
+    queue.submit(1)
+    batch = queue._take_batch(clock())
+    queue.submit(1)  # Đến trong lúc lô đang xử lý
+
+    def fail(user_ids):
+        raise ConnectionError("database down")
+
+    queue.process_batch = fail
+    queue._process(batch)
+    assert list(queue._pending) == [1]
+    first_received_at, _, failures, not_before = queue._pending[1]
+    assert (first_received_at, failures, not_before) == (clock(), 1, clock() + 10)
+
+
+def test_events_are_dropped_after_max_retries(clock):
+    processor = FlakyProcessor(failures=10)
+    queue = UserUpdateQueue(processor, coalesce_seconds=0, max_retries=2, retry_backoff_seconds=1)
+    queue.submit(1)
+    for _ in range(5):
+        _process_due(queue, clock)
+        clock.now += 60
+    assert processor.failures == 7  # Lần đầu + 2 lần thử lại
+    assert queue.depth == 0
+
+
+def test_submit_rejects_new_users_when_full(clock):
+    queue = UserUpdateQueue(FlakyProcessor(), coalesce_seconds=5, max_pending=2)
+    queue.submit(1)
+    queue.submit(2)
+    with pytest.raises(UserUpdateQueueFullError):
+        queue.submit(3)
+    assert queue.submit(1) is True  # User đã có trong hàng đợi vẫn được gộp
+    clock.now += 5
+    batch = queue._take_batch(clock())
+    with pytest.raises(UserUpdateQueueFullError):
+        queue.submit(3)  # User đang được xử lý vẫn tính vào max_pending
+    queue._process(batch)
+    assert queue.submit(3) is False
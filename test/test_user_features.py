@@ -0,0 +1,50 @@
+# test/test_user_features.py
+import random
+
+import numpy as np
+import pytest
+
+from app.ml.preprocessing import create_user_feature_array, create_user_feature_vector
+
+BIOS = [None, "", "Love travelling, live music and cooking", "hiking dogs coffee", "Café crème & naïve résumé"]
+
+
+def _pick(rnd: random.Random, values, extra=("unknown-category", None)):
+    return rnd.choice(list(values) + list(extra))
+
+
+def _raw_record(user_id: int, rnd: random.Random, artifacts) -> dict:
+    """Raw data ngẫu nhiên (như MatchPredictor._transform_raw_user_data_to_ml_input), gồm giá trị thiếu / lạ."""
+    sex, orientation, body_type, drink, smoke = (_pick(rnd, categories)
+                                                 for categories in artifacts.onehot_encoder_categorical.categories_)
+
+    def multi_value(items):
+        chosen = rnd.sample(list(items), rnd.randint(0, 3)) + rnd.choice([[], ["Something Else"]])
+        return " - ".join(sorted(chosen)) if chosen else None
+
+    return {
+        'id': user_id, 'age': rnd.choice([np.nan, 18, 27.0, 45, 90]), 'height': rnd.choice([np.nan, None, 55, 68, 81]),
+        'sex': sex, 'orientation': orientation, 'body_type': body_type, 'drink': drink, 'smoke': smoke,
+        'job': _pick(rnd, artifacts.top_n_job_categories, ("Astronaut", None, "  ")),
+        'education_level': _pick(rnd, artifacts.top_n_edu_categories, ("PhD in Memes", None)),
+        'dropped_out_school': rnd.choice([True, False, None]),
+        'interested_in_new_language': rnd.choice([True, False, None]),
+        'location_preference': rnd.choice([-1, None, 0, 10, 50, 2000]),
+        'bio': rnd.choice(BIOS),
+        'latitude': rnd.choice([None, rnd.uniform(-60, 60)]), 'longitude': rnd.choice([None, rnd.uniform(-170, 170)]),
+        'pets': multi_value(artifacts.top_pets_items), 'interests': multi_value(artifacts.top_interests_items),
+        'languages': multi_value(artifacts.top_languages_items),
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_feature_array_matches_legacy_vector(predictor, seed):
+    artifacts = predictor.artifacts
+    schema = artifacts.user_feature_schema
+    rnd = random.Random(seed)
+    for user_id in range(seed * 1000, seed * 1000 + 60):
+        raw = _raw_record(user_id, rnd, artifacts)
+        expected = create_user_feature_vector(raw, artifacts=artifacts).reindex(schema.columns).fillna(0)
+        actual = create_user_feature_array(raw, artifacts=artifacts)
+        assert actual.dtype == np.float32
+        np.testing.assert_array_equal(actual, expected.astype(np.float32).values, err_msg=repr(raw))